@@ -1,5 +1,4 @@
 """ELT Dashboard — мониторинг пайплайна и аналитика загрузки данных."""
-import asyncio
 import os
 from datetime import datetime, timedelta
 
@@ -8,7 +7,7 @@ import plotly.express as px
 import plotly.graph_objects as go
 import streamlit as st
 from dotenv import load_dotenv
-from src.config.settings import settings
+from src.utils import dashboard_data
 
 load_dotenv()
 
@@ -146,42 +145,30 @@ st.markdown("""
 
 
 
-async def get_db_conn():
-    """Устанавливает прямое соединение с БД для Streamlit."""
-    import asyncpg
-    from src.config.settings import settings
-    # Supabase uses PgBouncer in transaction mode, so we must disable prepared statements
-    return await asyncpg.connect(settings.database_dsn, statement_cache_size=0)
-
-
-@st.cache_data(ttl=30)
-def fetch_runs_data(_days: int = 30) -> pd.DataFrame:
-    """Получает историю запусков за последние N дней."""
-    async def _fetch():
-        conn = await get_db_conn()
-        try:
-            rows = await conn.fetch(f"""
-                SELECT run_id, started_at, finished_at, status, mode,
-                       tables_processed, total_rows_synced, validation_errors,
-                       duration_seconds, error_message
-                FROM {settings.schema_ops}.elt_runs
-                WHERE started_at > NOW() - INTERVAL '{_days} days'
-                ORDER BY started_at DESC
-            """)
-            return [dict(r) for r in rows]
-        finally:
-            await conn.close()
-    
+def _frame(fetch, *args) -> pd.DataFrame:
+    """DataFrame из функции src/utils/dashboard_data.py (пустой при ошибке)."""
     try:
-        data = asyncio.run(_fetch())
-        return pd.DataFrame(data) if data else pd.DataFrame()
+        rows = fetch(*args)
+        return pd.DataFrame(rows) if rows else pd.DataFrame()
     except Exception as e:
         # Не выводим ворнинг если таблиц еще нет (первый запуск)
-        if f'relation "{settings.schema_ops}.elt_runs" does not exist' not in str(e):
+        if 'does not exist' not in str(e):
             st.warning(f"Ошибка получения данных: {e}")
         return pd.DataFrame()
 
 
+@st.cache_data(ttl=30)
+def fetch_run_daily(days: int = 30) -> pd.DataFrame:
+    """Дневные сводки запусков за последние N дней (ops.elt_run_daily)."""
+    return _frame(dashboard_data.fetch_run_daily, days)
+
+
+@st.cache_data(ttl=30)
+def fetch_recent_runs(limit: int = 30) -> pd.DataFrame:
+    """Последние запуски для графика длительности и таблицы."""
+    return _frame(dashboard_data.fetch_recent_runs, limit)
+
+
 
 # Validations and Stats logic moved to pages/
 
@@ -213,11 +200,9 @@ def main():
         st.divider()
         st.caption(f"Last update: {datetime.now().strftime('%H:%M:%S')}")
 
-    # Load shared data
-
-
-    # Load shared data
-    runs_df = fetch_runs_data(days_range)
+    # Load shared data: дневные сводки за период + последние запуски
+    daily_df = fetch_run_daily(days_range)
+    runs_df = fetch_recent_runs(30)
     if not runs_df.empty:
         # Timezone Correction: UTC -> UTC+5
         runs_df['started_at'] = pd.to_datetime(runs_df['started_at']) + pd.Timedelta(hours=5)
@@ -227,20 +212,22 @@ def main():
     # LANDING PAGE: OVERVIEW
     st.markdown("### 📊 Pipeline Overview")
     
-    if runs_df.empty:
+    if daily_df.empty:
         st.info("No data. Run pipeline: `python -m src.main`")
         return
 
     # KPI Compact
     col1, col2, col3, col4, col5 = st.columns(5)
     
-    total_runs = len(runs_df)
-    successful = len(runs_df[runs_df['status'] == 'success'])
-    failed = len(runs_df[runs_df['status'] == 'failed'])
+    runs_by_status = daily_df.groupby('status')['runs'].sum()
+    total_runs = int(runs_by_status.sum())
+    successful = int(runs_by_status.get('success', 0))
+    failed = int(runs_by_status.get('failed', 0))
     success_rate = (successful / total_runs * 100) if total_runs > 0 else 0
     
-    total_rows = runs_df['total_rows_synced'].sum()
-    avg_duration = runs_df['duration_seconds'].mean()
+    total_rows = int(daily_df['rows_synced'].sum())
+    timed_runs = daily_df['timed_runs'].sum()
+    avg_duration = float(daily_df['duration_s_total'].sum()) / timed_runs if timed_runs else float('nan')
 
     col1.metric("Total Runs", total_runs)
     col2.metric("Success", successful, f"{success_rate:.0f}%")
@@ -255,12 +242,9 @@ def main():
     
     with c1:
         st.markdown("#### Run History")
-        if 'started_at' in runs_df.columns:
-            runs_df['date'] = pd.to_datetime(runs_df['started_at']).dt.date
-            daily = runs_df.groupby(['date', 'status']).size().reset_index(name='count')
-            
+        if not daily_df.empty:
             fig = px.bar(
-                daily, x='date', y='count', color='status',
+                daily_df, x='day', y='runs', color='status',
                 color_discrete_map={'success': '#10b981', 'failed': '#ef4444', 'running': '#f59e0b'},
                 barmode='stack', template='plotly_white', height=250
             )
@@ -274,7 +258,7 @@ def main():
 
     with c2:
         st.markdown("#### Duration (sec)")
-        recent = runs_df.head(30)
+        recent = runs_df.iloc[::-1].copy()
         if not recent.empty and 'duration_seconds' in recent.columns:
             recent['label'] = pd.to_datetime(recent['started_at']).dt.strftime('%m/%d %H:%M')
             fig = go.Figure()
@@ -1,67 +1,39 @@
 
 from datetime import datetime, timedelta
-import asyncio
 import pandas as pd
 import streamlit as st
 import plotly.express as px
-from src.config.settings import settings
+from src.utils import dashboard_data
 
-# Reuse connection function (ideally this should be in a utils file, but distinct for now)
 
-async def get_db_conn():
-    import asyncpg
-    # Supabase/PgBouncer compatibility
-    return await asyncpg.connect(settings.database_dsn, statement_cache_size=0)
-
-@st.cache_data(ttl=30)
-def fetch_table_stats() -> pd.DataFrame:
-    """Fetch aggregated table stats with time context component."""
-    async def _fetch():
-        conn = await get_db_conn()
-        try:
-            # Join with runs to get dates
-            rows = await conn.fetch(f"""
-
-                SELECT 
-                    ts.table_name,
-                    ts.rows_extracted,
-                    ts.rows_inserted,
-                    ts.rows_updated,
-                    ts.rows_deleted,
-                    ts.validation_errors,
-                    ts.duration_ms,
-                    r.started_at,
-                    r.run_id
-                FROM {settings.schema_ops}.elt_table_stats ts
-
-                JOIN {settings.schema_ops}.elt_runs r ON r.run_id = ts.run_id
-                ORDER BY r.started_at DESC
-                LIMIT 2000
-            """)
-            return [dict(r) for r in rows]
-        finally:
-            await conn.close()
-    
+def _frame(fetch, *args) -> pd.DataFrame:
     try:
-        data = asyncio.run(_fetch())
-        return pd.DataFrame(data) if data else pd.DataFrame()
+        rows = fetch(*args)
+        return pd.DataFrame(rows) if rows else pd.DataFrame()
     except Exception:
         return pd.DataFrame()
 
-st.set_page_config(page_title="Table Details", page_icon="📊", layout="wide")
-
-st.markdown("### 📊 Table Operations Analysis")
+@st.cache_data(ttl=30)
+def fetch_table_daily(days: int = 30) -> pd.DataFrame:
+    """Daily per-table rollups (ops.elt_table_daily)."""
+    return _frame(dashboard_data.fetch_table_daily, days)
 
-df = fetch_table_stats()
+@st.cache_data(ttl=30)
+def fetch_recent_table_stats(limit: int = 500) -> pd.DataFrame:
+    """Latest raw table loads for the detailed grid."""
+    return _frame(dashboard_data.fetch_recent_table_stats, limit)
 
+st.set_page_config(page_title="Table Details", page_icon="📊", layout="wide")
 
+st.markdown("### 📊 Table Operations Analysis")
 
+df = fetch_table_daily(30)
+logs_df = fetch_recent_table_stats()
 
 
 if not df.empty:
-    # Timezone Correction: UTC -> UTC+5 (Yekaterinburg)
-    df['started_at'] = pd.to_datetime(df['started_at']) + timedelta(hours=5)
-    df['date'] = df['started_at'].dt.date
+    # Сводки уже разбиты по суткам Екатеринбурга (ROLLUP_TIMEZONE)
+    df['date'] = pd.to_datetime(df['day'])
     
     # Define Categories and Entities
     def get_category(table_name):
@@ -76,12 +48,19 @@ if not df.empty:
                 return entity.capitalize()
         return "Other"
 
-    df['category'] = df['table_name'].apply(get_category)
-    df['entity'] = df['table_name'].apply(get_entity)
+    df['category'] = df['table_name'].map(get_category)
+    df['entity'] = df['table_name'].map(get_entity)
 
     # Filter out Others/Legacy completely
     df = df[df['category'] != "Legacy/Other"]
 
+    if not logs_df.empty:
+        # Timezone Correction: UTC -> UTC+5 (Yekaterinburg)
+        logs_df['started_at'] = pd.to_datetime(logs_df['started_at']) + timedelta(hours=5)
+        logs_df['category'] = logs_df['table_name'].map(get_category)
+        logs_df['entity'] = logs_df['table_name'].map(get_entity)
+        logs_df = logs_df[logs_df['category'] != "Legacy/Other"]
+
 
     # --- Global Filters ---
     st.markdown("#### 🔍 Filter View")
@@ -93,8 +72,10 @@ if not df.empty:
     # Apply filter
     if selected_entity != "Show All":
         filtered_df = df[df['entity'] == selected_entity]
+        filtered_logs = logs_df[logs_df['entity'] == selected_entity] if not logs_df.empty else logs_df
     else:
         filtered_df = df
+        filtered_logs = logs_df
 
     # Time Range calculation
     now = datetime.now()
@@ -171,6 +152,18 @@ if not df.empty:
     display_category_metrics(filtered_df)
     st.divider()
 
+    st.markdown("#### ⏱ Load Performance (p50 / p95, rows/s)")
+    perf = filtered_df.groupby('table_name').agg(
+        loads=('loads', 'sum'),
+        rows_extracted=('rows_extracted', 'sum'),
+        duration_ms_total=('duration_ms_total', 'sum'),
+        p50_ms=('duration_ms_p50', 'median'),
+        p95_ms=('duration_ms_p95', 'max'),
+    )
+    perf['rows_per_s'] = (perf['rows_extracted'] * 1000 / perf['duration_ms_total'].where(perf['duration_ms_total'] > 0)).round(0)
+    st.dataframe(perf.drop(columns=['duration_ms_total']).astype(float).round(0), use_container_width=True)
+    st.divider()
+
     # 1. Vertical Charts: Current followed by History
     st.markdown("#### 📈 Volume Trends (Inserts / Updates / Errors)")
     
@@ -188,16 +181,19 @@ if not df.empty:
     st.markdown("### 📋 Detailed Logs")
     
 
-    # Grid always follows entity filtering
-    st.dataframe(
-        filtered_df[['started_at', 'category', 'table_name', 'rows_extracted', 'rows_inserted', 'rows_updated', 'rows_deleted', 'validation_errors', 'duration_ms']].sort_values('started_at', ascending=False),
-        use_container_width=True,
-        hide_index=True,
-        column_config={
-            "started_at": st.column_config.DatetimeColumn("Timestamp", format="D MMM HH:mm"),
-            "duration_ms": st.column_config.NumberColumn("Duration (ms)")
-        }
-    )
+    # Grid always follows entity filtering (последние загрузки, не вся история)
+    if filtered_logs.empty:
+        st.info("No recent table loads.")
+    else:
+        st.dataframe(
+            filtered_logs[['started_at', 'category', 'table_name', 'rows_extracted', 'rows_inserted', 'rows_updated', 'rows_deleted', 'validation_errors', 'duration_ms']].sort_values('started_at', ascending=False),
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "started_at": st.column_config.DatetimeColumn("Timestamp", format="D MMM HH:mm"),
+                "duration_ms": st.column_config.NumberColumn("Duration (ms)")
+            }
+        )
 
 else:
     st.info("No table statistics available yet. Run the pipeline to generate data.")
@@ -1,61 +1,53 @@
 
-import asyncio
 import pandas as pd
 import streamlit as st
 import plotly.express as px
-from src.config.settings import settings
+from src.utils import dashboard_data
 
 
-async def get_db_conn():
-    import asyncpg
-    # Supabase/PgBouncer compatibility
-    return await asyncpg.connect(settings.database_dsn, statement_cache_size=0)
-
-@st.cache_data(ttl=30)
-def fetch_errors(limit: int = 500) -> pd.DataFrame:
-    async def _fetch():
-        conn = await get_db_conn()
-        try:
-            rows = await conn.fetch(f"""
-                SELECT created_at, table_name, column_name, invalid_value, error_type, message
-                FROM {settings.schema_ops}.validation_logs
-                ORDER BY created_at DESC
-                LIMIT $1
-            """, limit)
-            return [dict(r) for r in rows]
-        finally:
-            await conn.close()
-            
+def _frame(fetch, *args) -> pd.DataFrame:
     try:
-        data = asyncio.run(_fetch())
-        return pd.DataFrame(data) if data else pd.DataFrame()
+        rows = fetch(*args)
+        return pd.DataFrame(rows) if rows else pd.DataFrame()
     except Exception:
         return pd.DataFrame()
 
+@st.cache_data(ttl=30)
+def fetch_error_daily(days: int = 30) -> pd.DataFrame:
+    """Daily error counts per table / type (ops.elt_error_daily)."""
+    return _frame(dashboard_data.fetch_error_daily, days)
+
+@st.cache_data(ttl=30)
+def fetch_errors(limit: int = 500) -> pd.DataFrame:
+    return _frame(dashboard_data.fetch_recent_errors, limit)
+
 st.set_page_config(page_title="Data Quality", page_icon="🚨", layout="wide")
 
 st.markdown("### 🚨 Data Quality & Validation")
 
+days = st.slider("Period (days)", 1, 90, 30)
 limit = st.slider("Limit rows", 100, 2000, 500)
+daily_df = fetch_error_daily(days)
 errors_df = fetch_errors(limit)
 
-if not errors_df.empty:
+if not daily_df.empty:
     col1, col2 = st.columns(2)
     
     with col1:
         st.markdown("#### Errors by Table")
-        err_by_table = errors_df['table_name'].value_counts().reset_index()
+        err_by_table = daily_df.groupby('table_name', as_index=False)['errors'].sum()
         err_by_table.columns = ['Table', 'Count']
         fig1 = px.pie(err_by_table, names='Table', values='Count', hole=0.4, color_discrete_sequence=px.colors.sequential.RdBu)
         st.plotly_chart(fig1, use_container_width=True)
         
     with col2:
         st.markdown("#### Types of Errors")
-        err_by_type = errors_df['error_type'].value_counts().reset_index()
+        err_by_type = daily_df.groupby('error_type', as_index=False)['errors'].sum().sort_values('errors', ascending=False)
         err_by_type.columns = ['Type', 'Count']
         fig2 = px.bar(err_by_type, x='Count', y='Type', orientation='h', text='Count', color='Count', color_continuous_scale='Reds')
         st.plotly_chart(fig2, use_container_width=True)
 
+if not errors_df.empty:
     st.markdown("#### 🕵️ Error Inspector")
     
     # Filter by table
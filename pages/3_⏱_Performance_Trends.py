@@ -1,86 +1,78 @@
 
-import asyncio
 import pandas as pd
 import streamlit as st
 import plotly.graph_objects as go
-from src.config.settings import settings
+from src.utils import dashboard_data
 
 
-async def get_db_conn():
-    import asyncpg
-    # Supabase/PgBouncer compatibility
-    return await asyncpg.connect(settings.database_dsn, statement_cache_size=0)
-
-@st.cache_data(ttl=30)
-def fetch_run_metrics(days: int = 30) -> pd.DataFrame:
-    async def _fetch():
-        conn = await get_db_conn()
-        try:
-            rows = await conn.fetch(f"""
-                SELECT 
-                    started_at, 
-                    duration_seconds, 
-                    total_rows_synced,
-                    tables_processed,
-                    status
-                FROM {settings.schema_ops}.elt_runs
-                WHERE started_at > NOW() - INTERVAL '{days} days'
-                ORDER BY started_at ASC
-            """)
-            return [dict(r) for r in rows]
-        finally:
-            await conn.close()
+def _frame(fetch, *args) -> pd.DataFrame:
     try:
-        data = asyncio.run(_fetch())
-        return pd.DataFrame(data) if data else pd.DataFrame()
+        rows = fetch(*args)
+        return pd.DataFrame(rows) if rows else pd.DataFrame()
     except Exception:
         return pd.DataFrame()
 
+@st.cache_data(ttl=30)
+def fetch_run_daily(days: int = 30) -> pd.DataFrame:
+    """Daily run rollups: volume, p50/p95 duration, best throughput (ops.elt_run_daily)."""
+    return _frame(dashboard_data.fetch_run_daily, days)
+
+@st.cache_data(ttl=30)
+def fetch_run_metrics(limit: int = 200) -> pd.DataFrame:
+    """Latest runs with throughput computed in SQL."""
+    return _frame(dashboard_data.fetch_recent_runs, limit)
+
+@st.cache_data(ttl=30)
+def fetch_span_breakdown(runs: int = 20) -> pd.DataFrame:
+    """Длительности спанов (фаз и шагов) за последние N запусков."""
+    return _frame(dashboard_data.fetch_span_breakdown, runs)
+
 st.set_page_config(page_title="Performance", page_icon="⏱", layout="wide")
 
 st.markdown("### ⏱ Pipeline Performance")
 
+daily = fetch_run_daily(30)
 df = fetch_run_metrics()
 
 
-if not df.empty:
-    # Timezone Correction: UTC -> UTC+5
-    df['started_at'] = pd.to_datetime(df['started_at']) + pd.Timedelta(hours=5)
-    df['timestamp'] = df['started_at']
-    
-
-    # Throughput Calculation
-    # Avoid div by zero and None type (running jobs)
-    df['throughput'] = df.apply(lambda x: x['total_rows_synced'] / x['duration_seconds'] if (x['duration_seconds'] and x['duration_seconds'] > 0) else 0, axis=1)
+if not daily.empty:
+    finished = daily[daily['status'] != 'running']
+    volume = finished.groupby('day', as_index=False)['rows_synced'].sum()
+    # Латентность — по успешным запускам (упавшие обычно короче и искажают перцентили)
+    latency = daily[daily['status'] == 'success']
+    timed_runs = finished['timed_runs'].sum()
 
     c1, c2 = st.columns(2)
     with c1:
-        st.metric("Avg Duration", f"{df['duration_seconds'].mean():.2f}s")
+        avg_duration = finished['duration_s_total'].sum() / timed_runs if timed_runs else 0
+        st.metric("Avg Duration", f"{avg_duration:.2f}s")
     with c2:
-        st.metric("Max Throughput", f"{df['throughput'].max():.0f} rows/s")
+        st.metric("Max Throughput", f"{finished['throughput_max'].max():.0f} rows/s")
 
-    # Dual Axis Chart: Duration vs Rows
+    # Dual Axis Chart: Daily volume vs p50 / p95 latency
     fig = go.Figure()
     
     fig.add_trace(go.Bar(
-        x=df['timestamp'],
-        y=df['total_rows_synced'],
+        x=volume['day'],
+        y=volume['rows_synced'],
         name='Rows Synced',
         marker_color='#cbd5e1'
     ))
 
-    fig.add_trace(go.Scatter(
-        x=df['timestamp'],
-        y=df['duration_seconds'],
-        name='Duration (sec)',
-        yaxis='y2',
-        line=dict(color='#2563eb', width=2),
-        mode='lines+markers'
-    ))
+    for column, label, color in (('duration_s_p50', 'Duration p50 (sec)', '#2563eb'),
+                                 ('duration_s_p95', 'Duration p95 (sec)', '#f97316')):
+        fig.add_trace(go.Scatter(
+            x=latency['day'],
+            y=latency[column],
+            name=label,
+            yaxis='y2',
+            line=dict(color=color, width=2),
+            mode='lines+markers'
+        ))
 
     fig.update_layout(
-        title="Volume vs Latency",
-        xaxis_title="Run Time",
+        title="Volume vs Latency (daily)",
+        xaxis_title="Day",
         yaxis=dict(title="Rows Processed"),
         yaxis2=dict(
             title="Duration (s)",
@@ -93,6 +85,11 @@ if not df.empty:
     )
     
     st.plotly_chart(fig, use_container_width=True)
+else:
+    st.info("No run history found.")
+
+if not df.empty:
+    df['throughput'] = df['throughput'].fillna(0)
 
     st.markdown("#### 🕒 Scatter: Time vs Volume")
     fig2 = go.Figure(data=go.Scatter(
@@ -116,5 +113,37 @@ if not df.empty:
     )
     st.plotly_chart(fig2, use_container_width=True)
 
+# --- Phase / Step Breakdown (ops.elt_spans) ---
+st.markdown("#### 🧩 Phase Breakdown")
+spans = fetch_span_breakdown()
+
+if not spans.empty:
+    spans['started_at'] = pd.to_datetime(spans['started_at']) + pd.Timedelta(hours=5)
+    spans['duration_s'] = spans['duration_s'].astype(float)
+
+    phases = spans[spans['is_root'] & spans['name'].str.startswith('phase.')].copy()
+    phases['phase'] = phases['name'].str.replace('phase.', '', regex=False)
+    phases = phases.groupby(['started_at', 'phase'], as_index=False)['duration_s'].sum()
+
+    fig3 = go.Figure()
+    for phase_name, grp in phases.groupby('phase'):
+        fig3.add_trace(go.Bar(x=grp['started_at'], y=grp['duration_s'], name=phase_name))
+    fig3.update_layout(
+        barmode='stack',
+        xaxis_title="Run Time",
+        yaxis_title="Duration (s)",
+        template='plotly_white',
+        legend=dict(x=0, y=1.1, orientation='h'),
+        height=400
+    )
+    st.plotly_chart(fig3, use_container_width=True)
+
+    st.markdown("#### 🔬 Step Breakdown per Table (avg over runs)")
+    steps = spans[~spans['is_root'] & spans['table_name'].notna()]
+    if not steps.empty:
+        pivot = steps.pivot_table(
+            index='table_name', columns='name', values='duration_s', aggfunc='mean'
+        ).fillna(0).round(2)
+        st.dataframe(pivot, use_container_width=True)
 else:
-    st.info("No run history found.")
+    st.info("No span data yet (ops.elt_spans is empty).")
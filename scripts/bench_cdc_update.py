@@ -0,0 +1,89 @@
+"""Бенчмарк CDC UPDATE: построчный execute против prepared statement + executemany.
+
+Создает временную таблицу с N строками и обновляет их двумя способами:
+- per-row: `conn.execute` на каждую строку без кэша statements (поведение под
+  PgBouncer transaction-пулингом);
+- prepared: один prepared statement и пайплайн `executemany` (session / direct).
+
+Запуск (нужен session-режим или прямое подключение, SUPABASE_DIRECT_DB_URL):
+    python -m scripts.bench_cdc_update --rows 5000 --cols 20
+"""
+
+import argparse
+import asyncio
+import time
+import asyncpg
+from src.db.connection import DBConnection
+
+TABLE = "bench_cdc_update"
+
+
+def build_update(cols: int) -> str:
+    set_parts = [f'"c{i}" = ${i + 1}' for i in range(cols)]
+    set_parts.append(f'"__row_hash" = ${cols + 1}')
+    return f'UPDATE {TABLE} SET {", ".join(set_parts)} WHERE "id" = ${cols + 2}'
+
+
+def build_args(rows: int, cols: int, round_no: int):
+    return [
+        [f"v{round_no}_{r}_{i}" for i in range(cols)] + [f"h{round_no}_{r}", str(r)]
+        for r in range(rows)
+    ]
+
+
+async def prepare_table(conn: asyncpg.Connection, rows: int, cols: int):
+    col_defs = ", ".join(f'"c{i}" TEXT' for i in range(cols))
+    await conn.execute(f'CREATE TEMP TABLE {TABLE} ("id" TEXT PRIMARY KEY, {col_defs}, "__row_hash" TEXT)')
+    await conn.copy_records_to_table(
+        TABLE, records=[[str(r)] + [None] * cols + [None] for r in range(rows)]
+    )
+
+
+async def run_per_row(rows: int, cols: int) -> float:
+    conn = await asyncpg.connect(DBConnection.dsn(), statement_cache_size=0)
+    try:
+        await prepare_table(conn, rows, cols)
+        query, args_list = build_update(cols), build_args(rows, cols, 1)
+        t0 = time.perf_counter()
+        async with conn.transaction():
+            for args in args_list:
+                await conn.execute(query, *args)
+        return time.perf_counter() - t0
+    finally:
+        await conn.close()
+
+
+async def run_prepared(rows: int, cols: int) -> float:
+    conn = await asyncpg.connect(DBConnection.dsn())
+    try:
+        await prepare_table(conn, rows, cols)
+        query, args_list = build_update(cols), build_args(rows, cols, 2)
+        t0 = time.perf_counter()
+        async with conn.transaction():
+            stmt = await conn.prepare(query)
+            await stmt.executemany(args_list)
+        return time.perf_counter() - t0
+    finally:
+        await conn.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="CDC UPDATE benchmark")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--cols", type=int, default=20)
+    args = parser.parse_args()
+
+    if DBConnection.uses_transaction_pooling():
+        print("⚠️ DSN указывает на transaction-пулинг: prepared statements могут не работать.")
+        print("   Задайте SUPABASE_DIRECT_DB_URL и DB_USE_DIRECT=true.")
+
+    print(f"Строк: {args.rows}, колонок: {args.cols}")
+    per_row = await run_per_row(args.rows, args.cols)
+    print(f"per-row execute:          {per_row:8.2f}s  ({args.rows / per_row:,.0f} rows/s)")
+    prepared = await run_prepared(args.rows, args.cols)
+    print(f"prepared + executemany:   {prepared:8.2f}s  ({args.rows / prepared:,.0f} rows/s)")
+    print(f"Ускорение: x{per_row / prepared:.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,87 @@
+"""Бенчмарк памяти представлений строк и ошибок на горячем пути (tracemalloc).
+
+Сравнивает прежние представления с компактными:
+- ошибки валидации: Pydantic-модель на ошибку против NamedTuple ValidationError;
+- изменения CDC: словарь {'pk', 'hash', 'data': {колонка: значение}} против CDCChange;
+- строки для валидатора: словарь на строку против RowView с общим индексом колонок.
+
+Значения (строки ячеек) создаются в обоих вариантах одинаково, поэтому разница —
+только накладные расходы контейнеров. БД не нужна:
+    python -m scripts.bench_memory --rows 100000 --cols 20
+"""
+
+import argparse
+import tracemalloc
+from src.etl.cdc_processor import CDCChange
+from src.etl.processor import RowView
+from src.etl.validator import ValidationError, ValidationErrorModel
+
+
+def measure(build) -> int:
+    """Пиковый прирост памяти (байт) при построении и удержании результата build()."""
+    tracemalloc.start()
+    try:
+        result = build()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return peak
+
+
+def build_errors(model, count: int):
+    return [
+        model(row_index=i, column='дата', value=f'v{i}', error_type='INVALID_DATE', message=f'Дата v{i} не распознана')
+        for i in range(count)
+    ]
+
+
+def build_dict_changes(col_names, rows: int):
+    changes = []
+    for r in range(rows):
+        values = [f'v{r}_{i}' for i in range(len(col_names))]
+        data = {col: val for col, val in zip(col_names, values)}
+        data['_row_index'] = r + 2
+        changes.append({'pk': values[0], 'hash': f'h{r}', 'data': data})
+    return changes
+
+
+def build_slot_changes(col_names, rows: int):
+    changes = []
+    for r in range(rows):
+        values = [f'v{r}_{i}' for i in range(len(col_names))]
+        changes.append(CDCChange(values[0], f'h{r}', values, r + 2))
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hot-path memory benchmark")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--cols", type=int, default=20)
+    parser.add_argument("--errors", type=int, default=50000)
+    args = parser.parse_args()
+
+    col_names = [f'c{i}' for i in range(args.cols)]
+    sheet = [[f's{r}_{i}' for i in range(args.cols)] for r in range(args.rows)]
+    index = {c: i for i, c in enumerate(col_names)}
+
+    cases = [
+        (f"Ошибки валидации ({args.errors})",
+         lambda: build_errors(ValidationErrorModel, args.errors),
+         lambda: build_errors(ValidationError, args.errors)),
+        (f"Изменения CDC ({args.rows} x {args.cols})",
+         lambda: build_dict_changes(col_names, args.rows),
+         lambda: build_slot_changes(col_names, args.rows)),
+        (f"Строки для валидатора ({args.rows} x {args.cols})",
+         lambda: [{k: v for k, v in zip(col_names, row)} for row in sheet],
+         lambda: [RowView(row, index) for row in sheet]),
+    ]
+
+    print(f"{'Сценарий':<40} {'было, МБ':>10} {'стало, МБ':>10} {'экономия':>9}")
+    for title, before, after in cases:
+        old, new = measure(before), measure(after)
+        print(f"{title:<40} {old / 2**20:>10.1f} {new / 2**20:>10.1f} {1 - new / old:>9.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -42,13 +42,29 @@ def check_access(spreadsheet_id: str, creds: Credentials) -> tuple:
         return False, f"Error: {type(e).__name__}: {e}"
 
 
-def find_cdc_header_row(worksheet, scan_limit: int = 20) -> dict:
+def fetch_header_bands(sh, worksheets: list, scan_limit: int = 20) -> dict:
+    """Первые `scan_limit` строк всех указанных листов одним values.batchGet.
+
+    Returns:
+        dict gid -> список строк полосы заголовков
+    """
+    ranges = []
+    for ws in worksheets:
+        title = ws.title.replace("'", "''")
+        ranges.append(f"'{title}'!A1:ZZ{scan_limit}")
+    response = sh.values_batch_get(ranges)
+    return {
+        ws.id: vr.get('values', [])
+        for ws, vr in zip(worksheets, response.get('valueRanges', []))
+    }
+
+
+def find_cdc_header_row(data: list, scan_limit: int = 20) -> dict:
     """Находит строку с CDC метаданными (самую нижнюю если несколько).
     
     Returns:
         dict с ключами: header_row, data_start_row, headers, missing_cols
     """
-    data = worksheet.get(f"A1:ZZ{scan_limit}")
     if not data:
         return {"error": "No data found"}
     
@@ -87,7 +103,7 @@ def estimate_size_mb(row_count: int, col_count: int, bytes_per_cell: int = 50) -
     return (row_count * col_count * bytes_per_cell) / (1024 * 1024)
 
 
-def analyze_sheet(worksheet, verbose: bool = True) -> dict:
+def analyze_sheet(worksheet, header_band: list, verbose: bool = True) -> dict:
     """Анализирует структуру листа."""
     result = {
         "title": worksheet.title,
@@ -101,7 +117,7 @@ def analyze_sheet(worksheet, verbose: bool = True) -> dict:
     result["size_mb"] = size_mb
     
     # Находим строку с CDC метаданными
-    cdc_info = find_cdc_header_row(worksheet)
+    cdc_info = find_cdc_header_row(header_band)
     result.update(cdc_info)
     
     if verbose:
@@ -157,20 +173,24 @@ def main():
     for ws in worksheets:
         print(f"   - {ws.title} (GID: {ws.id})")
     
-    # Анализ
+    # Выбор листов для анализа
     if args.gid:
-        ws = sh.get_worksheet_by_id(args.gid)
-        if ws:
-            analyze_sheet(ws)
-        else:
+        selected = [ws for ws in worksheets if ws.id == args.gid]
+        if not selected:
             print(f"❌ Sheet with GID {args.gid} not found")
             sys.exit(1)
     elif args.all:
-        for ws in worksheets:
-            analyze_sheet(ws)
+        selected = worksheets
     else:
         # По умолчанию — первый лист
-        analyze_sheet(worksheets[0])
+        selected = worksheets[:1]
+    
+    # Полосы заголовков всех выбранных листов — одним запросом
+    bands = fetch_header_bands(sh, selected)
+    for ws in selected:
+        analyze_sheet(ws, bands.get(ws.id, []))
+    
+    if not args.gid and not args.all:
         print(f"\n💡 Use --all to analyze all sheets, or --gid <id> for specific sheet")
 
 
@@ -1,82 +1,60 @@
-"""Инспектор Google Sheets: извлечение заголовков из всех настроенных листов."""
+"""Инспектор Google Sheets: извлечение заголовков из всех настроенных листов.
 
-import gspread
-import yaml
+Читает только полосы заголовков: по два запроса к API на таблицу
+(метаданные листов + один values.batchGet), независимо от числа листов.
+"""
+
+import asyncio
 import json
 from pathlib import Path
-from google.oauth2.service_account import Credentials
 from src.config.settings import settings
+from src.etl.extractor import GSheetsExtractor
 
 
-def get_headers_from_sheets():
+async def get_headers_from_sheets():
     """Извлекает заголовки из всех листов, настроенных в sources.yml."""
     
-    # Загрузка конфигурации
-    config_path = Path('sources.yml')
-    if not config_path.exists():
+    config = settings.sources
+    if not config:
         print("❌ Файл sources.yml не найден")
         return
     
-    with open(config_path, 'r') as f:
-        config = yaml.safe_load(f)
-    
-    # Аутентификация Google
-    creds_path = settings.google_credentials_path
-    if not Path(creds_path).exists():
-        print(f"❌ Ключ Google не найден: {creds_path}")
+    if not Path(settings.google_service_account_json).exists():
+        print(f"❌ Ключ Google не найден: {settings.google_service_account_json}")
         return
     
-    with open(creds_path, 'r') as f:
-        creds_info = json.load(f)
-    
-    scopes = ['https://www.googleapis.com/auth/spreadsheets.readonly']
-    creds = Credentials.from_service_account_info(creds_info, scopes=scopes)
-    gc = gspread.authorize(creds)
-    
+    extractor = GSheetsExtractor()
     results = {}
     
     print("=" * 60)
     print("ИНСПЕКТОР GOOGLE SHEETS: Извлечение заголовков")
     print("=" * 60)
     
-    # Перебор всех таблиц и листов
+    # Перебор всех таблиц: один batch-запрос заголовков на таблицу
     for ssid, sdata in config.get('spreadsheets', {}).items():
         print(f"\n📊 Таблица: {ssid}")
+        sheets = sdata.get('sheets', [])
         try:
-            sh = gc.open_by_key(ssid)
+            headers_by_gid = await extractor.extract_headers(ssid, sheets)
         except Exception as e:
-            print(f"  ❌ Ошибка открытия: {e}")
+            print(f"  ❌ Ошибка чтения заголовков: {e}")
             continue
         
-        for sheet_cfg in sdata.get('sheets', []):
+        for sheet_cfg in sheets:
             target_table = sheet_cfg['target_table']
-            gid = sheet_cfg.get('gid', 0)
-            range_name = sheet_cfg.get('range', 'A:Z')
+            info = headers_by_gid.get(str(sheet_cfg.get('gid', 0)))
+            if info is None:
+                print(f"  ❌ {target_table}: лист не найден")
+                continue
             
-            try:
-                worksheet = sh.get_worksheet_by_id(gid)
-                
-                # Извлекаем только первую строку заголовков
-                # Парсим диапазон (например, "B4:W" -> "B4:W4")
-                import re
-                parts = range_name.split(':')
-                start_cell = parts[0]
-                match = re.search(r'\d+', start_cell)
-                row_num = match.group() if match else "1"
-                col_letter = re.sub(r'\d+', '', start_cell)
-                end_col = re.sub(r'\d+', '', parts[1]) if len(parts) > 1 else col_letter
-                header_range = f"{start_cell}:{end_col}{row_num}"
-                
-                headers = worksheet.get(header_range)
-                if headers and headers[0]:
-                    results[target_table] = headers[0]
-                    print(f"  ✅ {target_table}: {len(headers[0])} колонок")
-                    print(f"      {', '.join(headers[0][:5])}{'...' if len(headers[0]) > 5 else ''}")
-                else:
-                    print(f"  ⚠️  {target_table}: заголовки не найдены")
-                    
-            except Exception as e:
-                print(f"  ❌ {target_table}: {e}")
+            headers = info['headers']
+            if headers:
+                results[target_table] = headers
+                print(f"  ✅ {target_table}: {len(headers)} колонок (строка {info['header_row']}, "
+                      f"сетка {info['row_count']}x{info['column_count']})")
+                print(f"      {', '.join(headers[:5])}{'...' if len(headers) > 5 else ''}")
+            else:
+                print(f"  ⚠️  {target_table}: заголовки не найдены")
     
     # Сохранение результата
     output_path = Path('headers.json')
@@ -90,4 +68,4 @@ def get_headers_from_sheets():
 
 
 if __name__ == "__main__":
-    get_headers_from_sheets()
+    asyncio.run(get_headers_from_sheets())
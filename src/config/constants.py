@@ -4,6 +4,10 @@
 DB_BATCH_SIZE = 1000
 DB_CONNECTION_POOL_SIZE = 5
 DB_MAX_OVERFLOW = 10
+# Соединений пула на одну параллельную загрузку таблицы: advisory-блокировка
+# table:<staging> (простаивает в транзакции всю загрузку — DataLoader берет свои
+# соединения), чтение курсором и запись (sorted-merge CDC; прочие пути — одно)
+DB_CONNECTIONS_PER_TASK = 3
 
 # Data Processing
 DATE_FORMAT = '%d.%m.%Y'
@@ -3,6 +3,7 @@ import os
 from pathlib import Path
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from typing import Dict, Any, Optional
+from src.config.constants import DB_QUERY_TIMEOUT
 
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file='.env', env_file_encoding='utf-8', extra='ignore')
@@ -14,13 +15,72 @@ class Settings(BaseSettings):
     postgres_port: int = 5432
     postgres_db: Optional[str] = None
     supabase_db_url: Optional[str] = None
+    # Прямое подключение к Postgres (в обход PgBouncer), используется при DB_USE_DIRECT=true
+    supabase_direct_db_url: Optional[str] = None
+    db_use_direct: bool = False
+
+    # Connection Pool
+    db_pool_mode: str = "auto"  # auto | transaction (PgBouncer) | session (direct / session pooler)
+    db_pool_min_size: int = 1
+    # None — по параллельности: max(15, max(replay, worker concurrency) × 3 + 2), см. DBConnection.pool_max_size
+    db_pool_max_size: Optional[int] = None
+    db_acquire_timeout: float = DB_QUERY_TIMEOUT  # ожидание свободного соединения, сек
+    db_command_timeout: Optional[float] = None    # таймаут запроса на клиенте (None — без ограничения)
+    db_statement_cache_size: int = 100           # только вне transaction-пулинга
+    db_application_name: str = "planeta_elt"
+    db_work_mem: Optional[str] = None             # например "64MB" (только session-режим)
+    db_statement_timeout: Optional[str] = None    # например "10min" (только session-режим)
+    db_slow_query_ms: Optional[int] = 5000
 
     # Google Cloud
     google_service_account_json: str = "secrets/google-service-account.json"
+    # Базовый URL вместо Google API (локальный эмулятор: python -m src.utils.sheets_emulator)
+    google_api_endpoint: Optional[str] = None
+    # Начальная частота запросов (req/s) адаптивных лимитеров Google API (src/utils/rate_limit.py)
+    google_sheets_read_rps: float = 1.0
+    google_sheets_write_rps: float = 1.0
+    google_drive_rps: float = 10.0
     
     # App
     log_level: str = "INFO"
     use_staging_schema: bool = False
+    # Типизированные staging-колонки по контрактам (date/numeric/integer/time/boolean)
+    typed_staging: bool = False
+    # Поколоночные хеши (__col_hashes): CDC UPDATE пишет только изменившиеся колонки
+    column_change_detection: bool = False
+    # CDC слиянием по pk (серверный курсор вместо словаря хешей) для листов от N строк; 0 — выключено
+    sorted_merge_cdc_min_rows: int = 100000
+    # Full refresh: 'truncate' (TRUNCATE + COPY) или 'swap' (теневая таблица + RENAME)
+    full_refresh_strategy: str = "truncate"
+    full_refresh_unlogged: bool = False
+    # --replay-from-raw: сколько таблиц обрабатывается параллельно
+    replay_concurrency: int = 4
+    # --daemon: интервалы по умолчанию для категорий листов (refresh_interval в sources.yml важнее)
+    daemon_interval_cur: str = "5m"
+    daemon_interval_hst: str = "1d"
+    daemon_interval_ref: str = "7d"
+    daemon_tick_seconds: float = 30.0   # как часто демон проверяет, какие листы пора обновить
+    daemon_retry_seconds: float = 300.0 # повтор листа после сбоя запуска
+    # --webhook: прием правок из Apps Script (src/etl/webhook.py)
+    webhook_host: str = "127.0.0.1"
+    webhook_port: int = 8780
+    webhook_token: Optional[str] = None          # заголовок X-Webhook-Token или ?token=
+    webhook_flush_seconds: float = 2.0           # период загрузки накопленных правок
+    webhook_max_batch_rows: int = 500            # досрочная загрузка при таком числе строк
+    webhook_reconcile_interval: str = "1h"       # полная сверка листов с правками
+    # Очередь заданий ops.elt_jobs (--enqueue / --worker, src/etl/jobs.py)
+    worker_concurrency: int = 2          # заданий одновременно в одном процессе-воркере
+    worker_poll_seconds: float = 5.0     # пауза, когда готовых заданий нет
+    worker_heartbeat_seconds: float = 30.0  # задание без heartbeat 5 интервалов возвращается в очередь
+    job_max_attempts: int = 3
+    # Дневные сводки для дашборда (ops.elt_*_daily, src/etl/rollups.py): границы суток
+    rollup_timezone: str = "Asia/Yekaterinburg"  # как на дашборде (UTC+5)
+    # Хранение истории в партициях по месяцам (миграция 021, src/etl/partitions.py), дней; 0 — бессрочно.
+    # Месяц удаляется целиком (DROP партиции), когда весь он старше срока.
+    raw_dump_retention_days: int = 30
+    validation_log_retention_days: int = 90
+    table_stats_retention_days: int = 365
+    partition_premake_months: int = 2    # партиции наперед, кроме текущего месяца
     
     # Database Schemas
     schema_ops: str = "ops"
@@ -37,6 +97,11 @@ class Settings(BaseSettings):
     dq_anomaly_threshold_large: float = 0.1  # for large tables (> 10000 rows)
     dq_history_window: int = 5    # Compare with last 5 runs
 
+    # Metrics (Prometheus / OpenMetrics)
+    metrics_textfile: Optional[str] = None  # путь к файлу метрик; пусто = не писать файл
+    metrics_pushgateway_url: Optional[str] = None
+    metrics_job_name: str = "planeta_elt"
+
     @property
     def database_dsn(self) -> str:
         """Возвращает DSN для подключения. Приоритет у SUPABASE_DB_URL."""
@@ -1,49 +1,205 @@
 import asyncpg
 import logging
-from typing import Optional
+import time
+from typing import Any, Dict, List, Optional, Sequence
+from urllib.parse import urlsplit, parse_qs
 from src.config.settings import settings
+from src.config.constants import DB_CONNECTION_POOL_SIZE, DB_MAX_OVERFLOW, DB_CONNECTIONS_PER_TASK
+from src.utils.metrics import DB_POOL_ACQUIRE, DB_QUERY_DURATION, DB_POOL_SIZE
 
 log = logging.getLogger('db')
 
+
+class _TimedAcquire:
+    """Обертка над pool.acquire(), измеряющая время ожидания соединения."""
+
+    def __init__(self, pool: asyncpg.Pool, timeout: Optional[float] = None):
+        self._pool = pool
+        self._acquire = pool.acquire(timeout=timeout)
+
+    async def __aenter__(self):
+        t0 = time.perf_counter()
+        conn = await self._acquire.__aenter__()
+        DBConnection._acquire_stats['count'] += 1
+        waited = time.perf_counter() - t0
+        DBConnection._acquire_stats['wait_total'] += waited
+        DBConnection._acquire_stats['wait_max'] = max(DBConnection._acquire_stats['wait_max'], waited)
+        DB_POOL_ACQUIRE.observe(waited)
+        DB_POOL_SIZE.set(self._pool.get_size(), state='total')
+        DB_POOL_SIZE.set(self._pool.get_idle_size(), state='idle')
+        return conn
+
+    async def __aexit__(self, *exc):
+        return await self._acquire.__aexit__(*exc)
+
+
 class DBConnection:
     _pool: Optional[asyncpg.Pool] = None
+    _pool_mode: Optional[str] = None
+    _acquire_stats: Dict[str, float] = {'count': 0, 'wait_total': 0.0, 'wait_max': 0.0}
+
+    @classmethod
+    def dsn(cls) -> str:
+        """DSN с учетом выбора прямого подключения (в обход PgBouncer)."""
+        if settings.db_use_direct and settings.supabase_direct_db_url:
+            return settings.supabase_direct_db_url
+        return settings.database_dsn
+
+    @classmethod
+    def pool_mode(cls) -> str:
+        """Режим пулинга на стороне сервера: 'transaction' или 'session'.
+
+        'auto' считает transaction-пулингом PgBouncer/Supavisor на порту 6543
+        или DSN с параметром pgbouncer=true; прямое подключение — всегда session.
+        """
+        if cls._pool_mode is not None:
+            return cls._pool_mode
+
+        mode = settings.db_pool_mode
+        if mode == 'auto':
+            if settings.db_use_direct and settings.supabase_direct_db_url:
+                mode = 'session'
+            else:
+                parts = urlsplit(cls.dsn())
+                params = parse_qs(parts.query)
+                is_pgbouncer = params.get('pgbouncer', ['false'])[0].lower() == 'true'
+                mode = 'transaction' if (parts.port == 6543 or is_pgbouncer) else 'session'
+        cls._pool_mode = mode
+        return mode
+
+    @classmethod
+    def uses_transaction_pooling(cls) -> bool:
+        return cls.pool_mode() == 'transaction'
+
+    @classmethod
+    def supports_prepared_statements(cls) -> bool:
+        """Именованные prepared statements доступны вне transaction-пулинга."""
+        return not cls.uses_transaction_pooling()
+
+    @classmethod
+    def pool_max_size(cls) -> int:
+        """Размер пула: DB_POOL_MAX_SIZE или оценка по числу параллельных загрузок.
+
+        Каждая загрузка держит до DB_CONNECTIONS_PER_TASK соединений, плюс запас на
+        heartbeat, очередь и служебные запросы.
+        """
+        concurrency = max(settings.replay_concurrency, settings.worker_concurrency)
+        required = concurrency * DB_CONNECTIONS_PER_TASK + 2
+        if settings.db_pool_max_size:
+            if settings.db_pool_max_size < required:
+                log.warning(
+                    f"DB_POOL_MAX_SIZE={settings.db_pool_max_size} меньше оценки {required} "
+                    f"({concurrency} параллельных загрузок x {DB_CONNECTIONS_PER_TASK}): возможны ожидания пула"
+                )
+            return settings.db_pool_max_size
+        return max(DB_CONNECTION_POOL_SIZE + DB_MAX_OVERFLOW, required)
+
+    @classmethod
+    def _pool_kwargs(cls) -> Dict[str, Any]:
+        transaction_pooling = cls.uses_transaction_pooling()
+
+        # Параметры сессии передаются в startup-пакете: они же становятся
+        # значениями по умолчанию, поэтому переживают RESET ALL при возврате в пул.
+        # PgBouncer в transaction-режиме принимает только application_name.
+        server_settings = {'application_name': settings.db_application_name}
+        if not transaction_pooling:
+            if settings.db_work_mem:
+                server_settings['work_mem'] = settings.db_work_mem
+            if settings.db_statement_timeout:
+                server_settings['statement_timeout'] = settings.db_statement_timeout
+
+        return {
+            'dsn': cls.dsn(),
+            # PgBouncer (transaction) не поддерживает именованные prepared statements
+            'statement_cache_size': 0 if transaction_pooling else settings.db_statement_cache_size,
+            'min_size': settings.db_pool_min_size,
+            'max_size': cls.pool_max_size(),
+            'command_timeout': settings.db_command_timeout,
+            'server_settings': server_settings,
+            'init': cls._init_connection,
+        }
+
+    @classmethod
+    async def _init_connection(cls, conn: asyncpg.Connection):
+        """Хук инициализации нового соединения пула."""
+        conn.add_query_logger(cls._log_query)
+
+    @staticmethod
+    def _log_query(record):
+        DB_QUERY_DURATION.observe(record.elapsed)
+        if settings.db_slow_query_ms and record.elapsed * 1000 >= settings.db_slow_query_ms:
+            log.warning(f"Медленный запрос ({record.elapsed:.2f}s): {' '.join(record.query.split())[:200]}")
 
     @classmethod
     async def get_pool(cls) -> asyncpg.Pool:
         """Возвращает пул соединений, создавая его при необходимости."""
         if cls._pool is None:
-            log.info("Инициализация пула соединений БД...")
-            # Pgbouncer требует session mode или statement_cache_size=0
-            cls._pool = await asyncpg.create_pool(
-                dsn=settings.database_dsn,
-                statement_cache_size=0,
-                min_size=1,
-                max_size=10
+            kwargs = cls._pool_kwargs()
+            log.info(
+                f"Инициализация пула соединений БД (mode={cls.pool_mode()}, "
+                f"size={kwargs['min_size']}..{kwargs['max_size']}, "
+                f"statement_cache={kwargs['statement_cache_size']})..."
             )
+            cls._pool = await asyncpg.create_pool(**kwargs)
         return cls._pool
 
     @classmethod
     async def close(cls):
         """Закрывает пул соединений."""
         if cls._pool:
+            stats = cls.acquire_stats()
+            if stats['count']:
+                log.info(
+                    f"Пул БД: {stats['count']} выдач соединений, ожидание "
+                    f"avg={stats['wait_avg_ms']:.1f}ms max={stats['wait_max_ms']:.1f}ms"
+                )
             await cls._pool.close()
             cls._pool = None
+            cls._pool_mode = None
             log.info("Пул соединений закрыт.")
 
+    @classmethod
+    def acquire_stats(cls) -> Dict[str, float]:
+        """Сводка по ожиданию соединений из пула за время жизни процесса."""
+        count = cls._acquire_stats['count']
+        return {
+            'count': count,
+            'wait_avg_ms': (cls._acquire_stats['wait_total'] / count * 1000) if count else 0.0,
+            'wait_max_ms': cls._acquire_stats['wait_max'] * 1000,
+        }
+
     @classmethod
     async def fetch(cls, query: str, *args):
         pool = await cls.get_pool()
-        async with pool.acquire() as conn:
+        async with _TimedAcquire(pool, settings.db_acquire_timeout) as conn:
             return await conn.fetch(query, *args)
 
     @classmethod
     async def execute(cls, query: str, *args):
         pool = await cls.get_pool()
-        async with pool.acquire() as conn:
+        async with _TimedAcquire(pool, settings.db_acquire_timeout) as conn:
             return await conn.execute(query, *args)
 
+    @classmethod
+    async def execute_many(cls, conn, query: str, args_list: List[Sequence[Any]]) -> int:
+        """Выполняет один запрос для набора параметров на переданном соединении.
+
+        В session/direct режиме запрос готовится один раз (named prepared
+        statement) и параметры отправляются пайплайном через executemany.
+        Под transaction-пулингом PgBouncer — построчный execute.
+        """
+        if not args_list:
+            return 0
+        if cls.supports_prepared_statements():
+            stmt = await conn.prepare(query)
+            await stmt.executemany(args_list)
+        else:
+            for args in args_list:
+                await conn.execute(query, *args)
+        return len(args_list)
+
     @classmethod
     async def get_connection(cls):
         """Возвращает контекстный менеджер для получения соединения."""
         pool = await cls.get_pool()
-        return pool.acquire()
+        return _TimedAcquire(pool, settings.db_acquire_timeout)
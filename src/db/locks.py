@@ -0,0 +1,93 @@
+"""Advisory-блокировки Postgres для взаимного исключения между процессами и узлами.
+
+Блокировка транзакционная (`pg_try_advisory_xact_lock`): держится открытой
+транзакцией на соединении пула и освобождается при ее завершении, в том числе
+при обрыве соединения упавшего воркера. Поэтому она работает и через PgBouncer
+в transaction-режиме, где сессионные блокировки небезопасны. Все ключи одного
+держателя берутся на одном соединении. Трансформации выполняются на нем же;
+загрузка таблицы (processor.py) идет через DataLoader своими соединениями, и
+соединение блокировки простаивает в транзакции всю загрузку — это учтено в
+DB_CONNECTIONS_PER_TASK и размере пула.
+
+Имена — строки вида 'table:stg_gsheets.sales_cur' или 'transform:core.sales';
+часть до ':' используется как метка метрик ожидания.
+"""
+import asyncio
+import hashlib
+import logging
+import time
+import asyncpg
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+from src.db.connection import DBConnection
+from src.utils.metrics import DB_LOCK_CONTENDED, DB_LOCK_WAIT
+
+log = logging.getLogger('locks')
+
+
+class LockTimeout(Exception):
+    """Блокировку не удалось получить за отведенное время."""
+
+
+class LockLost(Exception):
+    """Транзакция блокировки не зафиксирована: защищенная работа могла идти без нее."""
+
+
+def lock_key(name: str) -> int:
+    """Стабильный 64-битный ключ advisory-блокировки для имени."""
+    return int.from_bytes(hashlib.blake2b(name.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+
+
+@asynccontextmanager
+async def advisory_lock(*names: str, timeout: Optional[float] = None,
+                        poll_interval: float = 0.5) -> AsyncIterator[asyncpg.Connection]:
+    """Держит advisory-блокировки `names` на время блока на одном соединении.
+
+    Ключи берутся по порядку имен (сортировка исключает взаимоблокировку между
+    держателями с пересекающимися наборами). Возвращает соединение с открытой
+    транзакцией: работа, выполненная на нем, идет под блокировкой и не занимает
+    второе соединение пула. timeout=None — ждать без ограничения, иначе LockTimeout.
+    Если транзакция не фиксируется (соединение оборвалось или закрыто сервером),
+    блокировка могла быть потеряна раньше — поднимается LockLost.
+    """
+    names = sorted(set(names))
+    async with await DBConnection.get_connection() as conn:
+        tx = conn.transaction()
+        await tx.start()
+        try:
+            # Блокировка держится весь блок; серверный таймаут простоя не должен ее снимать
+            await conn.execute("SET LOCAL idle_in_transaction_session_timeout = 0")
+            for name in names:
+                await _acquire(conn, name, timeout, poll_interval)
+            yield conn
+        except BaseException:
+            try:
+                await tx.rollback()
+            except Exception as e:
+                log.warning(f"Не удалось откатить транзакцию блокировок {', '.join(names)}: {e}")
+            raise
+        try:
+            await tx.commit()
+        except (asyncpg.PostgresError, asyncpg.InterfaceError, OSError) as e:
+            raise LockLost(f"Блокировки {', '.join(names)} потеряны до завершения работы: {e}") from e
+
+
+async def _acquire(conn, name: str, timeout: Optional[float], poll_interval: float) -> None:
+    key = lock_key(name)
+    kind = name.split(':', 1)[0]
+    start = time.monotonic()
+    contended = False
+    while not await conn.fetchval("SELECT pg_try_advisory_xact_lock($1)", key):
+        waited = time.monotonic() - start
+        if not contended:
+            contended = True
+            DB_LOCK_CONTENDED.inc(lock=kind)
+            log.info(f"Ожидание блокировки {name} (занята другим процессом)")
+        if timeout is not None and waited >= timeout:
+            DB_LOCK_WAIT.observe(waited, lock=kind)
+            raise LockTimeout(f"Блокировка {name} не получена за {timeout:.0f}с")
+        await asyncio.sleep(poll_interval)
+    waited = time.monotonic() - start
+    DB_LOCK_WAIT.observe(waited, lock=kind)
+    if contended:
+        log.info(f"Блокировка {name} получена через {waited:.1f}с")
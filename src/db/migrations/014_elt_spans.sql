@@ -0,0 +1,22 @@
+-- Migration 014: Span-based Performance Tracking
+-- Goal: Store per-phase / per-step timings of every ELT run (see src/utils/tracing.py)
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS ops.elt_spans (
+    id BIGSERIAL PRIMARY KEY,
+    run_id UUID NOT NULL REFERENCES ops.elt_runs(run_id) ON DELETE CASCADE,
+    span_id INTEGER NOT NULL,
+    parent_id INTEGER,            -- span_id родителя в рамках того же run_id
+    name TEXT NOT NULL,           -- phase.load, extract, load.copy, transform.sql, ...
+    table_name TEXT,
+    started_at TIMESTAMPTZ NOT NULL,
+    duration_ms NUMERIC(12,3) NOT NULL,
+    status TEXT NOT NULL DEFAULT 'ok',
+    attrs JSONB
+);
+
+CREATE INDEX IF NOT EXISTS idx_elt_spans_run_id ON ops.elt_spans(run_id);
+CREATE INDEX IF NOT EXISTS idx_elt_spans_name_started ON ops.elt_spans(name, started_at DESC);
+
+COMMIT;
@@ -0,0 +1,30 @@
+-- Migration 015: Typed staging helpers
+-- Goal: Transform SQL works both with text staging columns and with typed ones
+-- (TYPED_STAGING=true, see src/etl/staging_types.py).
+-- Overloads for native types are plain column copies (SQL functions are inlined
+-- by the planner); text overloads keep the previous string parsing.
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION stg_gsheets.to_money(v text) RETURNS numeric
+    LANGUAGE sql IMMUTABLE AS $$ SELECT COALESCE(NULLIF(regexp_replace(v, '[^0-9,.-]', '', 'g'), '')::numeric, 0) $$;
+CREATE OR REPLACE FUNCTION stg_gsheets.to_money(v numeric) RETURNS numeric
+    LANGUAGE sql IMMUTABLE AS $$ SELECT COALESCE(v, 0) $$;
+
+CREATE OR REPLACE FUNCTION stg_gsheets.to_int(v text, dflt integer) RETURNS integer
+    LANGUAGE sql IMMUTABLE AS $$ SELECT COALESCE(NULLIF(TRIM(v), '')::integer, dflt) $$;
+CREATE OR REPLACE FUNCTION stg_gsheets.to_int(v integer, dflt integer) RETURNS integer
+    LANGUAGE sql IMMUTABLE AS $$ SELECT COALESCE(v, dflt) $$;
+
+CREATE OR REPLACE FUNCTION stg_gsheets.to_time(v text, dflt time) RETURNS time
+    LANGUAGE sql IMMUTABLE AS $$ SELECT COALESCE(NULLIF(substring(TRIM(v) from '^\d{1,2}:\d{2}'), '')::time, dflt) $$;
+CREATE OR REPLACE FUNCTION stg_gsheets.to_time(v time, dflt time) RETURNS time
+    LANGUAGE sql IMMUTABLE AS $$ SELECT COALESCE(v, dflt) $$;
+
+-- Дата уже разобрана при загрузке -> значение; text -> NULL (разбор в CASE трансформации)
+CREATE OR REPLACE FUNCTION stg_gsheets.typed_date(v text) RETURNS date
+    LANGUAGE sql IMMUTABLE AS $$ SELECT NULL::date $$;
+CREATE OR REPLACE FUNCTION stg_gsheets.typed_date(v date) RETURNS date
+    LANGUAGE sql IMMUTABLE AS $$ SELECT v $$;
+
+COMMIT;
@@ -0,0 +1,16 @@
+-- Migration 016: Cached CDC header-row positions
+-- Goal: Skip the A1:ZZ20 header scan for 'range: auto' sheets on every run.
+-- The saved row is verified against the data batch; a rescan happens only on mismatch.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS ops.sheet_header_positions (
+    spreadsheet_id TEXT NOT NULL,
+    gid TEXT NOT NULL,
+    header_row INTEGER NOT NULL,
+    data_start_row INTEGER NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (spreadsheet_id, gid)
+);
+
+COMMIT;
@@ -0,0 +1,13 @@
+-- Migration 017: Replayable raw dumps
+-- Goal: Let --replay-from-raw pick the dumps of a run and restore their column order
+-- (JSONB does not keep key order, so the header order is stored separately).
+
+BEGIN;
+
+ALTER TABLE raw.sheets_dump ADD COLUMN IF NOT EXISTS run_id UUID;
+ALTER TABLE raw.sheets_dump ADD COLUMN IF NOT EXISTS col_names TEXT[];
+
+CREATE INDEX IF NOT EXISTS idx_sheets_dump_run_id ON raw.sheets_dump(run_id);
+CREATE INDEX IF NOT EXISTS idx_sheets_dump_sheet_extracted ON raw.sheets_dump(sheet_name, extracted_at DESC);
+
+COMMIT;
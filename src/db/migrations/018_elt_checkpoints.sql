@@ -0,0 +1,17 @@
+-- Migration 018: Resumable runs
+-- Goal: Record completed steps of every run (tables loaded with the source content hash,
+-- transform scripts executed) so `--resume <run_id>` can skip them.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS ops.elt_checkpoints (
+    run_id UUID NOT NULL REFERENCES ops.elt_runs(run_id) ON DELETE CASCADE,
+    phase TEXT NOT NULL,          -- load | transform
+    step TEXT NOT NULL,           -- target_table или имя SQL-скрипта
+    content_hash TEXT,            -- SHA-256 содержимого листа (для load)
+    details JSONB,
+    completed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (run_id, phase, step)
+);
+
+COMMIT;
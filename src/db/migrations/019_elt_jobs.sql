@@ -0,0 +1,32 @@
+-- Migration 019: Distributed job queue
+-- Goal: A run enqueues one job per sheet load and per transform script; any number of
+-- worker processes (`--worker`) claim them with FOR UPDATE SKIP LOCKED.
+-- Jobs of a run execute in stages by seq: loads (seq 0) in parallel, transforms one by one.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS ops.elt_jobs (
+    job_id BIGSERIAL PRIMARY KEY,
+    run_id UUID NOT NULL REFERENCES ops.elt_runs(run_id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,               -- load | transform
+    step TEXT NOT NULL,               -- target_table или имя SQL-скрипта
+    seq INTEGER NOT NULL DEFAULT 0,   -- этап: задание ждет завершения заданий с меньшим seq
+    payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    worker TEXT,
+    claimed_at TIMESTAMPTZ,
+    heartbeat_at TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ,
+    result JSONB,
+    error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    CONSTRAINT elt_jobs_kind_check CHECK (kind IN ('load', 'transform')),
+    CONSTRAINT elt_jobs_status_check CHECK (status IN ('pending', 'running', 'done', 'failed')),
+    UNIQUE (run_id, kind, step)
+);
+CREATE INDEX IF NOT EXISTS idx_elt_jobs_pending ON ops.elt_jobs(created_at, seq) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_elt_jobs_run_status ON ops.elt_jobs(run_id, status);
+
+COMMIT;
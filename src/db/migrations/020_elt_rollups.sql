@@ -0,0 +1,113 @@
+-- Migration 020: Run-history rollups for the dashboard
+-- Goal: Per-day aggregates of runs, table loads and validation errors, refreshed at the end
+-- of every run (src/etl/rollups.py), so dashboard pages read a few rows per day instead of
+-- scanning the whole elt_runs / elt_table_stats / validation_logs history.
+-- Days are calendar days in p_tz (ROLLUP_TIMEZONE, default Asia/Yekaterinburg as on the dashboard).
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS ops.elt_run_daily (
+    day DATE NOT NULL,
+    status TEXT NOT NULL,
+    runs INTEGER NOT NULL,
+    tables_processed BIGINT NOT NULL DEFAULT 0,
+    rows_synced BIGINT NOT NULL DEFAULT 0,
+    validation_errors BIGINT NOT NULL DEFAULT 0,
+    timed_runs INTEGER NOT NULL DEFAULT 0,      -- запуски с duration_seconds
+    duration_s_total NUMERIC NOT NULL DEFAULT 0,
+    duration_s_p50 NUMERIC,
+    duration_s_p95 NUMERIC,
+    duration_s_max NUMERIC,
+    throughput_max NUMERIC,                     -- строк/с лучшего запуска дня
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (day, status)
+);
+
+CREATE TABLE IF NOT EXISTS ops.elt_table_daily (
+    day DATE NOT NULL,
+    table_name TEXT NOT NULL,
+    loads INTEGER NOT NULL,
+    rows_extracted BIGINT NOT NULL DEFAULT 0,
+    rows_inserted BIGINT NOT NULL DEFAULT 0,
+    rows_updated BIGINT NOT NULL DEFAULT 0,
+    rows_deleted BIGINT NOT NULL DEFAULT 0,
+    validation_errors BIGINT NOT NULL DEFAULT 0,
+    duration_ms_total BIGINT NOT NULL DEFAULT 0,
+    duration_ms_p50 NUMERIC,
+    duration_ms_p95 NUMERIC,
+    throughput NUMERIC,                         -- rows_extracted / суммарное время, строк/с
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (day, table_name)
+);
+
+CREATE TABLE IF NOT EXISTS ops.elt_error_daily (
+    day DATE NOT NULL,
+    table_name TEXT NOT NULL,
+    error_type TEXT NOT NULL,
+    errors BIGINT NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (day, table_name, error_type)
+);
+
+CREATE INDEX IF NOT EXISTS idx_validation_logs_created_at ON ops.validation_logs(created_at);
+
+-- Пересчет сводок за сутки начиная с p_since (по умолчанию — сегодня) до текущего момента
+CREATE OR REPLACE FUNCTION ops.refresh_elt_rollups(p_since TIMESTAMPTZ, p_tz TEXT)
+RETURNS DATE LANGUAGE plpgsql AS $$
+DECLARE
+    v_day DATE := (COALESCE(p_since, NOW()) AT TIME ZONE p_tz)::date;
+    v_from TIMESTAMPTZ := v_day::timestamp AT TIME ZONE p_tz;
+BEGIN
+    -- Параллельные завершения запусков пересчитывают одни и те же дни по очереди
+    PERFORM pg_advisory_xact_lock(hashtext('ops.refresh_elt_rollups'));
+
+    DELETE FROM ops.elt_run_daily WHERE day >= v_day;
+    INSERT INTO ops.elt_run_daily (day, status, runs, tables_processed, rows_synced, validation_errors,
+                                   timed_runs, duration_s_total, duration_s_p50, duration_s_p95,
+                                   duration_s_max, throughput_max)
+    SELECT (r.started_at AT TIME ZONE p_tz)::date, r.status, COUNT(*),
+           COALESCE(SUM(r.tables_processed), 0), COALESCE(SUM(r.total_rows_synced), 0),
+           COALESCE(SUM(r.validation_errors), 0),
+           COUNT(r.duration_seconds), COALESCE(SUM(r.duration_seconds), 0),
+           percentile_cont(0.5) WITHIN GROUP (ORDER BY r.duration_seconds),
+           percentile_cont(0.95) WITHIN GROUP (ORDER BY r.duration_seconds),
+           MAX(r.duration_seconds),
+           MAX(r.total_rows_synced / NULLIF(r.duration_seconds, 0))
+    FROM ops.elt_runs r
+    WHERE r.started_at >= v_from
+    GROUP BY 1, 2;
+
+    DELETE FROM ops.elt_table_daily WHERE day >= v_day;
+    INSERT INTO ops.elt_table_daily (day, table_name, loads, rows_extracted, rows_inserted, rows_updated,
+                                     rows_deleted, validation_errors, duration_ms_total,
+                                     duration_ms_p50, duration_ms_p95, throughput)
+    SELECT (r.started_at AT TIME ZONE p_tz)::date, ts.table_name, COUNT(*),
+           COALESCE(SUM(ts.rows_extracted), 0), COALESCE(SUM(ts.rows_inserted), 0),
+           COALESCE(SUM(ts.rows_updated), 0), COALESCE(SUM(ts.rows_deleted), 0),
+           COALESCE(SUM(ts.validation_errors), 0), COALESCE(SUM(ts.duration_ms), 0),
+           percentile_cont(0.5) WITHIN GROUP (ORDER BY ts.duration_ms),
+           percentile_cont(0.95) WITHIN GROUP (ORDER BY ts.duration_ms),
+           SUM(ts.rows_extracted) * 1000.0 / NULLIF(SUM(ts.duration_ms), 0)
+    FROM ops.elt_table_stats ts
+    JOIN ops.elt_runs r ON r.run_id = ts.run_id
+    WHERE r.started_at >= v_from
+    GROUP BY 1, 2;
+
+    DELETE FROM ops.elt_error_daily WHERE day >= v_day;
+    INSERT INTO ops.elt_error_daily (day, table_name, error_type, errors)
+    SELECT (v.created_at AT TIME ZONE p_tz)::date, v.table_name, v.error_type, COUNT(*)
+    FROM ops.validation_logs v
+    WHERE v.created_at >= v_from
+    GROUP BY 1, 2, 3;
+
+    RETURN v_day;
+END;
+$$;
+
+-- Сводки по всей накопленной истории
+SELECT ops.refresh_elt_rollups(
+    LEAST((SELECT MIN(started_at) FROM ops.elt_runs), (SELECT MIN(created_at) FROM ops.validation_logs)),
+    'Asia/Yekaterinburg'
+);
+
+COMMIT;
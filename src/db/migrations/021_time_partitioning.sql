@@ -0,0 +1,184 @@
+-- Migration 021: Monthly range partitioning of append-only ops/raw tables
+-- Goal: ops.validation_logs, ops.elt_table_stats and raw.sheets_dump grow with every run.
+-- They become PARTITION BY RANGE on their timestamp column with one partition per month
+-- (<table>_pYYYYMM) plus a DEFAULT partition as a safety net. Retention drops whole
+-- partitions (src/etl/partitions.py, at the end of each run) instead of DELETE + VACUUM,
+-- and time predicates (dashboard, rollups) prune partitions.
+-- Existing rows are copied once into the new partitioned tables (one-time rewrite).
+
+BEGIN;
+
+-- Партиции [месяц, месяц + 1) на p_months месяцев начиная с p_from. Строки, уже попавшие
+-- в DEFAULT-партицию в этом диапазоне, переносятся в новую партицию.
+CREATE OR REPLACE FUNCTION ops.ensure_month_partitions(p_table TEXT, p_column TEXT, p_from DATE, p_months INTEGER)
+RETURNS INTEGER LANGUAGE plpgsql AS $$
+DECLARE
+    v_schema TEXT := split_part(p_table, '.', 1);
+    v_name TEXT := split_part(p_table, '.', 2);
+    v_month DATE := date_trunc('month', p_from)::date;
+    v_next DATE;
+    v_part TEXT;
+    v_created INTEGER := 0;
+BEGIN
+    FOR i IN 1..GREATEST(p_months, 1) LOOP
+        v_next := (v_month + INTERVAL '1 month')::date;
+        v_part := format('%s_p%s', v_name, to_char(v_month, 'YYYYMM'));
+        IF to_regclass(format('%I.%I', v_schema, v_part)) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I.%I (LIKE %I.%I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+                           v_schema, v_part, v_schema, v_name);
+            IF to_regclass(format('%I.%I', v_schema, v_name || '_default')) IS NOT NULL THEN
+                EXECUTE format('WITH moved AS (DELETE FROM %I.%I WHERE %I >= %L AND %I < %L RETURNING *) '
+                               'INSERT INTO %I.%I SELECT * FROM moved',
+                               v_schema, v_name || '_default', p_column, v_month, p_column, v_next,
+                               v_schema, v_part);
+            END IF;
+            EXECUTE format('ALTER TABLE %I.%I ATTACH PARTITION %I.%I FOR VALUES FROM (%L) TO (%L)',
+                           v_schema, v_name, v_schema, v_part, v_month, v_next);
+            v_created := v_created + 1;
+        END IF;
+        v_month := v_next;
+    END LOOP;
+    RETURN v_created;
+END;
+$$;
+
+-- Удаляет месячные партиции, целиком лежащие раньше p_before (DEFAULT не трогается)
+CREATE OR REPLACE FUNCTION ops.drop_old_partitions(p_table TEXT, p_before TIMESTAMPTZ)
+RETURNS INTEGER LANGUAGE plpgsql AS $$
+DECLARE
+    v_part RECORD;
+    v_dropped INTEGER := 0;
+BEGIN
+    FOR v_part IN
+        SELECT c.oid::regclass AS part, to_date(right(c.relname, 6), 'YYYYMM') AS month
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = p_table::regclass AND c.relname ~ '_p[0-9]{6}$'
+        ORDER BY 2
+    LOOP
+        EXIT WHEN v_part.month + INTERVAL '1 month' > p_before;
+        EXECUTE format('DROP TABLE %s', v_part.part);
+        v_dropped := v_dropped + 1;
+    END LOOP;
+    RETURN v_dropped;
+END;
+$$;
+
+-- Превращает обычную таблицу с BIGSERIAL id в партиционированную по месяцам p_column.
+-- Неуникальные индексы и внешние ключи переносятся, первичный ключ становится (id, p_column).
+-- Повторный вызов для уже партиционированной таблицы ничего не делает.
+CREATE OR REPLACE FUNCTION ops.partition_by_month(p_table TEXT, p_column TEXT, p_premake_months INTEGER DEFAULT 3)
+RETURNS VOID LANGUAGE plpgsql AS $$
+DECLARE
+    v_schema TEXT := split_part(p_table, '.', 1);
+    v_name TEXT := split_part(p_table, '.', 2);
+    v_old TEXT := v_name || '_unpartitioned';
+    v_seq TEXT := pg_get_serial_sequence(p_table, 'id');
+    v_indexes TEXT[];
+    v_fkeys TEXT[];
+    v_min DATE;
+    v_ddl TEXT;
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = p_table::regclass) THEN
+        RETURN;
+    END IF;
+
+    SELECT array_agg(pg_get_indexdef(x.indexrelid)) INTO v_indexes
+    FROM pg_index x WHERE x.indrelid = p_table::regclass AND NOT x.indisunique;
+    SELECT array_agg(format('ALTER TABLE %I.%I ADD CONSTRAINT %I %s', v_schema, v_name, conname,
+                            pg_get_constraintdef(oid))) INTO v_fkeys
+    FROM pg_constraint WHERE conrelid = p_table::regclass AND contype = 'f';
+
+    EXECUTE format('ALTER TABLE %I.%I RENAME TO %I', v_schema, v_name, v_old);
+    EXECUTE format('UPDATE %I.%I SET %I = NOW() WHERE %I IS NULL', v_schema, v_old, p_column, p_column);
+    EXECUTE format('CREATE TABLE %I.%I (LIKE %I.%I INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+                   'PARTITION BY RANGE (%I)', v_schema, v_name, v_schema, v_old, p_column);
+    EXECUTE format('ALTER TABLE %I.%I ALTER COLUMN %I SET NOT NULL', v_schema, v_name, p_column);
+    EXECUTE format('CREATE TABLE %I.%I PARTITION OF %I.%I DEFAULT', v_schema, v_name || '_default', v_schema, v_name);
+
+    EXECUTE format('SELECT MIN(%I)::date FROM %I.%I', p_column, v_schema, v_old) INTO v_min;
+    v_min := date_trunc('month', COALESCE(v_min, CURRENT_DATE))::date;
+    PERFORM ops.ensure_month_partitions(
+        p_table, p_column, v_min,
+        ((date_part('year', age(date_trunc('month', CURRENT_DATE), v_min)) * 12
+          + date_part('month', age(date_trunc('month', CURRENT_DATE), v_min)))::int + 1 + p_premake_months)
+    );
+    EXECUTE format('INSERT INTO %I.%I SELECT * FROM %I.%I', v_schema, v_name, v_schema, v_old);
+
+    IF v_seq IS NOT NULL THEN
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY %I.%I.id', v_seq, v_schema, v_name);
+    END IF;
+    EXECUTE format('DROP TABLE %I.%I', v_schema, v_old);
+
+    EXECUTE format('ALTER TABLE %I.%I ADD PRIMARY KEY (id, %I)', v_schema, v_name, p_column);
+    FOREACH v_ddl IN ARRAY COALESCE(v_indexes, '{}') LOOP
+        EXECUTE v_ddl;
+    END LOOP;
+    FOREACH v_ddl IN ARRAY COALESCE(v_fkeys, '{}') LOOP
+        EXECUTE v_ddl;
+    END LOOP;
+END;
+$$;
+
+SELECT ops.partition_by_month('raw.sheets_dump', 'extracted_at');
+SELECT ops.partition_by_month('ops.validation_logs', 'created_at');
+SELECT ops.partition_by_month('ops.elt_table_stats', 'created_at');
+
+-- Последние загрузки на дашборде читаются по created_at (ordered append по партициям)
+CREATE INDEX IF NOT EXISTS idx_elt_table_stats_created_at ON ops.elt_table_stats(created_at);
+
+-- Сводки: предикат по created_at статистики отсекает старые партиции
+CREATE OR REPLACE FUNCTION ops.refresh_elt_rollups(p_since TIMESTAMPTZ, p_tz TEXT)
+RETURNS DATE LANGUAGE plpgsql AS $$
+DECLARE
+    v_day DATE := (COALESCE(p_since, NOW()) AT TIME ZONE p_tz)::date;
+    v_from TIMESTAMPTZ := v_day::timestamp AT TIME ZONE p_tz;
+BEGIN
+    -- Параллельные завершения запусков пересчитывают одни и те же дни по очереди
+    PERFORM pg_advisory_xact_lock(hashtext('ops.refresh_elt_rollups'));
+
+    DELETE FROM ops.elt_run_daily WHERE day >= v_day;
+    INSERT INTO ops.elt_run_daily (day, status, runs, tables_processed, rows_synced, validation_errors,
+                                   timed_runs, duration_s_total, duration_s_p50, duration_s_p95,
+                                   duration_s_max, throughput_max)
+    SELECT (r.started_at AT TIME ZONE p_tz)::date, r.status, COUNT(*),
+           COALESCE(SUM(r.tables_processed), 0), COALESCE(SUM(r.total_rows_synced), 0),
+           COALESCE(SUM(r.validation_errors), 0),
+           COUNT(r.duration_seconds), COALESCE(SUM(r.duration_seconds), 0),
+           percentile_cont(0.5) WITHIN GROUP (ORDER BY r.duration_seconds),
+           percentile_cont(0.95) WITHIN GROUP (ORDER BY r.duration_seconds),
+           MAX(r.duration_seconds),
+           MAX(r.total_rows_synced / NULLIF(r.duration_seconds, 0))
+    FROM ops.elt_runs r
+    WHERE r.started_at >= v_from
+    GROUP BY 1, 2;
+
+    DELETE FROM ops.elt_table_daily WHERE day >= v_day;
+    INSERT INTO ops.elt_table_daily (day, table_name, loads, rows_extracted, rows_inserted, rows_updated,
+                                     rows_deleted, validation_errors, duration_ms_total,
+                                     duration_ms_p50, duration_ms_p95, throughput)
+    SELECT (r.started_at AT TIME ZONE p_tz)::date, ts.table_name, COUNT(*),
+           COALESCE(SUM(ts.rows_extracted), 0), COALESCE(SUM(ts.rows_inserted), 0),
+           COALESCE(SUM(ts.rows_updated), 0), COALESCE(SUM(ts.rows_deleted), 0),
+           COALESCE(SUM(ts.validation_errors), 0), COALESCE(SUM(ts.duration_ms), 0),
+           percentile_cont(0.5) WITHIN GROUP (ORDER BY ts.duration_ms),
+           percentile_cont(0.95) WITHIN GROUP (ORDER BY ts.duration_ms),
+           SUM(ts.rows_extracted) * 1000.0 / NULLIF(SUM(ts.duration_ms), 0)
+    FROM ops.elt_table_stats ts
+    JOIN ops.elt_runs r ON r.run_id = ts.run_id
+    WHERE r.started_at >= v_from
+      AND ts.created_at >= v_from  -- статистика пишется после старта запуска
+    GROUP BY 1, 2;
+
+    DELETE FROM ops.elt_error_daily WHERE day >= v_day;
+    INSERT INTO ops.elt_error_daily (day, table_name, error_type, errors)
+    SELECT (v.created_at AT TIME ZONE p_tz)::date, v.table_name, v.error_type, COUNT(*)
+    FROM ops.validation_logs v
+    WHERE v.created_at >= v_from
+    GROUP BY 1, 2, 3;
+
+    RETURN v_day;
+END;
+$$;
+
+COMMIT;
@@ -0,0 +1,10 @@
+-- Migration 022: Per-column change counts in table load stats
+-- Goal: With COLUMN_CHANGE_DETECTION the loader keeps per-column hashes (__col_hashes in staging
+-- tables, added by the loader on first use) and updates only changed columns. The number of
+-- updated rows per column is stored here to show which columns churn most.
+
+BEGIN;
+
+ALTER TABLE ops.elt_table_stats ADD COLUMN IF NOT EXISTS column_changes JSONB;  -- {"колонка": строк}
+
+COMMIT;
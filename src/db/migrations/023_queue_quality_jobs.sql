@@ -0,0 +1,12 @@
+-- Migration 023: Data-quality and maintenance jobs in the queue
+-- Goal: Queue runs (--enqueue / --worker) also check data quality of the loaded tables and
+-- maintain history partitions (src/etl/partitions.py), like ELTPipeline.run does in its
+-- quality and cleanup phases. Both are jobs of the last stage of a run.
+
+BEGIN;
+
+ALTER TABLE ops.elt_jobs DROP CONSTRAINT IF EXISTS elt_jobs_kind_check;
+ALTER TABLE ops.elt_jobs ADD CONSTRAINT elt_jobs_kind_check
+    CHECK (kind IN ('load', 'transform', 'quality', 'maintenance'));
+
+COMMIT;
@@ -22,7 +22,14 @@ USING (
     ORDER BY legacy_id
 ) AS source
 ON (target.legacy_id = source.legacy_id)
-WHEN MATCHED THEN
+-- Неизмененные строки staging не переписываются (row_hash тот же, связи те же);
+-- --full-refresh (elt.rebuild_core = on) пересчитывает все строки
+WHEN MATCHED AND (
+    current_setting('elt.rebuild_core', true) = 'on'
+    OR target.row_hash IS DISTINCT FROM source.row_hash
+    OR target.source IS DISTINCT FROM source.source
+    OR target.is_deleted IS DISTINCT FROM FALSE
+) THEN
     UPDATE SET
         row_hash = source.row_hash,
         source = source.source,
@@ -54,18 +61,25 @@ USING (
         COALESCE(NULLIF(TRIM("client_full"::text), ''), 'Без имени') as name,
         COALESCE(NULLIF(TRIM("phone_mobile"::text), ''), '+70000000000') as phone,
         NULLIF(TRIM("child_name"::text), '') as child_name,
-        CASE 
+        COALESCE(stg_gsheets.typed_date("child_birth_date"), CASE 
             WHEN "child_birth_date"::text ~ '^\d{2}\.\d{2}\.\d{4}$' 
             THEN TO_DATE("child_birth_date"::text, 'DD.MM.YYYY')
             ELSE NULL 
-        END as child_dob,
+        END) as child_dob,
         NULLIF(TRIM("product_type"::text), '') as status
     FROM stg_gsheets.clients_hst
     WHERE NULLIF(TRIM("client_full"::text), '') IS NOT NULL
     ORDER BY legacy_id
 ) AS source
 ON (target.legacy_id = source.legacy_id)
-WHEN MATCHED THEN
+-- Неизмененные строки staging не переписываются (row_hash тот же, связи те же);
+-- --full-refresh (elt.rebuild_core = on) пересчитывает все строки
+WHEN MATCHED AND (
+    current_setting('elt.rebuild_core', true) = 'on'
+    OR target.row_hash IS DISTINCT FROM source.row_hash
+    OR target.source IS DISTINCT FROM source.source
+    OR target.is_deleted IS DISTINCT FROM FALSE
+) THEN
     UPDATE SET
         row_hash = source.row_hash,
         source = source.source,
@@ -37,7 +37,15 @@ USING (
     ORDER BY legacy_id
 ) AS source
 ON (target.legacy_id = source.legacy_id)
-WHEN MATCHED THEN
+-- Неизмененные строки staging не переписываются (row_hash тот же, связи те же);
+-- --full-refresh (elt.rebuild_core = on) пересчитывает все строки
+WHEN MATCHED AND (
+    current_setting('elt.rebuild_core', true) = 'on'
+    OR target.row_hash IS DISTINCT FROM source.row_hash
+    OR target.source IS DISTINCT FROM source.source
+    OR target.client_id IS DISTINCT FROM source.client_id
+    OR target.is_deleted IS DISTINCT FROM FALSE
+) THEN
     UPDATE SET
         row_hash = source.row_hash,
         source = source.source,
@@ -81,20 +89,20 @@ USING (
         md5(COALESCE("date"::text, '') || COALESCE("client_full"::text, '') || COALESCE("product"::text, '') || COALESCE("final_price"::text, '')) as legacy_id,
         "__row_hash" as row_hash,
         'sales_hst' as source,
-        CASE 
+        COALESCE(stg_gsheets.typed_date("date")::timestamptz, CASE 
             WHEN "date"::text ~ '\d{2}\.\d{2}\.\d{2}' 
             THEN TO_DATE(substring("date"::text from '\d{2}\.\d{2}\.\d{2}'), 'DD.MM.YY')::timestamptz
             WHEN "date"::text ~ '\d{2}\.\d{2}\.\d{4}'
             THEN TO_DATE("date"::text, 'DD.MM.YYYY')::timestamptz
             ELSE NOW() 
-        END as date,
+        END) as date,
         COALESCE(NULLIF(TRIM("product"::text), ''), 'Неизвестно') as product_name,
         NULLIF(TRIM("product_type"::text), '') as type,
         NULLIF(TRIM("product_category"::text), '') as category,
-        COALESCE(NULLIF(TRIM("quantity"::text), '')::integer, 1) as quantity,
-        COALESCE(NULLIF(regexp_replace("full_price"::text, '[^0-9,.-]', '', 'g'), '')::numeric, 0) as full_price,
+        stg_gsheets.to_int("quantity", 1) as quantity,
+        stg_gsheets.to_money("full_price") as full_price,
         0 as discount,  -- Нет в HST
-        COALESCE(NULLIF(regexp_replace("final_price"::text, '[^0-9,.-]', '', 'g'), '')::numeric, 0) as final_price,
+        stg_gsheets.to_money("final_price") as final_price,
         0 as cash,      -- Нет в HST
         0 as transfer,  -- Нет в HST
         0 as terminal,  -- Нет в HST
@@ -109,7 +117,15 @@ USING (
     ORDER BY legacy_id
 ) AS source
 ON (target.legacy_id = source.legacy_id)
-WHEN MATCHED THEN
+-- Неизмененные строки staging не переписываются (row_hash тот же, связи те же);
+-- --full-refresh (elt.rebuild_core = on) пересчитывает все строки
+WHEN MATCHED AND (
+    current_setting('elt.rebuild_core', true) = 'on'
+    OR target.row_hash IS DISTINCT FROM source.row_hash
+    OR target.source IS DISTINCT FROM source.source
+    OR target.client_id IS DISTINCT FROM source.client_id
+    OR target.is_deleted IS DISTINCT FROM FALSE
+) THEN
     UPDATE SET
         row_hash = source.row_hash,
         source = source.source,
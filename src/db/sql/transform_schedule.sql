@@ -32,7 +32,16 @@ USING (
     ORDER BY legacy_id
 ) AS source
 ON (target.legacy_id = source.legacy_id)
-WHEN MATCHED THEN
+-- Неизмененные строки staging не переписываются (row_hash тот же, связи те же);
+-- --full-refresh (elt.rebuild_core = on) пересчитывает все строки
+WHEN MATCHED AND (
+    current_setting('elt.rebuild_core', true) = 'on'
+    OR target.row_hash IS DISTINCT FROM source.row_hash
+    OR target.source IS DISTINCT FROM source.source
+    OR target.client_id IS DISTINCT FROM source.client_id
+    OR target.employee_id IS DISTINCT FROM source.employee_id
+    OR target.is_deleted IS DISTINCT FROM FALSE
+) THEN
     UPDATE SET
         row_hash = source.row_hash,
         source = source.source,
@@ -66,15 +75,15 @@ USING (
         md5(COALESCE("date"::text, '') || COALESCE("start_time"::text, '') || COALESCE("client_full"::text, '')) as legacy_id,
         "__row_hash" as row_hash,
         'trainings_hst' as source,
-        CASE 
+        COALESCE(stg_gsheets.typed_date("date"), CASE 
             WHEN "date"::text ~ '^\d{2}\.\d{2}\.\d{4}$'
                 THEN TO_DATE("date"::text, 'DD.MM.YYYY')
             WHEN "date"::text ~ '\d{2}\.\d{2}\.\d{2}'
                 THEN TO_DATE(substring("date"::text from '\d{2}\.\d{2}\.\d{2}'), 'DD.MM.YY')
             ELSE CURRENT_DATE
-        END as date,
-        COALESCE(NULLIF(substring(TRIM("start_time"::text) from '^\d{1,2}:\d{2}'), ''), '09:00')::time as start_time,
-        COALESCE(NULLIF(substring(TRIM("end_time"::text) from '^\d{1,2}:\d{2}'), ''), '09:30')::time as end_time,
+        END) as date,
+        stg_gsheets.to_time("start_time", '09:00') as start_time,
+        stg_gsheets.to_time("end_time", '09:30') as end_time,
         COALESCE(NULLIF(TRIM(s."status"::text), ''), 'Свободно') as status,
         NULLIF(TRIM("product_type"::text), '') as type,
         NULLIF(TRIM("product_category"::text), '') as category,
@@ -89,7 +98,16 @@ USING (
     ORDER BY legacy_id
 ) AS source
 ON (target.legacy_id = source.legacy_id)
-WHEN MATCHED THEN
+-- Неизмененные строки staging не переписываются (row_hash тот же, связи те же);
+-- --full-refresh (elt.rebuild_core = on) пересчитывает все строки
+WHEN MATCHED AND (
+    current_setting('elt.rebuild_core', true) = 'on'
+    OR target.row_hash IS DISTINCT FROM source.row_hash
+    OR target.source IS DISTINCT FROM source.source
+    OR target.client_id IS DISTINCT FROM source.client_id
+    OR target.employee_id IS DISTINCT FROM source.employee_id
+    OR target.is_deleted IS DISTINCT FROM FALSE
+) THEN
     UPDATE SET
         row_hash = source.row_hash,
         source = source.source,
@@ -1,6 +1,10 @@
 import hashlib
 import json
-from typing import Optional, List, Dict, Set
+from collections import Counter
+from typing import Any, AsyncIterator, Iterable, Optional, List, Dict, Set, Tuple
+
+# Длина хеша одной колонки в __col_hashes (hex-символов, 48 бит)
+COLUMN_HASH_WIDTH = 12
 
 def compute_row_hash(row: list, exclude_columns: Optional[set] = None) -> str:
     """Вычисляет MD5 хеш строки данных для сравнения изменений."""
@@ -16,6 +20,32 @@ def compute_row_hash(row: list, exclude_columns: Optional[set] = None) -> str:
     return hashlib.md5(content.encode('utf-8')).hexdigest()
 
 
+def _short_hash(content: str) -> str:
+    return hashlib.md5(content.encode('utf-8')).hexdigest()[:COLUMN_HASH_WIDTH]
+
+
+def compute_column_hashes(row: list, col_names: List[str]) -> str:
+    """Хеши колонок строки одной строкой фиксированной ширины (__col_hashes).
+
+    Первый блок — хеш списка колонок: при изменении их состава или порядка
+    старые хеши не сравниваются и строка обновляется целиком.
+    """
+    parts = [_short_hash(json.dumps(list(col_names), ensure_ascii=False))]
+    parts.extend(_short_hash(normalize_value(val)) for val in row)
+    return ''.join(parts)
+
+
+def changed_columns(old_hashes: Optional[str], new_hashes: str, col_names: List[str]) -> Optional[List[str]]:
+    """Колонки с отличающимися хешами; None — сравнить нельзя (нет старых хешей или другой набор колонок)."""
+    w = COLUMN_HASH_WIDTH
+    if not old_hashes or len(old_hashes) != len(new_hashes) or old_hashes[:w] != new_hashes[:w]:
+        return None
+    return [
+        col for i, col in enumerate(col_names, start=1)
+        if old_hashes[i * w:(i + 1) * w] != new_hashes[i * w:(i + 1) * w]
+    ]
+
+
 def normalize_value(val) -> str:
     """Нормализует значение для стабильного хеширования."""
     if val is None or val == '':
@@ -24,6 +54,27 @@ def normalize_value(val) -> str:
     return ' '.join(s.split())
 
 
+class CDCChange:
+    """Вставка или обновление одной строки.
+
+    Слоты вместо словаря {'pk', 'hash', 'data': {...}}: на больших листах
+    изменения хранятся до записи, и словари на строку занимали большую часть памяти.
+    values — значения в порядке колонок загрузки.
+    """
+
+    __slots__ = ('pk', 'hash', 'values', 'row_index', 'col_hashes', 'columns')
+
+    def __init__(self, pk: Any, hash: str, values: Any, row_index: Optional[int] = None,
+                 col_hashes: Optional[str] = None, columns: Optional[List[str]] = None):
+        self.pk = pk
+        self.hash = hash
+        self.values = values
+        self.row_index = row_index
+        self.col_hashes = col_hashes
+        # Изменившиеся колонки (поколоночное сравнение); None — обновляется вся строка
+        self.columns = columns
+
+
 class CDCProcessor:
     """Обработчик CDC для сравнения данных между источником и БД.
     
@@ -32,33 +83,46 @@ class CDCProcessor:
     - row_hash (Content Hash): хеш содержимого для детекции изменений (динамичный).
     """
     
-    def __init__(self, existing_hashes: Dict[str, str]):
-        """existing_hashes: словарь {pk: hash} из текущего состояния БД."""
+    def __init__(self, existing_hashes: Dict[str, str],
+                 existing_column_hashes: Optional[Dict[str, str]] = None,
+                 col_names: Optional[List[str]] = None):
+        """existing_hashes: словарь {pk: hash} из текущего состояния БД.
+
+        existing_column_hashes ({pk: __col_hashes}) и col_names включают
+        поколоночное сравнение: у обновлений заполняется CDCChange.columns.
+        """
         self.existing_hashes = existing_hashes
-        self.to_insert: List[Dict] = []
-        self.to_update: List[Dict] = []
+        self.existing_column_hashes = existing_column_hashes
+        self.col_names = col_names
+        self.to_insert: List[CDCChange] = []
+        self.to_update: List[CDCChange] = []
         self.to_delete: List[str] = []
         self.unchanged: int = 0
+        # Сколько раз менялась каждая колонка (только при поколоночном сравнении)
+        self.column_changes: Counter = Counter()
     
-    def process_row(self, pk: str, row_hash: str, row_data: Dict):
-        """Обрабатывает одну строку и определяет действие."""
+    def process_row(self, pk: str, row_hash: str, row_data: Any, col_hashes: Optional[str] = None,
+                    row_index: Optional[int] = None):
+        """Обрабатывает одну строку и определяет действие (row_data — значения строки)."""
         if pk in self.existing_hashes:
             if self.existing_hashes[pk] == row_hash:
                 self.unchanged += 1
             else:
-                self.to_update.append({
-                    'pk': pk,
-                    'hash': row_hash,
-                    'data': row_data
-                })
+                change = CDCChange(pk, row_hash, row_data, row_index)
+                if col_hashes is not None and self.existing_column_hashes is not None:
+                    change.col_hashes = col_hashes
+                    columns = changed_columns(self.existing_column_hashes.get(pk), col_hashes, self.col_names)
+                    # Пустой список при разных row_hash — коллизия хешей: обновляем строку целиком
+                    change.columns = columns or None
+                    if columns:
+                        self.column_changes.update(columns)
+                self.to_update.append(change)
             # Удаляем из существующих, чтобы в конце остались только удаленные в источнике
             del self.existing_hashes[pk]
+            if self.existing_column_hashes is not None:
+                self.existing_column_hashes.pop(pk, None)
         else:
-            self.to_insert.append({
-                'pk': pk,
-                'hash': row_hash,
-                'data': row_data
-            })
+            self.to_insert.append(CDCChange(pk, row_hash, row_data, row_index, col_hashes))
     
     def finalize(self):
         """Все оставшиеся в existing_hashes ID считаются удалёнными в источнике."""
@@ -71,3 +135,37 @@ class CDCProcessor:
             'deleted': len(self.to_delete),
             'unchanged': self.unchanged
         }
+
+
+async def merge_changes(source: Iterable[Tuple], existing: AsyncIterator[Tuple]):
+    """Merge-join двух отсортированных по pk потоков (CDC без словаря хешей в памяти).
+
+    source — кортежи (pk, row_hash, ...) по возрастанию pk, existing — асинхронный
+    поток (pk, row_hash, ...) из БД в том же порядке (pk — str, порядок по кодовым
+    точкам = COLLATE "C"). Выдает (действие, строка источника, строка БД), где
+    действие — 'insert' / 'update' / 'unchanged' / 'delete'.
+
+    Как и CDCProcessor: повтор ключа в источнике — вставка, повтор ключа в БД
+    сравнивается один раз и не удаляется.
+    """
+    existing = aiter(existing)
+    current = await anext(existing, None)
+    for item in source:
+        pk = item[0]
+        while current is not None and current[0] < pk:
+            deleted = current
+            yield 'delete', None, deleted
+            while current is not None and current[0] == deleted[0]:
+                current = await anext(existing, None)
+        if current is not None and current[0] == pk:
+            matched = current
+            yield ('unchanged' if matched[1] == item[1] else 'update'), item, matched
+            while current is not None and current[0] == pk:
+                current = await anext(existing, None)
+        else:
+            yield 'insert', item, None
+    while current is not None:
+        deleted = current
+        yield 'delete', None, deleted
+        while current is not None and current[0] == deleted[0]:
+            current = await anext(existing, None)
@@ -0,0 +1,81 @@
+"""Чекпоинты запуска: какие таблицы загружены и какие шаги трансформации выполнены.
+
+Каждый запуск записывает в `ops.elt_checkpoints` завершенные шаги (фаза load —
+по таблице с хэшем содержимого источника, transform — по SQL-скрипту, export —
+по витрине). `--resume <run_id>` продолжает тот же запуск и пропускает шаги,
+уже отмеченные выполненными.
+"""
+import hashlib
+import json
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from src.config.settings import settings
+from src.db.connection import DBConnection
+
+log = logging.getLogger('checkpoints')
+
+
+def content_hash(col_names: List[str], rows: Iterable[List[Any]]) -> str:
+    """SHA-256 содержимого листа (заголовки + строки) для сверки источника."""
+    digest = hashlib.sha256()
+    digest.update('\x1f'.join(col_names).encode('utf-8'))
+    for row in rows:
+        digest.update(b'\x1e')
+        digest.update('\x1f'.join('' if v is None else str(v) for v in row).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class RunCheckpoints:
+    """Чекпоинты одного запуска (run_id) с локальным кэшем выполненных шагов."""
+
+    def __init__(self, run_id: Any):
+        self.run_id = str(run_id)
+        self._done: Dict[Tuple[str, str], Optional[str]] = {}
+
+    async def load(self) -> int:
+        """Загружает выполненные шаги запуска (для --resume). Возвращает их число."""
+        rows = await DBConnection.fetch(
+            f"SELECT phase, step, content_hash FROM {settings.schema_ops}.elt_checkpoints WHERE run_id = $1",
+            self.run_id
+        )
+        self._done = {(row['phase'], row['step']): row['content_hash'] for row in rows}
+        return len(self._done)
+
+    def is_done(self, phase: str, step: str) -> bool:
+        return (phase, step) in self._done
+
+    def done_steps(self, phase: str) -> List[str]:
+        return [step for (p, step) in self._done if p == phase]
+
+    async def mark(self, phase: str, step: str, content_hash: Optional[str] = None,
+                   details: Optional[Dict[str, Any]] = None):
+        """Отмечает шаг выполненным. Ошибка записи не прерывает запуск."""
+        query = f"""
+            INSERT INTO {settings.schema_ops}.elt_checkpoints (run_id, phase, step, content_hash, details)
+            VALUES ($1, $2, $3, $4, $5)
+            ON CONFLICT (run_id, phase, step) DO UPDATE SET
+                content_hash = EXCLUDED.content_hash,
+                details = EXCLUDED.details,
+                completed_at = NOW()
+        """
+        self._done[(phase, step)] = content_hash
+        try:
+            await DBConnection.execute(
+                query, self.run_id, phase, step, content_hash,
+                json.dumps(details, ensure_ascii=False, default=str) if details else None
+            )
+        except Exception as e:
+            log.warning(f"Не удалось сохранить чекпоинт {phase}/{step}: {e}")
+
+    async def reset_phase(self, phase: str):
+        """Сбрасывает чекпоинты фазы (например, трансформации после новой загрузки)."""
+        if not self.done_steps(phase):
+            return
+        self._done = {key: value for key, value in self._done.items() if key[0] != phase}
+        try:
+            await DBConnection.execute(
+                f"DELETE FROM {settings.schema_ops}.elt_checkpoints WHERE run_id = $1 AND phase = $2",
+                self.run_id, phase
+            )
+        except Exception as e:
+            log.warning(f"Не удалось сбросить чекпоинты фазы {phase}: {e}")
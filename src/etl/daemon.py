@@ -0,0 +1,200 @@
+"""Долгоживущий планировщик ELT (`--daemon`).
+
+Держит прогретыми авторизованные клиенты Google (извлечение и экспорт) и пул
+соединений с БД, а каждый лист sources.yml обновляет по своему интервалу:
+`refresh_interval` листа или таблицы, иначе интервал категории из настроек
+(`_cur` — 5 минут, `_hst` — сутки, справочники — неделя).
+
+Когда лист пора обновлять, демон одним запросом Drive API (modifiedTime на
+spreadsheet) проверяет, менялась ли таблица после последней выгрузки листа.
+Неизмененные листы просто переносятся на следующий интервал, измененные
+загружаются одним запуском `ELTPipeline` с фильтром `tables`.
+"""
+import asyncio
+import logging
+import re
+import signal
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from src.config.settings import settings
+from src.db.connection import DBConnection
+from src.etl.exporter import DataMartExporter
+from src.etl.extractor import GSheetsExtractor
+from src.etl.pipeline import ELTPipeline, table_category, table_in_scope
+
+log = logging.getLogger('daemon')
+
+_INTERVAL_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([smhdw]?)\s*$')
+_UNIT_SECONDS = {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+
+def parse_interval(value: Union[str, int, float]) -> float:
+    """'30s' / '5m' / '2h' / '1d' / '1w' или число секунд -> секунды."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        seconds = float(value)
+    else:
+        match = _INTERVAL_RE.match(str(value).lower())
+        if not match:
+            raise ValueError(f"Некорректный интервал обновления: {value!r} (ожидается, например, 30s, 5m, 1d)")
+        seconds = float(match.group(1)) * _UNIT_SECONDS[match.group(2)]
+    if seconds <= 0:
+        raise ValueError(f"Интервал обновления должен быть положительным: {value!r}")
+    return seconds
+
+
+def default_interval(table: str) -> str:
+    return {
+        'cur': settings.daemon_interval_cur,
+        'hst': settings.daemon_interval_hst,
+        'ref': settings.daemon_interval_ref,
+    }[table_category(table)]
+
+
+@dataclass
+class SheetSchedule:
+    """Расписание одного листа: интервал и время последней успешной выгрузки (UTC)."""
+    spreadsheet_id: str
+    target_table: str
+    interval: float
+    next_due: Optional[datetime] = None
+    last_pulled: Optional[datetime] = None
+
+    def is_due(self, now: datetime) -> bool:
+        return self.next_due is None or self.next_due <= now
+
+    def reschedule(self, start: datetime, seconds: Optional[float] = None):
+        self.next_due = start + timedelta(seconds=self.interval if seconds is None else seconds)
+
+
+def build_schedules(config: Dict[str, Any], scope: str = 'all') -> List[SheetSchedule]:
+    """Расписания листов sources.yml в пределах scope (см. ELTPipeline._is_in_scope)."""
+    schedules = []
+    for spreadsheet_id, sdata in (config or {}).get('spreadsheets', {}).items():
+        for sheet_cfg in sdata.get('sheets', []):
+            table = sheet_cfg['target_table']
+            if not table_in_scope(table, scope):
+                continue
+            interval = sheet_cfg.get('refresh_interval') or sdata.get('refresh_interval') or default_interval(table)
+            schedules.append(SheetSchedule(spreadsheet_id, table, parse_interval(interval)))
+    return schedules
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class SchedulerDaemon:
+    """Планировщик: тик раз в `daemon_tick_seconds`, загрузка только измененных листов."""
+
+    def __init__(self, scope: str = 'all', run_exports: bool = True,
+                 clock: Callable[[], datetime] = _utcnow):
+        self.scope = scope
+        self.run_exports = run_exports
+        self.schedules = build_schedules(settings.sources, scope)
+        self.extractor: Optional[GSheetsExtractor] = None
+        self.exporter: Optional[DataMartExporter] = None
+        self._clock = clock
+        self._stop = asyncio.Event()
+
+    async def start(self):
+        """Авторизация в Google, прогрев пула БД и восстановление расписания из истории."""
+        self.extractor = GSheetsExtractor()
+        self.exporter = DataMartExporter(self.extractor)
+        await asyncio.to_thread(self.extractor.ensure_authenticated)
+        await self.exporter.get_client()
+        await DBConnection.get_pool()
+        await self._seed_from_history()
+        log.info(f"Демон запущен: {len(self.schedules)} листов, scope={self.scope}")
+
+    async def _seed_from_history(self):
+        """Последние выгрузки таблиц из ops.elt_table_stats: рестарт не перезагружает все сразу."""
+        query = f"""
+            SELECT s.table_name, MAX(r.started_at) AS last_pulled
+            FROM {settings.schema_ops}.elt_table_stats s
+            JOIN {settings.schema_ops}.elt_runs r ON r.run_id = s.run_id
+            GROUP BY s.table_name
+        """
+        try:
+            rows = await DBConnection.fetch(query)
+        except Exception as e:
+            log.warning(f"Не удалось прочитать историю загрузок, все листы будут выгружены сразу: {e}")
+            return
+        history = {row['table_name']: row['last_pulled'] for row in rows}
+        for schedule in self.schedules:
+            last_pulled = history.get(schedule.target_table)
+            if last_pulled is not None:
+                schedule.last_pulled = last_pulled
+                schedule.reschedule(last_pulled)
+
+    def due(self, now: datetime) -> List[SheetSchedule]:
+        return [s for s in self.schedules if s.is_due(now)]
+
+    async def select_changed(self, due: List[SheetSchedule]) -> Tuple[List[SheetSchedule], List[SheetSchedule]]:
+        """Делит листы к обновлению на измененные и нет: один modifiedTime на spreadsheet."""
+        modified: Dict[str, Optional[datetime]] = {}
+        for spreadsheet_id in dict.fromkeys(s.spreadsheet_id for s in due):
+            modified[spreadsheet_id] = await asyncio.to_thread(self.extractor.get_modified_time, spreadsheet_id)
+
+        changed, unchanged = [], []
+        for schedule in due:
+            modified_time = modified[schedule.spreadsheet_id]
+            # Нет modifiedTime или выгрузок — загружаем, чтобы не пропустить изменения
+            if modified_time is None or schedule.last_pulled is None or modified_time > schedule.last_pulled:
+                changed.append(schedule)
+            else:
+                unchanged.append(schedule)
+        return changed, unchanged
+
+    async def tick(self):
+        now = self._clock()
+        due = self.due(now)
+        if not due:
+            return
+        changed, unchanged = await self.select_changed(due)
+        for schedule in unchanged:
+            schedule.reschedule(now)
+        if unchanged:
+            log.info(f"Без изменений, пропуск: {', '.join(s.target_table for s in unchanged)}")
+        if changed:
+            await self._pull(changed, now)
+
+    async def _pull(self, schedules: List[SheetSchedule], started: datetime):
+        tables = {s.target_table for s in schedules}
+        log.info(f"Обновление листов: {', '.join(sorted(tables))}")
+        pipeline = ELTPipeline(extractor=self.extractor, exporter=self.exporter)
+        try:
+            await pipeline.run(scope=self.scope, run_exports=self.run_exports, tables=tables)
+        except Exception as e:
+            log.error(f"Запуск {pipeline.run_id} завершился сбоем: {e}")
+
+        # Загруженные (и пустые) листы отмечены в чекпоинтах запуска
+        loaded = set(pipeline.checkpoints.done_steps('load'))
+        for schedule in schedules:
+            if schedule.target_table in loaded:
+                schedule.last_pulled = started
+                schedule.reschedule(started)
+            else:
+                schedule.reschedule(started, min(schedule.interval, settings.daemon_retry_seconds))
+
+    def stop(self):
+        log.info("Получен сигнал остановки, демон завершится после текущего запуска")
+        self._stop.set()
+
+    async def run_forever(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.stop)
+        try:
+            await self.start()
+            while not self._stop.is_set():
+                await self.tick()
+                try:
+                    await asyncio.wait_for(self._stop.wait(), timeout=settings.daemon_tick_seconds)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                loop.remove_signal_handler(sig)
+            await DBConnection.close()
+            log.info("Демон остановлен")
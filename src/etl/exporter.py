@@ -1,41 +1,41 @@
 import logging
 import asyncio
-import pandas as pd
-import gspread
 from typing import List, Dict, Any, Optional
 from src.db.connection import DBConnection
 from src.config.settings import settings
-from src.etl.extractor import GSheetsExtractor
+from src.etl.extractor import GSheetsExtractor, google_clients
+from src.utils.tracing import span
+from src.utils.metrics import SHEETS_API_CALLS
+from src.utils.rate_limit import SHEETS_READ, SHEETS_WRITE
 
 log = logging.getLogger('exporter')
 
 class DataMartExporter:
-    def __init__(self):
-        self.extractor = GSheetsExtractor() # Reusing for authentication
+    def __init__(self, extractor: Optional[GSheetsExtractor] = None):
+        self.extractor = extractor or GSheetsExtractor()  # Авторизация — лениво, при первом обращении
+        self._client = None
 
     async def get_client(self):
-        """Возвращает авторизованный клиент gspread."""
-        # extractor._get_service('sheets', 'v4') возвращает discovery object, 
-        # но нам нужен gspread. Reusing credentials logic.
-        from google.oauth2.service_account import Credentials
-        
-        scopes = [
-            'https://www.googleapis.com/auth/spreadsheets',
-            'https://www.googleapis.com/auth/drive'
-        ]
-        creds = Credentials.from_service_account_file(
-            settings.google_service_account_json, scopes=scopes
-        )
-        return gspread.authorize(creds)
+        """Возвращает авторизованный клиент gspread (с правом записи), создается один раз."""
+        if self._client is None:
+            scopes = [
+                'https://www.googleapis.com/auth/spreadsheets',
+                'https://www.googleapis.com/auth/drive'
+            ]
+            self._client, _ = google_clients(scopes)
+        return self._client
 
     async def export_view_to_sheet(self, view_name: str, spreadsheet_id: str, gid: str):
         """Экспортирует результат SQL View в Google Sheet."""
+        import pandas as pd  # тяжелый импорт — только когда экспорт действительно выполняется
+
         log.info(f"Экспорт витрины {view_name} в {spreadsheet_id} (gid={gid})...")
         
         # 1. Fetch data from DB
         try:
             query = f'SELECT * FROM {view_name}'
-            rows = await DBConnection.fetch(query)
+            with span('export.fetch'):
+                rows = await DBConnection.fetch(query)
             if not rows:
                 log.warning(f"Витрина {view_name} пуста, экспорт пропущен.")
                 return
@@ -59,17 +59,19 @@ class DataMartExporter:
         try:
             client = await self.get_client()
             loop = asyncio.get_event_loop()
-            await loop.run_in_executor(None, self._sync_write, client, spreadsheet_id, gid, values)
+            with span('export.write', rows=len(values) - 1):
+                await loop.run_in_executor(None, self._sync_write, client, spreadsheet_id, gid, values)
             log.info(f"Витрина {view_name} успешно экспортирована ({len(df)} строк).")
         except Exception as e:
             log.error(f"Ошибка при записи в Google Sheets: {e}")
 
     def _sync_write(self, client, spreadsheet_id, gid, values):
-        """Синхронная часть записи gspread."""
-        ss = client.open_by_key(spreadsheet_id)
+        """Синхронная часть записи gspread (запросы через общие лимитеры Google API)."""
+        # open_by_key + worksheets — чтение метаданных
+        ss = self._call(SHEETS_READ, 'metadata', client.open_by_key, spreadsheet_id)
         # Find worksheet by gid
         worksheet = None
-        for ws in ss.worksheets():
+        for ws in self._call(SHEETS_READ, 'metadata', ss.worksheets):
             if str(ws.id) == str(gid):
                 worksheet = ws
                 break
@@ -78,5 +80,12 @@ class DataMartExporter:
             raise ValueError(f"Лист с gid={gid} не найден.")
 
         # Очищаем и записываем
-        worksheet.clear()
-        worksheet.update('A1', values, value_input_option='USER_ENTERED')
+        self._call(SHEETS_WRITE, 'values.clear', worksheet.clear)
+        self._call(SHEETS_WRITE, 'values.update', worksheet.update, 'A1', values, value_input_option='USER_ENTERED')
+
+    @staticmethod
+    def _call(limiter, op, func, *args, **kwargs):
+        def attempt():
+            SHEETS_API_CALLS.inc(api='sheets', op=op)
+            return func(*args, **kwargs)
+        return limiter.call(attempt)
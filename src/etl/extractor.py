@@ -1,12 +1,21 @@
-import gspread
+import asyncio
 import json
 import logging
-from typing import List, Dict, Any, Tuple, Optional
+import re
+import threading
+from typing import TYPE_CHECKING, List, Dict, Any, Tuple, Optional
 from datetime import datetime
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
 from src.config.settings import settings
 from src.utils.helpers import slugify
+from src.utils.tracing import span
+from src.utils.metrics import SHEETS_API_CALLS
+from src.utils.rate_limit import SHEETS_READ, DRIVE
+
+if TYPE_CHECKING:
+    import gspread
+
+# gspread и клиенты Google импортируются при первой авторизации: запуски без
+# обращения к Sheets (--transform-only, диагностика) их не загружают.
 
 log = logging.getLogger('extractor')
 
@@ -14,32 +23,128 @@ log = logging.getLogger('extractor')
 _modification_cache: Dict[str, datetime] = {}
 
 
+# Хосты Google API, которые подменяются при GOOGLE_API_ENDPOINT (эмулятор)
+GOOGLE_API_HOSTS = ('https://sheets.googleapis.com', 'https://www.googleapis.com')
+
+
+def endpoint_http_client(base_url: str) -> type:
+    """Класс HTTP-клиента gspread, отправляющего запросы на `base_url` вместо Google."""
+    from gspread.http_client import HTTPClient
+
+    class EndpointHTTPClient(HTTPClient):
+        def request(self, method, endpoint, *args, **kwargs):
+            for host in GOOGLE_API_HOSTS:
+                if endpoint.startswith(host):
+                    endpoint = base_url + endpoint[len(host):]
+                    break
+            return super().request(method, endpoint, *args, **kwargs)
+
+    return EndpointHTTPClient
+
+
+def google_clients(scopes: List[str]) -> Tuple['gspread.Client', Any]:
+    """gspread-клиент и credentials для Drive.
+
+    При заданном GOOGLE_API_ENDPOINT (локальный эмулятор, см.
+    src/utils/sheets_emulator.py) используются анонимные credentials.
+    """
+    import gspread
+
+    endpoint = settings.google_api_endpoint
+    if endpoint:
+        from google.auth.credentials import AnonymousCredentials
+        creds = AnonymousCredentials()
+        return gspread.authorize(creds, http_client=endpoint_http_client(endpoint.rstrip('/'))), creds
+
+    from google.oauth2.service_account import Credentials
+
+    with open(settings.google_service_account_json, 'r') as f:
+        creds_info = json.load(f)
+    creds = Credentials.from_service_account_info(creds_info, scopes=scopes)
+    return gspread.authorize(creds), creds
+
+
+def drive_client(creds):
+    """Drive v3 discovery-клиент (с учетом GOOGLE_API_ENDPOINT)."""
+    from googleapiclient.discovery import build
+
+    client_options = None
+    if settings.google_api_endpoint:
+        client_options = {'api_endpoint': f"{settings.google_api_endpoint.rstrip('/')}/drive/v3/"}
+    return build('drive', 'v3', credentials=creds, cache_discovery=False, client_options=client_options)
+
+
+def header_band(range_name: str, scan_limit: int = 20) -> Tuple[str, int]:
+    """A1-диапазон, содержащий строку заголовков, и номер ее первой строки.
+
+    'auto' -> полоса A1:ZZ{scan_limit} для поиска CDC-заголовка;
+    'B4:W' -> 'B4:W4'; 'A:Z' -> 'A1:Z1'.
+    """
+    if range_name.lower() == 'auto':
+        return f"A1:ZZ{scan_limit}", 1
+    start, _, end = range_name.partition(':')
+    start_col = re.sub(r'\d+', '', start) or 'A'
+    row_match = re.search(r'\d+', start)
+    row = int(row_match.group()) if row_match else 1
+    end_col = re.sub(r'\d+', '', end) or start_col
+    return f"{start_col}{row}:{end_col}{row}", row
+
+
 class GSheetsExtractor:
+    """Извлечение из Google Sheets. Авторизация — при первом обращении к `gc`/`drive_service`."""
+
     def __init__(self):
-        self.gc = None
-        self.drive_service = None
-        self._authenticate()
+        self._gc = None
+        self._drive_service = None
+        self._auth_lock = threading.Lock()
+        # Позиции CDC-заголовков листов 'auto': (spreadsheet_id, gid) -> {header_row, data_start_row}.
+        # Загружаются из ops.sheet_header_positions, измененные помечаются в changed_header_positions.
+        self.header_positions: Dict[Tuple[str, str], Dict[str, int]] = {}
+        self.changed_header_positions: set = set()
+
+    def ensure_authenticated(self):
+        """Авторизация, если еще не выполнена (потокобезопасно: клиенты используются из to_thread)."""
+        with self._auth_lock:
+            if self._gc is None:
+                self._authenticate()
+
+    @property
+    def gc(self):
+        if self._gc is None:
+            self.ensure_authenticated()
+        return self._gc
+
+    @gc.setter
+    def gc(self, value):
+        self._gc = value
+
+    @property
+    def drive_service(self):
+        if self._drive_service is None:
+            self.ensure_authenticated()
+        return self._drive_service
+
+    @drive_service.setter
+    def drive_service(self, value):
+        self._drive_service = value
 
     def _authenticate(self):
         """Аутентификация в Google Services (Sheets + Drive)."""
         try:
-            creds_path = settings.google_service_account_json
-            with open(creds_path, 'r') as f:
-                creds_info = json.load(f)
-            
             scopes = [
                 'https://www.googleapis.com/auth/spreadsheets.readonly',
                 'https://www.googleapis.com/auth/drive.metadata.readonly'
             ]
-            creds = Credentials.from_service_account_info(creds_info, scopes=scopes)
-            
             # Sheets API
-            self.gc = gspread.authorize(creds)
+            self.gc, creds = google_clients(scopes)
             
             # Drive API для получения modifiedTime
-            self.drive_service = build('drive', 'v3', credentials=creds, cache_discovery=False)
+            self.drive_service = drive_client(creds)
             
-            log.info("Успешная авторизация в Google Services (Sheets + Drive).")
+            if settings.google_api_endpoint:
+                log.info(f"Google API перенаправлены на {settings.google_api_endpoint} (эмулятор).")
+            else:
+                log.info("Успешная авторизация в Google Services (Sheets + Drive).")
         except Exception as e:
             log.error(f"Ошибка авторизации в Google: {e}")
             raise
@@ -47,10 +152,10 @@ class GSheetsExtractor:
     def get_modified_time(self, spreadsheet_id: str) -> Optional[datetime]:
         """Получает время последней модификации spreadsheet через Drive API."""
         try:
-            file_metadata = self.drive_service.files().get(
-                fileId=spreadsheet_id,
-                fields='modifiedTime'
-            ).execute()
+            def files_get():
+                SHEETS_API_CALLS.inc(api='drive', op='files.get')
+                return self.drive_service.files().get(fileId=spreadsheet_id, fields='modifiedTime').execute()
+            file_metadata = DRIVE.call(files_get)
             
             modified_str = file_metadata.get('modifiedTime')
             if modified_str:
@@ -84,75 +189,131 @@ class GSheetsExtractor:
 
     async def extract_sheet_data(self, spreadsheet_id: str, gid: str, range_name: str, target_table: str, 
                                  check_modified: bool = False, mapping: Optional[Dict[str, str]] = None) -> Tuple[List[str], List[List[Any]]]:
-        """Извлекает данные из конкретного листа с повторными попытками.
+        """Извлекает данные из конкретного листа (запросы идут через лимитер с повторами при 429).
         
         Если range_name='auto', автоматически находит строку с CDC метаданными.
+        Синхронные вызовы gspread и ожидания лимитера выполняются в потоке
+        (asyncio.to_thread), чтобы не блокировать event loop.
         """
-        
+        return await asyncio.to_thread(
+            self._extract_sheet_data, spreadsheet_id, gid, range_name, target_table, check_modified, mapping
+        )
+
+    def _extract_sheet_data(self, spreadsheet_id: str, gid: str, range_name: str, target_table: str,
+                            check_modified: bool, mapping: Optional[Dict[str, str]]) -> Tuple[List[str], List[List[Any]]]:
         if check_modified and not self.is_spreadsheet_modified(spreadsheet_id):
             log.info(f"Пропуск {target_table} — изменений в таблице не обнаружено.")
             return [], []
         
         log.info(f"Извлечение {target_table} из {spreadsheet_id[:8]}... (gid={gid})")
         
-        for attempt in range(3):
-            try:
-                sh = self.gc.open_by_key(spreadsheet_id)
-                ws = sh.get_worksheet_by_id(int(gid))
-                
-                if not ws:
-                    raise ValueError(f"Лист с GID {gid} не найден в таблице {spreadsheet_id}")
-
-                # Smart header detection
-                if range_name.lower() == 'auto':
-                    header_info = self._find_cdc_header_row(ws)
+        try:
+            # open_by_key и get_worksheet_by_id — по одному запросу метаданных
+            sh = self._sheets_read('metadata', self.gc.open_by_key, spreadsheet_id)
+            ws = self._sheets_read('metadata', sh.get_worksheet_by_id, int(gid))
+            
+            if not ws:
+                raise ValueError(f"Лист с GID {gid} не найден в таблице {spreadsheet_id}")
+
+            # Smart header detection
+            if range_name.lower() == 'auto':
+                cache_key = (spreadsheet_id, str(gid))
+                headers, rows = self._fetch_from_cached_header(ws, cache_key, target_table)
+                if headers is None:
+                    with span('extract.header_detect'):
+                        header_info = self._find_cdc_header_row(ws)
                     if header_info is None:
                         raise ValueError(f"CDC header row не найден в {target_table}")
                     header_row = header_info['header_row']
                     data_start_row = header_info['data_start_row']
                     log.info(f"Auto-detected: header row {header_row}, data starts at row {data_start_row}")
+                    self._remember_header_position(cache_key, header_info)
                     
                     # Читаем заголовки и данные отдельно
-                    headers = ws.row_values(header_row)
-                    data = ws.get(f"A{data_start_row}:ZZ")
+                    with span('extract.fetch'):
+                        headers = self._sheets_read('values.get', ws.row_values, header_row)
+                        data = self._sheets_read('values.get', ws.get, f"A{data_start_row}:ZZ")
                     rows = data if data else []
-                else:
-                    data = ws.get(range_name)
-                    if not data:
-                        log.warning(f"Данные не найдены для {target_table}")
-                        return [], []
-                    headers = data[0]
-                    rows = data[1:]
-                
-                col_names = self._normalize_headers(headers, target_table, mapping)
-                
-                # Robust Mapping: выравниваем каждую строку под длину заголовков (padding)
-                aligned_rows = []
-                expected_len = len(headers)
-                for r in rows:
-                    if len(r) < expected_len:
-                        r.extend([None] * (expected_len - len(r)))
-                    aligned_rows.append(r[:expected_len])
-                
-                # Фильтрация полностью пустых строк
-                aligned_rows = [r for r in aligned_rows if any(cell is not None and str(cell).strip() for cell in r)]
-
-                return col_names, aligned_rows
-                
-            except Exception as e:
-                if '429' in str(e):
-                    sleep_time = (attempt + 1) * 5
-                    log.warning(f"Лимит квот исчерпан для {target_table}, повтор через {sleep_time}с...")
-                    import time
-                    time.sleep(sleep_time)
-                else:
-                    log.error(f"Ошибка при извлечении данных для {target_table}: {e}")
-                    raise
-        raise Exception(f"Не удалось извлечь {target_table} после всех попыток.")
+            else:
+                with span('extract.fetch'):
+                    data = self._sheets_read('values.get', ws.get, range_name)
+                if not data:
+                    log.warning(f"Данные не найдены для {target_table}")
+                    return [], []
+                headers = data[0]
+                rows = data[1:]
+            
+            col_names = self._normalize_headers(headers, target_table, mapping)
+            
+            # Robust Mapping: выравниваем каждую строку под длину заголовков (padding)
+            aligned_rows = []
+            expected_len = len(headers)
+            for r in rows:
+                if len(r) < expected_len:
+                    r.extend([None] * (expected_len - len(r)))
+                aligned_rows.append(r[:expected_len])
+            
+            # Фильтрация полностью пустых строк
+            aligned_rows = [r for r in aligned_rows if any(cell is not None and str(cell).strip() for cell in r)]
+
+            return col_names, aligned_rows
+            
+        except Exception as e:
+            log.error(f"Ошибка при извлечении данных для {target_table}: {e}")
+            raise
+
+    def _sheets_read(self, op: str, func, *args, **kwargs):
+        """Запрос чтения Sheets через общий адаптивный лимитер (повторы при 429)."""
+        def attempt():
+            SHEETS_API_CALLS.inc(api='sheets', op=op)
+            return func(*args, **kwargs)
+        return SHEETS_READ.call(attempt)
+
+    def _fetch_from_cached_header(self, worksheet, cache_key: Tuple[str, str], target_table: str,
+                                  scan_limit: int = 20) -> Tuple[Optional[List[Any]], List[List[Any]]]:
+        """Читает заголовки и данные одним запросом от сохраненной строки заголовков.
+
+        Сохраненная позиция проверяется по уже полученному блоку: если в его
+        начале (в пределах полосы сканирования) есть строка со всеми CDC
+        метаданными, она и есть заголовок. Иначе возвращает (None, []) —
+        нужен полный поиск.
+        """
+        cached = self.header_positions.get(cache_key)
+        if not cached or cached['header_row'] > scan_limit:
+            return None, []
+
+        cached_row = cached['header_row']
+        with span('extract.fetch', header='cached'):
+            data = self._sheets_read('values.get', worksheet.get, f"A{cached_row}:ZZ") or []
+
+        # Самая нижняя CDC-строка в той же полосе A1:ZZ{scan_limit}, что и при полном поиске
+        info = self._scan_cdc_header(data[:scan_limit - cached_row + 1])
+        if info is None:
+            log.info(f"{target_table}: сохраненная строка заголовков {cached_row} не подтверждена, повторный поиск")
+            self.header_positions.pop(cache_key, None)
+            return None, []
+
+        offset = info['header_row'] - 1
+        if offset:
+            header_info = {'header_row': cached_row + offset, 'data_start_row': cached_row + offset + 1}
+            log.info(f"{target_table}: строка заголовков сместилась на {header_info['header_row']}")
+            self._remember_header_position(cache_key, header_info)
+        return data[offset], data[offset + 1:]
+
+    def _remember_header_position(self, cache_key: Tuple[str, str], header_info: Dict[str, int]):
+        position = {'header_row': header_info['header_row'], 'data_start_row': header_info['data_start_row']}
+        if self.header_positions.get(cache_key) != position:
+            self.header_positions[cache_key] = position
+            self.changed_header_positions.add(cache_key)
 
     def _find_cdc_header_row(self, worksheet, scan_limit: int = 20) -> Optional[Dict[str, int]]:
         """Находит строку с CDC метаданными (самую нижнюю если несколько)."""
-        data = worksheet.get(f"A1:ZZ{scan_limit}")
+        data = self._sheets_read('values.get', worksheet.get, f"A1:ZZ{scan_limit}")
+        return self._scan_cdc_header(data)
+
+    @classmethod
+    def _scan_cdc_header(cls, data: Optional[List[List[Any]]]) -> Optional[Dict[str, int]]:
+        """Ищет в полосе строк последнюю строку, содержащую все CDC метаданные."""
         if not data:
             return None
         
@@ -160,9 +321,9 @@ class GSheetsExtractor:
         
         for row_idx, row in enumerate(data):
             normalized = {str(cell).strip().lower() for cell in row if cell}
-            found_cols = self.CDC_METADATA_COLS.intersection(normalized)
+            found_cols = cls.CDC_METADATA_COLS.intersection(normalized)
             
-            if len(found_cols) == len(self.CDC_METADATA_COLS):
+            if len(found_cols) == len(cls.CDC_METADATA_COLS):
                 last_match = {
                     "header_row": row_idx + 1,
                     "data_start_row": row_idx + 2
@@ -170,6 +331,81 @@ class GSheetsExtractor:
         
         return last_match
 
+    async def extract_headers(self, spreadsheet_id: str, sheets: Optional[List[Dict[str, Any]]] = None,
+                              scan_limit: int = 20) -> Dict[str, Dict[str, Any]]:
+        """Заголовки и размеры листов одной таблицы без чтения данных.
+
+        Два запроса на всю таблицу: метаданные листов (названия, размеры сетки)
+        и один values.batchGet с полосой заголовков каждого листа. `sheets` —
+        конфиги листов из sources.yml (gid, range, target_table, column_mapping);
+        None — все листы таблицы в режиме 'auto'.
+
+        Возвращает {gid: {title, row_count, column_count, header_row,
+        data_start_row, headers, col_names}}; header_row=None, если строка
+        заголовков не найдена. Запросы выполняются в потоке, как в extract_sheet_data.
+        """
+        return await asyncio.to_thread(self._extract_headers, spreadsheet_id, sheets, scan_limit)
+
+    def _extract_headers(self, spreadsheet_id: str, sheets: Optional[List[Dict[str, Any]]],
+                         scan_limit: int) -> Dict[str, Dict[str, Any]]:
+        try:
+            metadata = self._sheets_read(
+                'metadata', self.gc.http_client.fetch_sheet_metadata, spreadsheet_id,
+                params={'fields': 'sheets.properties(sheetId,title,gridProperties(rowCount,columnCount))'}
+            )
+            props_by_gid = {
+                str(sh['properties']['sheetId']): sh['properties'] for sh in metadata.get('sheets', [])
+            }
+            if sheets is None:
+                sheets = [{'gid': gid, 'range': 'auto', 'target_table': p['title']} for gid, p in props_by_gid.items()]
+
+            requests = []
+            for sheet_cfg in sheets:
+                gid = str(sheet_cfg.get('gid', 0))
+                props = props_by_gid.get(gid)
+                if props is None:
+                    log.warning(f"Лист с GID {gid} не найден в таблице {spreadsheet_id}")
+                    continue
+                band, first_row = header_band(sheet_cfg.get('range', 'A:Z'), scan_limit)
+                title = props['title'].replace("'", "''")
+                requests.append((gid, sheet_cfg, props, f"'{title}'!{band}", first_row))
+
+            value_ranges = []
+            if requests:
+                with span('extract.headers', sheets=len(requests)):
+                    response = self._sheets_read(
+                        'values.batchGet', self.gc.http_client.values_batch_get, spreadsheet_id, [r[3] for r in requests]
+                    )
+                value_ranges = response.get('valueRanges', [])
+
+            result: Dict[str, Dict[str, Any]] = {}
+            for (gid, sheet_cfg, props, _, first_row), vr in zip(requests, value_ranges):
+                data = vr.get('values', [])
+                grid = props.get('gridProperties', {})
+                if str(sheet_cfg.get('range', 'A:Z')).lower() == 'auto':
+                    info = self._scan_cdc_header(data)
+                    header_row = info['header_row'] if info else None
+                    headers = data[header_row - 1] if info else []
+                else:
+                    header_row = first_row
+                    headers = data[0] if data else []
+                result[gid] = {
+                    'title': props['title'],
+                    'row_count': grid.get('rowCount'),
+                    'column_count': grid.get('columnCount'),
+                    'header_row': header_row,
+                    'data_start_row': header_row + 1 if header_row else None,
+                    'headers': headers,
+                    'col_names': self._normalize_headers(
+                        headers, sheet_cfg.get('target_table', ''), sheet_cfg.get('column_mapping')
+                    ) if headers else [],
+                }
+            return result
+
+        except Exception as e:
+            log.error(f"Ошибка при чтении заголовков {spreadsheet_id}: {e}")
+            raise
+
 
     def _normalize_headers(self, headers: List[str], table_name: str, mapping: Optional[Dict[str, str]] = None) -> List[str]:
         """Превращает заголовки Sheet в валидные имена колонок Postgres."""
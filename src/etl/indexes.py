@@ -0,0 +1,130 @@
+"""Управление индексами staging-таблиц и ключей соединений трансформаций.
+
+Желаемые индексы выводятся из двух источников:
+- `sources.yml`: pk листа (поиск строк в CDC UPDATE/DELETE), `__row_hash`
+  (anti-join в cleanup.sql) и `_loaded_at` (проверки свежести);
+- SQL трансформаций: колонки в условиях `a.col = b.col`, где alias указывает
+  на таблицу вида `schema.table` вне staging (сторона поиска соединения).
+
+`SchemaManager.ensure_indexes()` создает недостающие индексы через
+CREATE INDEX CONCURRENTLY и сообщает о неиспользуемых и невалидных.
+"""
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Set, Tuple
+
+SQL_DIR = Path(__file__).parent.parent / 'db' / 'sql'
+
+# Префикс индексов, которыми управляет ELT (только их можно пересоздавать)
+MANAGED_PREFIX = 'ix_elt_'
+
+_SQL_KEYWORDS = {
+    'on', 'where', 'using', 'left', 'right', 'inner', 'full', 'cross', 'join', 'group',
+    'order', 'limit', 'union', 'returning', 'set', 'when', 'select', 'as',
+}
+_TABLE_ALIAS = re.compile(r'\b(?:FROM|JOIN|INTO)\s+([a-z_][a-z0-9_]*)\.([a-z_][a-z0-9_]*)(?:\s+(?:AS\s+)?([a-z_][a-z0-9_]*))?', re.IGNORECASE)
+_EQUALITY = re.compile(
+    r'\b([a-z_][a-z0-9_]*)\."?([a-z_][a-z0-9_]*)"?(?:::\w+)?\s*=\s*([a-z_][a-z0-9_]*)\."?([a-z_][a-z0-9_]*)"?',
+    re.IGNORECASE
+)
+
+
+class IndexSpec(NamedTuple):
+    """Желаемый индекс по одной колонке и причина, по которой он нужен."""
+    schema: str
+    table: str
+    column: str
+    reason: str
+
+    @property
+    def name(self) -> str:
+        return f"{MANAGED_PREFIX}{self.table}_{self.column}".lower()[:63]
+
+
+def staging_index_specs(sources: Dict[str, Any]) -> List[IndexSpec]:
+    """Индексы staging-таблиц по конфигурации sources.yml."""
+    specs: List[IndexSpec] = []
+    for sdata in sources.get('spreadsheets', {}).values():
+        for sheet_cfg in sdata.get('sheets', []):
+            target_table = sheet_cfg['target_table']
+            if '.' not in target_table:
+                continue
+            schema, table = target_table.split('.', 1)
+            pk_field = sheet_cfg.get('pk', '__row_hash')
+            if pk_field != '__row_hash':
+                specs.append(IndexSpec(schema, table, pk_field, 'cdc pk'))
+            specs.append(IndexSpec(schema, table, '__row_hash', 'row hash'))
+            specs.append(IndexSpec(schema, table, '_loaded_at', 'freshness'))
+    return specs
+
+
+def join_key_specs(sql: str, source: str = 'sql', scanned_schemas: Iterable[str] = ('stg_gsheets',)) -> List[IndexSpec]:
+    """Колонки соединений из SQL (alias.col = alias.col), в пределах одного оператора.
+
+    Таблицы из `scanned_schemas` трансформации читают целиком, поэтому для них
+    индекс по ключу соединения не нужен — индексируется сторона поиска.
+    """
+    scanned = set(scanned_schemas)
+    specs: List[IndexSpec] = []
+    for statement in sql.split(';'):
+        statement = re.sub(r'--[^\n]*', '', statement)
+        aliases: Dict[str, Tuple[str, str]] = {}
+        for schema, table, alias in _TABLE_ALIAS.findall(statement):
+            aliases[table.lower()] = (schema.lower(), table.lower())
+            if alias and alias.lower() not in _SQL_KEYWORDS:
+                aliases[alias.lower()] = (schema.lower(), table.lower())
+        for left_alias, left_col, right_alias, right_col in _EQUALITY.findall(statement):
+            sides = [(aliases.get(alias.lower()), col) for alias, col in ((left_alias, left_col), (right_alias, right_col))]
+            for target, col in sides:
+                if target and target[0] not in scanned:
+                    specs.append(IndexSpec(target[0], target[1], col.lower(), f'join key ({source})'))
+    return specs
+
+
+def transform_join_specs(sql_dir: Path = SQL_DIR, scanned_schemas: Iterable[str] = ('stg_gsheets',)) -> List[IndexSpec]:
+    """Ключи соединений из всех SQL-трансформаций и витрин."""
+    specs: List[IndexSpec] = []
+    for path in sorted(sql_dir.glob('*.sql')):
+        if path.name.startswith(('transform_', 'view_', 'cleanup')):
+            specs.extend(join_key_specs(path.read_text(encoding='utf-8'), path.name, scanned_schemas))
+    return specs
+
+
+def dedupe_specs(specs: Iterable[IndexSpec]) -> List[IndexSpec]:
+    seen: Set[Tuple[str, str, str]] = set()
+    result = []
+    for spec in specs:
+        key = (spec.schema, spec.table, spec.column)
+        if key not in seen:
+            seen.add(key)
+            result.append(spec)
+    return result
+
+
+def plan_indexes(specs: List[IndexSpec], existing: List[Dict[str, Any]],
+                 columns: Set[Tuple[str, str, str]]) -> Dict[str, List[Any]]:
+    """Сравнивает желаемые индексы с существующими.
+
+    `existing` — строки с ключами schema, table, index, first_col, valid, unique, scans;
+    `columns` — множество (schema, table, column) существующих колонок.
+    Возвращает missing (IndexSpec), invalid (имена управляемых индексов для
+    пересоздания) и unused (неуникальные индексы без сканирований).
+    """
+    covered = {
+        (row['schema'], row['table'], row['first_col'])
+        for row in existing if row['valid']
+    }
+    missing = [
+        spec for spec in dedupe_specs(specs)
+        if (spec.schema, spec.table, spec.column) in columns
+        and (spec.schema, spec.table, spec.column) not in covered
+    ]
+    invalid = [
+        row['index'] for row in existing
+        if not row['valid'] and row['index'].startswith(MANAGED_PREFIX)
+    ]
+    unused = [
+        row for row in existing
+        if row['valid'] and not row['unique'] and row['scans'] == 0
+    ]
+    return {'missing': missing, 'invalid': invalid, 'unused': unused}
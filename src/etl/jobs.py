@@ -0,0 +1,296 @@
+"""Очередь заданий ELT в Postgres (`ops.elt_jobs`) для нескольких воркеров.
+
+`--enqueue` регистрирует запуск и ставит в очередь по заданию на каждый лист
+(load) и на каждый SQL-скрипт трансформации (transform), а последним этапом —
+проверку качества (quality) и обслуживание партиций истории (maintenance).
+Процессы `--worker` на любых узлах забирают задания через `FOR UPDATE SKIP LOCKED`
+и выполняют их: загрузки листов — параллельно, трансформации — по одной после
+всех загрузок (этапы задаются полем seq). В отличие от ELTPipeline.run, проверка
+качества не останавливает трансформации: критические проблемы помечают задание
+и запуск как failed. Взаимное исключение по таблицам — advisory-блокировки
+Postgres, которые берут TableProcessor и Transformer (src/db/locks.py), вместо
+файлового ProcessLock.
+
+Воркер обновляет heartbeat выполняемого задания; задания упавших воркеров
+возвращаются в очередь (или помечаются failed после max_attempts). Запуск в
+ops.elt_runs завершает воркер, выполнивший последнее задание. Спаны задания
+сохраняются в ops.elt_spans сразу после него (под run_id запуска), метрики
+выгружаются при завершении запуска.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+from src.config.settings import settings
+from src.db.connection import DBConnection
+from src.etl.checkpoints import RunCheckpoints
+from src.etl.rollups import refresh_rollups
+from src.etl.extractor import GSheetsExtractor
+from src.etl.loader import DataLoader
+from src.etl.partitions import maintain_partitions
+from src.etl.pipeline import check_quality, log_table_stats, table_in_scope
+from src.etl.processor import TableProcessor
+from src.etl.quality import DataQualityChecker
+from src.etl.transformer import CLEANUP_SCRIPT, TRANSFORM_SCRIPTS, Transformer
+from src.etl.validator import ContractValidator
+from src.utils.tracing import span, tracer
+from src.utils import metrics as m
+
+log = logging.getLogger('jobs')
+
+LOAD = 'load'
+TRANSFORM = 'transform'
+QUALITY = 'quality'
+MAINTENANCE = 'maintenance'
+
+RESULT_KEYS = ('table', 'status', 'extracted', 'inserted', 'updated', 'deleted', 'errors', 'duration_ms', 'content_hash')
+
+# (kind, step, seq, payload)
+JobSpec = Tuple[str, str, int, Dict[str, Any]]
+
+
+def plan_jobs(config: Dict[str, Any], scope: str = 'all', full_refresh: bool = False) -> List[JobSpec]:
+    """Задания запуска: загрузки листов в scope (seq 0), скрипты трансформации по порядку,
+    затем проверка качества и обслуживание партиций (последний этап, параллельно)."""
+    jobs: List[JobSpec] = []
+    for spreadsheet_id, sdata in (config or {}).get('spreadsheets', {}).items():
+        for sheet_cfg in sdata.get('sheets', []):
+            if table_in_scope(sheet_cfg['target_table'], scope):
+                jobs.append((LOAD, sheet_cfg['target_table'], 0,
+                             {'spreadsheet_id': spreadsheet_id, 'full_refresh': full_refresh}))
+    scripts = TRANSFORM_SCRIPTS + [CLEANUP_SCRIPT]
+    for seq, script in enumerate(scripts, start=1):
+        jobs.append((TRANSFORM, script, seq, {'rebuild': full_refresh}))
+    jobs.append((QUALITY, scope, len(scripts) + 1, {'scope': scope}))
+    jobs.append((MAINTENANCE, 'partitions', len(scripts) + 1, {}))
+    return jobs
+
+
+def _json(value: Any) -> Optional[str]:
+    return json.dumps(value, ensure_ascii=False, default=str) if value is not None else None
+
+
+class JobQueue:
+    """Операции над ops.elt_jobs."""
+
+    def __init__(self, worker_id: Optional[str] = None):
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.table = f"{settings.schema_ops}.elt_jobs"
+
+    async def enqueue_run(self, scope: str = 'all', full_refresh: bool = False) -> uuid.UUID:
+        """Регистрирует запуск в ops.elt_runs и ставит его задания в очередь."""
+        run_id = uuid.uuid4()
+        jobs = plan_jobs(settings.sources, scope, full_refresh)
+        mode = 'queue_' + ('full_refresh' if full_refresh else 'cdc')
+        async with await DBConnection.get_connection() as conn:
+            async with conn.transaction():
+                await conn.execute(
+                    f"INSERT INTO {settings.schema_ops}.elt_runs (run_id, mode, status) VALUES ($1, $2, 'running')",
+                    str(run_id), mode
+                )
+                await DBConnection.execute_many(
+                    conn,
+                    f"INSERT INTO {self.table} (run_id, kind, step, seq, payload, max_attempts) "
+                    f"VALUES ($1, $2, $3, $4, $5, $6)",
+                    [(str(run_id), kind, step, seq, _json(payload), settings.job_max_attempts)
+                     for kind, step, seq, payload in jobs]
+                )
+        log.info(f"Запуск {run_id} поставлен в очередь: {len(jobs)} заданий (scope={scope}, {mode})")
+        return run_id
+
+    async def claim(self, run_id: Optional[Any] = None) -> Optional[Dict[str, Any]]:
+        """Забирает готовое задание: pending, и все задания запуска с меньшим seq завершены."""
+        query = f"""
+            UPDATE {self.table} j SET
+                status = 'running', attempts = j.attempts + 1, worker = $2,
+                claimed_at = NOW(), heartbeat_at = NOW()
+            WHERE j.job_id = (
+                SELECT c.job_id FROM {self.table} c
+                WHERE c.status = 'pending' AND ($1::uuid IS NULL OR c.run_id = $1::uuid)
+                  AND NOT EXISTS (
+                      SELECT 1 FROM {self.table} p
+                      WHERE p.run_id = c.run_id AND p.seq < c.seq AND p.status IN ('pending', 'running')
+                  )
+                ORDER BY c.created_at, c.seq, c.job_id
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+            RETURNING j.job_id, j.run_id, j.kind, j.step, j.payload, j.attempts, j.max_attempts
+        """
+        rows = await DBConnection.fetch(query, str(run_id) if run_id else None, self.worker_id)
+        if not rows:
+            return None
+        job = dict(rows[0])
+        if isinstance(job['payload'], str):
+            job['payload'] = json.loads(job['payload'])
+        return job
+
+    async def heartbeat(self, job_id: int):
+        await DBConnection.execute(f"UPDATE {self.table} SET heartbeat_at = NOW() WHERE job_id = $1", job_id)
+
+    async def complete(self, job: Dict[str, Any], result: Optional[Dict[str, Any]] = None):
+        await DBConnection.execute(
+            f"UPDATE {self.table} SET status = 'done', finished_at = NOW(), result = $2, error = NULL WHERE job_id = $1",
+            job['job_id'], _json(result)
+        )
+
+    async def fail(self, job: Dict[str, Any], error: str):
+        """Ошибка задания: снова в очередь, пока не исчерпаны попытки."""
+        await DBConnection.execute(f"""
+            UPDATE {self.table} SET
+                status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END,
+                finished_at = CASE WHEN attempts >= max_attempts THEN NOW() END,
+                worker = NULL, error = $2
+            WHERE job_id = $1
+        """, job['job_id'], error[:2000])
+
+    async def requeue_stale(self, stale_seconds: float) -> int:
+        """Возвращает в очередь задания воркеров, переставших обновлять heartbeat."""
+        rows = await DBConnection.fetch(f"""
+            UPDATE {self.table} SET
+                status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END,
+                finished_at = CASE WHEN attempts >= max_attempts THEN NOW() END,
+                error = 'heartbeat lost (worker ' || COALESCE(worker, '?') || ')', worker = NULL
+            WHERE status = 'running' AND heartbeat_at < NOW() - make_interval(secs => $1)
+            RETURNING job_id, step
+        """, float(stale_seconds))
+        for row in rows:
+            log.warning(f"Задание {row['job_id']} ({row['step']}) потеряло воркер, возвращено в очередь")
+        return len(rows)
+
+    async def progress(self, run_id: Any) -> Dict[str, int]:
+        rows = await DBConnection.fetch(
+            f"SELECT status, COUNT(*) AS cnt FROM {self.table} WHERE run_id = $1 GROUP BY status", str(run_id)
+        )
+        return {row['status']: row['cnt'] for row in rows}
+
+    async def finish_run_if_done(self, run_id: Any) -> bool:
+        """Завершает запуск в ops.elt_runs, если у него не осталось незавершенных заданий."""
+        loads = f"FROM {self.table} j WHERE j.run_id = r.run_id AND j.kind = 'load' AND j.status = 'done'"
+        rows = await DBConnection.fetch(f"""
+            UPDATE {settings.schema_ops}.elt_runs r SET
+                finished_at = NOW(),
+                status = CASE WHEN EXISTS (
+                    SELECT 1 FROM {self.table} j WHERE j.run_id = r.run_id AND j.status = 'failed'
+                ) THEN 'failed' ELSE 'success' END,
+                duration_seconds = ROUND(EXTRACT(EPOCH FROM NOW() - r.started_at)::numeric, 2),
+                tables_processed = (SELECT COUNT(*) {loads} AND j.result->>'status' IS DISTINCT FROM 'skipped'),
+                total_rows_synced = (SELECT COALESCE(SUM(COALESCE((j.result->>'inserted')::int, 0)
+                                                         + COALESCE((j.result->>'updated')::int, 0)), 0) {loads}),
+                validation_errors = (SELECT COALESCE(SUM((j.result->>'errors')::int), 0) {loads}),
+                error_message = (SELECT string_agg(j.step || ': ' || j.error, '; ')
+                                 FROM {self.table} j WHERE j.run_id = r.run_id AND j.status = 'failed')
+            WHERE r.run_id = $1 AND r.status = 'running'
+              AND NOT EXISTS (
+                  SELECT 1 FROM {self.table} j WHERE j.run_id = r.run_id AND j.status IN ('pending', 'running')
+              )
+            RETURNING r.status, r.duration_seconds
+        """, str(run_id))
+        if not rows:
+            return False
+        log.info(f"Запуск {run_id} завершен: {await self.progress(run_id)}")
+        await refresh_rollups(run_id)
+        # Счетчики воркера накапливаются за все выполненные им задания (не только этого запуска)
+        m.observe_run(rows[0]['status'], float(rows[0]['duration_seconds'] or 0))
+        m.metrics.export(run_id)
+        return True
+
+
+class JobWorker:
+    """Воркер очереди: `worker_concurrency` заданий одновременно в одном процессе."""
+
+    def __init__(self, queue: Optional[JobQueue] = None, extractor: Optional[GSheetsExtractor] = None):
+        self.queue = queue or JobQueue()
+        self.extractor = extractor or GSheetsExtractor()
+        self.loader = DataLoader()
+        self.validator = ContractValidator()
+        self.transformer = Transformer()
+        self._stop = asyncio.Event()
+        tracer.add_observer(m.span_observer)
+
+    def stop(self):
+        self._stop.set()
+
+    def _sheet_cfg(self, spreadsheet_id: str, target_table: str) -> Dict[str, Any]:
+        sdata = settings.sources.get('spreadsheets', {}).get(spreadsheet_id, {})
+        for sheet_cfg in sdata.get('sheets', []):
+            if sheet_cfg['target_table'] == target_table:
+                return sheet_cfg
+        raise ValueError(f"Лист {target_table} не найден в sources.yml ({spreadsheet_id})")
+
+    async def execute(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        step, payload = job['step'], job['payload']
+        if job['kind'] == LOAD:
+            sheet_cfg = self._sheet_cfg(payload['spreadsheet_id'], step)
+            processor = TableProcessor(self.extractor, self.loader, self.validator, job['run_id'])
+            with span('table', table=step):
+                result = await processor.process_table(
+                    payload['spreadsheet_id'], sheet_cfg, payload.get('full_refresh', False), False
+                )
+            if result.get('status') != 'skipped':
+                m.observe_table(result)
+                await log_table_stats(job['run_id'], result)
+            await RunCheckpoints(job['run_id']).mark(LOAD, step, result.get('content_hash'))
+            return {key: result[key] for key in RESULT_KEYS if key in result}
+        if job['kind'] == QUALITY:
+            summary = await check_quality(DataQualityChecker(), payload.get('scope', 'all'))
+            return {'issues': summary['issue_count']}
+        if job['kind'] == MAINTENANCE:
+            return {'partitions': await maintain_partitions()}
+        await self.transformer.run_script(step, payload.get('rebuild', False))
+        await RunCheckpoints(job['run_id']).mark(TRANSFORM, step)
+        return {'script': step}
+
+    async def _heartbeat(self, job_id: int):
+        while True:
+            await asyncio.sleep(settings.worker_heartbeat_seconds)
+            try:
+                await self.queue.heartbeat(job_id)
+            except Exception as e:
+                log.warning(f"Не удалось обновить heartbeat задания {job_id}: {e}")
+
+    async def process(self, job: Dict[str, Any]):
+        log.info(f"Задание {job['job_id']}: {job['kind']} {job['step']} (попытка {job['attempts']}/{job['max_attempts']})")
+        heartbeat = asyncio.create_task(self._heartbeat(job['job_id']))
+        job_span = None
+        try:
+            with span(f"job.{job['kind']}", step=job['step'], job_id=job['job_id']) as job_span:
+                result = await self.execute(job)
+        except Exception as e:
+            log.error(f"Задание {job['job_id']} ({job['step']}) завершилось ошибкой: {e}")
+            await self.queue.fail(job, str(e))
+        else:
+            await self.queue.complete(job, result)
+        finally:
+            heartbeat.cancel()
+            # Воркер живет дольше запуска: спаны задания сохраняются и убираются из трейсера
+            # сразу (параллельные задания других слотов остаются)
+            if job_span is not None:
+                await tracer.flush(job['run_id'], tracer.detach(job_span))
+        await self.queue.finish_run_if_done(job['run_id'])
+
+    async def _slot(self, run_id: Optional[Any], slot: int):
+        while not self._stop.is_set():
+            if slot == 0:
+                await self.queue.requeue_stale(settings.worker_heartbeat_seconds * 5)
+            job = await self.queue.claim(run_id)
+            if job:
+                await self.process(job)
+                continue
+            if run_id:
+                progress = await self.queue.progress(run_id)
+                if not progress.get('pending') and not progress.get('running'):
+                    return
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=settings.worker_poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self, run_id: Optional[Any] = None):
+        """Выполняет задания до остановки; с run_id — пока задания этого запуска не кончатся."""
+        log.info(f"Воркер {self.queue.worker_id} запущен (заданий одновременно: {settings.worker_concurrency})")
+        await asyncio.gather(*(self._slot(run_id, slot) for slot in range(max(1, settings.worker_concurrency))))
+        log.info(f"Воркер {self.queue.worker_id} остановлен")
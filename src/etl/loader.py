@@ -1,19 +1,51 @@
 import logging
 import asyncio
 import re
-from typing import List, Dict, Any, Tuple, Iterable, Optional
+from collections import Counter
+from typing import List, Dict, Any, Tuple, Iterable, Optional, Callable
 from src.db.connection import DBConnection
 from src.config.settings import settings
 from src.utils.cleaning import normalize_numeric_string
-from src.etl.cdc_processor import compute_row_hash, CDCProcessor
+from src.config.constants import DB_BATCH_SIZE
+from src.etl.cdc_processor import compute_row_hash, compute_column_hashes, changed_columns, merge_changes, CDCChange, CDCProcessor
+from src.etl.staging_types import column_parsers
+from src.utils.tracing import span
+from src.utils.metrics import observe_copy
 
 log = logging.getLogger('loader')
 
+# Размер транзакции при пакетном UPDATE (прогресс логируется после каждого батча)
+UPDATE_BATCH_SIZE = 500
+
+# Sorted-merge CDC: строк хешей за один FETCH серверного курсора
+MERGE_CURSOR_PREFETCH = 5000
+MERGE_STATS = {'insert': 'inserted', 'update': 'updated', 'delete': 'deleted'}
+
+# Full refresh через теневую таблицу (FULL_REFRESH_STRATEGY=swap)
+SHADOW_SUFFIX = "__shadow"
+SWAP_LOCK_TIMEOUT = "10s"
+
+class UnparsedValue(ValueError):
+    """Непустое значение типизированной колонки не разобрано парсером (TYPED_STAGING).
+
+    Такая строка не записывается: вместо NULL (а в core — 0 через to_money) в
+    staging остается прежняя версия строки.
+    """
+
+    def __init__(self, column: str, value: str, row_num: int, row_hash: str, values: List[Any]):
+        super().__init__(f"колонка {column}: значение {value!r} не распознано")
+        self.column, self.value, self.row_num = column, value, row_num
+        # Строковые значения строки и ее хеш — чтобы найти ключ пропущенной строки
+        self.row_hash, self.values = row_hash, values
+
+
 class DataLoader:
     def __init__(self):
         self.schema_prefix = 'staging.' if settings.use_staging_schema else ''
         # Строгая валидация: начинается с буквы, только буквы, цифры и подчеркивание.
         self._single_ident_pattern = re.compile(r'^[a-zA-Z][a-zA-Z0-9_]*$')
+        # Таблицы, в которых уже проверена колонка __col_hashes
+        self._col_hash_tables = set()
 
     def _validate_identifier(self, ident: str) -> str:
         """Проверяет идентификатор (таблица/колонка) на наличие инъекций."""
@@ -45,8 +77,17 @@ class DataLoader:
         # Если схемы нет в имени, используем префикс из настроек (если есть)
         return f'{self.schema_prefix}"{table}"'
 
-    def _prepare_row(self, r: List[Any], col_names: List[str], row_num: int) -> Tuple[List[str], str]:
-        """Унифицированная подготовка строки: выравнивание, очистка, хеширование."""
+    def _prepare_row(self, r: List[Any], col_names: List[str], row_num: int,
+                     parsers: Optional[Dict[int, Callable[[Any], Any]]] = None,
+                     with_column_hashes: bool = False) -> Tuple:
+        """Унифицированная подготовка строки: выравнивание, очистка, хеширование.
+
+        `parsers` (индекс колонки -> функция) приводят значения к нативным типам
+        типизированных staging-колонок; нераспознанное непустое значение —
+        UnparsedValue. Хеш всегда считается по строкам, поэтому CDC не зависит от
+        того, типизирована таблица или нет.
+        with_column_hashes=True добавляет третьим элементом __col_hashes.
+        """
         # Выравнивание и приведение к строке
         full_row = list(r) + [None] * (len(col_names) - len(r))
         full_row = full_row[:len(col_names)]
@@ -55,15 +96,52 @@ class DataLoader:
         full_row_str = [normalize_numeric_string(val) for val in full_row]
         row_hash = compute_row_hash(full_row_str)
         
-        return full_row_str, row_hash
+        values = full_row_str
+        if parsers:
+            values = list(full_row_str)
+            for idx, parse in parsers.items():
+                values[idx] = parse(full_row[idx])
+                if values[idx] is None and full_row_str[idx] is not None:
+                    raise UnparsedValue(col_names[idx], str(full_row[idx]).strip(), row_num, row_hash, full_row_str)
+        
+        if with_column_hashes:
+            return values, row_hash, compute_column_hashes(full_row_str, col_names)
+        return values, row_hash
+
+    async def _fetch_column_parsers(self, table: str, col_names: List[str]) -> Dict[int, Callable[[Any], Any]]:
+        """Парсеры для нетекстовых колонок staging-таблицы (только при TYPED_STAGING)."""
+        if not settings.typed_staging:
+            return {}
+        if '.' in table:
+            schema, table_only = table.split('.', 1)
+        else:
+            schema = self.schema_prefix.replace('.', '') if self.schema_prefix else 'public'
+            table_only = table
+        try:
+            rows = await DBConnection.fetch(
+                "SELECT column_name, data_type FROM information_schema.columns "
+                "WHERE table_schema = $1 AND table_name = $2",
+                schema, table_only
+            )
+        except Exception as e:
+            log.warning(f"Не удалось получить типы колонок {table}, загрузка строками: {e}")
+            return {}
+        return column_parsers(col_names, {row['column_name']: row['data_type'] for row in rows})
 
     async def load_full_refresh(self, table: str, col_names: List[str], rows: Iterable[List[Any]], row_count: Optional[int] = None) -> Dict[str, int]:
-        """Полная перезагрузка таблицы: TRUNCATE + INSERT."""
+        """Полная перезагрузка таблицы.
+
+        Стратегия задается `FULL_REFRESH_STRATEGY`: 'truncate' (TRUNCATE + COPY в
+        одной транзакции) или 'swap' (COPY в теневую таблицу + атомарная подмена
+        через RENAME). Если подмена невозможна (зависимые представления, FK,
+        триггеры, RLS, sequence, публикация), используется 'truncate'.
+        """
         if '.' not in table:
              table = self._validate_identifier(table)
         
         target_table_sql = self._format_table_name(table)
         validated_cols = [self._validate_identifier(c) for c in col_names]
+        target_cols = validated_cols + ["_row_index", "__row_hash"]
         
         # Determine count for logging (handle Generator)
         count_str = f"{row_count} строк" if row_count is not None else "? строк"
@@ -72,42 +150,188 @@ class DataLoader:
 
         log.info(f"Начало полной перезагрузки {target_table_sql} ({count_str})")
         stats = {'inserted': 0, 'errors': 0}
+        parsers = await self._fetch_column_parsers(table, col_names)
+        column_hashes = settings.column_change_detection and await self._ensure_column_hashes(table)
+        if column_hashes:
+            target_cols.append("__col_hashes")
+        
+        if '.' in table:
+            target_schema, target_table_only = table.split('.', 1)
+        else:
+            target_schema = self.schema_prefix.replace('.', '') if self.schema_prefix else None
+            target_table_only = table
         
         async with await DBConnection.get_connection() as conn:
+            if settings.full_refresh_strategy == 'swap':
+                blockers = await self._swap_blockers(conn, target_schema or 'public', target_table_only)
+                if not blockers:
+                    records = self._prepare_records(rows, col_names, parsers, stats, column_hashes)
+                    self._report_unparsed(table, stats)
+                    await self._swap_in_shadow(conn, table, target_schema or 'public', target_table_only, target_cols, records)
+                    stats['inserted'] = len(records)
+                    log.info(f"Полная перезагрузка {table} (swap) завершена: {stats}")
+                    return stats
+                log.warning(f"Swap для {table} невозможен ({', '.join(blockers)}), используем TRUNCATE")
+            
             async with conn.transaction():
-                await conn.execute(f'TRUNCATE TABLE {target_table_sql}')
+                with span('load.truncate'):
+                    await conn.execute(f'TRUNCATE TABLE {target_table_sql}')
                 
-                prepared_records = []
-                target_cols = validated_cols + ["_row_index", "__row_hash"]
-                
-                for idx, r in enumerate(rows):
-                    row_num = idx + 2
-                    try:
-                        full_row_str, row_hash = self._prepare_row(r, col_names, row_num)
-                        prepared_records.append(tuple(full_row_str + [row_num, row_hash]))
-                    except Exception as e:
-                        log.warning(f"Ошибка подготовки строки {row_num}: {e}")
-                        stats['errors'] += 1
+                prepared_records = self._prepare_records(rows, col_names, parsers, stats, column_hashes)
+                self._report_unparsed(table, stats)
                 
                 if prepared_records:
-                    if '.' in table:
-                        target_schema = table.split('.', 1)[0]
-                        target_table_only = table.split('.', 1)[1]
-                    else:
-                        target_schema = self.schema_prefix.replace('.', '') if self.schema_prefix else None
-                        target_table_only = table
-                        
-                    await conn.copy_records_to_table(
-                        target_table_only,
-                        schema_name=target_schema,
-                        records=prepared_records,
-                        columns=target_cols
-                    )
+                    with span('load.copy', rows=len(prepared_records)) as copy_span:
+                        await conn.copy_records_to_table(
+                            target_table_only,
+                            schema_name=target_schema,
+                            records=prepared_records,
+                            columns=target_cols
+                        )
+                    observe_copy(table, len(prepared_records), copy_span.duration_ms / 1000)
                     stats['inserted'] = len(prepared_records)
                     
         log.info(f"Полная перезагрузка {table} завершена: {stats}")
         return stats
 
+    def _prepare_records(self, rows: Iterable[List[Any]], col_names: List[str],
+                         parsers: Dict[int, Callable[[Any], Any]], stats: Dict[str, int],
+                         column_hashes: bool = False) -> List[tuple]:
+        """Готовит записи для COPY (значения + _row_index + __row_hash [+ __col_hashes])."""
+        prepared_records = []
+        with span('load.prepare'):
+            for idx, r in enumerate(rows):
+                row_num = idx + 2
+                try:
+                    prepared = self._prepare_row(r, col_names, row_num, parsers, column_hashes)
+                    prepared_records.append(tuple(prepared[0] + [row_num, *prepared[1:]]))
+                except UnparsedValue as e:
+                    stats.setdefault('unparsed', []).append(e)
+                    stats['errors'] += 1
+                except Exception as e:
+                    log.warning(f"Ошибка подготовки строки {row_num}: {e}")
+                    stats['errors'] += 1
+        return prepared_records
+
+    async def _swap_blockers(self, conn, schema: str, table_only: str) -> List[str]:
+        """Объекты, которые не переживут подмену таблицы через RENAME."""
+        rows = await conn.fetch(
+            """
+            WITH t AS (SELECT c.oid, c.relrowsecurity FROM pg_class c
+                       JOIN pg_namespace n ON n.oid = c.relnamespace
+                       WHERE n.nspname = $1 AND c.relname = $2)
+            SELECT DISTINCT 'view ' || v.relname AS blocker
+              FROM t JOIN pg_depend d ON d.refobjid = t.oid
+              JOIN pg_rewrite r ON r.oid = d.objid
+              JOIN pg_class v ON v.oid = r.ev_class AND v.oid <> t.oid
+            UNION ALL
+            SELECT 'fk ' || con.conname FROM t JOIN pg_constraint con ON con.confrelid = t.oid
+            UNION ALL
+            SELECT 'trigger ' || tg.tgname FROM t JOIN pg_trigger tg ON tg.tgrelid = t.oid AND NOT tg.tgisinternal
+            UNION ALL
+            SELECT 'rls' FROM t WHERE t.relrowsecurity
+            UNION ALL
+            -- Подмененная таблица выпала бы из публикации логической репликации
+            SELECT 'publication ' || p.pubname FROM t JOIN pg_publication_rel pr ON pr.prrelid = t.oid
+              JOIN pg_publication p ON p.oid = pr.prpubid
+            UNION ALL
+            SELECT 'sequence ' || col.column_name FROM information_schema.columns col
+             WHERE col.table_schema = $1 AND col.table_name = $2 AND col.column_default LIKE 'nextval(%'
+            UNION ALL
+            SELECT 'missing table' WHERE NOT EXISTS (SELECT 1 FROM t)
+            """,
+            schema, table_only
+        )
+        return [row['blocker'] for row in rows]
+
+    async def _swap_in_shadow(self, conn, table: str, schema: str, table_only: str,
+                              target_cols: List[str], records: List[tuple]):
+        """COPY в теневую таблицу, построение индексов и атомарная подмена.
+
+        Читатели живой таблицы не блокируются на время загрузки: ACCESS EXCLUSIVE
+        берется только на время RENAME в финальной транзакции.
+        """
+        live = f'"{schema}"."{table_only}"'
+        shadow_name = f"{table_only}{SHADOW_SUFFIX}"
+        shadow = f'"{schema}"."{shadow_name}"'
+        old = f"{table_only}__old"
+        unlogged = 'UNLOGGED ' if settings.full_refresh_unlogged else ''
+
+        with span('load.shadow_create'):
+            await conn.execute(f'DROP TABLE IF EXISTS {shadow}')
+            await conn.execute(
+                f'CREATE {unlogged}TABLE {shadow} (LIKE {live} INCLUDING DEFAULTS INCLUDING CONSTRAINTS '
+                f'INCLUDING GENERATED INCLUDING STORAGE INCLUDING COMMENTS)'
+            )
+
+        try:
+            if records:
+                with span('load.copy', rows=len(records)) as copy_span:
+                    await conn.copy_records_to_table(
+                        shadow_name, schema_name=schema, records=records, columns=target_cols
+                    )
+                observe_copy(table, len(records), copy_span.duration_ms / 1000)
+
+            # Индексы строятся после COPY: один проход сортировки вместо вставок в B-tree
+            renames = []
+            with span('load.shadow_indexes'):
+                constraints = await conn.fetch(
+                    "SELECT conname, pg_get_constraintdef(oid) AS def FROM pg_constraint "
+                    "WHERE conrelid = $1::regclass AND contype IN ('p', 'u', 'x')", live
+                )
+                for con in constraints:
+                    tmp_name = f"{con['conname']}{SHADOW_SUFFIX}"
+                    await conn.execute(f'ALTER TABLE {shadow} ADD CONSTRAINT "{tmp_name}" {con["def"]}')
+                    renames.append(f'ALTER TABLE {live} RENAME CONSTRAINT "{tmp_name}" TO "{con["conname"]}"')
+
+                indexes = await conn.fetch(
+                    "SELECT c.relname AS name, pg_get_indexdef(i.indexrelid) AS def FROM pg_index i "
+                    "JOIN pg_class c ON c.oid = i.indexrelid "
+                    "WHERE i.indrelid = $1::regclass "
+                    "AND NOT EXISTS (SELECT 1 FROM pg_constraint con WHERE con.conindid = i.indexrelid)", live
+                )
+                for idx in indexes:
+                    tmp_name = f"{idx['name']}{SHADOW_SUFFIX}"
+                    await conn.execute(self._retarget_index_def(idx['def'], tmp_name, shadow))
+                    renames.append(f'ALTER INDEX "{schema}"."{tmp_name}" RENAME TO "{idx["name"]}"')
+
+                if unlogged:
+                    await conn.execute(f'ALTER TABLE {shadow} SET LOGGED')
+
+                grants = await conn.fetch(
+                    "SELECT grantee, privilege_type FROM information_schema.role_table_grants "
+                    "WHERE table_schema = $1 AND table_name = $2 AND grantee <> current_user",
+                    schema, table_only
+                )
+                for g in grants:
+                    grantee = 'PUBLIC' if g['grantee'] == 'PUBLIC' else f'"{g["grantee"]}"'
+                    await conn.execute(f'GRANT {g["privilege_type"]} ON {shadow} TO {grantee}')
+
+            # Статистика до подмены: трансформации не должны планироваться по пустой таблице
+            with span('load.shadow_analyze'):
+                await conn.execute(f'ANALYZE {shadow}')
+
+            with span('load.swap'):
+                async with conn.transaction():
+                    await conn.execute(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'")
+                    await conn.execute(f'ALTER TABLE {live} RENAME TO "{old}"')
+                    await conn.execute(f'ALTER TABLE {shadow} RENAME TO "{table_only}"')
+                    await conn.execute(f'DROP TABLE "{schema}"."{old}"')
+                    for stmt in renames:
+                        await conn.execute(stmt)
+            log.info(f"🔁 {schema}.{table_only}: теневая таблица подменена ({len(records)} строк)")
+        except Exception:
+            await conn.execute(f'DROP TABLE IF EXISTS {shadow}')
+            raise
+
+    @staticmethod
+    def _retarget_index_def(index_def: str, new_name: str, new_table: str) -> str:
+        """Переносит определение индекса (pg_get_indexdef) на другую таблицу под новым именем."""
+        m = re.match(r'^(CREATE (?:UNIQUE )?INDEX )(\S+)( ON (?:ONLY )?)(\S+)( USING .*)$', index_def, re.S)
+        if not m:
+            raise ValueError(f"Неожиданное определение индекса: {index_def}")
+        return f'{m.group(1)}"{new_name}"{m.group(3)}{new_table}{m.group(5)}'
+
     async def fast_batch_insert(self, table: str, col_names: List[str], records: List[tuple], truncate_first: bool = False) -> int:
         """Быстрая batch-вставка без CDC (для миграций). Возвращает кол-во вставленных строк."""
         if '.' in table:
@@ -132,8 +356,15 @@ class DataLoader:
         log.info(f"fast_batch_insert: {len(records)} записей в {schema}.{table_only}")
         return len(records)
 
-    async def load_cdc(self, table: str, col_names: List[str], rows: Iterable[List[Any]], pk_field: str = '__row_hash', row_count: Optional[int] = None) -> Dict[str, int]:
-        """Инкрементальная загрузка с использованием CDC."""
+    async def load_cdc(self, table: str, col_names: List[str], rows: Iterable[List[Any]], pk_field: str = '__row_hash',
+                       row_count: Optional[int] = None, partial: bool = False,
+                       row_numbers: Optional[List[int]] = None) -> Dict[str, int]:
+        """Инкрементальная загрузка с использованием CDC.
+
+        partial=True — rows лишь часть листа (правки из webhook, src/etl/webhook.py):
+        хеши читаются только для их ключей, отсутствующие строки не удаляются.
+        row_numbers — значения _row_index строк (по умолчанию позиция + 2).
+        """
         if '.' not in table:
              table = self._validate_identifier(table)
         pk_field = self._validate_identifier(pk_field)
@@ -143,39 +374,217 @@ class DataLoader:
         if row_count is None and isinstance(rows, list):
              count_str = f"{len(rows)} строк"
 
-        log.info(f"CDC загрузка в {target_table_sql} ({count_str} из источника) [PK: {pk_field}]")
+        log.info(f"CDC загрузка в {target_table_sql} ({count_str} из источника{', частичная' if partial else ''}) [PK: {pk_field}]")
         
-        existing_hashes = await self._fetch_existing_hashes(table, pk_field)
-        processor = CDCProcessor(existing_hashes)
+        if not partial and settings.sorted_merge_cdc_min_rows and (row_count or 0) >= settings.sorted_merge_cdc_min_rows:
+            return await self.load_cdc_sorted(table, col_names, rows, pk_field, row_numbers)
+
+        parsers = await self._fetch_column_parsers(table, col_names)
+        column_hashes = settings.column_change_detection and await self._ensure_column_hashes(table)
+        unparsed: List[UnparsedValue] = []
+        prepared = self._prepare_cdc_rows(rows, col_names, pk_field, parsers, row_numbers, column_hashes, unparsed)
+        if partial:
+            prepared = list(prepared)
+        existing_column_hashes = {} if column_hashes else None
+        with span('load.fetch_hashes'):
+            existing_hashes = await self._fetch_existing_hashes(
+                table, pk_field, keys=[item[0] for item in prepared] if partial else None,
+                column_hashes=existing_column_hashes
+            )
+        processor = CDCProcessor(existing_hashes, existing_column_hashes, col_names)
         
+        with span('load.prepare'):
+            for pk_val, row_hash, values, row_num, col_hashes in prepared:
+                processor.process_row(pk_val, row_hash, values, col_hashes, row_num)
+
+        if not partial:
+            # Строки с нераспознанными значениями не удаляются: в staging остается прежняя версия
+            for e in unparsed:
+                pk_val = self._row_pk(pk_field, col_names, e.row_hash, e.values)
+                processor.existing_hashes.pop(pk_val, None)
+                if existing_column_hashes is not None:
+                    existing_column_hashes.pop(pk_val, None)
+            processor.finalize()
+        cdc_stats = processor.get_stats()
+        self._report_unparsed(table, cdc_stats, unparsed)
+        await self._apply_cdc_changes(table, processor, col_names, pk_field, column_hashes)
+        if processor.column_changes:
+            cdc_stats['column_changes'] = dict(processor.column_changes.most_common())
+            top = ', '.join(f"{col} ({n})" for col, n in processor.column_changes.most_common(5))
+            log.info(f"   📊 Чаще всего меняются колонки {table}: {top}")
+        return cdc_stats
+
+    async def load_cdc_sorted(self, table: str, col_names: List[str], rows: Iterable[List[Any]], pk_field: str,
+                              row_numbers: Optional[List[int]] = None) -> Dict[str, int]:
+        """CDC слиянием отсортированных по ключу потоков (большие таблицы, SORTED_MERGE_CDC_MIN_ROWS).
+
+        Хеши таблицы не собираются в словарь: они читаются серверным курсором в
+        порядке pk (сортирует Postgres), строки источника сортируются по pk, а
+        вставки, обновления и удаления пишутся батчами по мере обнаружения через
+        второе соединение. В памяти — строки источника (как списки значений) и
+        по одному батчу хешей БД и изменений, а не вся таблица.
+        """
+        table = self._validate_identifier(table)
+        pk_field = self._validate_identifier(pk_field)
+        target_table_sql = self._format_table_name(table)
+        validated_cols = [self._validate_identifier(c) for c in col_names]
+        if '.' in table:
+            target_schema, target_table_only = table.split('.', 1)
+        else:
+            target_schema = self.schema_prefix.replace('.', '') if self.schema_prefix else None
+            target_table_only = table
+
+        parsers = await self._fetch_column_parsers(table, col_names)
+        column_hashes = settings.column_change_detection and await self._ensure_column_hashes(table)
+
+        unparsed: List[UnparsedValue] = []
+        with span('load.prepare'):
+            # (pk как текст, row_hash, col_hashes, pk, _row_index, значения) — в порядке ключа
+            source = sorted(
+                ((str(pk), row_hash, col_hashes, pk, row_num, values)
+                 for pk, row_hash, values, row_num, col_hashes in self._prepare_cdc_rows(
+                     rows, col_names, pk_field, parsers, row_numbers, column_hashes, unparsed)),
+                key=lambda item: item[0]
+            )
+        # Ключи строк с нераспознанными значениями: прежние версии в staging не удаляются
+        keep = {str(self._row_pk(pk_field, col_names, e.row_hash, e.values)) for e in unparsed}
+        log.info(f"Sorted-merge CDC в {target_table_sql} ({len(source)} строк из источника) [PK: {pk_field}]")
+
+        extra = ', "__col_hashes"' if column_hashes else ''
+        query = (
+            f'SELECT "{pk_field}"::text AS pk, __row_hash{extra} FROM {target_table_sql} '
+            f'WHERE "{pk_field}" IS NOT NULL AND __row_hash IS NOT NULL ORDER BY 1 COLLATE "C"'
+        )
+        stats = {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+        column_changes: Counter = Counter()
+        inserts: List[tuple] = []
+        updates: List[CDCChange] = []
+        deletes: List[str] = []
+        insert_cols = validated_cols + ["_row_index", "__row_hash"] + (["__col_hashes"] if column_hashes else [])
+
+        async def existing_rows(conn):
+            async for row in conn.cursor(query, prefetch=MERGE_CURSOR_PREFETCH):
+                yield row['pk'], row['__row_hash'], row['__col_hashes'] if column_hashes else None
+
+        async def flush(write_conn, final: bool = False):
+            if inserts and (final or len(inserts) >= DB_BATCH_SIZE):
+                with span('load.copy', rows=len(inserts)) as copy_span:
+                    await write_conn.copy_records_to_table(
+                        target_table_only, schema_name=target_schema, records=inserts, columns=insert_cols
+                    )
+                observe_copy(table, len(inserts), copy_span.duration_ms / 1000)
+                inserts.clear()
+            if updates and (final or len(updates) >= UPDATE_BATCH_SIZE):
+                with span('load.update', rows=len(updates)):
+                    await self._update_rows(write_conn, target_table_sql, updates, col_names, pk_field, column_hashes)
+                updates.clear()
+            if deletes and (final or len(deletes) >= DB_BATCH_SIZE):
+                with span('load.delete', rows=len(deletes)):
+                    await write_conn.execute(f'DELETE FROM {target_table_sql} WHERE "{pk_field}" = ANY($1::text[])', deletes[:])
+                deletes.clear()
+
+        with span('load.merge', rows=len(source)):
+            async with await DBConnection.get_connection() as read_conn, \
+                       await DBConnection.get_connection() as write_conn:
+                # Курсор живет в транзакции; снимок читается на момент старта, записи идут отдельно
+                async with read_conn.transaction():
+                    async for action, item, current in merge_changes(source, existing_rows(read_conn)):
+                        if action == 'unchanged':
+                            stats['unchanged'] += 1
+                            continue
+                        if action == 'delete':
+                            if current[0] in keep:
+                                continue
+                            deletes.append(current[0])
+                        elif action == 'insert':
+                            values = item[5] + [item[4], item[1]]
+                            inserts.append(tuple(values + ([item[2]] if column_hashes else [])))
+                        else:
+                            update = CDCChange(item[3], item[1], item[5], item[4])
+                            if column_hashes:
+                                columns = changed_columns(current[2], item[2], col_names)
+                                update.col_hashes, update.columns = item[2], columns or None
+                                if columns:
+                                    column_changes.update(columns)
+                            updates.append(update)
+                        stats[MERGE_STATS[action]] += 1
+                        await flush(write_conn)
+                await flush(write_conn, final=True)
+
+        self._report_unparsed(table, stats, unparsed)
+        log.info(f"   ✅ Sorted-merge CDC {table}: {stats}")
+        if column_changes:
+            stats['column_changes'] = dict(column_changes.most_common())
+            top = ', '.join(f"{col} ({n})" for col, n in column_changes.most_common(5))
+            log.info(f"   📊 Чаще всего меняются колонки {table}: {top}")
+        return stats
+
+    async def _ensure_column_hashes(self, table: str) -> bool:
+        """Колонка __col_hashes в таблице (добавляется при первой загрузке с COLUMN_CHANGE_DETECTION).
+
+        False — колонку добавить не удалось, загрузка идет без поколоночного сравнения.
+        """
+        if table in self._col_hash_tables:
+            return True
+        try:
+            await DBConnection.execute(
+                f'ALTER TABLE {self._format_table_name(table)} ADD COLUMN IF NOT EXISTS "__col_hashes" text'
+            )
+        except Exception as e:
+            log.warning(f"Не удалось добавить __col_hashes в {table}, обновление строк целиком: {e}")
+            return False
+        self._col_hash_tables.add(table)
+        return True
+
+    def _prepare_cdc_rows(self, rows: Iterable[List[Any]], col_names: List[str], pk_field: str,
+                          parsers: Dict[int, Callable[[Any], Any]], row_numbers: Optional[List[int]] = None,
+                          column_hashes: bool = False, unparsed: Optional[List[UnparsedValue]] = None):
+        """Строки источника -> (pk, row_hash, values, _row_index, col_hashes); строки без ключа пропускаются.
+
+        values — список значений в порядке col_names (без словаря на строку);
+        col_hashes — None, если поколоночное сравнение выключено. Строки с
+        нераспознанными типизированными значениями пропускаются и попадают в unparsed.
+        """
         for idx, r in enumerate(rows):
-            row_num = idx + 2
+            row_num = row_numbers[idx] if row_numbers is not None else idx + 2
             try:
-                full_row_str, row_hash = self._prepare_row(r, col_names, row_num)
-                
-                # PK identification
-                if pk_field == '__row_hash':
-                    pk_val = row_hash
-                elif pk_field in col_names:
-                    pk_idx = col_names.index(pk_field)
-                    pk_val = full_row_str[pk_idx]
-                else:
-                    pk_val = None
+                prepared = self._prepare_row(r, col_names, row_num, parsers, column_hashes)
+                values, row_hash = prepared[0], prepared[1]
+                col_hashes = prepared[2] if column_hashes else None
+                pk_val = self._row_pk(pk_field, col_names, row_hash, values)
 
                 if not pk_val:
                      continue
 
-                row_data = {col: val for col, val in zip(col_names, full_row_str)}
-                row_data['_row_index'] = row_num
-                
-                processor.process_row(pk_val, row_hash, row_data)
+                yield pk_val, row_hash, values, row_num, col_hashes
+            except UnparsedValue as e:
+                if unparsed is not None:
+                    unparsed.append(e)
             except Exception as e:
                 log.warning(f"Ошибка обработки строки {row_num} для CDC: {e}")
 
-        processor.finalize()
-        cdc_stats = processor.get_stats()
-        await self._apply_cdc_changes(table, processor, col_names, pk_field)
-        return cdc_stats
+    @staticmethod
+    def _row_pk(pk_field: str, col_names: List[str], row_hash: str, values: List[Any]) -> Any:
+        """Значение ключа строки (None — ключа нет)."""
+        if pk_field == '__row_hash':
+            return row_hash
+        if pk_field in col_names:
+            return values[col_names.index(pk_field)]
+        return None
+
+    @staticmethod
+    def _report_unparsed(table: str, stats: Dict[str, Any], unparsed: Optional[List[UnparsedValue]] = None):
+        """Сводка по строкам, не загруженным из-за нераспознанных значений (stats['unparsed'] — число)."""
+        unparsed = unparsed if unparsed is not None else stats.pop('unparsed', [])
+        if not unparsed:
+            return
+        by_column = Counter(e.column for e in unparsed)
+        examples = ', '.join(f"строка {e.row_num}: {e.column}={e.value!r}" for e in unparsed[:5])
+        log.warning(
+            f"⚠ {table}: {len(unparsed)} строк не загружены — значения не распознаны "
+            f"({', '.join(f'{col}: {n}' for col, n in by_column.most_common())}); например {examples}"
+        )
+        stats['unparsed'] = len(unparsed)
 
     async def calculate_changes(self, table: str, col_names: List[str], rows: Iterable[List[Any]], pk_field: str = '__row_hash', row_count: Optional[int] = None) -> Dict[str, int]:
         """Вычисляет статистику изменений без применения (для dry-run)."""
@@ -190,47 +599,101 @@ class DataLoader:
 
         log.info(f"🔍 [DRY-RUN] Расчет изменений для {target_table_sql} ({count_str}) [PK: {pk_field}]")
         
-        existing_hashes = await self._fetch_existing_hashes(table, pk_field)
+        with span('load.fetch_hashes'):
+            existing_hashes = await self._fetch_existing_hashes(table, pk_field)
         processor = CDCProcessor(existing_hashes)
         
-        for idx, r in enumerate(rows):
-            row_num = idx + 2
-            try:
-                full_row_str, row_hash = self._prepare_row(r, col_names, row_num)
-                
-                if pk_field == '__row_hash':
-                    pk_val = row_hash
-                elif pk_field in col_names:
-                    pk_idx = col_names.index(pk_field)
-                    pk_val = full_row_str[pk_idx]
-                else:
-                    pk_val = None
-                
-                if not pk_val:
-                    continue
+        with span('load.prepare'):
+            for idx, r in enumerate(rows):
+                row_num = idx + 2
+                try:
+                    full_row_str, row_hash = self._prepare_row(r, col_names, row_num)
+                    
+                    if pk_field == '__row_hash':
+                        pk_val = row_hash
+                    elif pk_field in col_names:
+                        pk_idx = col_names.index(pk_field)
+                        pk_val = full_row_str[pk_idx]
+                    else:
+                        pk_val = None
+                    
+                    if not pk_val:
+                        continue
 
-                row_data = {col: val for col, val in zip(col_names, full_row_str)}
-                processor.process_row(pk_val, row_hash, row_data)
-            except Exception as e:
-                log.warning(f"Ошибка обработки строки {row_num} (dry-run): {e}")
+                    processor.process_row(pk_val, row_hash, full_row_str, row_index=row_num)
+                except Exception as e:
+                    log.warning(f"Ошибка обработки строки {row_num} (dry-run): {e}")
 
         processor.finalize()
         return processor.get_stats()
 
-    async def _fetch_existing_hashes(self, table: str, pk_field: str) -> Dict[str, str]:
-        # table и pk_field уже валидированы выше
+    async def _fetch_existing_hashes(self, table: str, pk_field: str,
+                                     keys: Optional[List[Any]] = None,
+                                     column_hashes: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """{pk: __row_hash}; переданный column_hashes заполняется {pk: __col_hashes} тем же запросом."""
         # table и pk_field уже валидированы выше (в вызывающем методе) или должны быть здесь
         target_table_sql = self._format_table_name(table)
         try:
-            query = f'SELECT "{pk_field}" as pk, __row_hash FROM {target_table_sql} WHERE "{pk_field}" IS NOT NULL'
-            rows = await DBConnection.fetch(query)
+            extra = ', "__col_hashes"' if column_hashes is not None else ''
+            query = f'SELECT "{pk_field}" as pk, __row_hash{extra} FROM {target_table_sql} WHERE "{pk_field}" IS NOT NULL'
+            if keys is not None:
+                # Частичная загрузка: только ключи пришедших строк
+                query += f' AND "{pk_field}" = ANY($1::text[])'
+                rows = await DBConnection.fetch(query, [str(k) for k in keys])
+            else:
+                rows = await DBConnection.fetch(query)
+            if column_hashes is not None:
+                column_hashes.update(
+                    (str(row['pk']), row['__col_hashes']) for row in rows if row['__row_hash'] and row['__col_hashes']
+                )
             return {str(row['pk']): row['__row_hash'] for row in rows if row['__row_hash']}
         except Exception as e:
             log.warning(f"Не удалось получить хеши для {table} (колонка {pk_field} отсутствует?): {e}")
             return {}
 
-    async def _apply_cdc_changes(self, table: str, processor: CDCProcessor, col_names: List[str], pk_field: str):
-        """Выполняет INSERT/UPDATE/DELETE запросы."""
+    async def _update_rows(self, conn, target_table_sql: str, items: List[CDCChange], col_names: List[str],
+                           pk_field: str, column_hashes: bool):
+        """UPDATE батча в одной транзакции.
+
+        Один текст запроса на набор колонок: готовится один раз (вне PgBouncer).
+        Без поколоночных хешей набор один — все колонки.
+        """
+        update_cols = [c for c in col_names if c != pk_field]
+        positions = {c: i for i, c in enumerate(col_names)}
+        groups: Dict[Optional[Tuple[str, ...]], List[CDCChange]] = {}
+        for item in items:
+            columns = item.columns
+            key = tuple(c for c in columns if c != pk_field) if columns else None
+            groups.setdefault(key, []).append(item)
+        
+        async with conn.transaction():
+            for columns, group in groups.items():
+                set_cols = update_cols if columns is None else list(columns)
+                query = self._update_query(target_table_sql, set_cols, pk_field, column_hashes)
+                set_idx = [positions[c] for c in set_cols]
+                args_list = [
+                    [item.values[i] for i in set_idx] + [item.hash]
+                    + ([item.col_hashes] if column_hashes else []) + [item.pk]
+                    for item in group
+                ]
+                await DBConnection.execute_many(conn, query, args_list)
+
+    @staticmethod
+    def _update_query(target_table_sql: str, set_cols: List[str], pk_field: str, column_hashes: bool) -> str:
+        """UPDATE указанных колонок и хешей по ключу ($1..$n — колонки, затем хеши, последний — ключ)."""
+        set_parts = [f'"{c}" = ${i}' for i, c in enumerate(set_cols, start=1)]
+        set_parts.append(f'"__row_hash" = ${len(set_parts) + 1}')
+        if column_hashes:
+            set_parts.append(f'"__col_hashes" = ${len(set_parts) + 1}')
+        return f'UPDATE {target_table_sql} SET {", ".join(set_parts)} WHERE "{pk_field}" = ${len(set_parts) + 1}'
+
+    async def _apply_cdc_changes(self, table: str, processor: CDCProcessor, col_names: List[str], pk_field: str,
+                                 column_hashes: bool = False):
+        """Выполняет INSERT/UPDATE/DELETE запросы.
+
+        column_hashes=True — пишется __col_hashes, а UPDATE меняет только колонки
+        из CDCChange.columns (строки без списка обновляются целиком).
+        """
         if '.' not in table:
              table = self._validate_identifier(table)
         target_table_sql = self._format_table_name(table)
@@ -245,10 +708,13 @@ class DataLoader:
                 
                 prepared_records = []
                 target_cols = validated_cols + ["_row_index", "__row_hash"]
+                if column_hashes:
+                    target_cols.append("__col_hashes")
                 
                 for item in processor.to_insert:
-                    data = item['data']
-                    values = [data.get(c) for c in col_names] + [data.get('_row_index'), item['hash']]
+                    values = list(item.values) + [item.row_index, item.hash]
+                    if column_hashes:
+                        values.append(item.col_hashes)
                     prepared_records.append(tuple(values))
 
                 if prepared_records:
@@ -259,41 +725,29 @@ class DataLoader:
                         target_schema = self.schema_prefix.replace('.', '') if self.schema_prefix else None
                         target_table_only = table
                         
-                    await conn.copy_records_to_table(
-                        target_table_only,
-                        schema_name=target_schema,
-                        records=prepared_records,
-                        columns=target_cols
-                    )
+                    with span('load.copy', rows=len(prepared_records)) as copy_span:
+                        await conn.copy_records_to_table(
+                            target_table_only,
+                            schema_name=target_schema,
+                            records=prepared_records,
+                            columns=target_cols
+                        )
+                    observe_copy(table, len(prepared_records), copy_span.duration_ms / 1000)
                 log.info(f"   ✅ Вставка завершена: {total} строк")
 
             # UPDATEs
             if processor.to_update:
                 total = len(processor.to_update)
                 log.info(f"📝 Обновление {total} строк в {table}...")
-                for idx, item in enumerate(processor.to_update):
-                    data = item['data']
-                    pk_val = item['pk']
-                    
-                    set_parts = []
-                    vals = []
-                    val_idx = 1
-                    for c in col_names:
-                        if c == pk_field: continue
-                        set_parts.append(f'"{c}" = ${val_idx}')
-                        vals.append(data.get(c))
-                        val_idx += 1
-                    
-                    set_parts.append(f'"__row_hash" = ${val_idx}')
-                    vals.append(item['hash'])
-                    val_idx += 1
-                    vals.append(pk_val) # PK for WHERE
-                    
-                    query = f'UPDATE {target_table_sql} SET {", ".join(set_parts)} WHERE "{pk_field}" = ${val_idx}'
-                    await conn.execute(query, *vals)
-                    
-                    if (idx + 1) % 500 == 0:
-                        log.info(f"   💓 Обновлено {idx + 1}/{total} ({(idx + 1) * 100 // total}%)")
+                
+                with span('load.update', rows=total):
+                    for start in range(0, total, UPDATE_BATCH_SIZE):
+                        batch = processor.to_update[start:start + UPDATE_BATCH_SIZE]
+                        await self._update_rows(conn, target_table_sql, batch, col_names, pk_field, column_hashes)
+                        
+                        done = start + len(batch)
+                        if done < total:
+                            log.info(f"   💓 Обновлено {done}/{total} ({done * 100 // total}%)")
                 
                 log.info(f"   ✅ Обновление завершено: {total} строк")
 
@@ -301,8 +755,10 @@ class DataLoader:
             if processor.to_delete:
                 total = len(processor.to_delete)
                 log.info(f"🗑️ Удаление {total} строк из {table}...")
-                del_query = f'DELETE FROM {target_table_sql} WHERE "{pk_field}" = $1'
-                for pk_val in processor.to_delete:
-                    await conn.execute(del_query, pk_val)
+                # Один запрос на батч ключей вместо DELETE на каждую строку
+                del_query = f'DELETE FROM {target_table_sql} WHERE "{pk_field}" = ANY($1::text[])'
+                with span('load.delete', rows=total):
+                    for start in range(0, total, DB_BATCH_SIZE):
+                        await conn.execute(del_query, processor.to_delete[start:start + DB_BATCH_SIZE])
                 log.info(f"   ✅ Удаление завершено: {total} строк")
 
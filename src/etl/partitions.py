@@ -0,0 +1,57 @@
+"""Обслуживание партиций истории: raw.sheets_dump, ops.validation_logs, ops.elt_table_stats.
+
+Таблицы разбиты по месяцам (миграция 021, партиции `<таблица>_pYYYYMM` и
+DEFAULT на случай пропуска). В конце каждого запуска `maintain_partitions`
+создает партиции наперед (`ops.ensure_month_partitions`) и удаляет месяцы,
+целиком вышедшие за срок хранения (`ops.drop_old_partitions`). Удаление
+партиции — это DROP TABLE: без DELETE по строкам и последующего VACUUM.
+"""
+import logging
+from typing import Dict, List, Tuple
+from src.config.settings import settings
+from src.db.connection import DBConnection
+from src.utils.tracing import span
+
+log = logging.getLogger('partitions')
+
+
+def partitioned_tables() -> List[Tuple[str, str, int]]:
+    """(таблица, колонка партиционирования, срок хранения в днях)."""
+    return [
+        (f"{settings.schema_raw}.sheets_dump", 'extracted_at', settings.raw_dump_retention_days),
+        (f"{settings.schema_ops}.validation_logs", 'created_at', settings.validation_log_retention_days),
+        (f"{settings.schema_ops}.elt_table_stats", 'created_at', settings.table_stats_retention_days),
+    ]
+
+
+async def maintain_partitions() -> Dict[str, Dict[str, int]]:
+    """Создает будущие партиции и удаляет просроченные. Возвращает {таблица: {created, dropped}}.
+
+    Сбой по одной таблице не останавливает остальные и сам запуск.
+    """
+    result = {}
+    for table, column, retention_days in partitioned_tables():
+        try:
+            with span('partitions.maintain', table=table):
+                rows = await DBConnection.fetch(
+                    f"SELECT {settings.schema_ops}.ensure_month_partitions($1, $2, CURRENT_DATE, $3) AS created",
+                    table, column, settings.partition_premake_months + 1
+                )
+                created = rows[0]['created'] if rows else 0
+                dropped = 0
+                if retention_days > 0:
+                    rows = await DBConnection.fetch(
+                        f"SELECT {settings.schema_ops}.drop_old_partitions($1, NOW() - make_interval(days => $2)) AS dropped",
+                        table, retention_days
+                    )
+                    dropped = rows[0]['dropped'] if rows else 0
+        except Exception as e:
+            log.warning(f"Ошибка обслуживания партиций {table}: {e}")
+            continue
+
+        result[table] = {'created': created, 'dropped': dropped}
+        if created:
+            log.info(f"{table}: создано партиций: {created}")
+        if dropped:
+            log.info(f"{table}: удалено партиций старше {retention_days} дн.: {dropped}")
+    return result
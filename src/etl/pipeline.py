@@ -1,8 +1,10 @@
+import asyncio
+import json
 import logging
 import time
 import uuid
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Set
 from src.config.settings import settings
 from src.etl.extractor import GSheetsExtractor
 from src.etl.loader import DataLoader
@@ -11,21 +13,94 @@ from src.etl.exporter import DataMartExporter
 from src.etl.validator import ContractValidator
 from src.etl.processor import TableProcessor
 from src.etl.quality import DataQualityChecker
+from src.etl import replay
+from src.etl.checkpoints import RunCheckpoints
+from src.etl.partitions import maintain_partitions
+from src.etl.rollups import refresh_rollups
 from src.utils.notifications import NotificationService
+from src.utils.tracing import tracer, span
+from src.utils import metrics as m
 from src.db.connection import DBConnection
 
 log = logging.getLogger('pipeline')
 
+REFERENCE_TABLES = ('rates', 'price_reference')
+
+
+def table_category(table: str) -> str:
+    """Категория таблицы: 'hst' (история), 'ref' (справочник) или 'cur' (текущие)."""
+    if table.endswith('_hst'):
+        return 'hst'
+    if any(ref in table for ref in REFERENCE_TABLES):
+        return 'ref'
+    return 'cur'
+
+
+def table_in_scope(table: str, scope: str) -> bool:
+    """current — текущие таблицы, historical — история и справочники, all — все."""
+    if scope == 'current':
+        return table_category(table) == 'cur'
+    if scope == 'historical':
+        return table_category(table) in ('hst', 'ref')
+    return True
+
+
+async def check_quality(checker: DataQualityChecker, scope: str, tables: Optional[Set[str]] = None) -> Dict[str, Any]:
+    """Проверки качества загруженных листов scope. RuntimeError — найдены критические проблемы."""
+    for sdata in (settings.sources or {}).get('spreadsheets', {}).values():
+        for sheet_cfg in sdata.get('sheets', []):
+            target_table = sheet_cfg['target_table']
+            if (tables is not None and target_table not in tables) or not table_in_scope(target_table, scope):
+                continue
+            with span('quality.check', table=target_table):
+                await checker.check_table(
+                    target_table, sheet_cfg.get('pk', '__row_hash'), critical_cols=sheet_cfg.get('date_columns', [])
+                )
+
+    summary = checker.get_summary()
+    if summary['has_critical_issues']:
+        log.critical("ОБНАРУЖЕНЫ КРИТИЧЕСКИЕ ОШИБКИ КАЧЕСТВА ДАННЫХ. Остановка пайплайна.")
+        raise RuntimeError("Data Quality check failed: critical issues found.")
+    return summary
+
+
+async def log_table_stats(run_id: Any, result: Dict[str, Any]):
+    """Статистика загрузки таблицы в ops.elt_table_stats (ошибка записи не прерывает запуск)."""
+    query = f"""
+        INSERT INTO {settings.schema_ops}.elt_table_stats (
+            run_id, table_name, rows_extracted, rows_inserted, 
+            rows_updated, rows_deleted, validation_errors, duration_ms, column_changes
+        ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9::jsonb)
+    """
+    column_changes = result.get('column_changes')
+    try:
+        await DBConnection.execute(
+            query, str(run_id), result['table'],
+            result.get('extracted', 0), result.get('inserted', 0),
+            result.get('updated', 0), result.get('deleted', 0),
+            result.get('errors', 0), result.get('duration_ms', 0),
+            json.dumps(column_changes, ensure_ascii=False) if column_changes else None
+        )
+    except Exception as e:
+        log.warning(f"Не удалось сохранить статистику таблицы {result['table']}: {e}")
+
+
 class ELTPipeline:
     """Оркестратор ELT пайплайна с сохранением метрик."""
     
-    def __init__(self):
-        self.extractor = GSheetsExtractor()
+    def __init__(self, resume_run_id: Optional[str] = None,
+                 extractor: Optional[GSheetsExtractor] = None,
+                 exporter: Optional[DataMartExporter] = None):
+        # Демон (src/etl/daemon.py) передает уже авторизованные клиенты между запусками
+        self.extractor = extractor or GSheetsExtractor()
         self.loader = DataLoader()
         self.transformer = Transformer()
-        self.exporter = DataMartExporter()
+        self.exporter = exporter or DataMartExporter(self.extractor)
         self.validator = ContractValidator()
-        self.run_id = uuid.uuid4()
+        # --resume продолжает прерванный запуск под тем же run_id
+        self.resuming = resume_run_id is not None
+        self.run_id = uuid.UUID(str(resume_run_id)) if self.resuming else uuid.uuid4()
+        self.checkpoints = RunCheckpoints(self.run_id)
         
         # Новый компонент для обработки таблиц
         self.processor = TableProcessor(
@@ -40,6 +115,8 @@ class ELTPipeline:
             'validation_errors': 0
         }
         self._table_run_details = []
+        self.tables: Optional[Set[str]] = None
+        tracer.add_observer(m.span_observer)
 
     async def run(self, 
                   skip_load: bool = False, 
@@ -47,41 +124,64 @@ class ELTPipeline:
                   full_refresh: bool = False,
                   dry_run: bool = False,
                   scope: str = 'all',
-                  run_exports: bool = True):
-        """Запуск ETL пайплайна."""
+                  run_exports: bool = True,
+                  replay_from: Optional[str] = None,
+                  tables: Optional[Set[str]] = None):
+        """Запуск ETL пайплайна.
+
+        replay_from — фаза загрузки берет данные из raw.sheets_dump вместо Google
+        Sheets ('latest', run_id или ISO-время, см. src/etl/replay.py).
+        tables — загружать только эти target_table (в пределах scope).
+        """
         self.dry_run = dry_run
+        self.tables = set(tables) if tables is not None else None
         start_time = time.time()
+        if self.resuming:
+            full_refresh = await self._resume_run(full_refresh)
         mode = 'полная перезагрузка' if full_refresh else 'инкрементально (CDC)'
+        if replay_from:
+            mode += f', replay из raw ({replay_from})'
         error_message = None
         
         log.info(f"=== Запуск ELT Пайплайна (ID: {self.run_id}) ===")
         log.info(f"Режим: {mode}, Scope: {scope}")
         
-        await self._start_run('full_refresh' if full_refresh else 'cdc')
+        tracer.reset()
+        m.metrics.reset()
+        if not self.resuming:
+            await self._start_run(('replay_' if replay_from else '') + ('full_refresh' if full_refresh else 'cdc'))
         
         # Проверка версии схемы
         await self._check_schema_version()
         
         try:
             if not skip_load:
-                await self._run_load_phase(full_refresh, scope)
+                with span('phase.load'):
+                    if replay_from:
+                        await self._run_replay_phase(replay_from, full_refresh, scope)
+                    else:
+                        await self._run_load_phase(full_refresh, scope)
                 
                 # Фаза качества данных (Data Quality)
                 if not dry_run:
-                    await self._run_quality_phase(scope)
+                    with span('phase.quality'):
+                        await self._run_quality_phase(scope)
             else:
                 log.info("Пропуск фазы загрузки (skip_load=True)")
 
             if not skip_transform:
-                await self._run_transform_phase()
+                with span('phase.transform'):
+                    await self._run_transform_phase(full_refresh)
             else:
                 log.info("Пропуск фазы трансформации (skip_transform=True)")
             
             if run_exports and not dry_run:
                 # Очистка перед экспортом (или после, порядок не критичен, но лучше не задерживать экспорт)
                 # Сделаем после трансформации
-                await self._run_cleanup_phase()
-                await self._run_export_phase()
+                with span('phase.cleanup'):
+                    await self._run_cleanup_phase()
+                with span('phase.export'):
+                    await self._run_export_phase()
                 
             status = 'success'
         except Exception as e:
@@ -92,6 +192,12 @@ class ELTPipeline:
         finally:
             duration = time.time() - start_time
             await self._finish_run(status, duration, error_message)
+            await refresh_rollups(self.run_id)
+            self._log_phase_breakdown()
+            if not dry_run:
+                await tracer.flush(self.run_id)
+                m.observe_run(status, duration)
+                m.metrics.export(self.run_id)
             self._print_summary_table(status, duration)
             
             # Отправка уведомления
@@ -111,6 +217,27 @@ class ELTPipeline:
         except Exception as e:
             log.warning(f"Не удалось зарегистрировать начало запуска: {e}")
 
+    async def _resume_run(self, full_refresh: bool) -> bool:
+        """Возобновляет запуск: статус снова 'running', загружаются чекпоинты.
+
+        Возвращает режим full_refresh (берется из исходного запуска, если он
+        был полной перезагрузкой).
+        """
+        rows = await DBConnection.fetch(
+            f"SELECT mode, status FROM {settings.schema_ops}.elt_runs WHERE run_id = $1", str(self.run_id)
+        )
+        if not rows:
+            raise RuntimeError(f"Запуск {self.run_id} не найден в {settings.schema_ops}.elt_runs, возобновление невозможно")
+        if rows[0]['status'] == 'success':
+            log.warning(f"Запуск {self.run_id} уже завершен успешно — будут выполнены только неотмеченные шаги")
+        await DBConnection.execute(
+            f"UPDATE {settings.schema_ops}.elt_runs SET status = 'running', finished_at = NULL, error_message = NULL "
+            f"WHERE run_id = $1", str(self.run_id)
+        )
+        done = await self.checkpoints.load()
+        log.info(f"Возобновление запуска {self.run_id} (режим {rows[0]['mode']}): выполнено шагов — {done}")
+        return full_refresh or rows[0]['mode'].endswith('full_refresh')
+
     async def _finish_run(self, status: str, duration: float, error_message: Optional[str] = None):
         query = f"""
             UPDATE {settings.schema_ops}.elt_runs SET
@@ -182,27 +309,7 @@ class ELTPipeline:
     async def _run_quality_phase(self, scope: str):
         """Фаза проверки качества загруженных данных."""
         log.info("Начало фазы проверки качества данных...")
-        
-        config = settings.sources
-        for spreadsheet_id, sdata in config.get('spreadsheets', {}).items():
-            for sheet_cfg in sdata.get('sheets', []):
-                target_table = sheet_cfg['target_table']
-                if not self._is_in_scope(target_table, scope):
-                    continue
-                
-                pk_field = sheet_cfg.get('pk', '__row_hash')
-                date_cols = sheet_cfg.get('date_columns', [])
-                
-                # Выполняем проверку
-                await self.quality_checker.check_table(
-                    target_table, pk_field, critical_cols=date_cols
-                )
-        
-        summary = self.quality_checker.get_summary()
-        if summary['has_critical_issues']:
-            log.critical("ОБНАРУЖЕНЫ КРИТИЧЕСКИЕ ОШИБКИ КАЧЕСТВА ДАННЫХ. Остановка пайплайна.")
-            raise RuntimeError("Data Quality check failed: critical issues found.")
-        
+        summary = await check_quality(self.quality_checker, scope, self.tables)
         log.info(f"Проверка качества завершена: {summary['issue_count']} предупреждений.")
 
     async def _run_load_phase(self, full_refresh: bool, scope: str = 'all'):
@@ -215,6 +322,8 @@ class ELTPipeline:
             log.warning("Конфигурация sources.yml не найдена.")
             return
 
+        await self._load_header_positions()
+
         for spreadsheet_id, sdata in config.get('spreadsheets', {}).items():
             for sheet_cfg in sdata.get('sheets', []):
                 target_table = sheet_cfg['target_table']
@@ -222,14 +331,20 @@ class ELTPipeline:
                 # Фильтрация по scope
                 if not self._is_in_scope(target_table, scope):
                     continue
+                if self.checkpoints.is_done('load', target_table):
+                    log.info(f"Пропуск {target_table}: загружена в прерванном запуске")
+                    continue
                 
                 try:
                     # Вызов процессора для обработки конкретной таблицы
-                    result = await self.processor.process_table(
-                        spreadsheet_id, sheet_cfg, full_refresh, dry_run_mode
-                    )
+                    with span('table', table=target_table):
+                        result = await self.processor.process_table(
+                            spreadsheet_id, sheet_cfg, full_refresh, dry_run_mode
+                        )
                     
                     if result.get('status') == 'skipped':
+                        if not dry_run_mode:
+                            await self.checkpoints.mark('load', target_table, details={'status': 'skipped'})
                         continue
                         
                     # Обновление статистики пайплайна
@@ -237,27 +352,118 @@ class ELTPipeline:
                     
                     if not dry_run_mode:
                         await self._log_table_stats(result)
+                        await self._mark_table_loaded(result)
                         
                 except Exception as e:
                     log.error(f"Ошибка при обработке таблицы {target_table}: {e}")
 
+        if not dry_run_mode:
+            await self._save_header_positions()
+
+    async def _run_replay_phase(self, replay_from: str, full_refresh: bool, scope: str = 'all'):
+        """Фаза загрузки из raw.sheets_dump: таблицы обрабатываются параллельно."""
+        dry_run_mode = getattr(self, 'dry_run', False)
+        target = replay.parse_replay_target(replay_from)
+        query, args = replay.dump_selection_query(target)
+        dumps = await DBConnection.fetch(query, *args)
+
+        sheet_cfgs = {
+            sheet_cfg['target_table']: sheet_cfg
+            for sdata in settings.sources.get('spreadsheets', {}).values()
+            for sheet_cfg in sdata.get('sheets', [])
+        }
+        selected = []
+        for dump in dumps:
+            sheet_cfg = sheet_cfgs.get(dump['sheet_name'])
+            if sheet_cfg is None:
+                log.warning(f"Дамп {dump['sheet_name']} пропущен: таблицы нет в sources.yml")
+            elif self.checkpoints.is_done('load', dump['sheet_name']):
+                log.info(f"Пропуск {dump['sheet_name']}: загружена в прерванном запуске")
+            elif self._is_in_scope(dump['sheet_name'], scope):
+                selected.append((dump, sheet_cfg))
+        log.info(f"Replay из raw.sheets_dump: {len(selected)} таблиц (concurrency={settings.replay_concurrency})")
+
+        semaphore = asyncio.Semaphore(max(1, settings.replay_concurrency))
+
+        async def replay_table(dump, sheet_cfg):
+            target_table = sheet_cfg['target_table']
+            async with semaphore:
+                try:
+                    with span('table', table=target_table):
+                        with span('replay.read', table=target_table, dump_id=dump['id']):
+                            records = await replay.load_dump(dump['id'], dump.get('extracted_at'))
+                            table_columns = [] if dump['col_names'] else await replay.table_columns(target_table)
+                            col_names = replay.restore_columns(records, dump['col_names'], table_columns)
+                            rows = replay.records_to_rows(records, col_names)
+                        if not rows:
+                            return
+                        result = await self.processor.process_rows(sheet_cfg, col_names, rows, full_refresh, dry_run_mode)
+
+                    self._update_run_stats(result, dry_run_mode)
+                    if not dry_run_mode:
+                        await self._log_table_stats(result)
+                        await self._mark_table_loaded(result)
+                except Exception as e:
+                    log.error(f"Ошибка replay таблицы {target_table}: {e}")
+
+        await asyncio.gather(*(replay_table(dump, sheet_cfg) for dump, sheet_cfg in selected))
+
+    async def _mark_table_loaded(self, result: Dict[str, Any]):
+        await self.checkpoints.mark('load', result['table'], result.get('content_hash'), details={
+            key: result.get(key, 0) for key in ('extracted', 'inserted', 'updated', 'deleted', 'errors')
+        })
+
+    async def _load_header_positions(self):
+        """Загружает сохраненные позиции CDC-заголовков листов 'auto' в экстрактор."""
+        query = f"SELECT spreadsheet_id, gid, header_row, data_start_row FROM {settings.schema_ops}.sheet_header_positions"
+        try:
+            rows = await DBConnection.fetch(query)
+        except Exception as e:
+            log.warning(f"Не удалось загрузить позиции заголовков листов: {e}")
+            return
+        self.extractor.header_positions = {
+            (row['spreadsheet_id'], row['gid']): {'header_row': row['header_row'], 'data_start_row': row['data_start_row']}
+            for row in rows
+        }
+        self.extractor.changed_header_positions = set()
+
+    async def _save_header_positions(self):
+        """Сохраняет найденные или сместившиеся позиции CDC-заголовков."""
+        changed = self.extractor.changed_header_positions
+        if not changed:
+            return
+        query = f"""
+            INSERT INTO {settings.schema_ops}.sheet_header_positions
+                (spreadsheet_id, gid, header_row, data_start_row, updated_at)
+            VALUES ($1, $2, $3, $4, NOW())
+            ON CONFLICT (spreadsheet_id, gid) DO UPDATE SET
+                header_row = EXCLUDED.header_row,
+                data_start_row = EXCLUDED.data_start_row,
+                updated_at = NOW()
+        """
+        try:
+            async with await DBConnection.get_connection() as conn:
+                await DBConnection.execute_many(conn, query, [
+                    (ssid, gid, pos['header_row'], pos['data_start_row'])
+                    for (ssid, gid), pos in self.extractor.header_positions.items()
+                    if (ssid, gid) in changed
+                ])
+            changed.clear()
+        except Exception as e:
+            log.warning(f"Не удалось сохранить позиции заголовков листов: {e}")
+
     def _is_in_scope(self, table: str, scope: str) -> bool:
-        if scope == 'all': return True
-        is_hst = table.endswith('_hst')
-        is_ref = any(ref in table for ref in ['rates', 'price_reference'])
-        
-        # Current tables are those that are NOT history and NOT reference
-        is_cur = not is_hst and not is_ref
-        
-        if scope == 'current': return is_cur
-        if scope == 'historical': return is_hst or is_ref
-        return True
+        if self.tables is not None and table not in self.tables:
+            return False
+        return table_in_scope(table, scope)
 
     def _update_run_stats(self, result: Dict[str, Any], dry_run: bool):
         self._run_stats['tables_processed'] += 1
         self._run_stats['total_rows_synced'] += result.get('inserted', 0) + result.get('updated', 0)
         self._run_stats['validation_errors'] += result.get('errors', 0)
         
+        m.observe_table(result)
+        
         self._table_run_details.append({
             'table': result['table'],
             'extracted': result.get('extracted', 0),
@@ -269,50 +475,42 @@ class ELTPipeline:
         })
 
     async def _log_table_stats(self, result: Dict[str, Any]):
-        query = f"""
-            INSERT INTO {settings.schema_ops}.elt_table_stats (
-                run_id, table_name, rows_extracted, rows_inserted, 
-                rows_updated, rows_deleted, validation_errors, duration_ms
-            ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
-        """
-        try:
-            await DBConnection.execute(
-                query, str(self.run_id), result['table'],
-                result.get('extracted', 0), result.get('inserted', 0),
-                result.get('updated', 0), result.get('deleted', 0),
-                result.get('errors', 0), result.get('duration_ms', 0)
-            )
-        except Exception as e:
-            log.warning(f"Не удалось сохранить статистику таблицы {result['table']}: {e}")
+        await log_table_stats(self.run_id, result)
 
-    async def _run_transform_phase(self):
+    async def _run_transform_phase(self, full_refresh: bool = False):
         log.info("Начало фазы трансформации...")
-        await self.transformer.run()
+        if self._run_stats['tables_processed']:
+            # Staging изменился в этом запуске — ранее выполненные трансформации устарели
+            await self.checkpoints.reset_phase('transform')
+        await self.transformer.run(checkpoints=None if getattr(self, 'dry_run', False) else self.checkpoints,
+                                   rebuild=full_refresh)
 
     async def _run_export_phase(self):
         log.info("Начало фазы экспорта витрин...")
         datamarts = settings.sources.get('datamarts', [])
         for dm in datamarts:
             try:
-                await self.exporter.export_view_to_sheet(
-                    view_name=dm['view'],
-                    spreadsheet_id=dm['spreadsheet_id'],
-                    gid=dm['gid']
-                )
+                with span('export.datamart', table=dm['view']):
+                    await self.exporter.export_view_to_sheet(
+                        view_name=dm['view'],
+                        spreadsheet_id=dm['spreadsheet_id'],
+                        gid=dm['gid']
+                    )
             except Exception as e:
                 log.error(f"Ошибка экспорта витрины {dm.get('view')}: {e}")
 
     async def _run_cleanup_phase(self):
-        """Очистка устаревших данных из raw.sheets_dump."""
-        log.info("Запуск очистки устаревших дампов...")
-        try:
-            # Вызываем raw.cleanup_old_dumps(30)
-            rows = await DBConnection.fetch("SELECT raw.cleanup_old_dumps(30) as deleted")
-            deleted = rows[0]['deleted'] if rows else 0
-            if deleted > 0:
-                log.info(f"Удалено {deleted} устаревших дампов (старше 30 дней).")
-        except Exception as e:
-            log.warning(f"Ошибка очистки дампов: {e}")
+        """Ротация истории: партиции raw.sheets_dump / validation_logs / elt_table_stats."""
+        log.info("Обслуживание партиций истории...")
+        await maintain_partitions()
+
+    def _log_phase_breakdown(self):
+        """Выводит длительность фаз запуска (корневые спаны)."""
+        phases = [s for s in tracer.spans if s.is_root and s.name.startswith('phase.')]
+        if not phases:
+            return
+        parts = [f"{s.name.split('.', 1)[1]}={s.duration_ms / 1000:.2f}s" for s in phases]
+        log.info(f"Длительность фаз: {', '.join(parts)}")
 
     def _print_summary_table(self, status: str, duration: float):
         if not self._table_run_details: return
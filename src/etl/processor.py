@@ -1,15 +1,50 @@
 import logging
 import time
-from typing import Dict, Any, List, Optional
+from collections.abc import Mapping
+from typing import Dict, Any, Iterator, List, Optional
 from src.etl.extractor import GSheetsExtractor
 from src.etl.loader import DataLoader
 from src.etl.validator import ContractValidator, ValidationResult
+from src.etl.staging_types import contract_name_for
+from src.etl.checkpoints import content_hash
 from src.db.connection import DBConnection
+from src.db.locks import advisory_lock
 from src.config.settings import settings
 from src.utils.helpers import slugify
+from src.utils.tracing import span
 
 log = logging.getLogger('processor')
 
+
+class RowView(Mapping):
+    """Строка листа как {колонка: значение} для валидатора.
+
+    Раньше на каждую строку строился словарь; здесь строка хранит только ссылку
+    на список значений и общий для всего листа индекс {колонка: позиция}.
+    При повторяющихся именах колонок берется последняя, как в dict(zip(...)).
+    """
+
+    __slots__ = ('_row', '_index')
+
+    def __init__(self, row: List[Any], index: Dict[str, int]):
+        self._row = row
+        self._index = index
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return self._row[self._index[key]]
+        except IndexError:
+            raise KeyError(key) from None
+
+    def __iter__(self) -> Iterator[str]:
+        # Короткие строки (обрезанные хвосты пустых ячеек) — без отсутствующих колонок
+        size = len(self._row)
+        return (key for key, i in self._index.items() if i < size)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
 class TableProcessor:
     """Процессор для обработки одной таблицы: Extract -> Validate -> Load."""
     
@@ -24,32 +59,43 @@ class TableProcessor:
         target_table = sheet_cfg['target_table']
         gid = sheet_cfg.get('gid', 0)
         range_name = sheet_cfg.get('range', 'A:Z')
-        mode = sheet_cfg.get('mode', 'upsert')
         mapping = sheet_cfg.get('column_mapping')
-        pk_field = sheet_cfg.get('pk', '__row_hash')
-        
-        # Убираем схему и суффиксы для поиска контракта
-        table_base = target_table.split('.')[-1]
-        contract_name = table_base.replace('_cur', '').replace('_hst', '')
-        
-        if contract_name == 'trainings':
-            contract_name = 'schedule'
-            
-        is_full_refresh = full_refresh or (mode == 'replace')
         start_time = time.time()
-        
-
 
         # 1. Извлечение
-        col_names, rows = await self.extractor.extract_sheet_data(
-            spreadsheet_id, str(gid), range_name, target_table, mapping=mapping
-        )
+        with span('extract', table=target_table):
+            col_names, rows = await self.extractor.extract_sheet_data(
+                spreadsheet_id, str(gid), range_name, target_table, mapping=mapping
+            )
         
         if not rows:
             return {'table': target_table, 'status': 'skipped', 'reason': 'no_data'}
             
         # 1.5. Audit Trace (Raw Dump)
-        await self._dump_raw_data(spreadsheet_id, target_table, col_names, rows)
+        with span('raw_dump', table=target_table):
+            await self._dump_raw_data(spreadsheet_id, target_table, col_names, rows)
+
+        result = await self.process_rows(sheet_cfg, col_names, rows, full_refresh, dry_run, start_time)
+        result['content_hash'] = content_hash(col_names, rows)
+        return result
+
+    async def process_rows(self, sheet_cfg: Dict[str, Any], col_names: List[str], rows: List[List[Any]],
+                           full_refresh: bool, dry_run: bool, start_time: Optional[float] = None,
+                           partial: bool = False, row_numbers: Optional[List[int]] = None) -> Dict[str, Any]:
+        """Validate -> Load для уже извлеченных строк (из Sheets или из raw.sheets_dump).
+
+        partial=True — rows только измененные строки листа (webhook): CDC без удалений.
+        """
+        target_table = sheet_cfg['target_table']
+        mode = sheet_cfg.get('mode', 'upsert')
+        mapping = sheet_cfg.get('column_mapping')
+        pk_field = sheet_cfg.get('pk', '__row_hash')
+        
+        # Убираем схему и суффиксы для поиска контракта
+        contract_name = contract_name_for(target_table)
+            
+        is_full_refresh = full_refresh or (mode == 'replace')
+        start_time = start_time or time.time()
 
         # 2. Валидация и трансформация в словари
         # Robust Mapping: Сопоставляем только те колонки, которые есть в контракте или маппинге
@@ -62,24 +108,25 @@ class TableProcessor:
             log.warning(f"Контракт для {contract_name} не найден. Используем все колонки.")
             contract_cols = set(col_names)
 
-        dict_rows = []
-        for row in rows:
-            # Создаем словарь только из известных нам колонок
-            row_dict = {k: v for k, v in zip(col_names, row) if k in contract_cols or (mapping and k in mapping.values())}
-            dict_rows.append(row_dict)
+        with span('validate', table=target_table):
+            # Представления строк только из известных нам колонок (общий индекс, без словаря на строку)
+            index = {k: i for i, k in enumerate(col_names) if k in contract_cols or (mapping and k in mapping.values())}
+            row_views = [RowView(row, index) for row in rows]
 
-        val_result = self.validator.validate_dataset(dict_rows, contract_name)
+            val_result = self.validator.validate_dataset(row_views, contract_name)
+            del row_views
         validation_errors = len(val_result.errors)
         
         if not val_result.is_valid:
             log.warning(f"⚠ {target_table}: обнаружено {validation_errors} ошибок валидации")
             if not dry_run:
-                await self._log_validation_errors(target_table, val_result)
+                with span('validate.log_errors', table=target_table):
+                    await self._log_validation_errors(target_table, val_result)
             
             # Проверка порогов
             self._check_error_thresholds(target_table, val_result)
 
-        # Обновляем col_names для загрузчика (только те, что пошли в dict_rows + PK обязательно)
+        # Обновляем col_names для загрузчика (только те, что прошли валидацию + PK обязательно)
         final_col_names = [c for c in col_names if c in contract_cols or (mapping and c in mapping.values())]
         
         # Гарантируем, что PK поле останется, если оно есть в исходных данных
@@ -102,16 +149,16 @@ class TableProcessor:
         final_rows = row_generator()
         row_count_val = len(rows)
 
-        # 3. Загрузка
+        # 3. Загрузка (запись — под advisory-блокировкой таблицы: параллельные
+        # запуски, воркеры и прием правок пишут в одну таблицу по очереди).
+        # Соединение блокировки не используется: DataLoader берет свои (DB_CONNECTIONS_PER_TASK)
         if dry_run:
-            load_stats = await self.loader.calculate_changes(target_table, final_col_names, final_rows, pk_field, row_count=row_count_val)
-            status = 'dry_run'
-        elif is_full_refresh:
-            load_stats = await self.loader.load_full_refresh(target_table, final_col_names, final_rows, row_count=row_count_val)
-            status = 'full_refresh'
+            load_stats, status = await self._load(target_table, final_col_names, final_rows, pk_field,
+                                                  row_count_val, dry_run, is_full_refresh, partial, row_numbers)
         else:
-            load_stats = await self.loader.load_cdc(target_table, final_col_names, final_rows, pk_field, row_count=row_count_val)
-            status = 'cdc'
+            async with advisory_lock(f"table:{target_table}"):
+                load_stats, status = await self._load(target_table, final_col_names, final_rows, pk_field,
+                                                      row_count_val, dry_run, is_full_refresh, partial, row_numbers)
             
         duration_ms = int((time.time() - start_time) * 1000)
         
@@ -124,9 +171,28 @@ class TableProcessor:
             'deleted': load_stats.get('deleted', 0),
             'errors': validation_errors,
             'duration_ms': duration_ms,
+            'column_changes': load_stats.get('column_changes'),
             'load_stats': load_stats
         }
 
+    async def _load(self, target_table: str, col_names: List[str], rows, pk_field: str, row_count: int,
+                    dry_run: bool, is_full_refresh: bool, partial: bool, row_numbers: Optional[List[int]]):
+        with span('load', table=target_table):
+            if dry_run:
+                load_stats = await self.loader.calculate_changes(target_table, col_names, rows, pk_field, row_count=row_count)
+                status = 'dry_run'
+            elif is_full_refresh:
+                load_stats = await self.loader.load_full_refresh(target_table, col_names, rows, row_count=row_count)
+                status = 'full_refresh'
+            elif partial:
+                load_stats = await self.loader.load_cdc(target_table, col_names, rows, pk_field,
+                                                        row_count=row_count, partial=True, row_numbers=row_numbers)
+                status = 'cdc_partial'
+            else:
+                load_stats = await self.loader.load_cdc(target_table, col_names, rows, pk_field, row_count=row_count)
+                status = 'cdc'
+        return load_stats, status
+
     def _check_error_thresholds(self, table: str, result: ValidationResult):
         """Проверяет, не превышены ли лимиты ошибок."""
         if len(result.errors) > 100:
@@ -153,9 +219,10 @@ class TableProcessor:
 
     async def _dump_raw_data(self, spreadsheet_id: str, sheet_name: str, col_names: list, rows: list):
         import json
-        query = "INSERT INTO raw.sheets_dump (spreadsheet_id, sheet_name, data) VALUES ($1, $2, $3)"
+        # col_names хранится отдельно: JSONB не сохраняет порядок ключей
+        query = "INSERT INTO raw.sheets_dump (spreadsheet_id, sheet_name, data, run_id, col_names) VALUES ($1, $2, $3, $4, $5)"
         try:
             full_data = json.dumps([dict(zip(col_names, row)) for row in rows], ensure_ascii=False)
-            await DBConnection.execute(query, spreadsheet_id, sheet_name, full_data)
+            await DBConnection.execute(query, spreadsheet_id, sheet_name, full_data, self.run_id, list(col_names))
         except Exception as e:
             log.warning(f"Ошибка дампа сырых данных {sheet_name}: {e}")
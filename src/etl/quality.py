@@ -1,5 +1,4 @@
 import logging
-import pandas as pd
 from typing import List, Dict, Any, Optional
 from src.config.settings import settings
 from src.db.connection import DBConnection
@@ -0,0 +1,95 @@
+"""Повторная обработка дампов raw.sheets_dump без обращения к Google.
+
+Каждый запуск сохраняет полное содержимое листов в `raw.sheets_dump`. Режим
+`--replay-from-raw` выбирает дампы (конкретного запуска, на момент времени или
+последние) и прогоняет их через `TableProcessor.process_rows` — валидацию,
+хэширование и загрузку — параллельно по таблицам.
+"""
+import json
+import logging
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple, Union
+from src.config.settings import settings
+from src.db.connection import DBConnection
+from src.etl.schema import META_COLUMNS
+
+log = logging.getLogger('replay')
+
+ReplayTarget = Union[None, uuid.UUID, datetime]
+
+
+def parse_replay_target(value: Optional[str]) -> ReplayTarget:
+    """'latest'/None -> последние дампы; UUID -> дампы запуска; иначе ISO-время."""
+    if not value or value == 'latest':
+        return None
+    try:
+        return uuid.UUID(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"--replay-from-raw ожидает run_id (UUID) или ISO-время, получено: {value!r}")
+
+
+def dump_selection_query(target: ReplayTarget) -> Tuple[str, List[Any]]:
+    """Запрос списка дампов (без данных): последний дамп каждой таблицы в рамках выбора."""
+    schema = settings.schema_raw
+    columns = "DISTINCT ON (sheet_name) id, spreadsheet_id, sheet_name, col_names, extracted_at"
+    if isinstance(target, uuid.UUID):
+        where, args = "WHERE run_id = $1", [target]
+    elif isinstance(target, datetime):
+        where, args = "WHERE extracted_at <= $1", [target]
+    else:
+        where, args = "", []
+    query = f"SELECT {columns} FROM {schema}.sheets_dump {where} ORDER BY sheet_name, extracted_at DESC, id DESC"
+    return query, args
+
+
+def restore_columns(records: List[Dict[str, Any]], col_names: Optional[List[str]],
+                    table_columns: List[str]) -> List[str]:
+    """Порядок колонок дампа.
+
+    Новые дампы хранят col_names. Для старых порядок восстанавливается по
+    колонкам staging-таблицы; ключи, которых в ней нет, идут в конце.
+    """
+    if col_names:
+        return list(col_names)
+    keys: Dict[str, None] = {}
+    for record in records:
+        keys.update(dict.fromkeys(record))
+    ordered = [c for c in table_columns if c in keys and c not in META_COLUMNS]
+    return ordered + sorted(k for k in keys if k not in ordered)
+
+
+def records_to_rows(records: List[Dict[str, Any]], col_names: List[str]) -> List[List[Any]]:
+    return [[record.get(col) for col in col_names] for record in records]
+
+
+async def load_dump(dump_id: int, extracted_at: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """Данные одного дампа (читаются по одному, чтобы не держать в памяти все).
+
+    extracted_at — ключ партиционирования: с ним запрос читает одну партицию-месяц.
+    """
+    if extracted_at is not None:
+        rows = await DBConnection.fetch(
+            f"SELECT data FROM {settings.schema_raw}.sheets_dump WHERE id = $1 AND extracted_at = $2",
+            dump_id, extracted_at
+        )
+    else:
+        rows = await DBConnection.fetch(f"SELECT data FROM {settings.schema_raw}.sheets_dump WHERE id = $1", dump_id)
+    if not rows:
+        return []
+    data = rows[0]['data']
+    return json.loads(data) if isinstance(data, str) else data
+
+
+async def table_columns(target_table: str) -> List[str]:
+    schema, _, table = target_table.rpartition('.')
+    rows = await DBConnection.fetch(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = $1 AND table_name = $2 ORDER BY ordinal_position",
+        schema or 'public', table
+    )
+    return [row['column_name'] for row in rows]
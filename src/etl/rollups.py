@@ -0,0 +1,33 @@
+"""Дневные сводки истории запусков для дашборда.
+
+`ops.elt_run_daily` (запуски по дню и статусу), `ops.elt_table_daily` (загрузки
+по дню и таблице: объемы, p50/p95 длительности, пропускная способность) и
+`ops.elt_error_daily` (ошибки валидации по таблице и типу) пересчитываются
+функцией `ops.refresh_elt_rollups` (миграция 020) в конце каждого запуска —
+только за сутки начиная с дня старта запуска. Дашборд читает сводки, а не сырую
+историю, поэтому время загрузки страниц не растет вместе с историей.
+"""
+import logging
+from typing import Any, Optional
+from src.config.settings import settings
+from src.db.connection import DBConnection
+from src.utils.tracing import span
+
+log = logging.getLogger('rollups')
+
+
+async def refresh_rollups(run_id: Optional[Any] = None):
+    """Пересчитывает сводки с суток старта запуска run_id (без run_id — за сегодня).
+
+    Сбой пересчета не влияет на запуск: сводки догонятся при следующем.
+    """
+    query = f"""
+        SELECT {settings.schema_ops}.refresh_elt_rollups(
+            (SELECT started_at FROM {settings.schema_ops}.elt_runs WHERE run_id = $1::uuid), $2
+        )
+    """
+    try:
+        with span('rollups.refresh'):
+            await DBConnection.execute(query, str(run_id) if run_id else None, settings.rollup_timezone)
+    except Exception as e:
+        log.warning(f"Не удалось обновить дневные сводки для дашборда: {e}")
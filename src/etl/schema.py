@@ -1,15 +1,66 @@
 import logging
 import asyncio
+from typing import Dict, List, Optional, Tuple
 from src.config.settings import settings
 from src.db.connection import DBConnection
 from src.etl.extractor import GSheetsExtractor
+from src.etl.validator import ContractValidator
+from src.etl.staging_types import contract_name_for, staging_column_types
+from src.etl.indexes import staging_index_specs, transform_join_specs, plan_indexes
 from src.utils.helpers import slugify
 
 log = logging.getLogger('schema')
 
+# Служебные колонки staging-таблиц (не приходят из заголовков листа)
+META_COLUMNS = ('_row_index', '__row_hash', '__col_hashes', '_loaded_at')
+
+
+def plan_column_changes(existing: List[str], headers: List[str],
+                        explicit_renames: Optional[Dict[str, str]] = None
+                        ) -> Tuple[List[Tuple[str, str]], List[str], List[str]]:
+    """Сравнивает колонки таблицы с заголовками листа.
+
+    Переименования берутся из explicit_renames ({старая: новая}, `column_renames`
+    листа в sources.yml). Без явного указания колонка считается переименованной,
+    только если исчезнувшая и новая колонки стоят между одними и теми же
+    неизмененными соседями слева и справа. Остальные случаи неоднозначны
+    (например, удалена последняя колонка и добавлена другая): новая колонка
+    добавляется, старая остается сиротой. Возвращает (renames [(old, new)], adds, orphans).
+    """
+    header_set, existing_set = set(headers), set(existing)
+    removed = [c for c in existing if c not in header_set]
+    added = [c for c in headers if c not in existing_set]
+
+    renames: List[Tuple[str, str]] = []
+    for old, new in (explicit_renames or {}).items():
+        if old in removed and new in added:
+            renames.append((old, new))
+            removed.remove(old)
+            added.remove(new)
+    changed = set(removed) | set(added)
+
+    def neighbours(cols: List[str], col: str) -> Tuple[Optional[str], Optional[str]]:
+        i = cols.index(col)
+        return (cols[i - 1] if i > 0 else None, cols[i + 1] if i + 1 < len(cols) else None)
+
+    for new in added:
+        new_prev, new_next = neighbours(headers, new)
+        if new_prev is None or new_next is None or new_prev in changed or new_next in changed:
+            continue
+        for old in removed:
+            if neighbours(existing, old) == (new_prev, new_next):
+                renames.append((old, new))
+                removed.remove(old)
+                break
+
+    renamed_to = {new for _, new in renames}
+    adds = [c for c in added if c not in renamed_to]
+    return renames, adds, removed
+
 class SchemaManager:
-    def __init__(self):
-        self.extractor = GSheetsExtractor()
+    def __init__(self, extractor: Optional[GSheetsExtractor] = None):
+        self.extractor = extractor or GSheetsExtractor()
+        self.validator = ContractValidator()
 
     async def deploy_meta_tables(self):
         """Создает системные таблицы (logs, runs, stats) и базовую структуру схем."""
@@ -57,6 +108,11 @@ class SchemaManager:
             data JSONB NOT NULL,
             extracted_at TIMESTAMPTZ DEFAULT NOW()
         );
+        -- run_id / col_names нужны для --replay-from-raw
+        ALTER TABLE {settings.schema_raw}.sheets_dump ADD COLUMN IF NOT EXISTS run_id UUID;
+        ALTER TABLE {settings.schema_raw}.sheets_dump ADD COLUMN IF NOT EXISTS col_names TEXT[];
+        CREATE INDEX IF NOT EXISTS idx_sheets_dump_run_id ON {settings.schema_raw}.sheets_dump(run_id);
+        CREATE INDEX IF NOT EXISTS idx_sheets_dump_sheet_extracted ON {settings.schema_raw}.sheets_dump(sheet_name, extracted_at DESC);
 
         -- 4. СИСТЕМНЫЕ ТАБЛИЦЫ В OPS
         CREATE TABLE IF NOT EXISTS {settings.schema_ops}.validation_logs (
@@ -100,49 +156,381 @@ class SchemaManager:
             duration_ms INTEGER,
             created_at TIMESTAMPTZ DEFAULT NOW()
         );
+        -- Сколько строк изменила каждая колонка (COLUMN_CHANGE_DETECTION)
+        ALTER TABLE {settings.schema_ops}.elt_table_stats ADD COLUMN IF NOT EXISTS column_changes JSONB;
         CREATE INDEX IF NOT EXISTS idx_elt_table_stats_run_id ON {settings.schema_ops}.elt_table_stats(run_id);
+
+        CREATE TABLE IF NOT EXISTS {settings.schema_ops}.elt_spans (
+            id BIGSERIAL PRIMARY KEY,
+            run_id UUID NOT NULL REFERENCES {settings.schema_ops}.elt_runs(run_id) ON DELETE CASCADE,
+            span_id INTEGER NOT NULL,
+            parent_id INTEGER,
+            name TEXT NOT NULL,
+            table_name TEXT,
+            started_at TIMESTAMPTZ NOT NULL,
+            duration_ms NUMERIC(12,3) NOT NULL,
+            status TEXT NOT NULL DEFAULT 'ok',
+            attrs JSONB
+        );
+        CREATE INDEX IF NOT EXISTS idx_elt_spans_run_id ON {settings.schema_ops}.elt_spans(run_id);
+        CREATE INDEX IF NOT EXISTS idx_elt_spans_name_started ON {settings.schema_ops}.elt_spans(name, started_at DESC);
+
+        CREATE TABLE IF NOT EXISTS {settings.schema_ops}.elt_checkpoints (
+            run_id UUID NOT NULL REFERENCES {settings.schema_ops}.elt_runs(run_id) ON DELETE CASCADE,
+            phase TEXT NOT NULL,
+            step TEXT NOT NULL,
+            content_hash TEXT,
+            details JSONB,
+            completed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (run_id, phase, step)
+        );
+
+        CREATE TABLE IF NOT EXISTS {settings.schema_ops}.elt_jobs (
+            job_id BIGSERIAL PRIMARY KEY,
+            run_id UUID NOT NULL REFERENCES {settings.schema_ops}.elt_runs(run_id) ON DELETE CASCADE,
+            kind TEXT NOT NULL,
+            step TEXT NOT NULL,
+            seq INTEGER NOT NULL DEFAULT 0,
+            payload JSONB NOT NULL DEFAULT '{{}}'::jsonb,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            worker TEXT,
+            claimed_at TIMESTAMPTZ,
+            heartbeat_at TIMESTAMPTZ,
+            finished_at TIMESTAMPTZ,
+            result JSONB,
+            error TEXT,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            CONSTRAINT elt_jobs_kind_check CHECK (kind IN ('load', 'transform', 'quality', 'maintenance')),
+            CONSTRAINT elt_jobs_status_check CHECK (status IN ('pending', 'running', 'done', 'failed')),
+            UNIQUE (run_id, kind, step)
+        );
+        CREATE INDEX IF NOT EXISTS idx_elt_jobs_pending ON {settings.schema_ops}.elt_jobs(created_at, seq) WHERE status = 'pending';
+        CREATE INDEX IF NOT EXISTS idx_elt_jobs_run_status ON {settings.schema_ops}.elt_jobs(run_id, status);
+        -- Задания проверки качества и обслуживания партиций (миграция 023)
+        ALTER TABLE {settings.schema_ops}.elt_jobs DROP CONSTRAINT IF EXISTS elt_jobs_kind_check;
+        ALTER TABLE {settings.schema_ops}.elt_jobs ADD CONSTRAINT elt_jobs_kind_check
+            CHECK (kind IN ('load', 'transform', 'quality', 'maintenance'));
+
+        -- Дневные сводки истории запусков для дашборда (миграция 020, src/etl/rollups.py)
+        CREATE TABLE IF NOT EXISTS {settings.schema_ops}.elt_run_daily (
+            day DATE NOT NULL,
+            status TEXT NOT NULL,
+            runs INTEGER NOT NULL,
+            tables_processed BIGINT NOT NULL DEFAULT 0,
+            rows_synced BIGINT NOT NULL DEFAULT 0,
+            validation_errors BIGINT NOT NULL DEFAULT 0,
+            timed_runs INTEGER NOT NULL DEFAULT 0,
+            duration_s_total NUMERIC NOT NULL DEFAULT 0,
+            duration_s_p50 NUMERIC,
+            duration_s_p95 NUMERIC,
+            duration_s_max NUMERIC,
+            throughput_max NUMERIC,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (day, status)
+        );
+
+        CREATE TABLE IF NOT EXISTS {settings.schema_ops}.elt_table_daily (
+            day DATE NOT NULL,
+            table_name TEXT NOT NULL,
+            loads INTEGER NOT NULL,
+            rows_extracted BIGINT NOT NULL DEFAULT 0,
+            rows_inserted BIGINT NOT NULL DEFAULT 0,
+            rows_updated BIGINT NOT NULL DEFAULT 0,
+            rows_deleted BIGINT NOT NULL DEFAULT 0,
+            validation_errors BIGINT NOT NULL DEFAULT 0,
+            duration_ms_total BIGINT NOT NULL DEFAULT 0,
+            duration_ms_p50 NUMERIC,
+            duration_ms_p95 NUMERIC,
+            throughput NUMERIC,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (day, table_name)
+        );
+
+        CREATE TABLE IF NOT EXISTS {settings.schema_ops}.elt_error_daily (
+            day DATE NOT NULL,
+            table_name TEXT NOT NULL,
+            error_type TEXT NOT NULL,
+            errors BIGINT NOT NULL,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (day, table_name, error_type)
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_validation_logs_created_at ON {settings.schema_ops}.validation_logs(created_at);
+
+        CREATE OR REPLACE FUNCTION {settings.schema_ops}.refresh_elt_rollups(p_since TIMESTAMPTZ, p_tz TEXT)
+        RETURNS DATE LANGUAGE plpgsql AS $$
+        DECLARE
+            v_day DATE := (COALESCE(p_since, NOW()) AT TIME ZONE p_tz)::date;
+            v_from TIMESTAMPTZ := v_day::timestamp AT TIME ZONE p_tz;
+        BEGIN
+            -- Параллельные завершения запусков пересчитывают одни и те же дни по очереди
+            PERFORM pg_advisory_xact_lock(hashtext('{settings.schema_ops}.refresh_elt_rollups'));
+
+            DELETE FROM {settings.schema_ops}.elt_run_daily WHERE day >= v_day;
+            INSERT INTO {settings.schema_ops}.elt_run_daily (day, status, runs, tables_processed, rows_synced, validation_errors,
+                                           timed_runs, duration_s_total, duration_s_p50, duration_s_p95,
+                                           duration_s_max, throughput_max)
+            SELECT (r.started_at AT TIME ZONE p_tz)::date, r.status, COUNT(*),
+                   COALESCE(SUM(r.tables_processed), 0), COALESCE(SUM(r.total_rows_synced), 0),
+                   COALESCE(SUM(r.validation_errors), 0),
+                   COUNT(r.duration_seconds), COALESCE(SUM(r.duration_seconds), 0),
+                   percentile_cont(0.5) WITHIN GROUP (ORDER BY r.duration_seconds),
+                   percentile_cont(0.95) WITHIN GROUP (ORDER BY r.duration_seconds),
+                   MAX(r.duration_seconds),
+                   MAX(r.total_rows_synced / NULLIF(r.duration_seconds, 0))
+            FROM {settings.schema_ops}.elt_runs r
+            WHERE r.started_at >= v_from
+            GROUP BY 1, 2;
+
+            DELETE FROM {settings.schema_ops}.elt_table_daily WHERE day >= v_day;
+            INSERT INTO {settings.schema_ops}.elt_table_daily (day, table_name, loads, rows_extracted, rows_inserted, rows_updated,
+                                             rows_deleted, validation_errors, duration_ms_total,
+                                             duration_ms_p50, duration_ms_p95, throughput)
+            SELECT (r.started_at AT TIME ZONE p_tz)::date, ts.table_name, COUNT(*),
+                   COALESCE(SUM(ts.rows_extracted), 0), COALESCE(SUM(ts.rows_inserted), 0),
+                   COALESCE(SUM(ts.rows_updated), 0), COALESCE(SUM(ts.rows_deleted), 0),
+                   COALESCE(SUM(ts.validation_errors), 0), COALESCE(SUM(ts.duration_ms), 0),
+                   percentile_cont(0.5) WITHIN GROUP (ORDER BY ts.duration_ms),
+                   percentile_cont(0.95) WITHIN GROUP (ORDER BY ts.duration_ms),
+                   SUM(ts.rows_extracted) * 1000.0 / NULLIF(SUM(ts.duration_ms), 0)
+            FROM {settings.schema_ops}.elt_table_stats ts
+            JOIN {settings.schema_ops}.elt_runs r ON r.run_id = ts.run_id
+            WHERE r.started_at >= v_from
+              AND ts.created_at >= v_from  -- статистика пишется после старта запуска
+            GROUP BY 1, 2;
+
+            DELETE FROM {settings.schema_ops}.elt_error_daily WHERE day >= v_day;
+            INSERT INTO {settings.schema_ops}.elt_error_daily (day, table_name, error_type, errors)
+            SELECT (v.created_at AT TIME ZONE p_tz)::date, v.table_name, v.error_type, COUNT(*)
+            FROM {settings.schema_ops}.validation_logs v
+            WHERE v.created_at >= v_from
+            GROUP BY 1, 2, 3;
+
+            RETURN v_day;
+        END;
+        $$;
+
+        -- Партиции [месяц, месяц + 1) на p_months месяцев начиная с p_from. Строки, уже попавшие
+        -- в DEFAULT-партицию в этом диапазоне, переносятся в новую партицию.
+        CREATE OR REPLACE FUNCTION {settings.schema_ops}.ensure_month_partitions(p_table TEXT, p_column TEXT, p_from DATE, p_months INTEGER)
+        RETURNS INTEGER LANGUAGE plpgsql AS $$
+        DECLARE
+            v_schema TEXT := split_part(p_table, '.', 1);
+            v_name TEXT := split_part(p_table, '.', 2);
+            v_month DATE := date_trunc('month', p_from)::date;
+            v_next DATE;
+            v_part TEXT;
+            v_created INTEGER := 0;
+        BEGIN
+            FOR i IN 1..GREATEST(p_months, 1) LOOP
+                v_next := (v_month + INTERVAL '1 month')::date;
+                v_part := format('%s_p%s', v_name, to_char(v_month, 'YYYYMM'));
+                IF to_regclass(format('%I.%I', v_schema, v_part)) IS NULL THEN
+                    EXECUTE format('CREATE TABLE %I.%I (LIKE %I.%I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+                                   v_schema, v_part, v_schema, v_name);
+                    IF to_regclass(format('%I.%I', v_schema, v_name || '_default')) IS NOT NULL THEN
+                        EXECUTE format('WITH moved AS (DELETE FROM %I.%I WHERE %I >= %L AND %I < %L RETURNING *) '
+                                       'INSERT INTO %I.%I SELECT * FROM moved',
+                                       v_schema, v_name || '_default', p_column, v_month, p_column, v_next,
+                                       v_schema, v_part);
+                    END IF;
+                    EXECUTE format('ALTER TABLE %I.%I ATTACH PARTITION %I.%I FOR VALUES FROM (%L) TO (%L)',
+                                   v_schema, v_name, v_schema, v_part, v_month, v_next);
+                    v_created := v_created + 1;
+                END IF;
+                v_month := v_next;
+            END LOOP;
+            RETURN v_created;
+        END;
+        $$;
+
+        -- Удаляет месячные партиции, целиком лежащие раньше p_before (DEFAULT не трогается)
+        CREATE OR REPLACE FUNCTION {settings.schema_ops}.drop_old_partitions(p_table TEXT, p_before TIMESTAMPTZ)
+        RETURNS INTEGER LANGUAGE plpgsql AS $$
+        DECLARE
+            v_part RECORD;
+            v_dropped INTEGER := 0;
+        BEGIN
+            FOR v_part IN
+                SELECT c.oid::regclass AS part, to_date(right(c.relname, 6), 'YYYYMM') AS month
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = p_table::regclass AND c.relname ~ '_p[0-9]{{6}}$'
+                ORDER BY 2
+            LOOP
+                EXIT WHEN v_part.month + INTERVAL '1 month' > p_before;
+                EXECUTE format('DROP TABLE %s', v_part.part);
+                v_dropped := v_dropped + 1;
+            END LOOP;
+            RETURN v_dropped;
+        END;
+        $$;
+
+        -- Превращает обычную таблицу с BIGSERIAL id в партиционированную по месяцам p_column.
+        -- Неуникальные индексы и внешние ключи переносятся, первичный ключ становится (id, p_column).
+        -- Повторный вызов для уже партиционированной таблицы ничего не делает.
+        CREATE OR REPLACE FUNCTION {settings.schema_ops}.partition_by_month(p_table TEXT, p_column TEXT, p_premake_months INTEGER DEFAULT 3)
+        RETURNS VOID LANGUAGE plpgsql AS $$
+        DECLARE
+            v_schema TEXT := split_part(p_table, '.', 1);
+            v_name TEXT := split_part(p_table, '.', 2);
+            v_old TEXT := v_name || '_unpartitioned';
+            v_seq TEXT := pg_get_serial_sequence(p_table, 'id');
+            v_indexes TEXT[];
+            v_fkeys TEXT[];
+            v_min DATE;
+            v_ddl TEXT;
+        BEGIN
+            IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = p_table::regclass) THEN
+                RETURN;
+            END IF;
+
+            SELECT array_agg(pg_get_indexdef(x.indexrelid)) INTO v_indexes
+            FROM pg_index x WHERE x.indrelid = p_table::regclass AND NOT x.indisunique;
+            SELECT array_agg(format('ALTER TABLE %I.%I ADD CONSTRAINT %I %s', v_schema, v_name, conname,
+                                    pg_get_constraintdef(oid))) INTO v_fkeys
+            FROM pg_constraint WHERE conrelid = p_table::regclass AND contype = 'f';
+
+            EXECUTE format('ALTER TABLE %I.%I RENAME TO %I', v_schema, v_name, v_old);
+            EXECUTE format('UPDATE %I.%I SET %I = NOW() WHERE %I IS NULL', v_schema, v_old, p_column, p_column);
+            EXECUTE format('CREATE TABLE %I.%I (LIKE %I.%I INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+                           'PARTITION BY RANGE (%I)', v_schema, v_name, v_schema, v_old, p_column);
+            EXECUTE format('ALTER TABLE %I.%I ALTER COLUMN %I SET NOT NULL', v_schema, v_name, p_column);
+            EXECUTE format('CREATE TABLE %I.%I PARTITION OF %I.%I DEFAULT', v_schema, v_name || '_default', v_schema, v_name);
+
+            EXECUTE format('SELECT MIN(%I)::date FROM %I.%I', p_column, v_schema, v_old) INTO v_min;
+            v_min := date_trunc('month', COALESCE(v_min, CURRENT_DATE))::date;
+            PERFORM {settings.schema_ops}.ensure_month_partitions(
+                p_table, p_column, v_min,
+                ((date_part('year', age(date_trunc('month', CURRENT_DATE), v_min)) * 12
+                  + date_part('month', age(date_trunc('month', CURRENT_DATE), v_min)))::int + 1 + p_premake_months)
+            );
+            EXECUTE format('INSERT INTO %I.%I SELECT * FROM %I.%I', v_schema, v_name, v_schema, v_old);
+
+            IF v_seq IS NOT NULL THEN
+                EXECUTE format('ALTER SEQUENCE %s OWNED BY %I.%I.id', v_seq, v_schema, v_name);
+            END IF;
+            EXECUTE format('DROP TABLE %I.%I', v_schema, v_old);
+
+            EXECUTE format('ALTER TABLE %I.%I ADD PRIMARY KEY (id, %I)', v_schema, v_name, p_column);
+            FOREACH v_ddl IN ARRAY COALESCE(v_indexes, '{{}}') LOOP
+                EXECUTE v_ddl;
+            END LOOP;
+            FOREACH v_ddl IN ARRAY COALESCE(v_fkeys, '{{}}') LOOP
+                EXECUTE v_ddl;
+            END LOOP;
+        END;
+        $$;
+
+        SELECT {settings.schema_ops}.partition_by_month('{settings.schema_raw}.sheets_dump', 'extracted_at');
+        SELECT {settings.schema_ops}.partition_by_month('{settings.schema_ops}.validation_logs', 'created_at');
+        SELECT {settings.schema_ops}.partition_by_month('{settings.schema_ops}.elt_table_stats', 'created_at');
+
+        -- Последние загрузки на дашборде читаются по created_at (ordered append по партициям)
+        CREATE INDEX IF NOT EXISTS idx_elt_table_stats_created_at ON {settings.schema_ops}.elt_table_stats(created_at);
+
+        CREATE TABLE IF NOT EXISTS {settings.schema_ops}.sheet_header_positions (
+            spreadsheet_id TEXT NOT NULL,
+            gid TEXT NOT NULL,
+            header_row INTEGER NOT NULL,
+            data_start_row INTEGER NOT NULL,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (spreadsheet_id, gid)
+        );
+
+        -- 5. ХЕЛПЕРЫ ТРАНСФОРМАЦИЙ (text и типизированные staging-колонки, миграция 015)
+        CREATE OR REPLACE FUNCTION {settings.schema_staging}.to_money(v text) RETURNS numeric
+            LANGUAGE sql IMMUTABLE AS $$ SELECT COALESCE(NULLIF(regexp_replace(v, '[^0-9,.-]', '', 'g'), '')::numeric, 0) $$;
+        CREATE OR REPLACE FUNCTION {settings.schema_staging}.to_money(v numeric) RETURNS numeric
+            LANGUAGE sql IMMUTABLE AS $$ SELECT COALESCE(v, 0) $$;
+        CREATE OR REPLACE FUNCTION {settings.schema_staging}.to_int(v text, dflt integer) RETURNS integer
+            LANGUAGE sql IMMUTABLE AS $$ SELECT COALESCE(NULLIF(TRIM(v), '')::integer, dflt) $$;
+        CREATE OR REPLACE FUNCTION {settings.schema_staging}.to_int(v integer, dflt integer) RETURNS integer
+            LANGUAGE sql IMMUTABLE AS $$ SELECT COALESCE(v, dflt) $$;
+        CREATE OR REPLACE FUNCTION {settings.schema_staging}.to_time(v text, dflt time) RETURNS time
+            LANGUAGE sql IMMUTABLE AS $$ SELECT COALESCE(NULLIF(substring(TRIM(v) from '^\\d{{1,2}}:\\d{{2}}'), '')::time, dflt) $$;
+        CREATE OR REPLACE FUNCTION {settings.schema_staging}.to_time(v time, dflt time) RETURNS time
+            LANGUAGE sql IMMUTABLE AS $$ SELECT COALESCE(v, dflt) $$;
+        CREATE OR REPLACE FUNCTION {settings.schema_staging}.typed_date(v text) RETURNS date
+            LANGUAGE sql IMMUTABLE AS $$ SELECT NULL::date $$;
+        CREATE OR REPLACE FUNCTION {settings.schema_staging}.typed_date(v date) RETURNS date
+            LANGUAGE sql IMMUTABLE AS $$ SELECT v $$;
         """
         log.info(f"Развертывание мета-таблиц и схем в {settings.schema_ops}...")
         await DBConnection.execute(ddl)
         log.info("Мета-таблицы и базовые схемы развернуты.")
 
-    async def deploy_staging_tables(self, use_staging_schema: bool = False):
-        """Пересоздает staging таблицы на основе заголовков из Sheets."""
+    def _contract_column_types(self, target_table: str, col_names: list) -> dict:
+        """Типы колонок staging-таблицы по ее контракту (пусто, если контракта нет)."""
+        try:
+            contract = self.validator.load_contract(contract_name_for(target_table))
+        except FileNotFoundError:
+            return {}
+        col_types = staging_column_types(contract, col_names)
+        if col_types:
+            log.info(f"Typed staging for {target_table}: {col_types}")
+        return col_types
+
+    async def deploy_staging_tables(self, use_staging_schema: bool = False, diff: bool = False) -> Dict[str, List[str]]:
+        """Пересоздает staging таблицы на основе заголовков из Sheets.
+
+        diff=True — неразрушающий режим: существующие таблицы приводятся к
+        заголовкам через ALTER TABLE ADD/RENAME COLUMN (данные сохраняются),
+        создаются только отсутствующие таблицы. Возвращает примененные ALTER.
+        """
         config = settings.sources
+        applied: Dict[str, List[str]] = {}
         if not config:
             log.warning("No configuration found")
-            return
+            return applied
         
         async with await DBConnection.get_connection() as conn:
             for spreadsheet_id, sdata in config.get('spreadsheets', {}).items():
-                for sheet_cfg in sdata.get('sheets', []):
+                sheets = sdata.get('sheets', [])
+                # Одним batch-запросом читаем только полосы заголовков всех листов таблицы
+                try:
+                    headers_by_gid = await self.extractor.extract_headers(spreadsheet_id, sheets)
+                except Exception as e:
+                    log.error(f"Failed to read headers from {spreadsheet_id}: {e}")
+                    continue
+
+                for sheet_cfg in sheets:
                     target_table = sheet_cfg['target_table']
-                    gid = sheet_cfg.get('gid', 0)
-                    range_name = sheet_cfg.get('range', 'A:Z')
+                    gid = str(sheet_cfg.get('gid', 0))
                     
                     try:
-                        col_names, _ = await self.extractor.extract_sheet_data(
-                            spreadsheet_id, str(gid), range_name, target_table
-                        )
+                        col_names = headers_by_gid.get(gid, {}).get('col_names', [])
                         
                         if not col_names:
                             log.warning(f"No columns found for {target_table}")
                             continue
                             
-                        # 2. Generate DDL
-                        cols_ddl = [f'"{col}" text' for col in col_names]
+                        # 2. Generate DDL (типы из контракта при TYPED_STAGING, иначе text)
+                        col_types = self._contract_column_types(target_table, col_names) if settings.typed_staging else {}
+                        schema, tbl, full_table_name = self._resolve_table_name(target_table, use_staging_schema)
+
+                        if diff:
+                            existing = await self._existing_columns(conn, schema, tbl)
+                            if existing:
+                                statements = self._evolve_statements(full_table_name, existing, col_names, col_types,
+                                                                     sheet_cfg.get('column_renames'))
+                                if statements:
+                                    async with conn.transaction():
+                                        for stmt in statements:
+                                            await conn.execute(stmt)
+                                    applied[target_table] = statements
+                                    log.info(f"Table {target_table} evolved: {len(statements)} change(s)")
+                                else:
+                                    log.info(f"Table {target_table} is up to date.")
+                                continue
+
+                        cols_ddl = [f'"{col}" {col_types.get(col, "text")}' for col in col_names]
                         cols_ddl.append('"_row_index" integer')
                         cols_ddl.append('"__row_hash" text')
+                        cols_ddl.append('"__col_hashes" text')
                         cols_ddl.append('"_loaded_at" timestamp with time zone default now()')
-                        
-                        # Определяем имя таблицы с учетом схемы
-                        if '.' in target_table:
-                            schema, tbl = target_table.split('.', 1)
-                            full_table_name = f'"{schema}"."{tbl}"'
-                        else:
-                            # Fallback для совместимости
-                            prefix = 'staging.' if use_staging_schema else ''
-                            full_table_name = f'{prefix}"{target_table}"'
 
                         ddl = f'DROP TABLE IF EXISTS {full_table_name}; CREATE TABLE {full_table_name} ({", ".join(cols_ddl)});'
                         
@@ -152,3 +540,113 @@ class SchemaManager:
                         
                     except Exception as e:
                         log.error(f"Failed to deploy schema for {target_table}: {e}")
+        return applied
+
+    @staticmethod
+    def _resolve_table_name(target_table: str, use_staging_schema: bool) -> Tuple[str, str, str]:
+        """(схема, таблица, квотированное имя) для target_table из sources.yml."""
+        if '.' in target_table:
+            schema, tbl = target_table.split('.', 1)
+            return schema, tbl, f'"{schema}"."{tbl}"'
+        # Fallback для совместимости
+        prefix = 'staging.' if use_staging_schema else ''
+        return ('staging' if use_staging_schema else 'public'), target_table, f'{prefix}"{target_table}"'
+
+    @staticmethod
+    async def _existing_columns(conn, schema: str, tbl: str) -> List[str]:
+        rows = await conn.fetch(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_schema = $1 AND table_name = $2 ORDER BY ordinal_position",
+            schema, tbl
+        )
+        return [row['column_name'] for row in rows]
+
+    @staticmethod
+    def _evolve_statements(full_table_name: str, existing: List[str], headers: List[str],
+                           col_types: Dict[str, str], explicit_renames: Optional[Dict[str, str]] = None) -> List[str]:
+        """ALTER TABLE для приведения колонок таблицы к заголовкам листа."""
+        data_cols = [c for c in existing if c not in META_COLUMNS]
+        renames, adds, orphans = plan_column_changes(data_cols, headers, explicit_renames)
+        statements = [f'ALTER TABLE {full_table_name} RENAME COLUMN "{old}" TO "{new}"' for old, new in renames]
+        statements += [f'ALTER TABLE {full_table_name} ADD COLUMN "{col}" {col_types.get(col, "text")}' for col in adds]
+        if orphans:
+            # Колонки не удаляются: данные могут понадобиться, удаление — вручную
+            log.warning(f"{full_table_name}: columns no longer in sheet headers kept: {orphans}")
+        return statements
+
+    async def _index_inventory(self, schemas: list):
+        """Существующие индексы и колонки в указанных схемах."""
+        existing = await DBConnection.fetch(
+            """
+            SELECT n.nspname AS schema, t.relname AS table, i.relname AS index,
+                   a.attname AS first_col, ix.indisvalid AS valid, ix.indisunique AS unique,
+                   COALESCE(st.idx_scan, 0) AS scans, pg_relation_size(i.oid) AS size_bytes
+              FROM pg_index ix
+              JOIN pg_class t ON t.oid = ix.indrelid
+              JOIN pg_namespace n ON n.oid = t.relnamespace
+              JOIN pg_class i ON i.oid = ix.indexrelid
+              LEFT JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = ix.indkey[0]
+              LEFT JOIN pg_stat_user_indexes st ON st.indexrelid = ix.indexrelid
+             WHERE n.nspname = ANY($1::text[])
+            """,
+            schemas
+        )
+        columns = await DBConnection.fetch(
+            "SELECT table_schema, table_name, column_name FROM information_schema.columns "
+            "WHERE table_schema = ANY($1::text[])",
+            schemas
+        )
+        return (
+            [dict(row) for row in existing],
+            {(row['table_schema'], row['table_name'], row['column_name']) for row in columns},
+        )
+
+    async def ensure_indexes(self, create: bool = True) -> dict:
+        """Создает недостающие индексы (CONCURRENTLY) и сообщает о лишних.
+
+        Источники: pk/__row_hash/_loaded_at из sources.yml и ключи соединений
+        SQL-трансформаций. При create=False только формирует отчет.
+        """
+        specs = staging_index_specs(settings.sources or {}) + transform_join_specs(scanned_schemas=(settings.schema_staging,))
+        schemas = sorted({spec.schema for spec in specs})
+        if not schemas:
+            return {'missing': [], 'invalid': [], 'unused': [], 'created': []}
+
+        existing, columns = await self._index_inventory(schemas)
+        plan = plan_indexes(specs, existing, columns)
+        plan['created'] = []
+
+        if create:
+            # CONCURRENTLY не блокирует запись и не может выполняться в транзакции
+            for index_name in plan['invalid']:
+                schema = next(r['schema'] for r in existing if r['index'] == index_name)
+                log.warning(f"Invalid index {schema}.{index_name}: recreating")
+                await DBConnection.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{schema}"."{index_name}"')
+            for spec in plan['missing']:
+                ddl = (f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{spec.name}" '
+                       f'ON "{spec.schema}"."{spec.table}" ("{spec.column}")')
+                try:
+                    await DBConnection.execute(ddl)
+                    plan['created'].append(spec)
+                    log.info(f"Index {spec.name} created ({spec.reason})")
+                except Exception as e:
+                    log.error(f"Failed to create index {spec.name}: {e}")
+
+        self._log_index_report(plan)
+        return plan
+
+    def _log_index_report(self, plan: dict):
+        created = {(s.schema, s.table, s.column) for s in plan['created']}
+        for spec in plan['missing']:
+            if (spec.schema, spec.table, spec.column) not in created:
+                log.warning(f"Missing index: {spec.schema}.{spec.table}({spec.column}) — {spec.reason}")
+        for row in plan['unused']:
+            log.info(
+                f"Unused index (idx_scan=0 since stats reset): {row['schema']}.{row['index']} "
+                f"on {row['table']}({row['first_col']}), {row['size_bytes'] / 1024:.0f} KB"
+            )
+        log.info(
+            f"Index check: created={len(plan['created'])}, "
+            f"missing={len(plan['missing']) - len(plan['created'])}, unused={len(plan['unused'])}"
+        )
+
@@ -0,0 +1,63 @@
+"""Типизированные staging-таблицы на основе JSON-контрактов.
+
+При включенном `TYPED_STAGING` колонки контрактов с типами date/money/integer/
+time/boolean создаются с нативными типами PostgreSQL, а значения разбираются
+один раз при загрузке (COPY передает их в бинарном формате). Остальные колонки
+остаются text. Загрузчик ориентируется на фактические типы колонок в БД, поэтому
+таблицы, еще не пересозданные через --deploy, продолжают грузиться строками.
+"""
+from typing import Any, Callable, Dict, List
+from src.utils.cleaning import parse_date, parse_numeric, parse_integer, parse_time, normalize_boolean
+from src.utils.helpers import slugify
+
+# Тип колонки контракта -> тип PostgreSQL
+CONTRACT_PG_TYPES = {
+    'date': 'date',
+    'money': 'numeric',
+    'numeric': 'numeric',
+    'integer': 'integer',
+    'time': 'time',
+    'boolean': 'boolean',
+}
+
+# information_schema.columns.data_type -> парсер значения из Sheets
+PARSERS_BY_PG_TYPE: Dict[str, Callable[[Any], Any]] = {
+    'date': parse_date,
+    'numeric': parse_numeric,
+    'integer': parse_integer,
+    'bigint': parse_integer,
+    'smallint': parse_integer,
+    'time without time zone': parse_time,
+    'boolean': normalize_boolean,
+}
+
+
+def contract_name_for(target_table: str) -> str:
+    """Имя контракта для staging-таблицы (stg_gsheets.sales_hst -> sales)."""
+    table_base = target_table.split('.')[-1]
+    contract_name = table_base.replace('_cur', '').replace('_hst', '')
+    if contract_name == 'trainings':
+        contract_name = 'schedule'
+    return contract_name
+
+
+def staging_column_types(contract: dict, col_names: List[str]) -> Dict[str, str]:
+    """Нестроковые типы PostgreSQL для колонок таблицы, описанных в контракте."""
+    types: Dict[str, str] = {}
+    for col in contract.get('columns', []):
+        pg_type = CONTRACT_PG_TYPES.get(col.get('type', 'string'))
+        if not pg_type:
+            continue
+        for name in (col['name'], slugify(col['name'])):
+            if name in col_names:
+                types[name] = pg_type
+    return types
+
+
+def column_parsers(col_names: List[str], db_types: Dict[str, str]) -> Dict[int, Callable[[Any], Any]]:
+    """Парсеры по индексам колонок, чей тип в БД отличается от text."""
+    return {
+        idx: PARSERS_BY_PG_TYPE[db_types[col]]
+        for idx, col in enumerate(col_names)
+        if db_types.get(col) in PARSERS_BY_PG_TYPE
+    }
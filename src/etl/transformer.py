@@ -4,65 +4,111 @@
 Использует внешние SQL файлы для трансформации и очистки.
 """
 import logging
+import re
 from pathlib import Path
-from src.db.connection import DBConnection
+from typing import List, Optional
+from src.db.locks import advisory_lock
+from src.etl.checkpoints import RunCheckpoints
+from src.utils.tracing import span
 
 log = logging.getLogger('transformer')
 
 SQL_DIR = Path(__file__).parent.parent / 'db' / 'sql'
 
+# Порядок важен: Clients -> Schedule -> Sales (dependencies) -> Views
+TRANSFORM_SCRIPTS = [
+    'transform_clients.sql',
+    'transform_schedule.sql', 
+    'transform_sales.sql',
+    'view_client_balances.sql'  # Пересоздаем витрину после обновления данных
+]
+CLEANUP_SCRIPT = 'cleanup.sql'
+
+# Таблицы/представления, которые изменяет скрипт (цели advisory-блокировок)
+_TARGET_RE = re.compile(
+    r'\b(?:MERGE\s+INTO|INSERT\s+INTO|UPDATE|DELETE\s+FROM|TRUNCATE(?:\s+TABLE)?|CREATE\s+OR\s+REPLACE\s+VIEW)'
+    r'\s+([a-z_][a-z0-9_]*\.[a-z_][a-z0-9_]*)',
+    re.IGNORECASE
+)
+
+
+def transform_targets(sql: str) -> List[str]:
+    """Объекты schema.name, в которые пишет SQL-скрипт (отсортированы: порядок взятия блокировок)."""
+    return sorted({target.lower() for target in _TARGET_RE.findall(sql)})
+
 class Transformer:
     """Выполняет SQL-трансформации из staging в public таблицы."""
     
-    async def run(self, tables: list[str] = None):
-        """Запускает трансформации."""
+    async def run(self, tables: list[str] = None, checkpoints: Optional[RunCheckpoints] = None,
+                  rebuild: bool = False):
+        """Запускает трансформации.
+
+        checkpoints — выполненные скрипты пропускаются, успешные отмечаются (--resume).
+        rebuild — пересчитать все строки core, а не только измененные (--full-refresh).
+        """
         log.info("Начало этапа трансформации данных...")
         
-        # Порядок важен: Clients -> Schedule -> Sales (dependencies) -> Views
-        files_to_run = [
-            'transform_clients.sql',
-            'transform_schedule.sql', 
-            'transform_sales.sql',
-            'view_client_balances.sql'  # Пересоздаем витрину после обновления данных
-        ]
-        
+        files_to_run = TRANSFORM_SCRIPTS
         success_count = 0
         
         for filename in files_to_run:
-            file_path = SQL_DIR / filename
-            if not file_path.exists():
-                log.error(f"SQL файл не найден: {file_path}")
+            if checkpoints and checkpoints.is_done('transform', filename):
+                log.info(f"Пропуск {filename}: выполнен в прерванном запуске")
+                success_count += 1
                 continue
                 
             try:
                 log.info(f"Выполнение {filename}...")
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    sql = f.read()
-                    
-                await DBConnection.execute(sql)
+                await self.run_script(filename, rebuild)
                 log.info(f"✓ {filename} успешно выполнен")
                 success_count += 1
-                
+                if checkpoints:
+                    await checkpoints.mark('transform', filename)
+            except FileNotFoundError as e:
+                log.error(str(e))
             except Exception as e:
                 log.error(f"✗ Ошибка при выполнении {filename}: {e}")
 
         # Запуск Cleanup / Soft Delete
         try:
             log.info("Запуск очистки (soft delete)...")
-            cleanup_path = SQL_DIR / 'cleanup.sql'
-            if cleanup_path.exists():
-                with open(cleanup_path, 'r', encoding='utf-8') as f:
-                    sql = f.read()
-                await DBConnection.execute(sql)
-                log.info("✓ Очистка завершена")
+            if checkpoints and checkpoints.is_done('transform', CLEANUP_SCRIPT):
+                log.info("Пропуск cleanup.sql: выполнен в прерванном запуске")
             else:
-                log.warning("Файл cleanup.sql не найден")
+                await self.run_script(CLEANUP_SCRIPT, rebuild)
+                log.info("✓ Очистка завершена")
+                if checkpoints:
+                    await checkpoints.mark('transform', CLEANUP_SCRIPT)
+        except FileNotFoundError:
+            log.warning("Файл cleanup.sql не найден")
         except Exception as e:
              log.error(f"✗ Ошибка при очистке: {e}")
 
         log.info(f"Трансформация завершена. Скриптов выполнено: {success_count}/{len(files_to_run)}")
         return success_count, 0
 
+    async def run_script(self, filename: str, rebuild: bool = False):
+        """Выполняет один SQL-скрипт из SQL_DIR (исключение — при ошибке).
+
+        На время выполнения берутся advisory-блокировки всех целевых таблиц
+        скрипта: одинаковые трансформации параллельных запусков (разных scope,
+        воркеров очереди) выполняются по очереди, независимые — одновременно.
+        Скрипт выполняется на соединении блокировок, в той же транзакции.
+        rebuild включает elt.rebuild_core: MERGE обновляет и строки с прежним
+        row_hash (после изменения SQL трансформации или справочников).
+        """
+        file_path = SQL_DIR / filename
+        if not file_path.exists():
+            raise FileNotFoundError(f"SQL файл не найден: {file_path}")
+        with open(file_path, 'r', encoding='utf-8') as f:
+            sql = f.read()
+        targets = [f"transform:{target}" for target in transform_targets(sql)]
+        async with advisory_lock(*targets) as conn:
+            if rebuild:
+                await conn.execute("SET LOCAL elt.rebuild_core = 'on'")
+            with span('transform.sql', script=filename):
+                await conn.execute(sql)
+
 async def run_all_transformations():
     """Утилита для запуска всех трансформаций."""
     transformer = Transformer()
@@ -2,27 +2,34 @@
 import json
 import re
 import logging
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Type, Union
+from typing import List, Dict, Any, Mapping, NamedTuple, Optional, Sequence, Type, Union
 from pydantic import BaseModel, Field, create_model, validator, ValidationError as PydanticValidationError, AliasChoices
 from src.utils.helpers import slugify
 
 log = logging.getLogger('validator')
 
-class ValidationError(BaseModel):
-    """Описание ошибки валидации."""
+class ValidationError(NamedTuple):
+    """Описание ошибки валидации.
+
+    Кортеж, а не Pydantic-модель: на грязном листе ошибок десятки тысяч, и
+    каждая модель несла свой __dict__ и служебные поля. Pydantic-представление
+    (ValidationErrorModel) строится только на границе — ValidationResult.to_model().
+    """
     row_index: int
     column: str
     value: Any
     error_type: str
     message: str
 
-class ValidationResult(BaseModel):
+@dataclass(slots=True)
+class ValidationResult:
     """Результат валидации набора данных."""
     is_valid: bool
     total_rows: int
     valid_rows: int
-    errors: List[ValidationError] = Field(default_factory=list)
+    errors: List[ValidationError] = field(default_factory=list)
     
     @property
     def error_rate(self) -> float:
@@ -30,6 +37,30 @@ class ValidationResult(BaseModel):
             return 0.0
         return (self.total_rows - self.valid_rows) / self.total_rows
 
+    def to_model(self) -> 'ValidationResultModel':
+        """Pydantic-представление для сериализации (API, отчеты)."""
+        return ValidationResultModel(
+            is_valid=self.is_valid,
+            total_rows=self.total_rows,
+            valid_rows=self.valid_rows,
+            errors=[ValidationErrorModel(**err._asdict()) for err in self.errors]
+        )
+
+class ValidationErrorModel(BaseModel):
+    """Ошибка валидации на границе API (см. ValidationError)."""
+    row_index: int
+    column: str
+    value: Any
+    error_type: str
+    message: str
+
+class ValidationResultModel(BaseModel):
+    """Результат валидации на границе API (см. ValidationResult)."""
+    is_valid: bool
+    total_rows: int
+    valid_rows: int
+    errors: List[ValidationErrorModel] = Field(default_factory=list)
+
 class ContractValidator:
     """Валидатор на основе JSON-контрактов и динамических Pydantic моделей."""
     
@@ -100,7 +131,7 @@ class ContractValidator:
         self._models_cache[entity_name] = model
         return model
 
-    def _is_empty_row(self, row: Dict[str, Any], contract: dict) -> bool:
+    def _is_empty_row(self, row: Mapping[str, Any], contract: dict) -> bool:
         """Проверяет, являются ли все обязательные поля пустыми (полностью пустая строка)."""
         required_cols = [c['name'] for c in contract.get('columns', []) if c.get('required', False)]
         for col_name in required_cols:
@@ -109,7 +140,7 @@ class ContractValidator:
                 return False  # Хотя бы одно обязательное поле заполнено
         return True  # Все обязательные поля пусты
 
-    def validate_row(self, row: Dict[str, Any], contract: dict, row_index: int) -> List[ValidationError]:
+    def validate_row(self, row: Mapping[str, Any], contract: dict, row_index: int) -> List[ValidationError]:
         """Валидирует одну строку."""
         errors = []
         
@@ -216,8 +247,8 @@ class ContractValidator:
 
         return errors
 
-    def validate_dataset(self, rows: List[Dict[str, Any]], entity_name: str) -> ValidationResult:
-        """Валидирует весь набор данных."""
+    def validate_dataset(self, rows: Sequence[Mapping[str, Any]], entity_name: str) -> ValidationResult:
+        """Валидирует весь набор данных (строки — словари или их представления, см. processor.RowView)."""
         contract = self.load_contract(entity_name)
         # Сохраняем имя сущности в контракте для _get_model_for_contract
         contract['name'] = entity_name
@@ -0,0 +1,356 @@
+"""Прием правок листов из Apps Script (onEdit) и их загрузка микропакетами.
+
+Триггер onEdit в таблице отправляет POST /edits с измененными строками листа
+целиком (от первой колонки, `getDisplayValues()`):
+
+    {"spreadsheet_id": "...", "gid": 389044927, "start_row": 42,
+     "values": [["01.03.2025", "Иванов", ..., "rec-17", ...]]}
+
+Правки копятся в `EditBatcher` (последняя правка строки побеждает) и раз в
+`WEBHOOK_FLUSH_SECONDS` (или при `WEBHOOK_MAX_BATCH_ROWS` строк) загружаются
+через `TableProcessor.process_rows` в частичном режиме CDC — валидация,
+хэширование и INSERT/UPDATE только пришедших строк, без чтения листа.
+
+Удаленные или очищенные строки, правки заголовков и листы без стабильного pk
+частичной загрузкой не обрабатываются: такие листы, как и все листы с
+правками, раз в `WEBHOOK_RECONCILE_INTERVAL` полностью сверяются обычным
+запуском `ELTPipeline` (с трансформациями).
+"""
+import asyncio
+import json
+import logging
+import re
+import signal
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlsplit
+from src.config.settings import settings
+from src.etl.daemon import parse_interval
+from src.etl.extractor import GSheetsExtractor
+from src.etl.loader import DataLoader
+from src.etl.pipeline import ELTPipeline
+from src.etl.processor import TableProcessor
+from src.etl.validator import ContractValidator
+from src.utils.tracing import span, tracer
+
+log = logging.getLogger('webhook')
+
+SheetKey = Tuple[str, str]
+
+MAX_BODY_BYTES = 10 * 1024 * 1024
+_RANGE_COLUMN_RE = re.compile(r'^\s*([A-Za-z]+)')
+
+
+def range_start_column(range_name: str) -> int:
+    """Индекс (с 0) первой колонки диапазона листа: 'B4:W' -> 1, 'auto' -> 0."""
+    match = _RANGE_COLUMN_RE.match(range_name or '')
+    if not match or range_name.lower() == 'auto':
+        return 0
+    index = 0
+    for char in match.group(1).upper():
+        index = index * 26 + ord(char) - ord('A') + 1
+    return index - 1
+
+
+@dataclass
+class SheetEdit:
+    """Строки листа, измененные одной правкой (номера строк листа с 1)."""
+    spreadsheet_id: str
+    gid: str
+    start_row: int
+    values: List[List[Any]]
+
+    @property
+    def key(self) -> SheetKey:
+        return (self.spreadsheet_id, self.gid)
+
+
+def parse_edits(payload: Any) -> List[SheetEdit]:
+    """Правка, список правок или {"edits": [...]} -> список SheetEdit (ValueError при ошибке)."""
+    if isinstance(payload, dict) and 'edits' in payload:
+        payload = payload['edits']
+    items = payload if isinstance(payload, list) else [payload]
+    edits = []
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError("Правка должна быть JSON-объектом")
+        missing = [f for f in ('spreadsheet_id', 'gid', 'start_row', 'values') if item.get(f) in (None, '')]
+        if missing:
+            raise ValueError(f"В правке нет полей: {', '.join(missing)}")
+        values = item['values']
+        if not isinstance(values, list) or not all(isinstance(row, list) for row in values):
+            raise ValueError("values должен быть списком строк (списков значений)")
+        try:
+            start_row = int(item['start_row'])
+        except (TypeError, ValueError):
+            raise ValueError(f"Некорректный start_row: {item['start_row']!r}")
+        if start_row < 1:
+            raise ValueError(f"Некорректный start_row: {start_row}")
+        edits.append(SheetEdit(str(item['spreadsheet_id']), str(item['gid']), start_row, values))
+    return edits
+
+
+class EditBatcher:
+    """Накопитель правок: (spreadsheet_id, gid) -> {номер строки: значения}."""
+
+    def __init__(self):
+        self._rows: Dict[SheetKey, Dict[int, List[Any]]] = {}
+
+    @property
+    def pending(self) -> int:
+        return sum(len(rows) for rows in self._rows.values())
+
+    def add(self, edit: SheetEdit) -> int:
+        rows = self._rows.setdefault(edit.key, {})
+        for offset, values in enumerate(edit.values):
+            rows[edit.start_row + offset] = values
+        return len(edit.values)
+
+    def drain(self) -> Dict[SheetKey, Dict[int, List[Any]]]:
+        batch, self._rows = self._rows, {}
+        return batch
+
+
+def supports_partial(sheet_cfg: Dict[str, Any]) -> bool:
+    """Частичная загрузка возможна для upsert-листов со стабильным pk (не __row_hash)."""
+    return sheet_cfg.get('mode', 'upsert') != 'replace' and sheet_cfg.get('pk', '__row_hash') != '__row_hash'
+
+
+class EditIngestor:
+    """Микропакетная загрузка правок и периодическая полная сверка измененных листов."""
+
+    def __init__(self, extractor: Optional[GSheetsExtractor] = None):
+        self.extractor = extractor or GSheetsExtractor()
+        self.processor = TableProcessor(self.extractor, DataLoader(), ContractValidator(), uuid.uuid4())
+        self.sheets: Dict[SheetKey, Dict[str, Any]] = {}
+        for spreadsheet_id, sdata in (settings.sources or {}).get('spreadsheets', {}).items():
+            for sheet_cfg in sdata.get('sheets', []):
+                self.sheets[(spreadsheet_id, str(sheet_cfg.get('gid', 0)))] = sheet_cfg
+        self.batcher = EditBatcher()
+        self.flush_seconds = settings.webhook_flush_seconds
+        self.max_batch_rows = settings.webhook_max_batch_rows
+        self.reconcile_seconds = parse_interval(settings.webhook_reconcile_interval)
+        self.stats = {'received_rows': 0, 'applied_rows': 0, 'flushes': 0, 'reconciles': 0, 'errors': 0}
+        # Заголовки листов: {key: {header_row, data_start_row, headers, col_names}}
+        self._headers: Dict[SheetKey, Dict[str, Any]] = {}
+        self._touched: Set[SheetKey] = set()
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+
+    def submit(self, edits: List[SheetEdit]) -> int:
+        """Ставит правки в очередь. ValueError — лист не описан в sources.yml."""
+        unknown = [e.key for e in edits if e.key not in self.sheets]
+        if unknown:
+            raise ValueError(f"Листы не описаны в sources.yml: {unknown}")
+        accepted = sum(self.batcher.add(edit) for edit in edits)
+        self.stats['received_rows'] += accepted
+        if self.batcher.pending >= self.max_batch_rows:
+            self._wakeup.set()
+        return accepted
+
+    async def _sheet_header(self, key: SheetKey) -> Optional[Dict[str, Any]]:
+        """Заголовок листа (кэшируется; один batchGet на все листы таблицы)."""
+        if key not in self._headers:
+            spreadsheet_id = key[0]
+            cfgs = [cfg for (ssid, _), cfg in self.sheets.items() if ssid == spreadsheet_id]
+            headers = await self.extractor.extract_headers(spreadsheet_id, cfgs)
+            for gid, info in headers.items():
+                self._headers[(spreadsheet_id, gid)] = info
+        return self._headers.get(key)
+
+    async def flush(self) -> List[Dict[str, Any]]:
+        """Загружает накопленные правки. Возвращает результаты process_rows по листам."""
+        async with self._flush_lock:
+            batch = self.batcher.drain()
+            if not batch:
+                return []
+            self.stats['flushes'] += 1
+            results = []
+            for key, rows in batch.items():
+                self._touched.add(key)
+                sheet_cfg = self.sheets[key]
+                if not supports_partial(sheet_cfg):
+                    log.info(f"{sheet_cfg['target_table']}: без стабильного pk, правки применятся при сверке")
+                    continue
+                apply_span = None
+                try:
+                    with span('webhook.apply', table=sheet_cfg['target_table']) as apply_span:
+                        result = await self._apply(key, sheet_cfg, rows)
+                except Exception as e:
+                    self.stats['errors'] += 1
+                    log.error(f"Ошибка загрузки правок {sheet_cfg['target_table']}: {e}")
+                    continue
+                finally:
+                    # У приема правок нет записи в ops.elt_runs, и спаны некуда сохранить;
+                    # без извлечения они копились бы до сброса трейсера в сверке
+                    if apply_span is not None:
+                        tracer.detach(apply_span)
+                if result:
+                    self.stats['applied_rows'] += result['extracted']
+                    results.append(result)
+            return results
+
+    async def _apply(self, key: SheetKey, sheet_cfg: Dict[str, Any], rows: Dict[int, List[Any]]) -> Optional[Dict[str, Any]]:
+        target_table = sheet_cfg['target_table']
+        header = await self._sheet_header(key)
+        if not header or not header['header_row']:
+            log.warning(f"{target_table}: строка заголовков не найдена, правки применятся при сверке")
+            return None
+        data_start_row = header['data_start_row']
+        if min(rows) < data_start_row:
+            # Изменен заголовок (или строки над ним): колонки могли сдвинуться
+            log.info(f"{target_table}: правка заголовка, лист будет полностью сверен")
+            self._headers.pop(key, None)
+            return None
+
+        first_col = range_start_column(sheet_cfg.get('range', 'A:Z'))
+        width = len(header['headers'])
+        row_numbers, values = [], []
+        for row_number in sorted(rows):
+            cells = list(rows[row_number][first_col:first_col + width])
+            cells.extend([None] * (width - len(cells)))
+            # Очищенная строка — удаление, его обработает полная сверка
+            if not any(cell is not None and str(cell).strip() for cell in cells):
+                continue
+            # _row_index как при полной загрузке: позиция строки данных + 2
+            row_numbers.append(row_number - data_start_row + 2)
+            values.append(cells)
+        if not values:
+            return None
+
+        result = await self.processor.process_rows(
+            sheet_cfg, header['col_names'], values, full_refresh=False, dry_run=False,
+            partial=True, row_numbers=row_numbers
+        )
+        log.info(f"{target_table}: правки загружены (+{result['inserted']} / ~{result['updated']})")
+        return result
+
+    async def reconcile(self):
+        """Полная сверка листов, по которым приходили правки (удаления, заголовки, листы без pk)."""
+        await self.flush()
+        touched, self._touched = self._touched, set()
+        if not touched:
+            return
+        tables = {self.sheets[key]['target_table'] for key in touched}
+        log.info(f"Сверка листов с правками: {', '.join(sorted(tables))}")
+        self.stats['reconciles'] += 1
+        # Заголовки перечитываются после сверки: позиции могли измениться
+        for key in touched:
+            self._headers.pop(key, None)
+        try:
+            await ELTPipeline(extractor=self.extractor).run(tables=tables, run_exports=False)
+        except Exception as e:
+            self.stats['errors'] += 1
+            self._touched |= touched
+            log.error(f"Сверка завершилась сбоем: {e}")
+
+    async def run(self, stop: asyncio.Event):
+        """Цикл: flush по таймеру/размеру пакета, сверка по интервалу."""
+        next_reconcile = time.monotonic() + self.reconcile_seconds
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+            if time.monotonic() >= next_reconcile:
+                await self.reconcile()
+                next_reconcile = time.monotonic() + self.reconcile_seconds
+        await self.flush()
+
+
+class WebhookServer:
+    """Минимальный HTTP/1.1 сервер на asyncio: POST /edits, GET /health."""
+
+    def __init__(self, ingestor: EditIngestor, host: Optional[str] = None, port: Optional[int] = None,
+                 token: Optional[str] = None):
+        self.ingestor = ingestor
+        self.host = host or settings.webhook_host
+        self.port = settings.webhook_port if port is None else port
+        self.token = token if token is not None else settings.webhook_token
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> 'WebhookServer':
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        log.info(f"Прием правок на http://{self.host}:{self.port}/edits")
+        return self
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def handle(self, method: str, target: str, headers: Dict[str, str], body: bytes) -> Tuple[int, Dict[str, Any]]:
+        """Обработка запроса (без сети): (HTTP-код, JSON-ответ)."""
+        url = urlsplit(target)
+        if method == 'GET' and url.path == '/health':
+            return 200, {'status': 'ok', 'pending_rows': self.ingestor.batcher.pending, **self.ingestor.stats}
+        if url.path != '/edits':
+            return 404, {'error': 'not found'}
+        if method != 'POST':
+            return 405, {'error': 'method not allowed'}
+        if self.token:
+            supplied = headers.get('x-webhook-token') or parse_qs(url.query).get('token', [None])[0]
+            if supplied != self.token:
+                return 401, {'error': 'invalid token'}
+        try:
+            edits = parse_edits(json.loads(body.decode('utf-8') or 'null'))
+            accepted = self.ingestor.submit(edits)
+        except (ValueError, UnicodeDecodeError) as e:
+            return 400, {'error': str(e)}
+        return 202, {'accepted_rows': accepted, 'pending_rows': self.ingestor.batcher.pending}
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = (await reader.readline()).decode('latin-1').strip()
+            method, target, _ = request_line.split(' ', 2)
+            headers: Dict[str, str] = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1').strip()
+                if not line:
+                    break
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get('content-length') or 0)
+            if length > MAX_BODY_BYTES:
+                status, response = 413, {'error': 'payload too large'}
+            else:
+                body = await reader.readexactly(length) if length else b''
+                status, response = self.handle(method, target, headers, body)
+        except (ValueError, asyncio.IncompleteReadError) as e:
+            status, response = 400, {'error': f'bad request: {e}'}
+        payload = json.dumps(response, ensure_ascii=False).encode('utf-8')
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode('latin-1') + payload
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+
+_REASONS = {200: 'OK', 202: 'Accepted', 400: 'Bad Request', 401: 'Unauthorized', 404: 'Not Found',
+            405: 'Method Not Allowed', 413: 'Payload Too Large'}
+
+
+async def serve(stop: Optional[asyncio.Event] = None):
+    """Запускает прием правок до сигнала остановки (`python src/main.py --webhook`)."""
+    stop = stop or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    ingestor = EditIngestor()
+    server = await WebhookServer(ingestor).start()
+    try:
+        await ingestor.run(stop)
+    finally:
+        await server.stop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.remove_signal_handler(sig)
+        log.info(f"Прием правок остановлен: {ingestor.stats}")
@@ -1,9 +1,9 @@
 import asyncio
 import argparse
 import sys
+import uuid
 from src.utils.logger import setup_logger
 from src.utils.process import ProcessLock
-from src.etl.pipeline import ELTPipeline
 from src.config.settings import settings
 from src.db.connection import DBConnection
 
@@ -16,52 +16,178 @@ async def main():
     parser.add_argument('--transform-only', action='store_true', help='Только трансформация (пропустить загрузку)')
     parser.add_argument('--full-refresh', action='store_true', help='Полная перезагрузка (TRUNCATE + INSERT)')
     parser.add_argument('--deploy-schema', action='store_true', help='Пересоздать схему таблиц из заголовков Sheets')
+    parser.add_argument('--evolve-schema', action='store_true',
+                        help='Привести staging-таблицы к заголовкам Sheets через ALTER ADD/RENAME COLUMN (без потери данных)')
     parser.add_argument('--dry-run', action='store_true', help='Режим просмотра изменений без применения')
+    parser.add_argument('--ensure-indexes', action='store_true',
+                        help='Создать недостающие индексы staging/ключей трансформаций и показать отчет (без запуска ELT)')
     
     # Новые аргументы
     parser.add_argument('--scope', choices=['current', 'historical', 'all'], default='all', 
                         help='Область синхронизации: current (текущие), historical (история), all (все)')
     parser.add_argument('--kill-conflicts', action='store_true', 
-                        help='Принудительно завершить другие запущенные процессы ELT перед стартом')
+                        help='Эксклюзивный запуск: принудительно завершить другие процессы ELT этого scope перед стартом')
     parser.add_argument('--wait', type=int, default=0,
-                        help='Время ожидания освобождения блокировки в секундах (по умолчанию 0 - ошибка сразу)')
+                        help='Эксклюзивный запуск: ждать освобождения файловой блокировки scope N секунд')
     parser.add_argument('--skip-export', action='store_true', help='Пропустить фазу экспорта витрин')
+    parser.add_argument('--resume', metavar='RUN_ID',
+                        help='Продолжить прерванный запуск: пропустить загруженные таблицы и выполненные трансформации')
+    parser.add_argument('--replay-from-raw', nargs='?', const='latest', metavar='RUN_ID|TIMESTAMP',
+                        help='Загрузить staging из raw.sheets_dump без обращения к Google '
+                             '(последние дампы, дампы запуска run_id или на момент ISO-времени); экспорт пропускается')
+    parser.add_argument('--daemon', action='store_true',
+                        help='Работать постоянно: обновлять листы по их интервалам (refresh_interval), '
+                             'загружая только измененные')
+    parser.add_argument('--webhook', action='store_true',
+                        help='Принимать правки из Apps Script (POST /edits) и загружать их микропакетами')
+    parser.add_argument('--enqueue', action='store_true',
+                        help='Поставить запуск в очередь ops.elt_jobs (задания загрузки листов и трансформаций) и выйти')
+    parser.add_argument('--worker', nargs='?', const='any', metavar='RUN_ID',
+                        help='Выполнять задания очереди ops.elt_jobs (с RUN_ID — до завершения этого запуска)')
+    parser.add_argument('--profile', action='store_true',
+                        help='Профилировать запуск (cProfile), отчеты в logs/profile_<run_id>.*')
+    parser.add_argument('--profile-memory', action='store_true',
+                        help='Дополнительно отслеживать аллокации (tracemalloc) и пик памяти по фазам')
     
     args = parser.parse_args()
+    if args.resume:
+        try:
+            uuid.UUID(args.resume)
+        except ValueError:
+            parser.error(f"--resume ожидает run_id (UUID), получено: {args.resume!r}")
+    if args.replay_from_raw:
+        from src.etl.replay import parse_replay_target
+        try:
+            parse_replay_target(args.replay_from_raw)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.worker and args.worker != 'any':
+        try:
+            uuid.UUID(args.worker)
+        except ValueError:
+            parser.error(f"--worker ожидает run_id (UUID), получено: {args.worker!r}")
+    modes = [flag for flag, enabled in (
+        ('--daemon', args.daemon), ('--webhook', args.webhook), ('--enqueue/--worker', args.enqueue or args.worker),
+    ) if enabled]
+    if len(modes) > 1:
+        parser.error(f"{' и '.join(modes)} запускаются отдельными процессами")
+    if modes:
+        conflicting = [flag for flag, value in (
+            ('--resume', args.resume), ('--replay-from-raw', args.replay_from_raw), ('--dry-run', args.dry_run),
+            # --enqueue ставит в очередь и полную перезагрузку
+            ('--full-refresh', args.full_refresh and not args.enqueue),
+            ('--skip-load', args.skip_load or args.transform_only),
+        ) if value]
+        if conflicting:
+            parser.error(f"{modes[0]} несовместим с {', '.join(conflicting)}")
     
-    # Инициализация защиты от параллельных запусков
-    lock = ProcessLock(name=f"elt_{args.scope}")
-    lock.check_and_lock(kill_conflicts=args.kill_conflicts, timeout=args.wait)
+    if args.enqueue or args.worker:
+        # Очередь: взаимное исключение — advisory-блокировки Postgres, файловый лок не нужен
+        await run_queue(args)
+        return
+    
+    # Параллельные запуски (в том числе разных scope) безопасны: загрузка каждой таблицы и
+    # каждая трансформация идут под advisory-блокировками Postgres. Файловый лок остается
+    # для долгоживущих режимов и явного эксклюзивного запуска (--kill-conflicts / --wait).
+    lock = None
+    if args.daemon or args.webhook or args.kill_conflicts or args.wait:
+        lock = ProcessLock(name='elt_webhook' if args.webhook else f"elt_{args.scope}")
+        lock.check_and_lock(kill_conflicts=args.kill_conflicts, timeout=args.wait)
     
     # Нормализация логики
     skip_load = args.skip_load or args.transform_only
     
+    # Клиенты Google создаются при первом обращении к Sheets; один экземпляр на процесс
+    from src.etl.extractor import GSheetsExtractor
+    extractor = GSheetsExtractor()
+    
     try:
         if args.deploy_schema:
             from src.etl.schema import SchemaManager
-            manager = SchemaManager()
+            manager = SchemaManager(extractor)
             log.info("Начало развертывания мета-таблиц...")
             await manager.deploy_meta_tables()
             log.info("Начало развертывания staging-таблиц...")
             await manager.deploy_staging_tables(use_staging_schema=settings.use_staging_schema)
+            await manager.ensure_indexes()
             if not skip_load:
                  args.full_refresh = True
+        elif args.evolve_schema:
+            from src.etl.schema import SchemaManager
+            manager = SchemaManager(extractor)
+            await manager.deploy_meta_tables()
+            log.info("Сравнение staging-таблиц с заголовками Sheets...")
+            await manager.deploy_staging_tables(use_staging_schema=settings.use_staging_schema, diff=True)
+            await manager.ensure_indexes()
+        
+        if args.ensure_indexes:
+            from src.etl.schema import SchemaManager
+            await SchemaManager(extractor).ensure_indexes()
+            return
+        
+        if args.daemon:
+            from src.etl.daemon import SchedulerDaemon
+            await SchedulerDaemon(scope=args.scope, run_exports=not args.skip_export).run_forever()
+            return
+        if args.webhook:
+            from src.etl.webhook import serve
+            await serve()
+            return
+        
+        from src.etl.pipeline import ELTPipeline
+        pipeline = ELTPipeline(resume_run_id=args.resume, extractor=extractor)
         
-        pipeline = ELTPipeline()
-        await pipeline.run(
-            skip_load=skip_load,
-            skip_transform=args.skip_transform,
-            full_refresh=args.full_refresh,
-            dry_run=args.dry_run,
-            scope=args.scope,
-            run_exports=not args.skip_export
-        )
+        profiler = None
+        if args.profile or args.profile_memory:
+            from src.utils.profiling import RunProfiler
+            profiler = RunProfiler(pipeline.run_id, trace_memory=args.profile_memory)
+            profiler.start()
+        
+        try:
+            await pipeline.run(
+                skip_load=skip_load,
+                skip_transform=args.skip_transform,
+                full_refresh=args.full_refresh,
+                dry_run=args.dry_run,
+                scope=args.scope,
+                # Экспорт витрин пишет в Google Sheets — в replay-режиме не выполняется
+                run_exports=not args.skip_export and not args.replay_from_raw,
+                replay_from=args.replay_from_raw
+            )
+        finally:
+            if profiler:
+                profiler.stop()
+                profiler.report()
+                profiler.print_summary()
     except Exception as e:
         log.critical(f"Критический сбой пайплайна: {e}", exc_info=True)
         sys.exit(1)
     finally:
         await DBConnection.close()
-        lock.unlock()
+        if lock:
+            lock.unlock()
+
+async def run_queue(args):
+    """--enqueue / --worker: распределенное выполнение через ops.elt_jobs."""
+    import signal
+    from src.etl.jobs import JobQueue, JobWorker
+    try:
+        run_id = None
+        if args.enqueue:
+            run_id = await JobQueue().enqueue_run(scope=args.scope, full_refresh=args.full_refresh)
+            print(run_id)
+        if args.worker:
+            worker = JobWorker()
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                loop.add_signal_handler(sig, worker.stop)
+            target = run_id or (None if args.worker == 'any' else args.worker)
+            await worker.run(run_id=target)
+    except Exception as e:
+        log.critical(f"Критический сбой очереди заданий: {e}", exc_info=True)
+        sys.exit(1)
+    finally:
+        await DBConnection.close()
 
 if __name__ == "__main__":
     try:
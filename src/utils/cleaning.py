@@ -1,4 +1,6 @@
 import re
+from datetime import date, datetime, time
+from decimal import Decimal, InvalidOperation
 from typing import Any, Optional
 
 def clean_string(val: Any) -> Optional[str]:
@@ -44,3 +46,86 @@ def normalize_boolean(val: Any) -> Optional[bool]:
     if s in ('false', '0', 'no', 'нет'):
         return False
     return None
+
+# Форматы дат из контрактов в порядке проверки (шаблоны однозначны благодаря якорям)
+_DATE_FORMATS = (
+    (re.compile(r'^\d{2}\.\d{2}\.\d{4}$'), '%d.%m.%Y'),
+    (re.compile(r'^\d{2}\.\d{2}\.\d{2}$'), '%d.%m.%y'),
+    (re.compile(r'^\d{4}-\d{2}-\d{2}$'), '%Y-%m-%d'),
+    (re.compile(r'^\d{2}\.\d{2}\.?$'), None),  # DD.MM. / DD.MM — без года
+)
+_WEEKDAY_PREFIX = re.compile(r'^[а-яa-z]{2,3}\s+', re.IGNORECASE)
+_TIME_PATTERN = re.compile(r'^(\d{1,2}):(\d{2})(?::(\d{2}))?')
+
+def parse_date(val: Any, default_year: Optional[int] = None) -> Optional[date]:
+    """Разбор даты в форматах контрактов (DD.MM.YYYY, DD.MM.YY, YYYY-MM-DD, DD.MM.)."""
+    if isinstance(val, datetime):
+        return val.date()
+    if isinstance(val, date):
+        return val
+    s = clean_string(val)
+    if s is None:
+        return None
+    s = _WEEKDAY_PREFIX.sub('', s).strip()
+
+    for pattern, fmt in _DATE_FORMATS:
+        if not pattern.match(s):
+            continue
+        try:
+            if fmt is None:
+                day, month = s.rstrip('.').split('.')
+                return date(default_year or date.today().year, int(month), int(day))
+            return datetime.strptime(s, fmt).date()
+        except ValueError:
+            return None
+    return None
+
+# Число с разделителями тысяч: '1.500.000' или '1,500.50' / '1.500,50' (десятичный — другой знак)
+_GROUPED_NUMBER = re.compile(r'-?\d{1,3}(?:([,.])\d{3})(?:\1\d{3})*(?:(?!\1)[,.]\d+|(?<=\d{3}\1\d{3}))')
+_PLAIN_NUMBER = re.compile(r'-?\d+(?:\.\d+)?')
+
+def parse_numeric(val: Any) -> Optional[Decimal]:
+    """Разбор денежной/числовой строки в Decimal ('1 500,50 руб' -> 1500.50).
+
+    Разделители тысяч: при наличии и запятой, и точки десятичный — последний
+    ('1,500.50', '1.500,50'); повторяющийся разделитель — тысячи ('1.500.000').
+    Нераспознанное значение — None (загрузчик такую строку не пишет).
+    """
+    if isinstance(val, (int, float, Decimal)) and not isinstance(val, bool):
+        return Decimal(str(val))
+    s = clean_string(val)
+    if s is None:
+        return None
+    s = re.sub(r'[^\d,.-]', '', s)
+    grouped = _GROUPED_NUMBER.fullmatch(s)
+    if grouped:
+        s = s.replace(grouped.group(1), '')
+    s = s.replace(',', '.')
+    if not _PLAIN_NUMBER.fullmatch(s):
+        return None
+    try:
+        return Decimal(s) if s else None
+    except InvalidOperation:
+        return None
+
+def parse_integer(val: Any) -> Optional[int]:
+    """Разбор целого числа; дробные значения с нулевой частью ('2.0') допускаются."""
+    number = parse_numeric(val)
+    if number is None or number != number.to_integral_value():
+        return None
+    return int(number)
+
+def parse_time(val: Any) -> Optional[time]:
+    """Разбор времени HH:MM[:SS] (хвост после времени игнорируется)."""
+    if isinstance(val, time):
+        return val
+    s = clean_string(val)
+    if s is None:
+        return None
+    m = _TIME_PATTERN.match(s)
+    if not m:
+        return None
+    try:
+        return time(int(m.group(1)), int(m.group(2)), int(m.group(3) or 0))
+    except ValueError:
+        return None
@@ -0,0 +1,138 @@
+"""Доступ к данным для Streamlit-дашборда (dashboard.py и pages/).
+
+Streamlit выполняет скрипты страниц в своих потоках, поэтому `asyncio.run` с
+новым соединением на каждый запрос каждый раз платил за подключение (и TLS до
+Supabase). Здесь один фоновый event loop на процесс держит общий пул
+`DBConnection`, а синхронные функции отправляют в него запросы.
+
+Графики и KPI читают дневные сводки (`ops.elt_*_daily`, см. src/etl/rollups.py),
+сырые таблицы — только последние N строк, поэтому объем чтения ограничен
+периодом, а не длиной истории. Функции возвращают списки словарей; кэширование
+(`st.cache_data`) и DataFrame — на стороне страниц.
+"""
+import asyncio
+import threading
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+from zoneinfo import ZoneInfo
+from src.config.settings import settings
+from src.db.connection import DBConnection
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name='dashboard-db', daemon=True).start()
+    return _loop
+
+
+def query(sql: str, *args) -> List[Dict[str, Any]]:
+    """Выполняет SELECT в общем пуле фонового event loop (NUMERIC -> float для pandas)."""
+    future = asyncio.run_coroutine_threadsafe(DBConnection.fetch(sql, *args), _get_loop())
+    return [
+        {key: float(value) if isinstance(value, Decimal) else value for key, value in row.items()}
+        for row in future.result()
+    ]
+
+
+def since_day(days: int, today: Optional[date] = None) -> date:
+    """Первый день периода из `days` суток (в часовом поясе сводок)."""
+    if today is None:
+        today = datetime.now(timezone.utc).astimezone(ZoneInfo(settings.rollup_timezone)).date()
+    return today - timedelta(days=days - 1)
+
+
+def fetch_run_daily(days: int = 30) -> List[Dict[str, Any]]:
+    """Запуски по дням и статусам: число, строки, ошибки, p50/p95 длительности."""
+    return query(f"""
+        SELECT day, status, runs, tables_processed, rows_synced, validation_errors,
+               timed_runs, duration_s_total, duration_s_p50, duration_s_p95, duration_s_max, throughput_max
+        FROM {settings.schema_ops}.elt_run_daily
+        WHERE day >= $1
+        ORDER BY day
+    """, since_day(days))
+
+
+def fetch_table_daily(days: int = 30) -> List[Dict[str, Any]]:
+    """Загрузки по дням и таблицам: объемы операций, длительности, пропускная способность."""
+    return query(f"""
+        SELECT day, table_name, loads, rows_extracted, rows_inserted, rows_updated, rows_deleted,
+               validation_errors, duration_ms_total, duration_ms_p50, duration_ms_p95, throughput
+        FROM {settings.schema_ops}.elt_table_daily
+        WHERE day >= $1
+        ORDER BY day, table_name
+    """, since_day(days))
+
+
+def fetch_error_daily(days: int = 30) -> List[Dict[str, Any]]:
+    """Ошибки валидации по дням, таблицам и типам."""
+    return query(f"""
+        SELECT day, table_name, error_type, errors
+        FROM {settings.schema_ops}.elt_error_daily
+        WHERE day >= $1
+        ORDER BY day
+    """, since_day(days))
+
+
+def fetch_recent_runs(limit: int = 30) -> List[Dict[str, Any]]:
+    """Последние запуски (по индексу started_at) с пропускной способностью."""
+    return query(f"""
+        SELECT run_id, started_at, finished_at, status, mode,
+               tables_processed, total_rows_synced, validation_errors,
+               duration_seconds, error_message,
+               total_rows_synced / NULLIF(duration_seconds, 0) AS throughput
+        FROM {settings.schema_ops}.elt_runs
+        ORDER BY started_at DESC
+        LIMIT $1
+    """, limit)
+
+
+def fetch_recent_table_stats(limit: int = 500) -> List[Dict[str, Any]]:
+    """Последние загрузки таблиц для детальной таблицы (по created_at — читаются свежие партиции)."""
+    return query(f"""
+        SELECT ts.table_name, ts.rows_extracted, ts.rows_inserted, ts.rows_updated, ts.rows_deleted,
+               ts.validation_errors, ts.duration_ms, r.started_at, r.run_id
+        FROM {settings.schema_ops}.elt_table_stats ts
+        JOIN {settings.schema_ops}.elt_runs r ON r.run_id = ts.run_id
+        ORDER BY ts.created_at DESC
+        LIMIT $1
+    """, limit)
+
+
+def fetch_recent_errors(limit: int = 500) -> List[Dict[str, Any]]:
+    """Последние ошибки валидации для инспектора (по created_at — читаются свежие партиции)."""
+    return query(f"""
+        SELECT created_at, table_name, column_name, invalid_value, error_type, message
+        FROM {settings.schema_ops}.validation_logs
+        ORDER BY created_at DESC
+        LIMIT $1
+    """, limit)
+
+
+def fetch_span_breakdown(runs: int = 20) -> List[Dict[str, Any]]:
+    """Длительности спанов (фаз и шагов) за последние N запусков."""
+    return query(f"""
+        WITH last_runs AS (
+            SELECT run_id, started_at
+            FROM {settings.schema_ops}.elt_runs
+            ORDER BY started_at DESC
+            LIMIT $1
+        )
+        SELECT
+            lr.started_at,
+            s.run_id,
+            s.name,
+            s.table_name,
+            s.parent_id IS NULL AS is_root,
+            SUM(s.duration_ms) / 1000.0 AS duration_s
+        FROM {settings.schema_ops}.elt_spans s
+        JOIN last_runs lr ON lr.run_id = s.run_id
+        GROUP BY lr.started_at, s.run_id, s.name, s.table_name, s.parent_id IS NULL
+        ORDER BY lr.started_at ASC
+    """, runs)
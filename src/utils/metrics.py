@@ -0,0 +1,312 @@
+"""Метрики пайплайна в формате Prometheus / OpenMetrics.
+
+Процесс накапливает счетчики, gauge и гистограммы в общем реестре `metrics`.
+В конце запуска `metrics.export(run_id)` пишет text-файл (для textfile collector
+node_exporter) и, если задан `METRICS_PUSHGATEWAY_URL`, отправляет их в
+Pushgateway. Внешние зависимости не нужны.
+"""
+import logging
+import os
+from abc import ABC, abstractmethod
+import socket
+import time
+import urllib.request
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+log = logging.getLogger('metrics')
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric(ABC):
+    type_name = 'untyped'
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+
+    @abstractmethod
+    def reset(self):
+        """Обнуляет значения (между запусками в одном процессе)."""
+
+    @abstractmethod
+    def samples(self, openmetrics: bool) -> Iterable[str]:
+        """Строки значений метрики в формате экспозиции."""
+
+    def header(self, openmetrics: bool) -> List[str]:
+        family = self.name
+        if self.type_name == 'counter' and not openmetrics:
+            family = f"{self.name}_total"
+        return [f"# HELP {family} {self.documentation}", f"# TYPE {family} {self.type_name}"]
+
+
+class Counter(_Metric):
+    type_name = 'counter'
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def reset(self):
+        self._values = {}
+
+    def samples(self, openmetrics: bool) -> Iterable[str]:
+        for key, value in self._values.items():
+            yield f"{self.name}_total{_format_labels(key)} {_format_value(value)}"
+
+
+class Gauge(_Metric):
+    type_name = 'gauge'
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._values: Dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels):
+        self._values[_label_key(labels)] = value
+
+    def get(self, **labels) -> Optional[float]:
+        return self._values.get(_label_key(labels))
+
+    def reset(self):
+        self._values = {}
+
+    def samples(self, openmetrics: bool) -> Iterable[str]:
+        for key, value in self._values.items():
+            yield f"{self.name}{_format_labels(key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._values: Dict[LabelKey, Dict[str, Any]] = {}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            self._values[key] = entry
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                entry['counts'][i] += 1
+        entry['sum'] += value
+        entry['count'] += 1
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(_label_key(labels))
+        return entry['count'] if entry else 0
+
+    def reset(self):
+        self._values = {}
+
+    def samples(self, openmetrics: bool) -> Iterable[str]:
+        for key, entry in self._values.items():
+            for bound, cnt in zip(self.buckets, entry['counts']):
+                yield f"{self.name}_bucket{_format_labels(key, ('le', _format_value(bound)))} {cnt}"
+            yield f"{self.name}_sum{_format_labels(key)} {_format_value(entry['sum'])}"
+            yield f"{self.name}_count{_format_labels(key)} {entry['count']}"
+
+
+class MetricsRegistry:
+    """Реестр метрик процесса с выводом в text-формат."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self._register(Counter(name, documentation))
+
+    def gauge(self, name: str, documentation: str) -> Gauge:
+        return self._register(Gauge(name, documentation))
+
+    def histogram(self, name: str, documentation: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, buckets))
+
+    def _register(self, metric: _Metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def reset(self):
+        """Обнуляет значения (начало нового запуска), определения метрик сохраняются."""
+        for metric in self._metrics.values():
+            metric.reset()
+
+    def render(self, openmetrics: bool = True) -> str:
+        """OpenMetrics (openmetrics=True) или классический Prometheus text 0.0.4."""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            samples = list(metric.samples(openmetrics))
+            if not samples:
+                continue
+            lines.extend(metric.header(openmetrics))
+            lines.extend(samples)
+        if openmetrics:
+            lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path: Path) -> Path:
+        """Атомарно записывает метрики в файл (tmp + rename).
+
+        `*.prom` пишется в формате Prometheus 0.0.4 (node_exporter textfile
+        collector), любое другое расширение — в OpenMetrics.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + f'.{os.getpid()}.tmp')
+        tmp_path.write_text(self.render(openmetrics=path.suffix != '.prom'), encoding='utf-8')
+        os.replace(tmp_path, path)
+        return path
+
+    def push(self, gateway_url: str, job: str, instance: str, timeout: float = 10.0):
+        """PUT метрик в Prometheus Pushgateway (группировка по job/instance)."""
+        url = f"{gateway_url.rstrip('/')}/metrics/job/{job}/instance/{instance}"
+        body = self.render(openmetrics=False).encode('utf-8')
+        request = urllib.request.Request(
+            url, data=body, method='PUT',
+            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+        )
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status
+
+    def export(self, run_id: Any):
+        """Выгружает метрики запуска согласно настройкам (textfile и/или pushgateway)."""
+        from src.config.settings import settings
+
+        if settings.metrics_textfile:
+            try:
+                path = self.write_textfile(Path(settings.metrics_textfile))
+                log.info(f"Метрики запуска {run_id} записаны в {path}")
+            except Exception as e:
+                log.warning(f"Не удалось записать файл метрик: {e}")
+
+        if settings.metrics_pushgateway_url:
+            try:
+                # instance = хост: группа в Pushgateway перезаписывается каждым запуском
+                self.push(settings.metrics_pushgateway_url, settings.metrics_job_name, socket.gethostname())
+                log.info(f"Метрики запуска {run_id} отправлены в Pushgateway ({settings.metrics_pushgateway_url})")
+            except Exception as e:
+                log.warning(f"Не удалось отправить метрики в Pushgateway: {e}")
+
+
+class SpanMetricsObserver:
+    """Переносит длительности фаз и таблиц из трейсера в гистограммы."""
+
+    def on_span_start(self, span):
+        pass
+
+    def on_span_end(self, span):
+        seconds = (span.duration_ms or 0.0) / 1000
+        if span.is_root and span.name.startswith('phase.'):
+            PHASE_DURATION.observe(seconds, phase=span.name.split('.', 1)[1])
+        elif span.name == 'table' and span.table:
+            TABLE_DURATION.observe(seconds, table=span.table)
+
+
+# Общий реестр процесса
+metrics = MetricsRegistry()
+span_observer = SpanMetricsObserver()
+
+# --- Определения метрик пайплайна ---
+ROWS_EXTRACTED = metrics.counter('elt_rows_extracted', 'Rows read from source sheets')
+ROWS_INSERTED = metrics.counter('elt_rows_inserted', 'Rows inserted into staging')
+ROWS_UPDATED = metrics.counter('elt_rows_updated', 'Rows updated in staging')
+ROWS_DELETED = metrics.counter('elt_rows_deleted', 'Rows deleted from staging')
+VALIDATION_ERRORS = metrics.counter('elt_validation_errors', 'Contract validation errors')
+
+PHASE_DURATION = metrics.histogram('elt_phase_duration_seconds', 'Duration of pipeline phases')
+TABLE_DURATION = metrics.histogram('elt_table_duration_seconds', 'Duration of per-table processing')
+
+SHEETS_API_CALLS = metrics.counter('elt_google_api_calls', 'Google Sheets/Drive API calls')
+SHEETS_API_RETRIES = metrics.counter('elt_google_api_retries', 'Google API retries by reason')
+GOOGLE_API_WAIT = metrics.histogram(
+    'elt_google_api_wait_seconds', 'Time spent waiting for the Google API rate limiter',
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+GOOGLE_API_RATE = metrics.gauge('elt_google_api_rate_limit', 'Current adaptive Google API request rate (req/s)')
+
+DB_POOL_ACQUIRE = metrics.histogram(
+    'elt_db_pool_acquire_seconds', 'Time spent waiting for a pooled DB connection',
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0, 30.0)
+)
+
+DB_QUERY_DURATION = metrics.histogram(
+    'elt_db_query_seconds', 'Duration of DB queries (client side)',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0, 30.0, 120.0)
+)
+DB_POOL_SIZE = metrics.gauge('elt_db_pool_connections', 'DB pool connections by state')
+DB_LOCK_WAIT = metrics.histogram(
+    'elt_db_lock_wait_seconds', 'Time spent waiting for Postgres advisory locks',
+    buckets=(0.001, 0.01, 0.1, 0.5, 1.0, 5.0, 30.0, 60.0, 300.0, 900.0)
+)
+DB_LOCK_CONTENDED = metrics.counter('elt_db_lock_contended', 'Advisory lock acquisitions that had to wait')
+
+COPY_ROWS = metrics.counter('elt_copy_rows', 'Rows written with COPY')
+COPY_SECONDS = metrics.counter('elt_copy_seconds', 'Seconds spent in COPY')
+COPY_THROUGHPUT = metrics.gauge('elt_copy_throughput_rows_per_second', 'COPY throughput of the last load')
+
+RUN_DURATION = metrics.gauge('elt_run_duration_seconds', 'Duration of the last pipeline run')
+RUN_SUCCESS = metrics.gauge('elt_run_success', '1 if the last run succeeded, 0 otherwise')
+RUN_FINISHED = metrics.gauge('elt_run_finished_timestamp_seconds', 'Unix time the last run finished')
+
+
+def observe_copy(table: str, rows: int, seconds: float):
+    """Фиксирует одну COPY-операцию (объем и пропускную способность)."""
+    COPY_ROWS.inc(rows, table=table)
+    COPY_SECONDS.inc(seconds, table=table)
+    if seconds > 0:
+        COPY_THROUGHPUT.set(round(rows / seconds, 2), table=table)
+
+
+def observe_table(result: Dict[str, Any]):
+    """Объемы загрузки одной таблицы (результат TableProcessor)."""
+    table = result['table']
+    ROWS_EXTRACTED.inc(result.get('extracted', 0), table=table)
+    ROWS_INSERTED.inc(result.get('inserted', 0), table=table)
+    ROWS_UPDATED.inc(result.get('updated', 0), table=table)
+    ROWS_DELETED.inc(result.get('deleted', 0), table=table)
+    VALIDATION_ERRORS.inc(result.get('errors', 0), table=table)
+
+
+def observe_run(status: str, duration: float):
+    RUN_DURATION.set(round(duration, 3))
+    RUN_SUCCESS.set(1 if status == 'success' else 0)
+    RUN_FINISHED.set(round(time.time(), 3))
@@ -0,0 +1,148 @@
+"""Профилирование запуска пайплайна (cProfile + опционально tracemalloc).
+
+Используется флагом `--profile` в `src/main.py`. Результаты пишутся в `logs/`:
+- `profile_<run_id>.prof` — сырые данные cProfile (для snakeviz / pstats);
+- `profile_<run_id>.txt` — топ функций по cumulative time, пик памяти по фазам
+  и главные точки аллокаций.
+
+cProfile видит только поток, в котором включен, поэтому в каждом потоке,
+запущенном после start() (asyncio.to_thread: чтение и разбор Sheets), включается
+свой профилировщик (threading.setprofile), и их статистика суммируется в отчете.
+"""
+import cProfile
+import io
+import logging
+import pstats
+import sys
+import threading
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from src.utils.tracing import tracer
+
+log = logging.getLogger('profiling')
+
+
+class RunProfiler:
+    """Профилировщик одного запуска. Фазы определяются корневыми спанами трейсера."""
+
+    def __init__(self, run_id: Any, trace_memory: bool = False, top_n: int = 25,
+                 output_dir: Optional[Path] = None):
+        self.run_id = str(run_id)
+        self.trace_memory = trace_memory
+        self.top_n = top_n
+        self.output_dir = output_dir or Path("logs")
+        self.output_dir.mkdir(exist_ok=True)
+
+        self._profile = cProfile.Profile()
+        # Профилировщики рабочих потоков (asyncio.to_thread)
+        self._thread_profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+        self._started_tracemalloc = False
+        # Пик памяти (байты) и время (мс) для каждой фазы
+        self.phase_stats: Dict[str, Dict[str, float]] = {}
+
+    @property
+    def stats_path(self) -> Path:
+        return self.output_dir / f"profile_{self.run_id}.prof"
+
+    @property
+    def report_path(self) -> Path:
+        return self.output_dir / f"profile_{self.run_id}.txt"
+
+    def start(self):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start(25)
+            self._started_tracemalloc = True
+        tracer.add_observer(self)
+        threading.setprofile(self._profile_thread)
+        self._profile.enable()
+        log.info(f"Профилирование включено (память: {'да' if self.trace_memory else 'нет'}).")
+
+    def _profile_thread(self, frame, event, arg):
+        """Хук первого события нового потока: включает в нем отдельный cProfile."""
+        sys.setprofile(None)
+        profile = cProfile.Profile()
+        with self._lock:
+            self._thread_profiles.append(profile)
+        profile.enable()
+
+    def stop(self):
+        self._profile.disable()
+        threading.setprofile(None)
+        tracer.remove_observer(self)
+        if self.trace_memory and tracemalloc.is_tracing():
+            self._snapshot = tracemalloc.take_snapshot()
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+
+    # --- Наблюдатель трейсера ---
+
+    def on_span_start(self, span):
+        if span.is_root and self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+
+    def on_span_end(self, span):
+        if not span.is_root:
+            return
+        entry = self.phase_stats.setdefault(span.name, {'duration_ms': 0.0, 'peak_bytes': 0})
+        entry['duration_ms'] += span.duration_ms or 0.0
+        if self.trace_memory and tracemalloc.is_tracing():
+            _, peak = tracemalloc.get_traced_memory()
+            entry['peak_bytes'] = max(entry['peak_bytes'], peak)
+
+    # --- Отчет ---
+
+    def report(self) -> str:
+        """Сохраняет .prof и текстовый отчет, возвращает текст отчета."""
+        self._stats().dump_stats(str(self.stats_path))
+
+        lines: List[str] = [f"PROFILE REPORT (Run ID: {self.run_id})", ""]
+        lines.append(f"Потоков в профиле: {1 + len(self._thread_profiles)} (основной + рабочие)")
+        lines.append(f"Top {self.top_n} функций по cumulative time:")
+        buf = io.StringIO()
+        self._stats(buf).strip_dirs().sort_stats('cumulative').print_stats(self.top_n)
+        lines.append(buf.getvalue())
+
+        if self.phase_stats:
+            lines.extend(self._phase_lines())
+            lines.append("")
+
+        if self._snapshot is not None:
+            lines.append(f"Top {self.top_n} точек аллокации (по размеру):")
+            for stat in self._snapshot.statistics('lineno')[:self.top_n]:
+                lines.append(f"  {stat}")
+
+        text = "\n".join(lines)
+        self.report_path.write_text(text, encoding='utf-8')
+        return text
+
+    def _stats(self, stream=None) -> pstats.Stats:
+        """Статистика основного и рабочих потоков вместе."""
+        stats = pstats.Stats(self._profile, stream=stream)
+        with self._lock:
+            for profile in self._thread_profiles:
+                stats.add(profile)
+        return stats
+
+    def _phase_lines(self) -> List[str]:
+        if not self.phase_stats:
+            return []
+        lines = [f"{'Фаза':<24} | {'Время':>9} | {'Пик памяти':>11}", "-" * 52]
+        for name, st in self.phase_stats.items():
+            peak = f"{st['peak_bytes'] / 1024 / 1024:.1f} MB" if self.trace_memory else "—"
+            lines.append(f"{name:<24} | {st['duration_ms'] / 1000:>8.2f}s | {peak:>11}")
+        return lines
+
+    def print_summary(self, limit: int = 15):
+        """Печатает краткую сводку в stdout (топ cumulative + память по фазам)."""
+        print("\n" + "=" * 80)
+        print(f"ПРОФИЛЬ ЗАПУСКА (Run ID: {self.run_id[:8]}...)")
+        print("-" * 80)
+        stats = self._stats().strip_dirs().sort_stats('cumulative')
+        stats.print_stats(limit)
+        for line in self._phase_lines():
+            print(line)
+        print(f"Файлы: {self.stats_path}, {self.report_path}")
+        print("=" * 80 + "\n")
@@ -0,0 +1,131 @@
+"""Общий адаптивный ограничитель частоты запросов к Google API.
+
+Token bucket с AIMD-подстройкой скорости: каждый успешный запрос немного
+увеличивает допустимую частоту (additive increase), каждый ответ 429 — снижает
+ее в `decrease` раз (multiplicative decrease) и приостанавливает выдачу токенов
+на время backoff. Так лимитер находит устойчивую частоту для квоты проекта.
+
+Лимитеры общие для процесса (`SHEETS_READ`, `SHEETS_WRITE`, `DRIVE`) и
+потокобезопасны: ими пользуются и задачи таблиц, и экспортер в executor.
+Время ожидания и текущая частота публикуются в метриках.
+"""
+import logging
+import random
+import threading
+import time
+from typing import Callable, Optional, TypeVar
+from src.config.settings import settings
+from src.config.constants import RETRY_BASE_DELAY
+from src.utils.metrics import GOOGLE_API_RATE, GOOGLE_API_WAIT, SHEETS_API_RETRIES
+from src.utils.retry import RetryError, is_rate_limit_error
+
+log = logging.getLogger('rate_limit')
+
+T = TypeVar('T')
+
+
+class AdaptiveRateLimiter:
+    """Token bucket с AIMD-подстройкой частоты (запросов в секунду)."""
+
+    def __init__(self, name: str, rate: float, min_rate: Optional[float] = None, max_rate: Optional[float] = None,
+                 burst: float = 5.0, increase: float = 0.05, decrease: float = 0.5,
+                 max_backoff: float = 60.0, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.initial_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate if min_rate is not None else rate / 20
+        self.max_rate = max_rate if max_rate is not None else rate * 4
+        self._min_ratio = self.min_rate / rate
+        self._max_ratio = self.max_rate / rate
+        self.burst = burst
+        self.increase = increase
+        self.decrease = decrease
+        self.max_backoff = max_backoff
+        self._clock = clock
+        self._tokens = burst
+        self._updated = clock()
+        self._blocked_until = 0.0
+        self._throttles = 0
+        self._lock = threading.Lock()
+        GOOGLE_API_RATE.set(round(self.rate, 3), api=name)
+
+    def reset(self, rate: Optional[float] = None):
+        """Возвращает лимитер в исходное состояние (полный bucket, без паузы).
+
+        Новая `rate` масштабирует и границы min_rate/max_rate.
+        """
+        with self._lock:
+            self.rate = rate if rate is not None else self.initial_rate
+            self.min_rate = self.rate * self._min_ratio
+            self.max_rate = self.rate * self._max_ratio
+            self._tokens = self.burst
+            self._updated = self._clock()
+            self._blocked_until = 0.0
+            self._throttles = 0
+
+    def _reserve(self, tokens: float) -> float:
+        """Резервирует токены и возвращает, сколько секунд нужно подождать."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._blocked_until - now)
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Блокирующее ожидание токена (для синхронных клиентов gspread/discovery).
+
+        Вызывается только вне event loop: экстрактор работает в asyncio.to_thread,
+        экспортер — в executor.
+        """
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        GOOGLE_API_WAIT.observe(wait, api=self.name)
+        return wait
+
+    def on_success(self):
+        with self._lock:
+            self._throttles = 0
+            # +increase запросов/с примерно за каждую секунду успешной работы
+            self.rate = min(self.max_rate, self.rate + self.increase / max(self.rate, self.increase))
+            GOOGLE_API_RATE.set(round(self.rate, 3), api=self.name)
+
+    def on_throttle(self) -> float:
+        """Ответ 429: снижает частоту и приостанавливает выдачу токенов. Возвращает паузу."""
+        with self._lock:
+            self._throttles += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            backoff = min(self.max_backoff, RETRY_BASE_DELAY * (2 ** (self._throttles - 1)))
+            backoff += random.uniform(0, backoff * 0.1)
+            self._blocked_until = max(self._blocked_until, self._clock() + backoff)
+            self._tokens = min(self._tokens, 0.0)
+            GOOGLE_API_RATE.set(round(self.rate, 3), api=self.name)
+        SHEETS_API_RETRIES.inc(api=self.name, reason='rate_limit')
+        log.warning(f"{self.name}: 429 от Google API, частота снижена до {self.rate:.2f} req/s, пауза {backoff:.1f}с")
+        return backoff
+
+    def call(self, func: Callable[..., T], *args, max_attempts: int = 5, tokens: float = 1.0, **kwargs) -> T:
+        """Выполняет запрос под лимитером, повторяя его после ответов 429."""
+        last_error = None
+        for _ in range(max_attempts):
+            self.acquire(tokens)
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    raise
+                last_error = e
+                self.on_throttle()
+                continue
+            self.on_success()
+            return result
+        raise RetryError(f"{self.name}: Failed after {max_attempts} attempts (rate limit)", last_error=last_error)
+
+
+# Лимитеры процесса. Квоты Google по умолчанию — 60 запросов чтения и 60 записи
+# в минуту на пользователя (сервисный аккаунт), Drive — значительно выше.
+SHEETS_READ = AdaptiveRateLimiter('sheets_read', settings.google_sheets_read_rps)
+SHEETS_WRITE = AdaptiveRateLimiter('sheets_write', settings.google_sheets_write_rps)
+DRIVE = AdaptiveRateLimiter('drive', settings.google_drive_rps)
@@ -20,7 +20,8 @@ class SchemaDoctor:
     }
     
     EXPECTED_TABLES = {
-        'ops': {'elt_runs', 'elt_table_stats', 'validation_logs'},
+        'ops': {'elt_runs', 'elt_table_stats', 'elt_spans', 'validation_logs', 'sheet_header_positions', 'elt_checkpoints', 'elt_jobs',
+                'elt_run_daily', 'elt_table_daily', 'elt_error_daily'},
         'raw': {'sheets_dump'},
         'core': {'clients', 'sales', 'schedule', 'expenses'},
         'lookups': {'employees', 'products', 'expense_categories'}
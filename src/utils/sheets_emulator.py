@@ -0,0 +1,436 @@
+"""Локальный эмулятор Google Sheets v4 / Drive v3 для офлайн-тестов и нагрузочных прогонов.
+
+Реализует подмножество API, которое используют экстрактор и экспортер:
+- GET  /v4/spreadsheets/{id}                      — метаданные (листы, размеры сетки);
+- GET  /v4/spreadsheets/{id}/values/{range}       — values.get;
+- GET  /v4/spreadsheets/{id}/values:batchGet      — values.batchGet;
+- PUT  /v4/spreadsheets/{id}/values/{range}       — values.update;
+- POST /v4/spreadsheets/{id}/values/{range}:clear — values.clear;
+- GET  /drive/v3/files/{id}                       — files.get (modifiedTime).
+
+Поддерживает искусственную задержку, случайные 429 и квоту запросов в минуту.
+Пайплайн переключается на эмулятор через `GOOGLE_API_ENDPOINT=http://127.0.0.1:8765`.
+
+Запуск с листами из sources.yml (заголовки по контрактам):
+    python -m src.utils.sheets_emulator --from-sources --rows 50000 --latency-ms 80 --error-rate 0.02
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+CDC_METADATA_COLS = ['record_id', 'content_hash', 'created_at', 'updated_at', 'updated_by']
+
+_CELL = re.compile(r'^([A-Za-z]*)(\d*)$')
+
+
+def column_index(letters: str) -> int:
+    """'A' -> 0, 'Z' -> 25, 'AA' -> 26."""
+    idx = 0
+    for ch in letters.upper():
+        idx = idx * 26 + (ord(ch) - ord('A') + 1)
+    return idx - 1
+
+
+def column_letters(idx: int) -> str:
+    letters = ''
+    idx += 1
+    while idx:
+        idx, rem = divmod(idx - 1, 26)
+        letters = chr(ord('A') + rem) + letters
+    return letters
+
+
+def split_range(range_name: str) -> Tuple[Optional[str], str]:
+    """"'Лист 1'!A1:B" -> ('Лист 1', 'A1:B'); 'A1:B' -> (None, 'A1:B'); 'Лист' -> ('Лист', '')."""
+    if '!' in range_name:
+        title, _, cells = range_name.rpartition('!')
+    elif _CELL.match(range_name.split(':')[0]) and range_name:
+        title, cells = None, range_name
+    else:
+        title, cells = range_name, ''
+    if title and title.startswith("'") and title.endswith("'"):
+        title = title[1:-1].replace("''", "'")
+    return title, cells
+
+
+def parse_cells(cells: str) -> Tuple[int, int, Optional[int], Optional[int]]:
+    """A1-диапазон -> (row0, col0, row_end, col_end), концы включительно; None — до края."""
+    if not cells:
+        return 0, 0, None, None
+    start, _, end = cells.partition(':')
+    start_col, start_row = _CELL.match(start).groups()
+    row0 = int(start_row) - 1 if start_row else 0
+    col0 = column_index(start_col) if start_col else 0
+    if not end:
+        # Одиночная ячейка
+        return row0, col0, (row0 if start_row else None), (col0 if start_col else None)
+    end_col, end_row = _CELL.match(end).groups()
+    return (row0, col0,
+            int(end_row) - 1 if end_row else None,
+            column_index(end_col) if end_col else None)
+
+
+class EmulatedSheet:
+    def __init__(self, gid: int, title: str, rows: List[List[Any]], row_count: int = 0, column_count: int = 0):
+        self.gid = gid
+        self.title = title
+        self.rows = [list(r) for r in rows]
+        self.row_count = max(row_count, len(self.rows), 1000)
+        self.column_count = max(column_count, max((len(r) for r in self.rows), default=0), 26)
+
+    def read(self, cells: str) -> List[List[Any]]:
+        row0, col0, row_end, col_end = parse_cells(cells)
+        stop = len(self.rows) if row_end is None else min(row_end + 1, len(self.rows))
+        values = []
+        for row in self.rows[row0:stop]:
+            part = row[col0:] if col_end is None else row[col0:col_end + 1]
+            # Как и API: пустые ячейки в конце строки не возвращаются
+            while part and part[-1] in ('', None):
+                part = part[:-1]
+            values.append(['' if v is None else str(v) for v in part])
+        # ... и пустые строки в конце диапазона тоже
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+    def write(self, cells: str, values: List[List[Any]]):
+        row0, col0, _, _ = parse_cells(cells)
+        for r_offset, row in enumerate(values):
+            target = row0 + r_offset
+            while len(self.rows) <= target:
+                self.rows.append([])
+            current = self.rows[target]
+            if len(current) < col0 + len(row):
+                current.extend([''] * (col0 + len(row) - len(current)))
+            current[col0:col0 + len(row)] = row
+        self.row_count = max(self.row_count, len(self.rows))
+
+    def clear(self, cells: str):
+        if not cells:
+            self.rows = []
+            return
+        row0, col0, row_end, col_end = parse_cells(cells)
+        stop = len(self.rows) if row_end is None else min(row_end + 1, len(self.rows))
+        for row in self.rows[row0:stop]:
+            end = len(row) if col_end is None else min(col_end + 1, len(row))
+            for i in range(col0, end):
+                row[i] = ''
+
+    def properties(self, index: int) -> Dict[str, Any]:
+        return {
+            'sheetId': self.gid, 'title': self.title, 'index': index, 'sheetType': 'GRID',
+            'gridProperties': {'rowCount': self.row_count, 'columnCount': self.column_count},
+        }
+
+
+class EmulatedSpreadsheet:
+    def __init__(self, spreadsheet_id: str, title: str = ''):
+        self.id = spreadsheet_id
+        self.title = title or spreadsheet_id
+        self.sheets: Dict[int, EmulatedSheet] = {}
+        self.modified_time = datetime.now(timezone.utc)
+
+    def add_sheet(self, sheet: EmulatedSheet) -> EmulatedSheet:
+        self.sheets[sheet.gid] = sheet
+        return sheet
+
+    def sheet_by_title(self, title: Optional[str]) -> Optional[EmulatedSheet]:
+        if title is None:
+            return next(iter(self.sheets.values()), None)
+        return next((s for s in self.sheets.values() if s.title == title), None)
+
+    def touch(self):
+        self.modified_time = max(datetime.now(timezone.utc), self.modified_time + timedelta(milliseconds=1))
+
+
+def generate_rows(headers: List[str], count: int, types: Optional[Dict[str, str]] = None,
+                  seed: int = 0) -> List[List[str]]:
+    """Детерминированные строки данных под заголовки (значения по типам контракта)."""
+    rnd = random.Random(seed)
+    types = types or {}
+    base = datetime(2024, 1, 1)
+    rows = []
+    for i in range(count):
+        row = []
+        for col in headers:
+            kind = types.get(col, 'string')
+            if col == 'record_id':
+                row.append(f"r{seed}-{i}")
+            elif col in ('created_at', 'updated_at'):
+                row.append((base + timedelta(minutes=i)).strftime('%d.%m.%Y %H:%M:%S'))
+            elif col == 'content_hash':
+                row.append(f"{rnd.getrandbits(64):016x}")
+            elif kind == 'date':
+                row.append((base + timedelta(days=i % 700)).strftime('%d.%m.%Y'))
+            elif kind in ('money', 'numeric'):
+                row.append(f"{rnd.randint(100, 100000) / 100:.2f}")
+            elif kind == 'integer':
+                row.append(str(rnd.randint(1, 50)))
+            elif kind == 'time':
+                row.append(f"{rnd.randint(8, 21):02d}:{rnd.choice(('00', '30'))}")
+            elif kind == 'boolean':
+                row.append(rnd.choice(('TRUE', 'FALSE')))
+            else:
+                row.append(f"{col}_{i % 997}")
+        rows.append(row)
+    return rows
+
+
+def generated_sheet(gid: int, title: str, headers: List[str], rows: int, types: Optional[Dict[str, str]] = None,
+                    cdc: bool = False, header_row: int = 1, seed: int = 0) -> EmulatedSheet:
+    """Лист с заголовком в `header_row` и `rows` строками данных.
+
+    cdc=True добавляет CDC-колонки и служебную строку над заголовком (как в
+    листах с range: auto).
+    """
+    headers = list(headers) + ([c for c in CDC_METADATA_COLS if c not in headers] if cdc else [])
+    prefix = [[] for _ in range(header_row - 1)]
+    if cdc and header_row > 1:
+        prefix[0] = [f"{title}: служебная строка"]
+    data = generate_rows(headers, rows, types, seed)
+    return EmulatedSheet(gid, title, prefix + [headers] + data)
+
+
+def spreadsheets_from_sources(sources: Dict[str, Any], rows: int,
+                              contracts_dir: Optional[Path] = None) -> List[EmulatedSpreadsheet]:
+    """Таблицы и листы по sources.yml; заголовки и типы — из JSON-контрактов."""
+    from src.etl.staging_types import contract_name_for
+
+    contracts_dir = contracts_dir or Path(__file__).resolve().parent.parent / 'contracts'
+    result = []
+    for seed, (ssid, sdata) in enumerate(sources.get('spreadsheets', {}).items()):
+        book = EmulatedSpreadsheet(ssid, sdata.get('name', ssid))
+        for sheet_cfg in sdata.get('sheets', []):
+            target_table = sheet_cfg['target_table']
+            contract_path = contracts_dir / f"{contract_name_for(target_table)}.json"
+            if contract_path.exists():
+                columns = json.loads(contract_path.read_text(encoding='utf-8')).get('columns', [])
+                headers = [c['name'] for c in columns]
+                types = {c['name']: c.get('type', 'string') for c in columns}
+            else:
+                headers, types = [f"col_{i + 1}" for i in range(10)], {}
+            range_name = str(sheet_cfg.get('range', 'A:Z'))
+            cdc = range_name.lower() == 'auto'
+            header_row = 3 if cdc else (parse_cells(range_name)[0] + 1)
+            gid = int(sheet_cfg.get('gid', 0))
+            book.add_sheet(generated_sheet(gid, target_table.split('.')[-1], headers, rows, types,
+                                           cdc=cdc, header_row=header_row, seed=seed * 1000 + gid % 1000))
+        result.append(book)
+    return result
+
+
+class SheetsEmulator:
+    """HTTP-сервер эмулятора. `start()` поднимает его в фоновом потоке."""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency_ms: float = 0.0,
+                 error_rate: float = 0.0, quota_per_minute: Optional[int] = None, seed: int = 0):
+        self.host = host
+        self.port = port
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.quota_per_minute = quota_per_minute
+        self.spreadsheets: Dict[str, EmulatedSpreadsheet] = {}
+        self.stats: Dict[str, int] = {}
+        self._random = random.Random(seed)
+        self._recent: deque = deque()
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def add_spreadsheet(self, spreadsheet: EmulatedSpreadsheet) -> EmulatedSpreadsheet:
+        self.spreadsheets[spreadsheet.id] = spreadsheet
+        return spreadsheet
+
+    def start(self) -> 'SheetsEmulator':
+        self._server = ThreadingHTTPServer((self.host, self.port), _make_handler(self))
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name='sheets-emulator', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _throttled(self) -> bool:
+        """Решает, ответить ли 429: по квоте в минуту или случайно."""
+        with self._lock:
+            now = time.monotonic()
+            if self.quota_per_minute:
+                while self._recent and now - self._recent[0] > 60:
+                    self._recent.popleft()
+                if len(self._recent) >= self.quota_per_minute:
+                    return True
+                self._recent.append(now)
+            return self.error_rate > 0 and self._random.random() < self.error_rate
+
+    def _count(self, op: str):
+        with self._lock:
+            self.stats[op] = self.stats.get(op, 0) + 1
+
+    def handle(self, method: str, raw_path: str, body: Optional[dict]) -> Tuple[int, dict]:
+        """Маршрутизация запроса: (HTTP-статус, JSON-ответ)."""
+        parts = urlsplit(raw_path)
+        path, query = parts.path, parse_qs(parts.query)
+
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        if self._throttled():
+            self._count('429')
+            return 429, _error(429, 'Quota exceeded for quota metric (emulated)', 'RESOURCE_EXHAUSTED')
+
+        match = re.match(r'^/drive/v3/files/([^/]+)$', path)
+        if match and method == 'GET':
+            book = self.spreadsheets.get(unquote(match.group(1)))
+            if not book:
+                return 404, _error(404, 'File not found', 'NOT_FOUND')
+            self._count('files.get')
+            return 200, {'id': book.id, 'modifiedTime': book.modified_time.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'}
+
+        match = re.match(r'^/v4/spreadsheets/([^/:]+)(.*)$', path)
+        if not match:
+            return 404, _error(404, f'Unknown path {path}', 'NOT_FOUND')
+        book = self.spreadsheets.get(unquote(match.group(1)))
+        if not book:
+            return 404, _error(404, 'Requested entity was not found.', 'NOT_FOUND')
+        rest = match.group(2)
+
+        if rest == '' and method == 'GET':
+            self._count('metadata')
+            return 200, {
+                'spreadsheetId': book.id,
+                'properties': {'title': book.title, 'locale': 'ru_RU', 'timeZone': 'Europe/Moscow'},
+                'sheets': [{'properties': s.properties(i)} for i, s in enumerate(book.sheets.values())],
+            }
+
+        if rest == '/values:batchGet' and method == 'GET':
+            self._count('values.batchGet')
+            value_ranges = [self._value_range(book, r) for r in query.get('ranges', [])]
+            if any(vr is None for vr in value_ranges):
+                return 400, _error(400, 'Unable to parse range', 'INVALID_ARGUMENT')
+            return 200, {'spreadsheetId': book.id, 'valueRanges': value_ranges}
+
+        match = re.match(r'^/values/(.+?)(:clear)?$', rest)
+        if match:
+            range_name = unquote(match.group(1))
+            title, cells = split_range(range_name)
+            sheet = book.sheet_by_title(title)
+            if sheet is None:
+                return 400, _error(400, f'Unable to parse range: {range_name}', 'INVALID_ARGUMENT')
+            if match.group(2) and method == 'POST':
+                self._count('values.clear')
+                sheet.clear(cells)
+                book.touch()
+                return 200, {'spreadsheetId': book.id, 'clearedRange': range_name}
+            if method == 'GET':
+                self._count('values.get')
+                return 200, self._value_range(book, range_name)
+            if method == 'PUT':
+                self._count('values.update')
+                values = (body or {}).get('values', [])
+                sheet.write(cells, values)
+                book.touch()
+                return 200, {
+                    'spreadsheetId': book.id, 'updatedRange': range_name,
+                    'updatedRows': len(values), 'updatedColumns': max((len(r) for r in values), default=0),
+                    'updatedCells': sum(len(r) for r in values),
+                }
+
+        return 404, _error(404, f'Unsupported call {method} {path}', 'NOT_FOUND')
+
+    @staticmethod
+    def _value_range(book: EmulatedSpreadsheet, range_name: str) -> Optional[dict]:
+        title, cells = split_range(range_name)
+        sheet = book.sheet_by_title(title)
+        if sheet is None:
+            return None
+        response = {'range': range_name, 'majorDimension': 'ROWS'}
+        values = sheet.read(cells)
+        if values:
+            response['values'] = values
+        return response
+
+
+def _error(code: int, message: str, status: str) -> dict:
+    return {'error': {'code': code, 'message': message, 'status': status}}
+
+
+def _make_handler(emulator: SheetsEmulator):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _dispatch(self, method: str):
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or b'{}') if length else None
+            status, payload = emulator.handle(method, self.path, body)
+            data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=UTF-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self._dispatch('GET')
+
+        def do_PUT(self):
+            self._dispatch('PUT')
+
+        def do_POST(self):
+            self._dispatch('POST')
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local Google Sheets / Drive emulator')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--from-sources', action='store_true', help='Сгенерировать листы по sources.yml и контрактам')
+    parser.add_argument('--rows', type=int, default=1000, help='Строк данных в каждом листе')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Задержка каждого ответа')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Доля случайных ответов 429')
+    parser.add_argument('--quota-per-minute', type=int, default=None, help='Квота запросов в минуту (сверх — 429)')
+    args = parser.parse_args()
+
+    emulator = SheetsEmulator(args.host, args.port, args.latency_ms, args.error_rate, args.quota_per_minute)
+    if args.from_sources:
+        from src.config.settings import settings
+        for book in spreadsheets_from_sources(settings.sources, args.rows):
+            emulator.add_spreadsheet(book)
+    emulator.start()
+    print(f"Sheets emulator: {emulator.url} ({len(emulator.spreadsheets)} spreadsheets)")
+    print(f"Запуск пайплайна против эмулятора: GOOGLE_API_ENDPOINT={emulator.url} python src/main.py")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        emulator.stop()
+
+
+if __name__ == '__main__':
+    main()
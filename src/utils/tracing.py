@@ -0,0 +1,176 @@
+"""Span-based инструментирование этапов пайплайна.
+
+Каждый этап (extract, validate, load, transform, export, ...) оборачивается в
+span: контекстный менеджер `span(...)` или декоратор `@traced(...)`. Спаны
+накапливаются в памяти процесса и сохраняются одной bulk-записью в
+`ops.elt_spans` в конце запуска (`tracer.flush(run_id)`).
+"""
+import contextvars
+import itertools
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional
+
+log = logging.getLogger('tracing')
+
+# Текущий (родительский) span для вложенных вызовов; contextvars корректно
+# разделяют состояние между asyncio-задачами.
+_current_span: contextvars.ContextVar[Optional['Span']] = contextvars.ContextVar('current_span', default=None)
+
+
+class Span:
+    """Один измеренный интервал выполнения."""
+
+    __slots__ = ('span_id', 'parent_id', 'name', 'table', 'started_at', 'duration_ms', 'status', 'attrs', '_t0')
+
+    def __init__(self, span_id: int, name: str, table: Optional[str] = None,
+                 parent_id: Optional[int] = None, attrs: Optional[Dict[str, Any]] = None):
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.table = table
+        self.started_at = datetime.now(timezone.utc)
+        self.duration_ms: Optional[float] = None
+        self.status = 'ok'
+        self.attrs = attrs or {}
+        self._t0 = time.perf_counter()
+
+    @property
+    def is_root(self) -> bool:
+        return self.parent_id is None
+
+
+class SpanRecorder:
+    """Сборщик спанов одного запуска пайплайна."""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        # Спаны создаются и в потоках asyncio.to_thread (extract.fetch / extract.headers)
+        # одновременно с циклом событий: next() у count атомарен, список — под блокировкой
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        # Наблюдатели (профилировщик, метрики) получают уведомления о начале/конце спанов
+        self._observers: List[Any] = []
+
+    def reset(self):
+        """Очищает накопленные спаны (начало нового запуска)."""
+        with self._lock:
+            self.spans = []
+            self._ids = itertools.count(1)
+
+    def add_observer(self, observer: Any):
+        """Регистрирует наблюдателя с методами on_span_start(span) / on_span_end(span)."""
+        if observer not in self._observers:
+            self._observers.append(observer)
+
+    def remove_observer(self, observer: Any):
+        if observer in self._observers:
+            self._observers.remove(observer)
+
+    @contextmanager
+    def span(self, name: str, table: Optional[str] = None, **attrs):
+        """Измеряет время выполнения блока. Таблица наследуется от родителя."""
+        parent = _current_span.get()
+        if table is None and parent is not None:
+            table = parent.table
+
+        current = Span(next(self._ids), name, table, parent.span_id if parent else None, attrs)
+        token = _current_span.set(current)
+        self._notify('on_span_start', current)
+        try:
+            yield current
+        except BaseException:
+            current.status = 'error'
+            raise
+        finally:
+            current.duration_ms = (time.perf_counter() - current._t0) * 1000
+            _current_span.reset(token)
+            with self._lock:
+                self.spans.append(current)
+            self._notify('on_span_end', current)
+
+    def detach(self, root: Span) -> List[Span]:
+        """Извлекает из сборщика завершенный span `root` и всех его потомков.
+
+        Для долгоживущих процессов без сброса между запусками (воркер очереди,
+        прием правок): поддерево одного задания сохраняется или отбрасывается
+        отдельно, остальные спаны (параллельные задания) остаются.
+        """
+        ids = {root.span_id}
+        taken = []
+        with self._lock:
+            # Родитель всегда получает id раньше потомков
+            for s in sorted(self.spans, key=lambda s: s.span_id):
+                if s.span_id in ids or s.parent_id in ids:
+                    ids.add(s.span_id)
+                    taken.append(s)
+            self.spans = [s for s in self.spans if s.span_id not in ids]
+        return taken
+
+    def _notify(self, method: str, span: Span):
+        for observer in self._observers:
+            try:
+                getattr(observer, method)(span)
+            except Exception as e:
+                log.debug(f"Наблюдатель {observer!r} упал на {method}: {e}")
+
+    def summary(self) -> Dict[str, float]:
+        """Суммарная длительность (мс) по имени спана."""
+        totals: Dict[str, float] = {}
+        for s in self.spans:
+            totals[s.name] = totals.get(s.name, 0.0) + (s.duration_ms or 0.0)
+        return totals
+
+    async def flush(self, run_id: Any, spans: Optional[List[Span]] = None) -> int:
+        """Сохраняет спаны запуска (по умолчанию все) в ops.elt_spans одной COPY-операцией."""
+        spans = self.spans if spans is None else spans
+        if not spans:
+            return 0
+
+        from src.db.connection import DBConnection
+        from src.config.settings import settings
+
+        records = [
+            (str(run_id), s.span_id, s.parent_id, s.name, s.table, s.started_at,
+             round(s.duration_ms or 0.0, 3), s.status,
+             json.dumps(s.attrs, ensure_ascii=False, default=str) if s.attrs else None)
+            for s in sorted(spans, key=lambda s: s.span_id)
+        ]
+        try:
+            async with await DBConnection.get_connection() as conn:
+                await conn.copy_records_to_table(
+                    'elt_spans',
+                    schema_name=settings.schema_ops,
+                    records=records,
+                    columns=['run_id', 'span_id', 'parent_id', 'name', 'table_name',
+                             'started_at', 'duration_ms', 'status', 'attrs']
+                )
+            return len(records)
+        except Exception as e:
+            log.warning(f"Не удалось сохранить спаны запуска {run_id}: {e}")
+            return 0
+
+
+# Общий сборщик процесса
+tracer = SpanRecorder()
+
+
+def span(name: str, table: Optional[str] = None, **attrs):
+    """Сокращение для tracer.span(...)."""
+    return tracer.span(name, table, **attrs)
+
+
+def traced(name: str):
+    """Декоратор для async-функций: оборачивает вызов в span `name`."""
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -4,7 +4,11 @@ import os
 # Добавляем корень проекта в путь
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from src.etl.cdc_processor import CDCProcessor
+from unittest.mock import AsyncMock, MagicMock, patch
+import pytest
+from src.etl.cdc_processor import CDCChange, CDCProcessor, compute_column_hashes, changed_columns, merge_changes, compute_row_hash
+from src.config.settings import settings
+from src.etl.loader import DataLoader
 
 def test_cdc_processor_logic():
     # Исходное состояние: {pk: hash}
@@ -43,6 +47,123 @@ def test_cdc_processor_logic():
     assert proc_del.get_stats()['deleted'] == 1
     assert proc_del.to_delete == ["99"]
 
+def test_changed_columns_compares_per_column_hashes():
+    cols = ["id", "name", "phone"]
+    old = compute_column_hashes(["1", "Anna", "100"], cols)
+    new = compute_column_hashes(["1", "Anna ", "200"], cols)
+    # Нормализация значения как у row_hash: пробелы по краям не считаются изменением
+    assert changed_columns(old, new, cols) == ["phone"]
+    # Нет старых хешей или другой набор колонок — сравнить нельзя
+    assert changed_columns(None, new, cols) is None
+    assert changed_columns(compute_column_hashes(["1", "Anna", "100"], ["id", "phone", "name"]), new, cols) is None
+
+
+def test_processor_reports_changed_columns_and_churn():
+    cols = ["id", "name", "phone"]
+    existing_cols = {
+        "1": compute_column_hashes(["1", "Anna", "100"], cols),
+        "2": compute_column_hashes(["2", "Boris", "300"], cols),
+    }
+    processor = CDCProcessor({"1": "h1", "2": "h2", "3": "h3"}, existing_cols, cols)
+    processor.process_row("1", "h1-new", {"id": "1"}, compute_column_hashes(["1", "Anna", "200"], cols))
+    processor.process_row("2", "h2-new", {"id": "2"}, compute_column_hashes(["2", "Bob", "301"], cols))
+    # Строка без сохраненных хешей обновляется целиком
+    processor.process_row("3", "h3-new", {"id": "3"}, compute_column_hashes(["3", "Vera", "1"], cols))
+
+    assert [item.columns for item in processor.to_update] == [["phone"], ["name", "phone"], None]
+    assert processor.column_changes == {"phone": 2, "name": 1}
+
+
+@pytest.mark.asyncio
+async def test_update_writes_only_changed_columns_grouped_by_column_set():
+    loader = DataLoader()
+    cols = ["id", "name", "phone", "city"]
+    processor = CDCProcessor({}, {}, cols)
+    for pk, columns in (("1", ["phone"]), ("2", ["name", "phone"]), ("3", ["phone"]), ("4", None)):
+        processor.to_update.append(
+            CDCChange(pk, f"h{pk}", [pk, f"n{pk}", f"p{pk}", f"g{pk}"], col_hashes=f"c{pk}", columns=columns)
+        )
+
+    conn = MagicMock()
+    conn.transaction = MagicMock(return_value=MagicMock(__aenter__=AsyncMock(), __aexit__=AsyncMock(return_value=False)))
+    conn_cm = MagicMock(__aenter__=AsyncMock(return_value=conn), __aexit__=AsyncMock(return_value=False))
+    execute_many = AsyncMock()
+    with patch("src.etl.loader.DBConnection.get_connection", AsyncMock(return_value=conn_cm)), \
+         patch("src.etl.loader.DBConnection.execute_many", execute_many):
+        await loader._apply_cdc_changes("stg.clients", processor, cols, "id", column_hashes=True)
+
+    assert [c.args[1:] for c in execute_many.await_args_list] == [
+        ('UPDATE "stg"."clients" SET "phone" = $1, "__row_hash" = $2, "__col_hashes" = $3 WHERE "id" = $4',
+         [["p1", "h1", "c1", "1"], ["p3", "h3", "c3", "3"]]),
+        ('UPDATE "stg"."clients" SET "name" = $1, "phone" = $2, "__row_hash" = $3, "__col_hashes" = $4 WHERE "id" = $5',
+         [["n2", "p2", "h2", "c2", "2"]]),
+        ('UPDATE "stg"."clients" SET "name" = $1, "phone" = $2, "city" = $3, "__row_hash" = $4, "__col_hashes" = $5 '
+         'WHERE "id" = $6',
+         [["n4", "p4", "g4", "h4", "c4", "4"]]),
+    ]
+
+
+async def _aiter(items):
+    for item in items:
+        yield item
+
+
+@pytest.mark.asyncio
+async def test_merge_changes_matches_dict_processor():
+    source = [("1", "h1"), ("3", "h3-new"), ("3", "h3-dup"), ("5", "h5"), ("7", "h7")]
+    existing = [("0", "x"), ("1", "h1"), ("2", "h2"), ("3", "h3"), ("3", "h3-old-dup"), ("6", "h6")]
+
+    actions = [(action, (item or current)[0]) async for action, item, current in merge_changes(source, _aiter(existing))]
+
+    assert actions == [
+        ("delete", "0"), ("unchanged", "1"), ("delete", "2"), ("update", "3"), ("insert", "3"),
+        ("insert", "5"), ("delete", "6"), ("insert", "7"),
+    ]
+    processor = CDCProcessor(dict(reversed(existing)))
+    for pk, row_hash in source:
+        processor.process_row(pk, row_hash, {})
+    processor.finalize()
+    stats = {"insert": 0, "update": 0, "delete": 0, "unchanged": 0}
+    for action, _ in actions:
+        stats[action] += 1
+    assert processor.get_stats() == {
+        "inserted": stats["insert"], "updated": stats["update"], "deleted": stats["delete"], "unchanged": stats["unchanged"]
+    }
+
+
+@pytest.mark.asyncio
+async def test_large_sheet_uses_sorted_merge_and_writes_in_batches():
+    loader = DataLoader()
+    cols = ["id", "name"]
+    db_rows = [{"pk": pk, "__row_hash": compute_row_hash([pk, name])} for pk, name in (("10", "a"), ("2", "b"), ("3", "c"))]
+    db_rows.sort(key=lambda row: row["pk"])
+    read_conn, write_conn = MagicMock(), MagicMock()
+    read_conn.cursor = MagicMock(return_value=_aiter(db_rows))
+    for conn in (read_conn, write_conn):
+        conn.transaction = MagicMock(return_value=MagicMock(__aenter__=AsyncMock(), __aexit__=AsyncMock(return_value=False)))
+    copied = []
+    write_conn.copy_records_to_table = AsyncMock(side_effect=lambda *a, records, **kw: copied.extend(records))
+    write_conn.execute = AsyncMock()
+    acquires = iter([read_conn, write_conn])
+    get_connection = AsyncMock(side_effect=lambda: MagicMock(
+        __aenter__=AsyncMock(return_value=next(acquires)), __aexit__=AsyncMock(return_value=False)))
+    execute_many = AsyncMock()
+    fetch_hashes = AsyncMock()
+
+    with patch.object(settings, "sorted_merge_cdc_min_rows", 3), \
+         patch("src.etl.loader.DBConnection.get_connection", get_connection), \
+         patch("src.etl.loader.DBConnection.execute_many", execute_many), \
+         patch.object(loader, "_fetch_existing_hashes", fetch_hashes):
+        stats = await loader.load_cdc("stg.clients", cols, [["3", "c2"], ["10", "a"], ["4", "d"]], "id", row_count=3)
+
+    assert stats == {"inserted": 1, "updated": 1, "deleted": 1, "unchanged": 1}
+    fetch_hashes.assert_not_awaited()
+    assert 'ORDER BY 1 COLLATE "C"' in read_conn.cursor.call_args.args[0]
+    assert [r[:3] for r in copied] == [("4", "d", 4)]
+    assert execute_many.await_args.args[2] == [["c2", compute_row_hash(["3", "c2"]), "3"]]
+    write_conn.execute.assert_awaited_once_with('DELETE FROM "stg"."clients" WHERE "id" = ANY($1::text[])', ["2"])
+
+
 if __name__ == "__main__":
     try:
         test_cdc_processor_logic()
@@ -0,0 +1,48 @@
+import pytest
+from contextlib import nullcontext
+from unittest.mock import AsyncMock, patch
+from src.db.connection import DBConnection
+from src.etl.checkpoints import RunCheckpoints, content_hash
+from src.etl.transformer import Transformer
+
+
+def test_content_hash_depends_on_headers_and_cells():
+    base = content_hash(['a', 'b'], [['1', '2']])
+    assert base == content_hash(['a', 'b'], [['1', '2']])
+    assert base != content_hash(['a', 'c'], [['1', '2']])
+    assert base != content_hash(['a', 'b'], [['1', '2'], []])
+    # Разбиение на ячейки важно: '12' + '' не то же самое, что '1' + '2'
+    assert base != content_hash(['a', 'b'], [['12', '']])
+
+
+@pytest.mark.asyncio
+async def test_checkpoints_load_mark_and_reset():
+    checkpoints = RunCheckpoints('00000000-0000-0000-0000-000000000001')
+    rows = [{'phase': 'load', 'step': 'stg_gsheets.sales_hst', 'content_hash': 'abc'}]
+    with patch('src.etl.checkpoints.DBConnection.fetch', AsyncMock(return_value=rows)), \
+         patch('src.etl.checkpoints.DBConnection.execute', AsyncMock()) as execute:
+        assert await checkpoints.load() == 1
+        assert checkpoints.is_done('load', 'stg_gsheets.sales_hst')
+
+        await checkpoints.mark('transform', 'transform_clients.sql')
+        assert checkpoints.done_steps('transform') == ['transform_clients.sql']
+
+        await checkpoints.reset_phase('transform')
+        assert not checkpoints.is_done('transform', 'transform_clients.sql')
+        assert checkpoints.is_done('load', 'stg_gsheets.sales_hst')
+        assert 'DELETE' in execute.call_args_list[-1][0][0]
+
+
+@pytest.mark.asyncio
+async def test_transformer_skips_completed_scripts():
+    checkpoints = RunCheckpoints('00000000-0000-0000-0000-000000000002')
+    checkpoints._done = {('transform', 'transform_clients.sql'): None, ('transform', 'transform_schedule.sql'): None}
+    with patch('src.db.connection.DBConnection.execute', AsyncMock()) as execute, \
+         patch('src.etl.transformer.advisory_lock', lambda *names: nullcontext(DBConnection)):
+        success, _ = await Transformer().run(checkpoints=checkpoints)
+
+    assert success == 4
+    # Выполнены только оставшиеся скрипты: sales, витрина и cleanup (+ их чекпоинты)
+    scripts = [c for c in execute.await_args_list if 'elt_checkpoints' not in c.args[0]]
+    assert len(scripts) == 3
+    assert checkpoints.is_done('transform', 'cleanup.sql')
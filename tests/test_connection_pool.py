@@ -0,0 +1,100 @@
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+from src.config.settings import settings
+from src.db.connection import DBConnection
+from src.utils.metrics import DB_QUERY_DURATION
+
+POOLER_DSN = "postgresql://u:p@aws-0-eu.pooler.supabase.com:6543/postgres"
+SESSION_DSN = "postgresql://u:p@aws-0-eu.pooler.supabase.com:5432/postgres"
+DIRECT_DSN = "postgresql://u:p@db.abc.supabase.co:5432/postgres"
+
+
+@pytest.fixture(autouse=True)
+def reset_mode():
+    DBConnection._pool_mode = None
+    yield
+    DBConnection._pool_mode = None
+
+
+def _patch(**overrides):
+    values = {'supabase_db_url': POOLER_DSN, 'supabase_direct_db_url': None,
+              'db_use_direct': False, 'db_pool_mode': 'auto', 'db_work_mem': '64MB',
+              'db_statement_timeout': '10min'}
+    values.update(overrides)
+    return patch.multiple(settings, **values)
+
+
+def test_transaction_pooler_disables_statement_cache():
+    with _patch():
+        assert DBConnection.pool_mode() == 'transaction'
+        kwargs = DBConnection._pool_kwargs()
+    assert kwargs['statement_cache_size'] == 0
+    # Через PgBouncer передаем только application_name
+    assert kwargs['server_settings'] == {'application_name': settings.db_application_name}
+    assert kwargs['max_size'] == DBConnection.pool_max_size()
+
+
+def test_pool_is_sized_by_concurrency():
+    with patch.multiple(settings, db_pool_max_size=None, replay_concurrency=4, worker_concurrency=8):
+        assert DBConnection.pool_max_size() == 8 * 3 + 2
+    with patch.multiple(settings, db_pool_max_size=None, replay_concurrency=2, worker_concurrency=2):
+        assert DBConnection.pool_max_size() == 15
+    with patch.multiple(settings, db_pool_max_size=6, replay_concurrency=4, worker_concurrency=2):
+        assert DBConnection.pool_max_size() == 6
+
+
+def test_pgbouncer_query_param_detected():
+    with _patch(supabase_db_url=SESSION_DSN + "?pgbouncer=true"):
+        assert DBConnection.uses_transaction_pooling()
+
+
+def test_session_mode_enables_cache_and_session_settings():
+    with _patch(supabase_db_url=SESSION_DSN):
+        assert DBConnection.pool_mode() == 'session'
+        kwargs = DBConnection._pool_kwargs()
+    assert kwargs['statement_cache_size'] == settings.db_statement_cache_size
+    assert kwargs['server_settings']['work_mem'] == '64MB'
+    assert kwargs['server_settings']['statement_timeout'] == '10min'
+
+
+def test_direct_dsn_selection():
+    with _patch(supabase_direct_db_url=DIRECT_DSN, db_use_direct=True):
+        assert DBConnection.dsn() == DIRECT_DSN
+        assert DBConnection.pool_mode() == 'session'
+
+
+def test_explicit_mode_overrides_detection():
+    with _patch(supabase_db_url=SESSION_DSN, db_pool_mode='transaction'):
+        assert DBConnection.uses_transaction_pooling()
+
+
+def test_query_logger_observes_duration():
+    DB_QUERY_DURATION.reset()
+    record = MagicMock(elapsed=0.02, query="SELECT 1")
+    DBConnection._log_query(record)
+    assert DB_QUERY_DURATION.count() == 1
+
+
+@pytest.mark.asyncio
+async def test_execute_many_uses_prepared_statement_in_session_mode():
+    conn = MagicMock()
+    stmt = MagicMock(executemany=AsyncMock())
+    conn.prepare = AsyncMock(return_value=stmt)
+    conn.execute = AsyncMock()
+    with _patch(supabase_db_url=SESSION_DSN):
+        n = await DBConnection.execute_many(conn, "UPDATE t SET a = $1 WHERE id = $2", [('x', '1'), ('y', '2')])
+    assert n == 2
+    conn.prepare.assert_awaited_once()
+    stmt.executemany.assert_awaited_once_with([('x', '1'), ('y', '2')])
+    conn.execute.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_execute_many_falls_back_to_per_row_under_pgbouncer():
+    conn = MagicMock()
+    conn.prepare = AsyncMock()
+    conn.execute = AsyncMock()
+    with _patch():
+        await DBConnection.execute_many(conn, "UPDATE t SET a = $1 WHERE id = $2", [('x', '1'), ('y', '2')])
+    conn.prepare.assert_not_awaited()
+    assert conn.execute.await_count == 2
@@ -0,0 +1,130 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.etl.daemon import SchedulerDaemon, SheetSchedule, build_schedules, parse_interval
+from src.etl.pipeline import table_category
+
+NOW = datetime(2026, 3, 2, 12, 0, tzinfo=timezone.utc)
+
+SOURCES = {'spreadsheets': {
+    'hst_book': {'sheets': [{'target_table': 'stg_gsheets.sales_hst'}]},
+    'cur_book': {'refresh_interval': '10m', 'sheets': [
+        {'target_table': 'stg_gsheets.sales_cur'},
+        {'target_table': 'stg_gsheets.clients_cur', 'refresh_interval': 90},
+    ]},
+    'ref_book': {'sheets': [{'target_table': 'stg_gsheets.price_reference'}]},
+}}
+
+
+def test_parse_interval_units():
+    assert parse_interval('30s') == 30
+    assert parse_interval('5m') == 300
+    assert parse_interval('2h') == 7200
+    assert parse_interval('1d') == 86400
+    assert parse_interval('1w') == 604800
+    assert parse_interval(45) == 45
+    assert parse_interval('120') == 120
+    for bad in ('soon', '0m', '-5m'):
+        with pytest.raises(ValueError):
+            parse_interval(bad)
+
+
+def test_table_category():
+    assert table_category('stg_gsheets.sales_hst') == 'hst'
+    assert table_category('stg_gsheets.price_reference') == 'ref'
+    assert table_category('stg_gsheets.sales_cur') == 'cur'
+
+
+def test_build_schedules_intervals_and_scope():
+    intervals = {s.target_table: s.interval for s in build_schedules(SOURCES)}
+    assert intervals == {
+        'stg_gsheets.sales_hst': 86400,          # категория по умолчанию
+        'stg_gsheets.sales_cur': 600,            # refresh_interval таблицы
+        'stg_gsheets.clients_cur': 90,           # refresh_interval листа
+        'stg_gsheets.price_reference': 604800,
+    }
+    current = {s.target_table for s in build_schedules(SOURCES, 'current')}
+    assert current == {'stg_gsheets.sales_cur', 'stg_gsheets.clients_cur'}
+
+
+def make_daemon(modified_times):
+    with patch('src.etl.daemon.settings') as mock_settings:
+        mock_settings.sources = SOURCES
+        mock_settings.daemon_interval_cur = '5m'
+        mock_settings.daemon_interval_hst = '1d'
+        mock_settings.daemon_interval_ref = '7d'
+        daemon = SchedulerDaemon(clock=lambda: NOW)
+    daemon.extractor = MagicMock()
+    daemon.extractor.get_modified_time.side_effect = lambda ssid: modified_times.get(ssid)
+    return daemon
+
+
+@pytest.mark.asyncio
+async def test_tick_pulls_only_due_and_modified_sheets():
+    daemon = make_daemon({
+        'cur_book': NOW - timedelta(minutes=1),
+        'hst_book': NOW - timedelta(days=3),
+    })
+    schedules = {s.target_table: s for s in daemon.schedules}
+    # sales_cur и sales_hst пора обновлять; справочник — еще нет
+    for table in ('stg_gsheets.sales_cur', 'stg_gsheets.sales_hst'):
+        schedules[table].last_pulled = NOW - timedelta(days=2)
+        schedules[table].next_due = NOW - timedelta(seconds=1)
+    schedules['stg_gsheets.clients_cur'].last_pulled = NOW - timedelta(minutes=5)
+    schedules['stg_gsheets.clients_cur'].next_due = NOW
+    schedules['stg_gsheets.price_reference'].next_due = NOW + timedelta(days=1)
+
+    pipeline = MagicMock()
+    pipeline.run = AsyncMock()
+    pipeline.checkpoints.done_steps.return_value = ['stg_gsheets.sales_cur', 'stg_gsheets.clients_cur']
+    with patch('src.etl.daemon.ELTPipeline', return_value=pipeline):
+        await daemon.tick()
+
+    # modifiedTime запрашивается один раз на spreadsheet
+    polled = [c.args[0] for c in daemon.extractor.get_modified_time.call_args_list]
+    assert sorted(polled) == ['cur_book', 'hst_book']
+    assert pipeline.run.call_args.kwargs['tables'] == {'stg_gsheets.sales_cur', 'stg_gsheets.clients_cur'}
+
+    assert schedules['stg_gsheets.sales_cur'].last_pulled == NOW
+    assert schedules['stg_gsheets.sales_cur'].next_due == NOW + timedelta(minutes=10)
+    # Неизмененный лист переносится на следующий интервал без загрузки
+    assert schedules['stg_gsheets.sales_hst'].last_pulled == NOW - timedelta(days=2)
+    assert schedules['stg_gsheets.sales_hst'].next_due == NOW + timedelta(days=1)
+
+
+@pytest.mark.asyncio
+async def test_failed_sheet_is_retried_sooner():
+    daemon = make_daemon({})
+    pipeline = MagicMock()
+    pipeline.run = AsyncMock(side_effect=RuntimeError('boom'))
+    pipeline.checkpoints.done_steps.return_value = []
+
+    with patch('src.etl.daemon.ELTPipeline', return_value=pipeline), \
+         patch('src.etl.daemon.settings') as mock_settings:
+        mock_settings.daemon_retry_seconds = 60
+        await daemon.tick()
+
+    # Без modifiedTime и истории загружаются все листы
+    assert pipeline.run.call_args.kwargs['tables'] == {s.target_table for s in daemon.schedules}
+    hst = next(s for s in daemon.schedules if s.target_table == 'stg_gsheets.sales_hst')
+    assert hst.last_pulled is None
+    assert hst.next_due == NOW + timedelta(seconds=60)
+
+
+@pytest.mark.asyncio
+async def test_seed_from_history_defers_recently_loaded_sheets():
+    daemon = make_daemon({})
+    rows = [{'table_name': 'stg_gsheets.sales_hst', 'last_pulled': NOW - timedelta(hours=2)}]
+    with patch('src.etl.daemon.DBConnection.fetch', AsyncMock(return_value=rows)):
+        await daemon._seed_from_history()
+
+    due = {s.target_table for s in daemon.due(NOW)}
+    assert 'stg_gsheets.sales_hst' not in due
+    assert 'stg_gsheets.sales_cur' in due
+
+
+def test_schedule_is_due_without_history():
+    schedule = SheetSchedule('ssid', 'stg_gsheets.sales_cur', 300)
+    assert schedule.is_due(NOW)
+    schedule.reschedule(NOW)
+    assert not schedule.is_due(NOW + timedelta(seconds=299))
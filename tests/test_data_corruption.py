@@ -1,6 +1,8 @@
 import sys
 from pathlib import Path
 import asyncio
+from contextlib import nullcontext
+from unittest.mock import patch
 import pytest
 
 # Add project root to path
@@ -71,7 +73,8 @@ async def test_data_corruption_fix():
         'pk': 'name'
     }
     
-    result = await processor.process_table("scope_id", sheet_cfg, full_refresh=False, dry_run=False)
+    with patch('src.etl.processor.advisory_lock', lambda name: nullcontext()):
+        result = await processor.process_table("scope_id", sheet_cfg, full_refresh=False, dry_run=False)
     
     # Проверка
     call = loader.last_load_call
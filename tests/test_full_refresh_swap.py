@@ -0,0 +1,72 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.etl.loader import DataLoader
+
+
+def _mock_connection(fetch_results):
+    conn = MagicMock()
+    conn.execute = AsyncMock()
+    conn.copy_records_to_table = AsyncMock()
+    conn.fetch = AsyncMock(side_effect=fetch_results)
+    transaction = AsyncMock()
+    transaction.__aenter__.return_value = None
+    transaction.__aexit__.return_value = None
+    conn.transaction.return_value = transaction
+    acquire = MagicMock()
+    acquire.__aenter__ = AsyncMock(return_value=conn)
+    acquire.__aexit__ = AsyncMock(return_value=None)
+    return conn, acquire
+
+
+class TestFullRefreshSwap(unittest.IsolatedAsyncioTestCase):
+
+    async def test_swap_copies_into_shadow_and_renames(self):
+        fetch_results = [
+            [],  # blockers
+            [{'conname': 'sales_hst_pkey', 'def': 'PRIMARY KEY (record_id)'}],
+            [{'name': 'idx_sales_hst_row_hash',
+              'def': 'CREATE INDEX idx_sales_hst_row_hash ON stg_gsheets.sales_hst USING btree (__row_hash)'}],
+            [{'grantee': 'web_reader', 'privilege_type': 'SELECT'}],
+        ]
+        conn, acquire = _mock_connection(fetch_results)
+        with patch('src.config.settings.settings.full_refresh_strategy', 'swap'), \
+             patch('src.db.connection.DBConnection.get_connection', return_value=acquire):
+            stats = await DataLoader().load_full_refresh('stg_gsheets.sales_hst', ['record_id'], [['a'], ['b']])
+
+        self.assertEqual(stats['inserted'], 2)
+        args, kwargs = conn.copy_records_to_table.call_args
+        self.assertEqual(args[0], 'sales_hst__shadow')
+        self.assertEqual(kwargs['schema_name'], 'stg_gsheets')
+
+        statements = [c.args[0] for c in conn.execute.call_args_list]
+        self.assertNotIn('TRUNCATE', ' '.join(statements))
+        self.assertIn('ALTER TABLE "stg_gsheets"."sales_hst__shadow" ADD CONSTRAINT "sales_hst_pkey__shadow" PRIMARY KEY (record_id)', statements)
+        self.assertIn('CREATE INDEX "idx_sales_hst_row_hash__shadow" ON "stg_gsheets"."sales_hst__shadow" USING btree (__row_hash)', statements)
+        self.assertIn('GRANT SELECT ON "stg_gsheets"."sales_hst__shadow" TO "web_reader"', statements)
+        rename_idx = statements.index('ALTER TABLE "stg_gsheets"."sales_hst__shadow" RENAME TO "sales_hst"')
+        self.assertLess(statements.index('ALTER TABLE "stg_gsheets"."sales_hst" RENAME TO "sales_hst__old"'), rename_idx)
+        self.assertIn('ALTER INDEX "stg_gsheets"."idx_sales_hst_row_hash__shadow" RENAME TO "idx_sales_hst_row_hash"', statements)
+        # Статистика собирается до подмены
+        self.assertLess(statements.index('ANALYZE "stg_gsheets"."sales_hst__shadow"'),
+                        statements.index('ALTER TABLE "stg_gsheets"."sales_hst" RENAME TO "sales_hst__old"'))
+
+    async def test_published_table_is_a_swap_blocker(self):
+        conn, _ = _mock_connection([[{'blocker': 'publication elt_pub'}]])
+        blockers = await DataLoader()._swap_blockers(conn, 'stg_gsheets', 'sales_hst')
+
+        self.assertEqual(blockers, ['publication elt_pub'])
+        self.assertIn('pg_publication_rel', conn.fetch.call_args.args[0])
+
+    async def test_swap_falls_back_to_truncate_when_blocked(self):
+        conn, acquire = _mock_connection([[{'blocker': 'view v_sales'}]])
+        with patch('src.config.settings.settings.full_refresh_strategy', 'swap'), \
+             patch('src.db.connection.DBConnection.get_connection', return_value=acquire):
+            await DataLoader().load_full_refresh('stg_gsheets.sales_hst', ['record_id'], [['a']])
+
+        conn.execute.assert_any_call('TRUNCATE TABLE "stg_gsheets"."sales_hst"')
+        args, _ = conn.copy_records_to_table.call_args
+        self.assertEqual(args[0], 'sales_hst')
+
+
+if __name__ == '__main__':
+    unittest.main()
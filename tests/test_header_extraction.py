@@ -0,0 +1,172 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from src.etl.extractor import GSheetsExtractor, header_band
+from src.utils.metrics import SHEETS_API_CALLS
+from src.utils.rate_limit import SHEETS_READ, SHEETS_WRITE, DRIVE
+
+
+@pytest.fixture(autouse=True)
+def fast_limiters():
+    """Лимитеры Google API без ожиданий: тесты не упираются в квоту 1 req/s."""
+    limiters = (SHEETS_READ, SHEETS_WRITE, DRIVE)
+    for limiter in limiters:
+        limiter.reset(rate=1000.0)
+    yield
+    for limiter in limiters:
+        limiter.reset()
+
+
+def make_extractor(metadata, value_ranges):
+    with patch.object(GSheetsExtractor, '_authenticate'):
+        extractor = GSheetsExtractor()
+    extractor.gc = MagicMock()
+    extractor.gc.http_client.fetch_sheet_metadata.return_value = metadata
+    extractor.gc.http_client.values_batch_get.return_value = {'valueRanges': value_ranges}
+    return extractor
+
+
+METADATA = {'sheets': [
+    {'properties': {'sheetId': 11, 'title': 'Продажи', 'gridProperties': {'rowCount': 5000, 'columnCount': 26}}},
+    {'properties': {'sheetId': 22, 'title': "Client's", 'gridProperties': {'rowCount': 900, 'columnCount': 12}}},
+]}
+
+
+def test_header_band_covers_only_header_row():
+    assert header_band('B4:W') == ('B4:W4', 4)
+    assert header_band('A:Z') == ('A1:Z1', 1)
+    assert header_band('auto', 15) == ('A1:ZZ15', 1)
+
+
+@pytest.mark.asyncio
+async def test_extract_headers_uses_two_calls_for_all_sheets():
+    cdc_band = [
+        ['Отчет'],
+        ['Дата', 'Клиент', 'record_id', 'content_hash', 'created_at', 'updated_at', 'updated_by'],
+    ]
+    extractor = make_extractor(METADATA, [{'values': cdc_band}, {'values': [['Имя', 'Телефон']]}])
+    sheets = [
+        {'gid': 11, 'range': 'auto', 'target_table': 'stg_gsheets.sales_hst'},
+        {'gid': '22', 'range': 'B3:K', 'target_table': 'stg_gsheets.clients_cur',
+         'column_mapping': {'Имя': 'client_name'}},
+    ]
+    SHEETS_API_CALLS.reset()
+
+    result = await extractor.extract_headers('ssid', sheets)
+
+    ranges = extractor.gc.http_client.values_batch_get.call_args[0][1]
+    assert ranges == ["'Продажи'!A1:ZZ20", "'Client''s'!B3:K3"]
+    assert SHEETS_API_CALLS.get(api='sheets', op='metadata') == 1
+    assert SHEETS_API_CALLS.get(api='sheets', op='values.batchGet') == 1
+
+    sales = result['11']
+    assert (sales['header_row'], sales['data_start_row']) == (2, 3)
+    assert (sales['row_count'], sales['column_count']) == (5000, 26)
+    assert 'record_id' in sales['col_names']
+    assert result['22']['header_row'] == 3
+    assert result['22']['col_names'][0] == 'client_name'
+
+
+@pytest.mark.asyncio
+async def test_extract_headers_reports_missing_cdc_row_and_skips_unknown_gid():
+    extractor = make_extractor(METADATA, [{'values': [['a', 'b']]}])
+    sheets = [
+        {'gid': 11, 'range': 'auto', 'target_table': 'stg_gsheets.sales_hst'},
+        {'gid': 99, 'range': 'A:Z', 'target_table': 'stg_gsheets.missing'},
+    ]
+
+    result = await extractor.extract_headers('ssid', sheets)
+
+    assert list(result) == ['11']
+    assert result['11']['header_row'] is None
+    assert result['11']['col_names'] == []
+
+
+CDC_ROW = ['Дата', 'Клиент', 'record_id', 'content_hash', 'created_at', 'updated_at', 'updated_by']
+
+
+def make_worksheet(rows_from):
+    """Лист, отдающий строки начиная с номера из диапазона 'A{n}:ZZ' / 'A1:ZZ20'."""
+    ws = MagicMock()
+
+    def get(range_name):
+        start = int(range_name.split(':')[0][1:])
+        return [list(r) for r in rows_from[start - 1:]]
+    ws.get.side_effect = get
+    ws.row_values.side_effect = lambda n: list(rows_from[n - 1])
+    return ws
+
+
+def make_sheet_extractor(ws):
+    with patch.object(GSheetsExtractor, '_authenticate'):
+        extractor = GSheetsExtractor()
+    extractor.gc = MagicMock()
+    extractor.gc.open_by_key.return_value.get_worksheet_by_id.return_value = ws
+    return extractor
+
+
+@pytest.mark.asyncio
+async def test_cached_header_position_is_verified_with_single_fetch():
+    ws = make_worksheet([['Отчет'], [], CDC_ROW, ['01.01.2025', 'Иванов', 'r1', 'h', '', '', '']])
+    extractor = make_sheet_extractor(ws)
+    extractor.header_positions[('ssid', '5')] = {'header_row': 3, 'data_start_row': 4}
+
+    col_names, rows = await extractor.extract_sheet_data('ssid', '5', 'auto', 'stg_gsheets.sales_hst')
+
+    assert ws.get.call_args_list == [(('A3:ZZ',),)]
+    ws.row_values.assert_not_called()
+    assert 'record_id' in col_names
+    assert rows[0][1] == 'Иванов'
+    assert not extractor.changed_header_positions
+
+
+@pytest.mark.asyncio
+async def test_stale_header_position_falls_back_to_rescan():
+    # Строку над заголовком удалили: заголовок поднялся с 3-й строки на 2-ю
+    ws = make_worksheet([['Отчет'], CDC_ROW, ['01.01.2025', 'Петров', 'r2', 'h', '', '', '']])
+    extractor = make_sheet_extractor(ws)
+    extractor.header_positions[('ssid', '5')] = {'header_row': 3, 'data_start_row': 4}
+
+    _, rows = await extractor.extract_sheet_data('ssid', '5', 'auto', 'stg_gsheets.sales_hst')
+
+    assert ws.get.call_args_list[1] == (('A1:ZZ20',),)
+    assert extractor.header_positions[('ssid', '5')] == {'header_row': 2, 'data_start_row': 3}
+    assert extractor.changed_header_positions == {('ssid', '5')}
+    assert rows[0][1] == 'Петров'
+
+
+@pytest.mark.asyncio
+async def test_header_moved_down_within_band_is_found_without_rescan():
+    ws = make_worksheet([['Отчет'], [], ['Вставка'], CDC_ROW, ['01.01.2025', 'Сидоров', 'r3', 'h', '', '', '']])
+    extractor = make_sheet_extractor(ws)
+    extractor.header_positions[('ssid', '5')] = {'header_row': 3, 'data_start_row': 4}
+
+    _, rows = await extractor.extract_sheet_data('ssid', '5', 'auto', 'stg_gsheets.sales_hst')
+
+    assert ws.get.call_count == 1
+    assert extractor.header_positions[('ssid', '5')] == {'header_row': 4, 'data_start_row': 5}
+    assert rows[0][1] == 'Сидоров'
+
+
+@pytest.mark.asyncio
+async def test_limiter_wait_does_not_block_event_loop():
+    import asyncio
+    ws = make_worksheet([CDC_ROW, ['01.01.2025', 'Иванов', 'r1', 'h', '', '', '']])
+    extractor = make_sheet_extractor(ws)
+    SHEETS_READ.reset(rate=10.0)
+    SHEETS_READ._tokens = -2.0  # ~0.2с ожидания токена на первом запросе
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    try:
+        _, rows = await extractor.extract_sheet_data('ssid', '5', 'auto', 'stg_gsheets.sales_hst')
+    finally:
+        task.cancel()
+
+    assert rows[0][1] == 'Иванов'
+    assert ticks >= 5
@@ -0,0 +1,51 @@
+from src.etl.indexes import IndexSpec, join_key_specs, plan_indexes, staging_index_specs
+
+SQL = """
+MERGE INTO core.schedule AS target
+USING (
+    SELECT c.id AS client_id
+    FROM stg_gsheets.trainings_cur s
+    LEFT JOIN core.clients c ON c.name = s.klient
+    LEFT JOIN lookups.employees e ON e.full_name = s."sotrudnik"::text
+) AS source
+ON (target.legacy_id = source.legacy_id);
+"""
+
+
+def test_join_keys_index_lookup_side_only():
+    keys = {(s.schema, s.table, s.column) for s in join_key_specs(SQL)}
+    assert keys == {
+        ('core', 'clients', 'name'),
+        ('lookups', 'employees', 'full_name'),
+        ('core', 'schedule', 'legacy_id'),
+    }
+
+
+def test_staging_specs_from_sources():
+    sources = {'spreadsheets': {'x': {'sheets': [
+        {'target_table': 'stg_gsheets.sales_hst', 'pk': 'record_id'},
+        {'target_table': 'stg_gsheets.sales_cur'},
+    ]}}}
+    cols = {(s.table, s.column) for s in staging_index_specs(sources)}
+    assert ('sales_hst', 'record_id') in cols
+    assert ('sales_cur', '__row_hash') in cols
+    assert ('sales_cur', '_loaded_at') in cols
+
+
+def test_plan_indexes_missing_invalid_unused():
+    specs = [
+        IndexSpec('stg_gsheets', 'sales_hst', 'record_id', 'cdc pk'),
+        IndexSpec('stg_gsheets', 'sales_hst', '__row_hash', 'row hash'),
+        IndexSpec('stg_gsheets', 'sales_hst', 'absent_col', 'cdc pk'),
+    ]
+    existing = [
+        {'schema': 'stg_gsheets', 'table': 'sales_hst', 'index': 'ix_elt_sales_hst_record_id',
+         'first_col': 'record_id', 'valid': False, 'unique': False, 'scans': 0},
+        {'schema': 'stg_gsheets', 'table': 'sales_hst', 'index': 'old_hash_idx',
+         'first_col': '__row_hash', 'valid': True, 'unique': False, 'scans': 0},
+    ]
+    columns = {('stg_gsheets', 'sales_hst', c) for c in ('record_id', '__row_hash')}
+    plan = plan_indexes(specs, existing, columns)
+    assert [s.column for s in plan['missing']] == ['record_id']
+    assert plan['invalid'] == ['ix_elt_sales_hst_record_id']
+    assert [r['index'] for r in plan['unused']] == ['old_hash_idx']
@@ -0,0 +1,272 @@
+import asyncpg
+import pytest
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.db.locks import LockLost, LockTimeout, advisory_lock, lock_key
+from src.etl.jobs import JobQueue, JobWorker, plan_jobs
+from src.etl.processor import TableProcessor
+from src.etl.transformer import Transformer, transform_targets
+from src.utils.metrics import DB_LOCK_CONTENDED, RUN_DURATION
+from src.utils.tracing import tracer
+
+SOURCES = {'spreadsheets': {
+    'hst_book': {'sheets': [{'target_table': 'stg_gsheets.sales_hst', 'gid': '1'}]},
+    'cur_book': {'sheets': [{'target_table': 'stg_gsheets.sales_cur', 'gid': '2'}]},
+}}
+
+
+def test_plan_jobs_stages_loads_before_ordered_transforms():
+    jobs = plan_jobs(SOURCES, scope='current', full_refresh=True)
+
+    loads = [j for j in jobs if j[0] == 'load']
+    assert loads == [('load', 'stg_gsheets.sales_cur', 0, {'spreadsheet_id': 'cur_book', 'full_refresh': True})]
+    transforms = [(step, seq) for kind, step, seq, _ in jobs if kind == 'transform']
+    assert transforms[0] == ('transform_clients.sql', 1)
+    assert transforms[-1] == ('cleanup.sql', len(transforms))
+    # Полная перезагрузка пересчитывает и core (MERGE без пропуска неизмененных строк)
+    assert all(payload == {'rebuild': True} for kind, _, _, payload in jobs if kind == 'transform')
+    # Проверка качества и обслуживание партиций — последний этап, после cleanup.sql
+    assert jobs[-2:] == [('quality', 'current', len(transforms) + 1, {'scope': 'current'}),
+                         ('maintenance', 'partitions', len(transforms) + 1, {})]
+
+
+def test_lock_key_is_stable_signed_bigint():
+    key = lock_key('table:stg_gsheets.sales_cur')
+    assert key == lock_key('table:stg_gsheets.sales_cur')
+    assert key != lock_key('table:stg_gsheets.sales_hst')
+    assert -2 ** 63 <= key < 2 ** 63
+
+
+def make_connection(fetchval_results):
+    conn = MagicMock()
+    conn.fetchval = AsyncMock(side_effect=fetchval_results)
+    conn.execute = AsyncMock()
+    tx = conn.transaction.return_value
+    tx.start, tx.commit, tx.rollback = AsyncMock(), AsyncMock(), AsyncMock()
+    acquire = MagicMock()
+    acquire.__aenter__ = AsyncMock(return_value=conn)
+    acquire.__aexit__ = AsyncMock(return_value=False)
+    return conn, acquire
+
+
+@pytest.mark.asyncio
+async def test_advisory_lock_waits_and_counts_contention():
+    conn, acquire = make_connection([False, True])
+    DB_LOCK_CONTENDED.reset()
+    with patch('src.db.locks.DBConnection.get_connection', AsyncMock(return_value=acquire)):
+        async with advisory_lock('table:stg_gsheets.sales_cur', poll_interval=0) as locked:
+            assert locked is conn
+
+    assert conn.fetchval.call_count == 2
+    assert conn.fetchval.call_args.args[1] == lock_key('table:stg_gsheets.sales_cur')
+    assert DB_LOCK_CONTENDED.get(lock='table') == 1
+    conn.transaction.return_value.commit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_advisory_lock_takes_all_keys_on_one_connection():
+    conn, acquire = make_connection([True, True])
+    get_connection = AsyncMock(return_value=acquire)
+    with patch('src.db.locks.DBConnection.get_connection', get_connection):
+        async with advisory_lock('transform:core.sales', 'transform:core.clients', 'transform:core.sales'):
+            pass
+
+    get_connection.assert_awaited_once()
+    keys = [c.args[1] for c in conn.fetchval.call_args_list]
+    assert keys == [lock_key('transform:core.clients'), lock_key('transform:core.sales')]
+    assert 'idle_in_transaction_session_timeout' in conn.execute.call_args_list[0].args[0]
+
+
+@pytest.mark.asyncio
+async def test_advisory_lock_rolls_back_on_error_and_reports_lost_lock():
+    conn, acquire = make_connection([True])
+    with patch('src.db.locks.DBConnection.get_connection', AsyncMock(return_value=acquire)):
+        with pytest.raises(ValueError):
+            async with advisory_lock('table:t'):
+                raise ValueError('boom')
+    conn.transaction.return_value.rollback.assert_awaited_once()
+
+    conn, acquire = make_connection([True])
+    conn.transaction.return_value.commit.side_effect = asyncpg.InterfaceError('connection is closed')
+    with patch('src.db.locks.DBConnection.get_connection', AsyncMock(return_value=acquire)):
+        with pytest.raises(LockLost):
+            async with advisory_lock('table:t'):
+                pass
+
+
+@pytest.mark.asyncio
+async def test_advisory_lock_timeout():
+    _, acquire = make_connection([False] * 10)
+    with patch('src.db.locks.DBConnection.get_connection', AsyncMock(return_value=acquire)):
+        with pytest.raises(LockTimeout):
+            async with advisory_lock('transform:cleanup.sql', timeout=0, poll_interval=0):
+                pass
+
+
+@pytest.mark.asyncio
+async def test_claim_uses_skip_locked_and_decodes_payload():
+    row = {'job_id': 7, 'run_id': 'r', 'kind': 'load', 'step': 't', 'payload': '{"spreadsheet_id": "s"}',
+           'attempts': 1, 'max_attempts': 3}
+    with patch('src.etl.jobs.DBConnection.fetch', AsyncMock(return_value=[row])) as fetch:
+        job = await JobQueue(worker_id='w1').claim()
+
+    query, run_arg, worker_arg = fetch.call_args.args
+    assert 'FOR UPDATE SKIP LOCKED' in query
+    assert run_arg is None and worker_arg == 'w1'
+    assert job['payload'] == {'spreadsheet_id': 's'}
+
+
+def make_worker():
+    queue = MagicMock()
+    for name in ('complete', 'fail', 'finish_run_if_done', 'heartbeat', 'requeue_stale', 'progress', 'claim'):
+        setattr(queue, name, AsyncMock())
+    return JobWorker(queue=queue, extractor=MagicMock())
+
+
+@pytest.fixture
+def recorded_locks():
+    names = []
+
+    @asynccontextmanager
+    async def fake_lock(*lock_names, **kwargs):
+        names.extend(lock_names)
+        yield MagicMock(execute=AsyncMock())
+    with patch('src.etl.processor.advisory_lock', fake_lock), \
+         patch('src.etl.transformer.advisory_lock', fake_lock):
+        yield names
+
+
+def test_transform_targets_are_written_objects_in_lock_order():
+    sql = """
+        MERGE INTO core.sales t USING (SELECT * FROM stg_gsheets.sales_cur) s ON t.id = s.id
+        WHEN MATCHED THEN UPDATE SET amount = s.amount;
+        UPDATE core.clients SET is_active = false;
+        CREATE OR REPLACE VIEW analytics.v_client_balances AS SELECT 1;
+    """
+    assert transform_targets(sql) == ['analytics.v_client_balances', 'core.clients', 'core.sales']
+
+
+@pytest.mark.asyncio
+async def test_transform_script_locks_all_targets(recorded_locks):
+    with patch('src.db.connection.DBConnection.execute') as execute:
+        await Transformer().run_script('cleanup.sql')
+
+    # Скрипт выполняется на соединении блокировок, а не на отдельном из пула
+    execute.assert_not_called()
+    assert recorded_locks == ['transform:core.clients', 'transform:core.sales', 'transform:core.schedule']
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('dry_run, expected', [(False, ['table:stg_gsheets.sales_cur']), (True, [])])
+async def test_processor_locks_table_only_for_writes(recorded_locks, dry_run, expected):
+    loader = MagicMock()
+    loader.load_cdc = AsyncMock(return_value={'inserted': 1})
+    loader.calculate_changes = AsyncMock(return_value={'inserted': 1})
+    validator = MagicMock()
+    validator.load_contract.side_effect = FileNotFoundError
+    validator.validate_dataset.return_value.is_valid = True
+    validator.validate_dataset.return_value.errors = []
+    processor = TableProcessor(MagicMock(), loader, validator, 'run')
+
+    result = await processor.process_rows({'target_table': 'stg_gsheets.sales_cur', 'pk': 'id'},
+                                          ['id'], [['1']], full_refresh=False, dry_run=dry_run)
+
+    assert result['inserted'] == 1
+    assert recorded_locks == expected
+
+
+@pytest.mark.asyncio
+async def test_load_job_records_stats_and_completes():
+    worker = make_worker()
+    job = {'job_id': 1, 'run_id': 'run', 'kind': 'load', 'step': 'stg_gsheets.sales_cur',
+           'payload': {'spreadsheet_id': 'cur_book', 'full_refresh': False}, 'attempts': 1, 'max_attempts': 3}
+    processor = MagicMock()
+    processor.process_table = AsyncMock(return_value={'table': 'stg_gsheets.sales_cur', 'status': 'cdc',
+                                                      'inserted': 2, 'load_stats': {}})
+    tracer.reset()
+    with patch('src.etl.jobs.settings') as mock_settings, \
+         patch('src.etl.jobs.TableProcessor', return_value=processor), \
+         patch('src.etl.jobs.log_table_stats', AsyncMock()), \
+         patch('src.etl.jobs.RunCheckpoints') as checkpoints, \
+         patch.object(tracer, 'flush', AsyncMock()) as flush:
+        mock_settings.sources = SOURCES
+        mock_settings.worker_heartbeat_seconds = 30
+        checkpoints.return_value.mark = AsyncMock()
+        await worker.process(job)
+
+    result = worker.queue.complete.call_args.args[1]
+    assert result == {'table': 'stg_gsheets.sales_cur', 'status': 'cdc', 'inserted': 2}
+    worker.queue.finish_run_if_done.assert_awaited_once_with('run')
+    # Спаны задания сохранены под run_id и не остаются в трейсере долгоживущего воркера
+    run_id, spans = flush.call_args.args
+    assert run_id == 'run' and [s.name for s in spans] == ['job.load', 'table']
+    assert tracer.spans == []
+
+
+@pytest.mark.asyncio
+async def test_finished_run_exports_metrics():
+    row = {'status': 'success', 'duration_seconds': 12.5}
+    with patch('src.etl.jobs.DBConnection.fetch', AsyncMock(side_effect=[[row], []])), \
+         patch('src.etl.jobs.refresh_rollups', AsyncMock()), \
+         patch('src.etl.jobs.m.metrics.export') as export:
+        assert await JobQueue(worker_id='w1').finish_run_if_done('run') is True
+    export.assert_called_once_with('run')
+    assert RUN_DURATION.get() == 12.5
+
+    with patch('src.etl.jobs.DBConnection.fetch', AsyncMock(return_value=[])), \
+         patch('src.etl.jobs.m.metrics.export') as export:
+        assert await JobQueue(worker_id='w1').finish_run_if_done('run') is False
+    export.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_failed_transform_job_is_reported():
+    worker = make_worker()
+    worker.transformer.run_script = AsyncMock(side_effect=RuntimeError('syntax error'))
+    job = {'job_id': 2, 'run_id': 'run', 'kind': 'transform', 'step': 'transform_sales.sql',
+           'payload': {}, 'attempts': 1, 'max_attempts': 3}
+
+    await worker.process(job)
+
+    worker.queue.complete.assert_not_called()
+    assert worker.queue.fail.call_args.args == (job, 'syntax error')
+    worker.queue.finish_run_if_done.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_quality_and_maintenance_jobs():
+    worker = make_worker()
+    checker = MagicMock()
+    checker.check_table = AsyncMock()
+    checker.get_summary.return_value = {'has_critical_issues': False, 'issue_count': 2}
+    with patch('src.etl.pipeline.settings') as mock_settings, \
+         patch('src.etl.jobs.DataQualityChecker', return_value=checker), \
+         patch('src.etl.jobs.maintain_partitions', AsyncMock(return_value={'raw.sheets_dump': {'created': 1}})):
+        mock_settings.sources = SOURCES
+        quality = await worker.execute({'kind': 'quality', 'step': 'current', 'payload': {'scope': 'current'},
+                                        'run_id': 'run'})
+        maintenance = await worker.execute({'kind': 'maintenance', 'step': 'partitions', 'payload': {},
+                                            'run_id': 'run'})
+
+    assert quality == {'issues': 2}
+    assert [c.args[0] for c in checker.check_table.await_args_list] == ['stg_gsheets.sales_cur']
+    assert maintenance == {'partitions': {'raw.sheets_dump': {'created': 1}}}
+
+    checker.get_summary.return_value = {'has_critical_issues': True, 'issue_count': 1}
+    with patch('src.etl.pipeline.settings') as mock_settings, \
+         patch('src.etl.jobs.DataQualityChecker', return_value=checker):
+        mock_settings.sources = SOURCES
+        with pytest.raises(RuntimeError):
+            await worker.execute({'kind': 'quality', 'step': 'all', 'payload': {'scope': 'all'}, 'run_id': 'run'})
+
+
+@pytest.mark.asyncio
+async def test_worker_for_run_exits_when_no_jobs_left():
+    worker = make_worker()
+    worker.queue.claim.return_value = None
+    worker.queue.progress.return_value = {'done': 5, 'failed': 1}
+
+    await worker.run(run_id='run')
+
+    worker.queue.requeue_stale.assert_awaited()
+    assert worker.queue.claim.call_args.args == ('run',)
@@ -0,0 +1,87 @@
+import pytest
+from unittest.mock import MagicMock, AsyncMock
+from src.utils.metrics import _Metric, MetricsRegistry, SpanMetricsObserver, PHASE_DURATION, TABLE_DURATION, DB_POOL_ACQUIRE
+from src.utils.tracing import SpanRecorder
+
+
+def test_openmetrics_render():
+    reg = MetricsRegistry()
+    rows = reg.counter('elt_rows_inserted', 'Rows inserted')
+    rows.inc(5, table='stg_gsheets.sales_cur')
+    rows.inc(2, table='stg_gsheets.sales_cur')
+    hist = reg.histogram('elt_phase_duration_seconds', 'Phase duration', buckets=(1.0, 10.0))
+    hist.observe(0.5, phase='load')
+    hist.observe(3.0, phase='load')
+
+    text = reg.render()
+
+    assert '# TYPE elt_rows_inserted counter' in text
+    assert 'elt_rows_inserted_total{table="stg_gsheets.sales_cur"} 7' in text
+    assert 'elt_phase_duration_seconds_bucket{phase="load",le="1"} 1' in text
+    assert 'elt_phase_duration_seconds_bucket{phase="load",le="10"} 2' in text
+    assert 'elt_phase_duration_seconds_bucket{phase="load",le="+Inf"} 2' in text
+    assert 'elt_phase_duration_seconds_count{phase="load"} 2' in text
+    assert text.endswith('# EOF\n')
+
+
+def test_prometheus_textfile_and_reset(tmp_path):
+    reg = MetricsRegistry()
+    reg.counter('elt_google_api_calls', 'calls').inc(api='sheets', op='values.get')
+    reg.gauge('elt_run_success', 'ok').set(1)
+
+    path = reg.write_textfile(tmp_path / 'elt.prom')
+    text = path.read_text()
+    # Классический формат: семейство счетчика с суффиксом _total, без # EOF
+    assert '# TYPE elt_google_api_calls_total counter' in text
+    assert '# EOF' not in text
+    assert 'elt_run_success 1' in text
+
+    reg.reset()
+    assert reg.render(openmetrics=False).strip() == ''
+
+
+def test_label_escaping():
+    reg = MetricsRegistry()
+    reg.counter('c', 'doc').inc(table='a"b\\c')
+    assert 'c_total{table="a\\"b\\\\c"} 1' in reg.render()
+
+
+def test_metric_without_samples_cannot_be_created():
+    class Incomplete(_Metric):
+        def reset(self):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete('elt_incomplete', 'no samples')
+
+
+def test_span_observer_feeds_phase_and_table_histograms():
+    PHASE_DURATION.reset()
+    TABLE_DURATION.reset()
+    recorder = SpanRecorder()
+    recorder.add_observer(SpanMetricsObserver())
+
+    with recorder.span('phase.load'):
+        with recorder.span('table', table='stg_gsheets.clients_cur'):
+            pass
+
+    assert PHASE_DURATION.count(phase='load') == 1
+    assert TABLE_DURATION.count(table='stg_gsheets.clients_cur') == 1
+
+
+@pytest.mark.asyncio
+async def test_connection_acquire_wait_is_observed():
+    from src.db.connection import _TimedAcquire
+
+    conn = MagicMock()
+    acquire_ctx = MagicMock()
+    acquire_ctx.__aenter__ = AsyncMock(return_value=conn)
+    acquire_ctx.__aexit__ = AsyncMock(return_value=None)
+    pool = MagicMock()
+    pool.acquire.return_value = acquire_ctx
+
+    DB_POOL_ACQUIRE.reset()
+    async with _TimedAcquire(pool) as got:
+        assert got is conn
+    assert DB_POOL_ACQUIRE.count() == 1
+    acquire_ctx.__aexit__.assert_awaited_once()
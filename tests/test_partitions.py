@@ -0,0 +1,60 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.config.settings import settings
+from src.etl.partitions import maintain_partitions, partitioned_tables
+from src.etl.schema import SchemaManager
+
+
+@pytest.mark.asyncio
+async def test_maintain_partitions_premakes_and_drops_by_retention():
+    calls = []
+
+    async def fake_fetch(query, *args):
+        calls.append((query, args))
+        if 'ensure_month_partitions' in query:
+            return [{'created': 1}]
+        return [{'dropped': 2}]
+
+    with patch('src.etl.partitions.DBConnection.fetch', fake_fetch):
+        result = await maintain_partitions()
+
+    assert result == {table: {'created': 1, 'dropped': 2} for table, _, _ in partitioned_tables()}
+    ensure = [args for query, args in calls if 'ensure_month_partitions' in query]
+    drop = [args for query, args in calls if 'drop_old_partitions' in query]
+    assert ensure[0] == ('raw.sheets_dump', 'extracted_at', settings.partition_premake_months + 1)
+    assert drop == [
+        ('raw.sheets_dump', settings.raw_dump_retention_days),
+        ('ops.validation_logs', settings.validation_log_retention_days),
+        ('ops.elt_table_stats', settings.table_stats_retention_days),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_zero_retention_keeps_history_and_failures_are_isolated():
+    async def fake_fetch(query, *args):
+        if args[0] == 'raw.sheets_dump':
+            raise RuntimeError('function does not exist')
+        assert 'drop_old_partitions' not in query or args[0] != 'ops.validation_logs'
+        return [{'created': 0, 'dropped': 0}]
+
+    with patch('src.etl.partitions.DBConnection.fetch', fake_fetch), \
+         patch.object(settings, 'validation_log_retention_days', 0):
+        result = await maintain_partitions()
+
+    assert 'raw.sheets_dump' not in result
+    assert result['ops.validation_logs'] == {'created': 0, 'dropped': 0}
+    assert result['ops.elt_table_stats'] == {'created': 0, 'dropped': 0}
+
+
+@pytest.mark.asyncio
+async def test_meta_ddl_converts_history_tables_to_partitions():
+    with patch('src.etl.schema.DBConnection.execute', AsyncMock()) as execute:
+        await SchemaManager(extractor=MagicMock()).deploy_meta_tables()
+
+    ddl = execute.await_args.args[0]
+    for table, column, _ in partitioned_tables():
+        call = f"{settings.schema_ops}.partition_by_month('{table}', '{column}');"
+        assert call in ddl
+        # Таблица переводится на партиции после создания, функции — до вызова
+        assert ddl.index(f"CREATE TABLE IF NOT EXISTS {table} (") < ddl.index(call)
+    assert ddl.index(f"FUNCTION {settings.schema_ops}.partition_by_month(") < ddl.index('SELECT ' + f"{settings.schema_ops}.partition_by_month(")
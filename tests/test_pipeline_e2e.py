@@ -1,6 +1,7 @@
 import unittest
 import uuid
 import json
+from contextlib import nullcontext
 from unittest.mock import MagicMock, AsyncMock, patch
 from src.etl.pipeline import ELTPipeline
 
@@ -62,7 +63,8 @@ class TestPipelineE2E(unittest.IsolatedAsyncioTestCase):
                 # Чтобы DBConnection.execute и fetch работали во всех модулях
                 with patch("src.db.connection.DBConnection.execute", side_effect=mock_exec), \
                      patch("src.db.connection.DBConnection.fetch", side_effect=mock_fetch), \
-                     patch("src.db.connection.DBConnection.get_connection", new_callable=AsyncMock) as mock_get_conn:
+                     patch("src.db.connection.DBConnection.get_connection", new_callable=AsyncMock) as mock_get_conn, \
+                     patch("src.etl.processor.advisory_lock", lambda name: nullcontext()):
                     
                     # Настройка контекстного менеджера соединения
                     mock_conn = MagicMock()
@@ -0,0 +1,44 @@
+import asyncio
+from src.utils.profiling import RunProfiler
+from src.utils.tracing import tracer
+
+
+def test_profiler_writes_reports_and_phase_memory(tmp_path):
+    profiler = RunProfiler('run-123', trace_memory=True, top_n=5, output_dir=tmp_path)
+    profiler.start()
+    try:
+        with tracer.span('phase.load'):
+            data = [list(range(100)) for _ in range(200)]
+            with tracer.span('extract'):
+                sum(len(d) for d in data)
+    finally:
+        profiler.stop()
+
+    text = profiler.report()
+
+    assert profiler.stats_path.exists()
+    assert profiler.report_path.exists()
+    # Учитываются только корневые спаны (фазы)
+    assert set(profiler.phase_stats) == {'phase.load'}
+    assert profiler.phase_stats['phase.load']['peak_bytes'] > 0
+    assert 'cumulative' in text
+    assert profiler not in tracer._observers
+    tracer.reset()
+
+
+def _parse_in_thread():
+    return sum(int(str(i)) for i in range(20000))
+
+
+def test_profiler_includes_worker_threads(tmp_path):
+    profiler = RunProfiler('run-456', output_dir=tmp_path)
+    profiler.start()
+    try:
+        asyncio.run(asyncio.to_thread(_parse_in_thread))
+    finally:
+        profiler.stop()
+
+    text = profiler.report()
+
+    assert '_parse_in_thread' in text
+    assert len(profiler._thread_profiles) >= 1
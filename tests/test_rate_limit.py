@@ -0,0 +1,81 @@
+import pytest
+from unittest.mock import patch
+from src.utils.rate_limit import AdaptiveRateLimiter
+from src.utils.retry import RetryError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_limiter(**kwargs):
+    clock = FakeClock()
+    return AdaptiveRateLimiter('test', rate=2.0, burst=2.0, clock=clock, **kwargs), clock
+
+
+def test_bucket_allows_burst_then_paces_requests():
+    limiter, clock = make_limiter()
+    assert limiter._reserve(1) == 0
+    assert limiter._reserve(1) == 0
+    assert limiter._reserve(1) == pytest.approx(0.5)
+    clock.now = 10.0
+    assert limiter._reserve(1) == 0
+
+
+def test_aimd_decreases_on_429_and_recovers_slowly():
+    limiter, clock = make_limiter()
+    limiter.on_throttle()
+    assert limiter.rate == pytest.approx(1.0)
+    # После 429 выдача токенов приостановлена на время backoff
+    assert limiter._reserve(1) >= 2.0
+
+    for _ in range(10):
+        limiter.on_success()
+    assert 1.0 < limiter.rate < 2.0
+    for _ in range(10_000):
+        limiter.on_success()
+    assert limiter.rate == pytest.approx(limiter.max_rate)
+
+
+def test_call_retries_rate_limited_requests():
+    limiter, clock = make_limiter()
+    responses = iter([Exception('APIError: [429]: Quota exceeded'), 'ok'])
+
+    def request():
+        value = next(responses)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    with patch('time.sleep'):
+        assert limiter.call(request) == 'ok'
+    assert limiter.rate < 2.0
+
+
+def test_call_gives_up_and_passes_through_other_errors():
+    limiter, clock = make_limiter()
+
+    def throttled():
+        raise Exception('429 Too Many Requests')
+
+    with patch('time.sleep'), pytest.raises(RetryError):
+        limiter.call(throttled, max_attempts=3)
+
+    def broken():
+        raise ValueError('bad range')
+
+    limiter.reset()
+    with pytest.raises(ValueError):
+        limiter.call(broken)
+
+
+def test_reset_scales_bounds():
+    limiter, clock = make_limiter()
+    limiter.reset(rate=100.0)
+    assert (limiter.min_rate, limiter.max_rate) == (5.0, 400.0)
+    limiter.reset()
+    assert limiter.rate == 2.0
@@ -0,0 +1,40 @@
+import uuid
+from datetime import datetime
+import pytest
+from src.etl.replay import parse_replay_target, dump_selection_query, restore_columns, records_to_rows
+
+
+def test_parse_replay_target():
+    run_id = uuid.uuid4()
+    assert parse_replay_target(None) is None
+    assert parse_replay_target('latest') is None
+    assert parse_replay_target(str(run_id)) == run_id
+    assert parse_replay_target('2025-03-01T12:00') == datetime(2025, 3, 1, 12, 0)
+    with pytest.raises(ValueError):
+        parse_replay_target('yesterday')
+
+
+def test_dump_selection_query_filters_by_target():
+    query, args = dump_selection_query(None)
+    assert 'DISTINCT ON (sheet_name)' in query and 'WHERE' not in query and args == []
+
+    run_id = uuid.uuid4()
+    query, args = dump_selection_query(run_id)
+    assert 'WHERE run_id = $1' in query and args == [run_id]
+
+    ts = datetime(2025, 3, 1)
+    query, args = dump_selection_query(ts)
+    assert 'WHERE extracted_at <= $1' in query and args == [ts]
+
+
+def test_restore_columns_prefers_stored_order():
+    records = [{'b': '2', 'a': '1'}]
+    assert restore_columns(records, ['a', 'b'], []) == ['a', 'b']
+
+
+def test_restore_columns_for_legacy_dump_uses_table_order():
+    records = [{'client': 'x', 'date': '01.01.2025'}, {'date': '02.01.2025', 'extra': 'y'}]
+    table_columns = ['date', 'client', '_row_index', '__row_hash', '_loaded_at']
+    col_names = restore_columns(records, None, table_columns)
+    assert col_names == ['date', 'client', 'extra']
+    assert records_to_rows(records, col_names) == [['01.01.2025', 'x', None], ['02.01.2025', None, 'y']]
@@ -0,0 +1,44 @@
+import pytest
+from datetime import date
+from decimal import Decimal
+from unittest.mock import AsyncMock, patch
+from src.etl.rollups import refresh_rollups
+from src.utils import dashboard_data
+
+
+@pytest.mark.asyncio
+async def test_refresh_rollups_recomputes_from_run_start_day():
+    with patch('src.etl.rollups.DBConnection.execute', AsyncMock()) as execute:
+        await refresh_rollups('00000000-0000-0000-0000-000000000001')
+
+    query, run_id, tz = execute.call_args.args
+    assert 'refresh_elt_rollups' in query and 'elt_runs WHERE run_id = $1' in query
+    assert run_id == '00000000-0000-0000-0000-000000000001'
+    assert tz == 'Asia/Yekaterinburg'
+
+
+@pytest.mark.asyncio
+async def test_refresh_rollups_failure_does_not_break_run():
+    with patch('src.etl.rollups.DBConnection.execute', AsyncMock(side_effect=RuntimeError('no function'))):
+        await refresh_rollups()
+
+
+def test_dashboard_queries_share_one_loop_and_return_floats():
+    calls = []
+
+    async def fake_fetch(query, *args):
+        import asyncio
+        calls.append(asyncio.get_running_loop())
+        return [{'day': date(2025, 3, 1), 'runs': 2, 'duration_s_p50': Decimal('1.50')}]
+
+    with patch('src.utils.dashboard_data.DBConnection.fetch', fake_fetch):
+        first = dashboard_data.fetch_run_daily(7)
+        dashboard_data.fetch_table_daily(7)
+
+    assert first == [{'day': date(2025, 3, 1), 'runs': 2, 'duration_s_p50': 1.5}]
+    assert len(calls) == 2 and calls[0] is calls[1]
+
+
+def test_since_day_covers_period_inclusive():
+    assert dashboard_data.since_day(1, today=date(2025, 3, 10)) == date(2025, 3, 10)
+    assert dashboard_data.since_day(30, today=date(2025, 3, 10)) == date(2025, 2, 9)
@@ -0,0 +1,41 @@
+from src.etl.schema import SchemaManager, plan_column_changes
+
+
+def test_new_column_is_added():
+    renames, adds, orphans = plan_column_changes(['a', 'b'], ['a', 'b', 'c'])
+    assert (renames, adds, orphans) == ([], ['c'], [])
+
+
+def test_renamed_header_in_same_slot_is_renamed():
+    renames, adds, orphans = plan_column_changes(['a', 'b', 'c'], ['a', 'b2', 'c'])
+    assert (renames, adds, orphans) == ([('b', 'b2')], [], [])
+
+
+def test_removed_column_is_kept_and_unrelated_column_added():
+    renames, adds, orphans = plan_column_changes(['a', 'b', 'c'], ['a', 'c', 'd'])
+    assert (renames, adds, orphans) == ([], ['d'], ['b'])
+
+
+def test_dropped_last_column_and_appended_column_is_not_a_rename():
+    # Совпадает только левый сосед — неоднозначно: данные "c" не должны попасть в "z"
+    renames, adds, orphans = plan_column_changes(['a', 'b', 'c'], ['a', 'b', 'z'])
+    assert (renames, adds, orphans) == ([], ['z'], ['c'])
+
+
+def test_edge_column_is_renamed_only_by_explicit_map():
+    renames, adds, orphans = plan_column_changes(['a', 'b'], ['a2', 'b'])
+    assert (renames, adds, orphans) == ([], ['a2'], ['a'])
+    renames, adds, orphans = plan_column_changes(['a', 'b'], ['a2', 'b'], {'a': 'a2', 'x': 'y'})
+    assert (renames, adds, orphans) == ([('a', 'a2')], [], [])
+
+
+def test_evolve_statements_ignore_meta_columns_and_use_types():
+    existing = ['date', 'client', '_row_index', '__row_hash', '_loaded_at']
+    statements = SchemaManager._evolve_statements(
+        '"stg_gsheets"."sales_hst"', existing, ['date', 'client_full', 'final_price'], {'final_price': 'numeric'},
+        {'client': 'client_full'}
+    )
+    assert statements == [
+        'ALTER TABLE "stg_gsheets"."sales_hst" RENAME COLUMN "client" TO "client_full"',
+        'ALTER TABLE "stg_gsheets"."sales_hst" ADD COLUMN "final_price" numeric',
+    ]
@@ -0,0 +1,75 @@
+import pytest
+from unittest.mock import patch
+from src.config.settings import settings
+from src.etl.extractor import GSheetsExtractor
+from src.etl.exporter import DataMartExporter
+from src.utils.retry import RetryError
+from src.utils.sheets_emulator import (
+    SheetsEmulator, EmulatedSpreadsheet, EmulatedSheet, generated_sheet, parse_cells, split_range
+)
+from src.utils.rate_limit import SHEETS_READ, SHEETS_WRITE, DRIVE
+
+
+@pytest.fixture(autouse=True)
+def fast_limiters():
+    """Лимитеры Google API без ожиданий: тесты не упираются в квоту 1 req/s."""
+    limiters = (SHEETS_READ, SHEETS_WRITE, DRIVE)
+    for limiter in limiters:
+        limiter.reset(rate=1000.0)
+    yield
+    for limiter in limiters:
+        limiter.reset()
+
+
+@pytest.fixture
+def emulator():
+    emu = SheetsEmulator()
+    book = emu.add_spreadsheet(EmulatedSpreadsheet('ss1', 'Тест'))
+    book.add_sheet(generated_sheet(101, 'sales', ['date', 'client_full'], rows=50,
+                                   types={'date': 'date'}, cdc=True, header_row=3))
+    book.add_sheet(EmulatedSheet(202, 'clients', [[], [], [], ['Имя', 'Телефон'], ['Анна', '123']]))
+    with emu, patch.object(settings, 'google_api_endpoint', emu.url):
+        yield emu
+
+
+def test_range_parsing():
+    assert split_range("'It''s'!A1:B") == ("It's", 'A1:B')
+    assert split_range('A3:ZZ') == (None, 'A3:ZZ')
+    assert parse_cells('B4:W') == (3, 1, None, 22)
+    assert parse_cells('A3:3') == (2, 0, 2, None)
+
+
+@pytest.mark.asyncio
+async def test_extractor_reads_from_emulator(emulator):
+    extractor = GSheetsExtractor()
+
+    col_names, rows = await extractor.extract_sheet_data('ss1', '101', 'auto', 'stg_gsheets.sales_hst')
+    assert col_names[:3] == ['date', 'client_full', 'record_id']
+    assert len(rows) == 50
+
+    col_names, rows = await extractor.extract_sheet_data('ss1', '202', 'A4:B', 'stg_gsheets.clients_cur')
+    assert rows == [['Анна', '123']]
+
+    headers = await extractor.extract_headers('ss1', [{'gid': 101, 'range': 'auto', 'target_table': 'stg_gsheets.sales_hst'}])
+    assert headers['101']['header_row'] == 3
+    assert extractor.get_modified_time('ss1') is not None
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_calls_are_retried(emulator):
+    emulator.error_rate = 1.0
+    extractor = GSheetsExtractor()
+    with patch('time.sleep'), pytest.raises(RetryError):
+        await extractor.extract_sheet_data('ss1', '202', 'A4:B', 'stg_gsheets.clients_cur')
+    assert emulator.stats['429'] >= 3
+
+
+@pytest.mark.asyncio
+async def test_exporter_writes_to_emulator(emulator):
+    exporter = DataMartExporter()
+    client = await exporter.get_client()
+    exporter._sync_write(client, 'ss1', '202', [['a', 'b'], ['1', '2']])
+
+    sheet = emulator.spreadsheets['ss1'].sheets[202]
+    assert sheet.read('A1:B') == [['a', 'b'], ['1', '2']]
+    assert emulator.stats['values.clear'] == 1 and emulator.stats['values.update'] == 1
@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+from src.etl.extractor import GSheetsExtractor
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Бюджет холодного старта до готового к --transform-only пайплайна (сейчас ~0.3с).
+# Время на общих CI-раннерах нестабильно, поэтому проверяется только по запросу:
+# STARTUP_BUDGET_SECONDS=1.0 pytest tests/test_startup.py
+STARTUP_BUDGET_SECONDS = os.environ.get('STARTUP_BUDGET_SECONDS')
+HEAVY_MODULES = ('gspread', 'googleapiclient', 'google.oauth2', 'pandas')
+
+STARTUP_PROBE = f"""
+import sys, time
+start = time.perf_counter()
+import src.main
+from src.etl.pipeline import ELTPipeline
+ELTPipeline()
+print(time.perf_counter() - start)
+print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))
+"""
+
+
+def test_startup_is_fast_and_skips_google_and_pandas():
+    proc = subprocess.run([sys.executable, '-c', STARTUP_PROBE], cwd=ROOT,
+                          capture_output=True, text=True, timeout=60)
+    assert proc.returncode == 0, proc.stderr
+    elapsed, loaded = proc.stdout.splitlines()
+    assert loaded == '', f"тяжелые модули загружены при старте: {loaded}"
+    if STARTUP_BUDGET_SECONDS:
+        assert float(elapsed) < float(STARTUP_BUDGET_SECONDS)
+
+
+def test_extractor_authenticates_once_on_first_use():
+    extractor = GSheetsExtractor()
+    with patch('src.etl.extractor.google_clients', return_value=(MagicMock(), 'creds')) as clients, \
+         patch('src.etl.extractor.drive_client', return_value=MagicMock()) as drive:
+        clients.assert_not_called()
+        assert extractor.gc is extractor.gc
+        assert extractor.drive_service is not None
+
+    clients.assert_called_once()
+    drive.assert_called_once_with('creds')
@@ -0,0 +1,117 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.utils.tracing import SpanRecorder, traced, tracer
+
+
+def test_nested_spans_record_parent_and_table():
+    recorder = SpanRecorder()
+    with recorder.span('table', table='stg_gsheets.sales_cur'):
+        with recorder.span('extract'):
+            pass
+        with recorder.span('load', rows=10):
+            pass
+
+    by_name = {s.name: s for s in recorder.spans}
+    root = by_name['table']
+    assert root.is_root
+    assert by_name['extract'].parent_id == root.span_id
+    # Таблица наследуется от родителя
+    assert by_name['load'].table == 'stg_gsheets.sales_cur'
+    assert by_name['load'].attrs == {'rows': 10}
+    assert all(s.duration_ms is not None and s.duration_ms >= 0 for s in recorder.spans)
+
+
+def test_span_marks_error_status():
+    recorder = SpanRecorder()
+    with pytest.raises(ValueError):
+        with recorder.span('transform.sql'):
+            raise ValueError('boom')
+    assert recorder.spans[0].status == 'error'
+
+
+def test_summary_and_reset():
+    recorder = SpanRecorder()
+    for _ in range(3):
+        with recorder.span('load.copy'):
+            pass
+    assert set(recorder.summary()) == {'load.copy'}
+    recorder.reset()
+    assert recorder.spans == []
+
+
+def test_spans_from_threads_get_unique_ids():
+    from concurrent.futures import ThreadPoolExecutor
+    recorder = SpanRecorder()
+
+    def work(_):
+        for _ in range(500):
+            with recorder.span('extract.fetch'):
+                pass
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(work, range(8)))
+
+    ids = [s.span_id for s in recorder.spans]
+    assert len(ids) == 8 * 500
+    assert len(set(ids)) == len(ids)
+
+
+def test_detach_takes_only_the_subtree():
+    recorder = SpanRecorder()
+    with recorder.span('job.load') as first:
+        with recorder.span('extract'):
+            with recorder.span('extract.fetch'):
+                pass
+    with recorder.span('job.transform'):
+        pass
+
+    taken = recorder.detach(first)
+
+    assert [s.name for s in taken] == ['job.load', 'extract', 'extract.fetch']
+    assert [s.name for s in recorder.spans] == ['job.transform']
+
+
+@pytest.mark.asyncio
+async def test_traced_decorator_and_concurrent_tasks():
+    tracer.reset()
+
+    @traced('step')
+    async def step(n):
+        await asyncio.sleep(0)
+        return n
+
+    async def task(table):
+        with tracer.span('table', table=table):
+            return await step(table)
+
+    await asyncio.gather(task('a'), task('b'))
+
+    steps = [s for s in tracer.spans if s.name == 'step']
+    roots = {s.span_id: s.table for s in tracer.spans if s.name == 'table'}
+    # Каждый step привязан к родителю своей задачи
+    assert sorted(roots[s.parent_id] for s in steps) == ['a', 'b']
+    tracer.reset()
+
+
+@pytest.mark.asyncio
+async def test_flush_bulk_copies_spans():
+    recorder = SpanRecorder()
+    with recorder.span('phase.load'):
+        with recorder.span('extract', table='t'):
+            pass
+
+    mock_conn = MagicMock()
+    mock_conn.copy_records_to_table = AsyncMock()
+    mock_acquire = MagicMock()
+    mock_acquire.__aenter__ = AsyncMock(return_value=mock_conn)
+    mock_acquire.__aexit__ = AsyncMock(return_value=None)
+
+    with patch('src.db.connection.DBConnection.get_connection', new_callable=AsyncMock, return_value=mock_acquire):
+        written = await recorder.flush('00000000-0000-0000-0000-000000000001')
+
+    assert written == 2
+    mock_conn.copy_records_to_table.assert_called_once()
+    args, kwargs = mock_conn.copy_records_to_table.call_args
+    assert args[0] == 'elt_spans'
+    assert [r[3] for r in kwargs['records']] == ['phase.load', 'extract']
@@ -1,11 +1,13 @@
 import pytest
 import asyncio
+from contextlib import nullcontext
 from pathlib import Path
 import sys
 from unittest.mock import AsyncMock, patch, MagicMock
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+from src.db.connection import DBConnection
 from src.etl.transformer import Transformer, SQL_DIR
 
 # Helper for async tests without pytest-asyncio
@@ -64,7 +66,8 @@ class TestTransformerExecution:
         """Проверяем, что метод run выполняет SQL файлы."""
         transformer = Transformer()
         
-        with patch('src.db.connection.DBConnection.execute', new_callable=AsyncMock) as mock_execute:
+        with patch('src.db.connection.DBConnection.execute', new_callable=AsyncMock) as mock_execute, \
+             patch('src.etl.transformer.advisory_lock', lambda *names: nullcontext(DBConnection)):
             success, errors = await transformer.run()
             
             assert success > 0
@@ -83,3 +86,22 @@ class TestTransformerExecution:
             assert any(('INSERT INTO' in sql or 'MERGE INTO' in sql) and 'sales' in sql for sql in sqls)
             assert any(('INSERT INTO' in sql or 'MERGE INTO' in sql) and 'schedule' in sql for sql in sqls)
             assert any('UPDATE core.sales' in sql for sql in sqls) # Cleanup
+
+
+@pytest.mark.asyncio
+async def test_rebuild_disables_unchanged_row_guard():
+    """--full-refresh: скрипт выполняется с elt.rebuild_core, MERGE пересчитывает все строки."""
+    for f in ['transform_clients.sql', 'transform_schedule.sql', 'transform_sales.sql']:
+        sql = (SQL_DIR / f).read_text(encoding='utf-8')
+        assert sql.count("WHEN MATCHED AND (\n    current_setting('elt.rebuild_core', true) = 'on'") == 2, f
+
+    conn = MagicMock(execute=AsyncMock())
+    with patch('src.etl.transformer.advisory_lock', lambda *names: nullcontext(conn)):
+        await Transformer().run_script('transform_sales.sql')
+        assert conn.execute.await_count == 1  # только сам скрипт
+        conn.execute.reset_mock()
+        await Transformer().run_script('transform_sales.sql', rebuild=True)
+
+    statements = [c.args[0] for c in conn.execute.await_args_list]
+    assert statements[0] == "SET LOCAL elt.rebuild_core = 'on'"
+    assert 'MERGE INTO core.sales' in statements[1]
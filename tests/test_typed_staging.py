@@ -0,0 +1,90 @@
+import pytest
+from datetime import date, time
+from decimal import Decimal
+from unittest.mock import AsyncMock, patch
+from src.etl.loader import DataLoader, UnparsedValue
+from src.etl.staging_types import staging_column_types, column_parsers, contract_name_for
+from src.utils.cleaning import parse_date, parse_numeric, parse_integer, parse_time
+
+
+def test_parse_date_contract_formats():
+    assert parse_date("05.01.2024") == date(2024, 1, 5)
+    assert parse_date("05.01.24") == date(2024, 1, 5)
+    assert parse_date("2024-01-05") == date(2024, 1, 5)
+    assert parse_date("пн 05.01.24") == date(2024, 1, 5)
+    assert parse_date("05.01.", default_year=2025) == date(2025, 1, 5)
+    assert parse_date("31.02.2024") is None
+    assert parse_date("вчера") is None
+    assert parse_date("") is None
+
+
+def test_parse_numbers_and_time():
+    assert parse_numeric("1 500,50 руб") == Decimal("1500.50")
+    assert parse_numeric("1,500.50") == Decimal("1500.50")
+    assert parse_numeric("1.500,50") == Decimal("1500.50")
+    assert parse_numeric("1.500.000") == Decimal("1500000")
+    assert parse_numeric("1,2,3.4") is None
+    assert parse_integer("12,5") is None
+    assert parse_date("32.01.2025") is None
+    assert parse_date("1/3/2025") is None
+    assert parse_numeric("abc") is None
+    assert parse_integer("2") == 2
+    assert parse_integer("2.0") == 2
+    assert parse_integer("2.5") is None
+    assert parse_time("9:30") == time(9, 30)
+    assert parse_time("10:00-11:00") == time(10, 0)
+    assert parse_time("утро") is None
+
+
+def test_staging_column_types_from_contract():
+    contract = {'columns': [
+        {'name': 'date', 'type': 'date'},
+        {'name': 'client_full', 'type': 'string'},
+        {'name': 'final_price', 'type': 'money'},
+        {'name': 'quantity', 'type': 'integer'},
+    ]}
+    types = staging_column_types(contract, ['date', 'client_full', 'final_price'])
+    assert types == {'date': 'date', 'final_price': 'numeric'}
+    assert contract_name_for('stg_gsheets.trainings_hst') == 'schedule'
+
+
+def test_prepare_row_parses_typed_columns_with_stable_hash():
+    loader = DataLoader()
+    cols = ['date', 'client_full', 'final_price']
+    row = ['05.01.2024', 'Иванов', '1500,50']
+    parsers = column_parsers(cols, {'date': 'date', 'client_full': 'text', 'final_price': 'numeric'})
+
+    text_values, text_hash = loader._prepare_row(row, cols, 2)
+    typed_values, typed_hash = loader._prepare_row(row, cols, 2, parsers)
+
+    assert typed_values == [date(2024, 1, 5), 'Иванов', Decimal('1500.50')]
+    assert text_values[0] == '05.01.2024'
+    # CDC-хеш не зависит от типизации staging
+    assert typed_hash == text_hash
+
+
+@pytest.mark.parametrize('value', ['32.01.2025', '1/3/2025'])
+def test_prepare_row_rejects_unparsed_typed_value(value):
+    parsers = column_parsers(['id', 'date'], {'date': 'date'})
+    with pytest.raises(UnparsedValue) as exc:
+        DataLoader()._prepare_row(['1', value], ['id', 'date'], 5, parsers)
+    assert (exc.value.column, exc.value.value, exc.value.row_num) == ('date', value, 5)
+
+
+@pytest.mark.asyncio
+async def test_cdc_skips_unparsed_rows_and_keeps_previous_version():
+    loader = DataLoader()
+    cols = ['id', 'final_price']
+    parsers = column_parsers(cols, {'final_price': 'numeric'})
+    apply = AsyncMock()
+    with patch.object(loader, '_fetch_column_parsers', AsyncMock(return_value=parsers)), \
+         patch.object(loader, '_fetch_existing_hashes', AsyncMock(return_value={'1': 'old', '2': 'old', '3': 'old'})), \
+         patch.object(loader, '_apply_cdc_changes', apply):
+        stats = await loader.load_cdc('stg_gsheets.sales_cur', cols, [['1', '1,500.50'], ['2', 'сто рублей']], 'id')
+
+    processor = apply.await_args.args[1]
+    assert [c.pk for c in processor.to_update] == ['1']
+    assert processor.to_update[0].values[1] == Decimal('1500.50')
+    # Строка 2 не распознана: не обновлена и не удалена; строка 3 исчезла из листа
+    assert processor.to_delete == ['3']
+    assert stats['unparsed'] == 1
@@ -283,6 +283,22 @@ class TestContractValidator:
         assert result.valid_rows == 2
         assert len(result.errors) >= 1
     
+    def test_row_views_validate_like_dicts(self, validator):
+        """Представления строк процессора дают тот же результат, что и словари."""
+        from src.etl.processor import RowView
+        col_names = ['дата', 'лишняя', 'клиент', 'продукт']
+        rows = [
+            ['01.12.25', 'x', 'Иванов', 'Абонемент'],
+            ['32-12', 'y', '', 'Разовое'],
+            ['03.12.25', 'z', 'Сидоров'],
+        ]
+        index = {k: i for i, k in enumerate(col_names) if k != 'лишняя'}
+        views = [RowView(row, index) for row in rows]
+        dicts = [{k: v for k, v in zip(col_names, row) if k != 'лишняя'} for row in rows]
+
+        assert [dict(v) for v in views] == dicts
+        assert validator.validate_dataset(views, 'sales') == validator.validate_dataset(dicts, 'sales')
+    
     def test_validate_empty_dataset(self, validator):
         """Пустой набор данных считается валидным."""
         result = validator.validate_dataset([], 'sales')
@@ -317,6 +333,16 @@ class TestValidationResult:
         
         assert result.error_rate == 0.0
 
+    def test_to_model_for_api_boundary(self):
+        """Pydantic-представление строится из компактных записей."""
+        error = ValidationError(row_index=3, column='дата', value='x', error_type='INVALID_DATE', message='bad')
+        result = ValidationResult(is_valid=False, total_rows=5, valid_rows=4, errors=[error])
+
+        assert result.to_model().model_dump() == {
+            'is_valid': False, 'total_rows': 5, 'valid_rows': 4,
+            'errors': [{'row_index': 3, 'column': 'дата', 'value': 'x', 'error_type': 'INVALID_DATE', 'message': 'bad'}],
+        }
+
 
 class TestEdgeCases:
     """Тесты граничных случаев."""
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.etl.loader import DataLoader
+from src.etl.webhook import (
+    EditBatcher, EditIngestor, SheetEdit, WebhookServer, parse_edits, range_start_column
+)
+
+SOURCES = {'spreadsheets': {'book': {'sheets': [
+    {'gid': '10', 'range': 'auto', 'target_table': 'stg_gsheets.clients_cur', 'pk': 'record_id'},
+    {'gid': '20', 'range': 'B3:E', 'target_table': 'stg_gsheets.expenses_cur'},
+]}}}
+
+HEADERS = {
+    '10': {'header_row': 2, 'data_start_row': 3, 'headers': ['Имя', 'record_id'], 'col_names': ['imya', 'record_id']},
+    '20': {'header_row': 3, 'data_start_row': 4, 'headers': ['a', 'b'], 'col_names': ['a', 'b']},
+}
+
+
+def test_parse_edits_forms_and_errors():
+    single = {'spreadsheet_id': 'book', 'gid': 10, 'start_row': 5, 'values': [['x', 'r1']]}
+    assert parse_edits(single) == [SheetEdit('book', '10', 5, [['x', 'r1']])]
+    assert len(parse_edits({'edits': [single, single]})) == 2
+    for bad in ({'gid': 10}, {**single, 'values': 'x'}, {**single, 'start_row': 0}, ['oops']):
+        with pytest.raises(ValueError):
+            parse_edits(bad)
+
+
+def test_batcher_keeps_latest_edit_per_row():
+    batcher = EditBatcher()
+    batcher.add(SheetEdit('book', '10', 5, [['a'], ['b']]))
+    batcher.add(SheetEdit('book', '10', 6, [['c']]))
+    assert batcher.pending == 2
+    assert batcher.drain() == {('book', '10'): {5: ['a'], 6: ['c']}}
+    assert batcher.pending == 0
+
+
+def test_range_start_column():
+    assert range_start_column('auto') == 0
+    assert range_start_column('B4:W') == 1
+    assert range_start_column('AA1:AC') == 26
+
+
+def make_ingestor():
+    with patch('src.etl.webhook.settings') as mock_settings:
+        mock_settings.sources = SOURCES
+        mock_settings.webhook_flush_seconds = 0.01
+        mock_settings.webhook_max_batch_rows = 3
+        mock_settings.webhook_reconcile_interval = '1h'
+        ingestor = EditIngestor(extractor=MagicMock())
+    ingestor.extractor.extract_headers = AsyncMock(return_value=HEADERS)
+    ingestor.processor.process_rows = AsyncMock(
+        side_effect=lambda cfg, cols, rows, **kw: {'table': cfg['target_table'], 'extracted': len(rows),
+                                                   'inserted': len(rows), 'updated': 0}
+    )
+    return ingestor
+
+
+@pytest.mark.asyncio
+async def test_flush_applies_only_edited_rows_with_partial_cdc():
+    ingestor = make_ingestor()
+    ingestor.submit([
+        SheetEdit('book', '10', 7, [['Иванов', 'r7', 'лишнее'], ['', '']]),
+        SheetEdit('book', '10', 5, [['Петров', 'r5']]),
+    ])
+
+    results = await ingestor.flush()
+
+    ingestor.extractor.extract_headers.assert_awaited_once()
+    args, kwargs = ingestor.processor.process_rows.call_args
+    assert args[1] == ['imya', 'record_id']
+    assert args[2] == [['Петров', 'r5'], ['Иванов', 'r7']]
+    assert kwargs['partial'] is True
+    assert kwargs['row_numbers'] == [4, 6]  # как при полной загрузке: строка - data_start_row + 2
+    assert results[0]['extracted'] == 2
+    # Очищенная строка 8 удаляется только при сверке
+    assert ('book', '10') in ingestor._touched
+
+
+@pytest.mark.asyncio
+async def test_flush_does_not_accumulate_spans():
+    from src.utils.tracing import tracer
+    tracer.reset()
+    ingestor = make_ingestor()
+    for start_row in (5, 6, 7):
+        ingestor.submit([SheetEdit('book', '10', start_row, [['Петров', f'r{start_row}']])])
+        await ingestor.flush()
+
+    assert ingestor.stats['applied_rows'] == 3
+    assert tracer.spans == []
+
+
+@pytest.mark.asyncio
+async def test_header_edits_and_sheets_without_pk_wait_for_reconcile():
+    ingestor = make_ingestor()
+    ingestor.submit([
+        SheetEdit('book', '10', 2, [['Имя', 'record_id']]),
+        SheetEdit('book', '20', 4, [['', '1', '2']]),
+    ])
+
+    assert await ingestor.flush() == []
+    ingestor.processor.process_rows.assert_not_called()
+    assert ingestor._touched == {('book', '10'), ('book', '20')}
+
+    pipeline = MagicMock()
+    pipeline.run = AsyncMock()
+    with patch('src.etl.webhook.ELTPipeline', return_value=pipeline):
+        await ingestor.reconcile()
+    assert pipeline.run.call_args.kwargs['tables'] == {'stg_gsheets.clients_cur', 'stg_gsheets.expenses_cur'}
+    assert not ingestor._touched
+
+
+def test_unknown_sheet_is_rejected():
+    ingestor = make_ingestor()
+    with pytest.raises(ValueError):
+        ingestor.submit([SheetEdit('other', '10', 5, [['x']])])
+
+
+def test_server_handle_token_and_health():
+    ingestor = make_ingestor()
+    server = WebhookServer(ingestor, host='127.0.0.1', port=0, token='secret')
+    body = json.dumps({'spreadsheet_id': 'book', 'gid': 10, 'start_row': 5, 'values': [['x', 'r']]}).encode()
+
+    assert server.handle('POST', '/edits', {}, body)[0] == 401
+    assert server.handle('POST', '/edits?token=secret', {}, body) == (202, {'accepted_rows': 1, 'pending_rows': 1})
+    assert server.handle('POST', '/edits', {'x-webhook-token': 'secret'}, b'{}')[0] == 400
+    status, health = server.handle('GET', '/health', {}, b'')
+    assert status == 200 and health['received_rows'] == 1
+
+
+@pytest.mark.asyncio
+async def test_posted_edits_are_flushed_by_size():
+    ingestor = make_ingestor()
+    server = await WebhookServer(ingestor, host='127.0.0.1', port=0, token='').start()
+    stop = asyncio.Event()
+    runner = asyncio.create_task(ingestor.run(stop))
+    try:
+        body = json.dumps({'spreadsheet_id': 'book', 'gid': 10, 'start_row': 3,
+                           'values': [['a', 'r1'], ['b', 'r2'], ['c', 'r3']]}).encode()
+        reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+        writer.write(b'POST /edits HTTP/1.1\r\nHost: x\r\nContent-Type: application/json\r\n'
+                     b'Content-Length: ' + str(len(body)).encode() + b'\r\n\r\n' + body)
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        assert response.startswith(b'HTTP/1.1 202')
+
+        for _ in range(100):
+            if ingestor.stats['applied_rows'] == 3:
+                break
+            await asyncio.sleep(0.01)
+        assert ingestor.stats['applied_rows'] == 3
+    finally:
+        stop.set()
+        await runner
+        await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_partial_load_cdc_reads_only_batch_keys_and_keeps_other_rows():
+    loader = DataLoader()
+    loader._fetch_column_parsers = AsyncMock(return_value={})
+    loader._apply_cdc_changes = AsyncMock()
+    with patch('src.etl.loader.DBConnection.fetch', AsyncMock(return_value=[])) as fetch:
+        stats = await loader.load_cdc('stg_gsheets.clients_cur', ['imya', 'record_id'],
+                                      [['Петров', 'r5']], 'record_id', partial=True, row_numbers=[4])
+
+    query, keys = fetch.call_args.args
+    assert 'ANY($1::text[])' in query and keys == ['r5']
+    assert stats == {'inserted': 1, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+    processor = loader._apply_cdc_changes.call_args.args[1]
+    assert processor.to_insert[0].row_index == 4
+    assert processor.to_insert[0].values == ['Петров', 'r5']